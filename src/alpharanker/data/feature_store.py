@@ -0,0 +1,367 @@
+"""
+feature_store.py
+================
+训练面板的内存映射特征库 (Memory-mapped Feature Store)。
+
+将 parquet 特征宽表一次性落盘为 float32 内存映射矩阵，之后所有训练/消融脚本
+只打开零拷贝视图，不再重复 read_parquet + copy + fillna + 切分。
+
+落盘结构 (store_dir/CURRENT 指向当前版本目录 store_dir/v-*/)：
+  - X.npy         : [行 × 特征] float32，按日期稳定排序，行优先 (C-order)
+  - label_*.npy   : 标签向量 (原始标签 + 5 档 relevance)
+  - dates.npy     : 每个截面的日期 (datetime64[ns])，严格升序
+  - offsets.npy   : 截面在行方向上的偏移 (长度 = 截面数 + 1)，即 LambdaRank 的 query group
+  - source_dates.npy : 源文件中的全部日期 (含标签缺失的截面)，比例切分以它为准
+  - tickers.npy   : 每行对应的股票代码
+  - meta.json     : 列索引、类别编码、填充规则与源文件指纹
+重建时写入新的版本目录再原子替换 CURRENT，旧版本即使仍被其他进程内存映射 (Windows 下无法删除) 也不受影响。
+
+用法:
+    store = load_or_build_store(FEATURES_PATH, FEATURE_COLS, date_col="report_date",
+                                label_col="label_rank", fill_value=0.0)
+    tr = store.view(end="2024-01-01")                 # 日期区间 → 连续行段，零拷贝
+    X, y, q = tr.X, tr.relevance, tr.group_sizes
+    sub = store.view(features=FEATURE_COLS[:6])       # 特征子集
+"""
+
+import os
+import json
+import hashlib
+import shutil
+import time
+import uuid
+import numpy as np
+import pandas as pd
+
+STORE_VERSION = 2
+CURRENT_FILE = "CURRENT"
+
+# 与各训练脚本中 pd.cut(pct, bins=[0, .2, .4, .6, .8, 1.0], include_lowest=True) 完全等价的分档边界
+RELEVANCE_BINS = np.array([0.2, 0.4, 0.6, 0.8])
+
+
+def relevance_grades(pct):
+    """截面百分位 → 5 档整数 (0=最差, 4=最佳)，右闭区间，与 pd.cut 的分档一致。"""
+    return np.searchsorted(RELEVANCE_BINS, np.asarray(pct, dtype=np.float64), side="left").astype(np.int32)
+
+
+def default_store_dir(source_path, build_tag=""):
+    """
+    特征库默认与源 parquet 并排存放: us_features.parquet → us_features.<tag>.store/
+    tag 为构建参数的短哈希，不同预处理口径 (填充值、标签列) 各自一份，互不覆盖。
+    """
+    stem = os.path.splitext(source_path)[0]
+    return f"{stem}.{build_tag}.store" if build_tag else f"{stem}.store"
+
+
+def _source_fingerprint(source_path):
+    """文件指纹；文件不存在时 size / mtime 为 None (之后出现同样会触发重建)"""
+    try:
+        st = os.stat(source_path)
+    except OSError:
+        return {"path": os.path.abspath(source_path), "size": None, "mtime_ns": None}
+    return {"path": os.path.abspath(source_path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def resolve_store_dir(store_dir):
+    """CURRENT 指向的版本目录；旧版单目录布局 (meta.json 直接在 store_dir 下) 原样返回"""
+    pointer = os.path.join(store_dir, CURRENT_FILE)
+    if os.path.exists(pointer):
+        with open(pointer, "r", encoding="utf-8") as f:
+            return os.path.join(store_dir, f.read().strip())
+    return store_dir
+
+
+class StoreView:
+    """
+    特征库在某个日期区间/特征子集上的只读视图。
+    行方向永远是连续切片 (零拷贝)；特征方向若为连续列段同样零拷贝，否则只复制所选列。
+    """
+
+    def __init__(self, store, row_slice, date_slice, col_idx):
+        self._store = store
+        self.rows = row_slice
+        self._dates = date_slice
+        self._col_idx = col_idx
+
+    @property
+    def feature_cols(self):
+        return [self._store.feature_cols[i] for i in self._col_idx]
+
+    @property
+    def X(self):
+        return self._store._take_columns(self._store.X[self.rows], self._col_idx)
+
+    @property
+    def relevance(self):
+        return self._store.labels["relevance"][self.rows]
+
+    def label(self, name):
+        return self._store.labels[name][self.rows]
+
+    @property
+    def dates(self):
+        """本视图覆盖的截面日期 (升序)。"""
+        return self._store.dates[self._dates]
+
+    @property
+    def group_sizes(self):
+        """LambdaRank query group：每个截面的行数。"""
+        return np.diff(self._store.offsets[self._dates.start:self._dates.stop + 1])
+
+    @property
+    def row_dates(self):
+        """逐行日期 (由 offsets 展开，不读盘)。"""
+        return np.repeat(self.dates, self.group_sizes)
+
+    @property
+    def tickers(self):
+        return self._store.tickers[self.rows]
+
+    def __len__(self):
+        return self.rows.stop - self.rows.start
+
+    def frame(self, features=None, labels=None):
+        """
+        构造用于评估的轻量 DataFrame：日期、ticker、全部标签，以及按需附带的特征列。
+        只物化实际请求的列，不会复制整块特征矩阵。
+        """
+        date_col = self._store.date_col
+        data = {date_col: self.row_dates, "ticker": self.tickers}
+        for name in (labels if labels is not None else self._store.label_names):
+            data[name] = self.label(name)
+        for col in (features or []):
+            data[col] = self._store.X[self.rows, self._store.feature_index([col])[0]]
+        return pd.DataFrame(data)
+
+
+class FeatureStore:
+    """
+    只读打开一个已落盘的特征库。全部数组均通过 np.load(mmap_mode='r') 映射，
+    打开成本与面板大小无关，多个进程可共享同一份页缓存。
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.version_dir = resolve_store_dir(store_dir)
+        with open(os.path.join(self.version_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+
+        self.feature_cols = self.meta["feature_cols"]
+        self.label_names = self.meta["label_names"]
+        self.date_col = self.meta["date_col"]
+        self.categories = self.meta.get("categories", {})
+        self._col_pos = {c: i for i, c in enumerate(self.feature_cols)}
+
+        def _load(name):
+            return np.load(os.path.join(self.version_dir, name), mmap_mode="r")
+
+        self.X = _load("X.npy")
+        self.dates = _load("dates.npy")
+        self.source_dates = _load("source_dates.npy")
+        self.offsets = _load("offsets.npy")
+        self.tickers = _load("tickers.npy")
+        self.labels = {name: _load(f"label_{name}.npy") for name in self.label_names}
+
+    @property
+    def n_rows(self):
+        return self.X.shape[0]
+
+    @property
+    def fingerprint(self):
+        """数据指纹：源文件 + 构建参数。用于下游模型缓存的 key。"""
+        return self.meta["fingerprint"]
+
+    def feature_index(self, cols):
+        missing = [c for c in cols if c not in self._col_pos]
+        if missing:
+            raise KeyError(f"特征库中不存在以下列: {missing}")
+        return [self._col_pos[c] for c in cols]
+
+    @staticmethod
+    def _take_columns(X, col_idx):
+        # 连续升序列段 → 直接切片 (视图)；否则仅复制所选列
+        if len(col_idx) == X.shape[1] and col_idx == list(range(X.shape[1])):
+            return X
+        if col_idx and col_idx == list(range(col_idx[0], col_idx[-1] + 1)):
+            return X[:, col_idx[0]:col_idx[-1] + 1]
+        return X[:, col_idx]
+
+    def date_positions(self, start=None, end=None):
+        """日期区间 [start, end) → 截面下标区间。"""
+        lo = 0 if start is None else int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start)), side="left"))
+        hi = len(self.dates) if end is None else int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(end)), side="left"))
+        return lo, max(lo, hi)
+
+    def view(self, start=None, end=None, features=None):
+        """返回日期区间 [start, end) 与特征子集上的零拷贝视图。"""
+        lo, hi = self.date_positions(start, end)
+        return self.view_by_position(lo, hi, features)
+
+    def view_by_position(self, lo, hi, features=None):
+        """按截面下标 [lo, hi) 取视图，用于按比例或滚动窗口切分。"""
+        col_idx = self.feature_index(features) if features is not None else list(range(len(self.feature_cols)))
+        rows = slice(int(self.offsets[lo]), int(self.offsets[hi]))
+        return StoreView(self, rows, slice(lo, hi), col_idx)
+
+    def available(self, cols):
+        """按给定顺序过滤出特征库中实际存在的列 (源文件可能缺少部分因子)。"""
+        return [c for c in cols if c in self._col_pos]
+
+    def split_positions(self, train=0.70, val=0.15):
+        """
+        与各脚本 split_by_time 一致：按源文件的全部截面日期 (含标签缺失、建库时被丢弃的截面)
+        取 70/15/15 的分界日期，再映射为本库的截面下标区间 (train, val, test)。
+        """
+        src = self.source_dates
+        n = len(src)
+        n_train, n_val = int(n * train), int(n * val)
+
+        def pos(i):
+            if i >= n:
+                return len(self.dates)
+            return int(np.searchsorted(self.dates, src[i], side="left"))
+
+        a, b = pos(n_train), pos(n_train + n_val)
+        return (0, a), (a, b), (b, len(self.dates))
+
+    def split_by_ratio(self, train=0.70, val=0.15, features=None):
+        """按 split_positions 切分为 (train, val, test) 三个视图。"""
+        return tuple(self.view_by_position(lo, hi, features) for lo, hi in self.split_positions(train, val))
+
+
+def _remove_stale_versions(store_dir, keep):
+    """清理旧版本目录 (及旧版单目录布局的文件)；仍被映射而删不掉的留待下次构建再清"""
+    for name in os.listdir(store_dir):
+        path = os.path.join(store_dir, name)
+        if name.startswith("v-") and name != keep:
+            shutil.rmtree(path, ignore_errors=True)
+        elif name.endswith(".npy") or name == "meta.json":
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def build_store(df, store_dir, feature_cols, date_col="date", label_col="label_rank",
+                extra_label_cols=(), categorical_cols=(), fill_value=0.5, fill_median=True,
+                ticker_col="ticker", fingerprint=None):
+    """
+    将特征宽表落盘为内存映射特征库。
+
+    预处理与各训练脚本的 prepare_data 保持一致 (只做一次):
+      1. 丢弃 label_col 缺失的行，按日期稳定排序
+      2. 数值特征先用截面中位数填充 (fill_median=True)，再用 fill_value 兜底
+      3. 类别特征编码为整数 code，映射表写入 meta.json
+      4. label_col 截面百分位 → 5 档 relevance
+    """
+    source_dates = np.unique(pd.to_datetime(df[date_col]).values).astype("datetime64[ns]")
+    df = df[df[label_col].notna()]
+    dates = pd.to_datetime(df[date_col])
+    order = np.argsort(dates.values, kind="stable")
+    df = df.iloc[order]
+    dates = dates.iloc[order]
+
+    requested_cols = list(feature_cols)
+    feature_cols = [c for c in feature_cols if c in df.columns]
+    categorical_cols = [c for c in categorical_cols if c in feature_cols]
+    numeric_cols = [c for c in feature_cols if c not in categorical_cols]
+    n = len(df)
+
+    # 每次构建写入新的版本目录，完成后再切换 CURRENT 指针
+    version = f"v-{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    tmp_dir = os.path.join(store_dir, version)
+    os.makedirs(tmp_dir)
+
+    # 逐列写入 memmap，避免整块 float64 中间矩阵
+    X = np.lib.format.open_memmap(os.path.join(tmp_dir, "X.npy"), mode="w+",
+                                  dtype=np.float32, shape=(n, len(feature_cols)))
+    if fill_median and numeric_cols:
+        medians = df[numeric_cols].groupby(dates.values).transform("median")
+    categories = {}
+    for j, col in enumerate(feature_cols):
+        if col in categorical_cols:
+            cat = df[col].astype("category")
+            categories[col] = [str(c) for c in cat.cat.categories]
+            X[:, j] = cat.cat.codes.values
+        else:
+            v = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+            if fill_median:
+                v = np.where(np.isnan(v), medians[col].to_numpy(dtype=np.float64, na_value=np.nan), v)
+            X[:, j] = np.where(np.isnan(v), fill_value, v)
+    X.flush()
+    del X
+
+    uniq, counts = np.unique(dates.values, return_counts=True)
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    np.save(os.path.join(tmp_dir, "dates.npy"), uniq.astype("datetime64[ns]"))
+    np.save(os.path.join(tmp_dir, "offsets.npy"), offsets)
+    np.save(os.path.join(tmp_dir, "source_dates.npy"), source_dates)
+    np.save(os.path.join(tmp_dir, "tickers.npy"), df[ticker_col].astype(str).values.astype("U"))
+
+    label_names = ["relevance", label_col] + [c for c in extra_label_cols if c in df.columns and c != label_col]
+    pct = df[label_col].groupby(dates.values).rank(pct=True)
+    np.save(os.path.join(tmp_dir, "label_relevance.npy"), relevance_grades(pct.values))
+    for name in label_names[1:]:
+        np.save(os.path.join(tmp_dir, f"label_{name}.npy"), df[name].values.astype(np.float32))
+
+    meta = {
+        "version": STORE_VERSION,
+        "n_rows": n,
+        "feature_cols": feature_cols,
+        "requested_cols": requested_cols,
+        "categories": categories,
+        "label_names": label_names,
+        "date_col": date_col,
+        "fill_value": fill_value,
+        "fill_median": fill_median,
+        "fingerprint": fingerprint or {},
+    }
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    pointer = os.path.join(store_dir, CURRENT_FILE)
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(pointer + ".tmp", pointer)
+    _remove_stale_versions(store_dir, keep=version)
+    print(f"✅ 特征库已构建: {store_dir} ({n} 行 × {len(feature_cols)} 特征, {len(uniq)} 截面)")
+    return FeatureStore(store_dir)
+
+
+def load_or_build_store(source_path, feature_cols, store_dir=None, transform=None, depends=(), **build_kwargs):
+    """
+    打开与源 parquet 对应的特征库；若源文件或构建参数发生变化则重建。
+    已有特征库只要覆盖了所请求的列即可复用 (多个脚本共享同一份面板，列顺序以 view(features=...) 为准)；
+    否则以 已有列 ∪ 请求列 重建。
+
+    transform: 可选的 DataFrame → DataFrame 预处理 (如合并宏观 regime 标签、L1 校验)，
+               只在重建时执行一次。
+    depends  : transform 额外读取的文件 (如 macro_regime.parquet)，其指纹一并纳入校验，变化即重建。
+    """
+    build = {
+        "transform": getattr(transform, "__qualname__", None),
+        "build": {k: list(v) if isinstance(v, (list, tuple)) else v for k, v in sorted(build_kwargs.items())},
+    }
+    build_tag = hashlib.sha1(json.dumps(build, sort_keys=True).encode("utf-8")).hexdigest()[:8]
+    store_dir = store_dir or default_store_dir(source_path, build_tag)
+    fingerprint = {"source": _source_fingerprint(source_path), **build}
+    if depends:
+        fingerprint["depends"] = [_source_fingerprint(p) for p in depends]
+
+    requested = list(feature_cols)
+    meta_path = os.path.join(resolve_store_dir(store_dir), "meta.json")
+    if os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") == STORE_VERSION and meta.get("fingerprint") == fingerprint:
+            known = meta.get("requested_cols", meta["feature_cols"])
+            if set(requested) <= set(known):
+                return FeatureStore(store_dir)
+            requested = known + [c for c in requested if c not in known]
+
+    print(f">> 特征库缺失或已过期，正在从 {source_path} 重建...")
+    df = pd.read_parquet(source_path)
+    if transform is not None:
+        df = transform(df)
+    return build_store(df, store_dir, requested, fingerprint=fingerprint, **build_kwargs)
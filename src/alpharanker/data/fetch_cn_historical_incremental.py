@@ -5,6 +5,9 @@ from tqdm import tqdm
 import sys
 import time
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from alpharanker.data.index_constituents import ensure_constituents
+
 # 路径配置
 DATA_ROOT = r'C:\Data\Market'
 PRICE_DIR = os.path.join(DATA_ROOT, 'cn', 'prices')
@@ -54,20 +57,21 @@ def fetch_chunk(ticker_std, start_date, end_date):
     combined_df.to_parquet(file_path, compression="snappy")
     return "SUCCESS"
 
-def get_index_tickers():
-    bs.login()
-    tickers = []
-    for query_func in [bs.query_hs300_stocks, bs.query_zz500_stocks]:
-        rs = query_func()
-        while rs.next():
-            r = rs.get_row_data()
-            tickers.append(r[1].split(".")[1] + (".SS" if r[1].startswith("sh") else ".SZ"))
-    bs.logout()
-    return list(set(tickers))
+def get_index_tickers(start_date=None, end_date=None):
+    """
+    HS300 + ZZ500 成分股。给定区间时取区间内任意时点在指数中的标的 (Point-in-Time，无生存偏差)，
+    否则取当前成分股。成分股来自本地区间库，不再每次登录查询。
+    """
+    store = ensure_constituents()
+    if start_date is None:
+        today = pd.Timestamp.today()
+        tickers = set(store.members_on(today, "HS300")) | set(store.members_on(today, "ZZ500"))
+        return sorted(tickers)
+    return list(store.members_between(start_date, end_date or pd.Timestamp.today(), ("HS300", "ZZ500")))
 
 def main():
-    focus_tickers = get_index_tickers()
     years = ["2014", "2015", "2016"]
+    focus_tickers = get_index_tickers(f"{years[0]}-01-01", f"{years[-1]}-12-31")
     
     print(f">> 开始补全历史数据 (增量模式): {years}")
     
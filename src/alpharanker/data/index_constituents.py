@@ -0,0 +1,321 @@
+"""
+index_constituents.py
+=====================
+HS300 / ZZ500 成分股的 Point-in-Time 区间库。
+
+原先 signal_generator 每个信号日都要登录 Baostock 查一次成分股，
+fetch_cn_historical*.get_index_tickers 与 eval_cn_* 又各自维护一份 "当前成分股" index_map
+(带生存偏差)。这里把成分股历史一次性整理成区间表并落盘：
+
+  - 区间表 (index, ticker, name, start, end)：end 为空表示至今仍在指数中
+  - 增量刷新：只对上次覆盖日之后的月末做快照查询，updateDate 未变的快照直接跳过
+  - 内存中按 "变动日" 切段，每段一行 [段 × 标的] 布尔矩阵：
+      members_on(d)          → 一次二分查找 + 取预先算好的数组
+      members_between(a, b)  → 相关段按行 any
+      contains(tickers, dates) → 整个面板一次向量化打标
+
+用法:
+    store = ensure_constituents(until="2024-12-31")       # 必要时增量刷新
+    store.members_on("2020-06-30", "HS300")
+    store.members_between("2014-01-01", "2016-12-31", ("HS300", "ZZ500"))
+    df["index_group"] = store.index_group(df["ticker"], df["date"])
+"""
+
+import os
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+
+DATA_ROOT = r'C:\Data\Market'
+CONSTITUENTS_PATH = os.path.join(DATA_ROOT, 'cn', 'index_constituents.parquet')
+HISTORY_START = "2014-01-01"
+
+INDEX_QUERIES = {"HS300": "query_hs300_stocks", "ZZ500": "query_zz500_stocks", "SZ50": "query_sz50_stocks"}
+DEFAULT_INDICES = ("HS300", "ZZ500")
+
+_OPEN_END = np.datetime64("2262-01-01", "D")
+
+
+def _bs_to_std(bs_code):
+    """sh.600519 → 600519.SS"""
+    market, _, code = bs_code.partition(".")
+    return f"{code}.{'SS' if market == 'sh' else 'SZ'}"
+
+
+def _day(d):
+    if isinstance(d, str) and len(d) >= 10:
+        return np.datetime64(d[:10], "D")
+    return np.datetime64(pd.Timestamp(d).date(), "D")
+
+
+def _meta_path(path):
+    return os.path.splitext(path)[0] + ".meta.json"
+
+
+class _IndexSegments:
+    """单个指数的分段成员矩阵"""
+
+    def __init__(self, intervals):
+        self.tickers = np.array(sorted(intervals["ticker"].unique()), dtype=object)
+        starts = intervals["start"].to_numpy().astype("datetime64[D]")
+        ends = intervals["end"].to_numpy().astype("datetime64[D]")
+        ends = np.where(np.isnat(ends), _OPEN_END, ends)
+        self.breaks = np.unique(np.r_[starts, ends[ends < _OPEN_END]])
+        tid = np.searchsorted(self.tickers, intervals["ticker"].to_numpy())
+        # 段 i = [breaks[i], breaks[i+1])；区间 [start, end) 覆盖 start 所在段到 end 前一段
+        lo = np.searchsorted(self.breaks, starts)
+        hi = np.searchsorted(self.breaks, ends)
+        self.member = np.zeros((len(self.breaks), len(self.tickers)), dtype=bool)
+        for t, a, b in zip(tid, lo, hi):
+            self.member[a:b, t] = True
+        self._sets = [self.tickers[row] for row in self.member]
+        self._empty = np.array([], dtype=object)
+        # members_on 直接返回缓存数组，设为只读，调用方修改不会污染区间库
+        for arr in self._sets + [self._empty]:
+            arr.flags.writeable = False
+
+    def segment(self, d):
+        return int(np.searchsorted(self.breaks, _day(d), side="right")) - 1
+
+    def members_on(self, d):
+        i = self.segment(d)
+        return self._sets[i] if i >= 0 else self._empty
+
+    def members_between(self, a, b):
+        lo, hi = max(self.segment(a), 0), self.segment(b)
+        if hi < 0 or hi < lo:
+            return self._empty
+        return self.tickers[self.member[lo:hi + 1].any(axis=0)]
+
+    def contains(self, tickers, dates):
+        seg = np.searchsorted(self.breaks, dates, side="right") - 1
+        tid = np.searchsorted(self.tickers, tickers)
+        tid = np.minimum(tid, len(self.tickers) - 1)
+        found = (len(self.tickers) > 0) & (self.tickers[tid] == tickers) & (seg >= 0)
+        out = np.zeros(len(tickers), dtype=bool)
+        out[found] = self.member[seg[found], tid[found]]
+        return out
+
+
+class ConstituentStore:
+    """
+    指数成分股区间库。intervals 列: index, ticker, name, start, end (NaT = 至今)
+    covered_until: {指数: 已快照覆盖到的日期}，之后的日期视为沿用最后一次快照
+    """
+
+    def __init__(self, intervals, covered_until=None):
+        self.intervals = intervals.sort_values(["index", "ticker", "start"]).reset_index(drop=True)
+        self.covered_until = dict(covered_until or {})
+        self._segments = {ix: _IndexSegments(g) for ix, g in self.intervals.groupby("index")}
+        latest = self.intervals.sort_values("start").drop_duplicates("ticker", keep="last")
+        self.names = dict(zip(latest["ticker"], latest["name"]))
+
+    @property
+    def indices(self):
+        return sorted(self._segments)
+
+    def _seg(self, index):
+        if index not in self._segments:
+            raise KeyError(f"成分股库中没有指数 {index}，可选: {self.indices}")
+        return self._segments[index]
+
+    def covers(self, d, indices=DEFAULT_INDICES):
+        return all(ix in self.covered_until and _day(self.covered_until[ix]) >= _day(d) for ix in indices)
+
+    # ── 查询 ────────────────────────────────────────────────────────────────
+    def members_on(self, d, index="HS300"):
+        """d 当日的成分股 (已排序的只读代码数组，需要修改时请 .copy())"""
+        return self._seg(index).members_on(d)
+
+    def members_between(self, a, b, indices="HS300"):
+        """[a, b] 期间任意一天在指数中的标的 (可传多个指数取并集)"""
+        indices = (indices,) if isinstance(indices, str) else indices
+        parts = [self._seg(ix).members_between(a, b) for ix in indices]
+        return np.array(sorted(set().union(*parts)), dtype=object) if len(parts) > 1 else parts[0]
+
+    def contains(self, tickers, dates, index="HS300"):
+        """逐行判断 (ticker, date) 当时是否在指数中，返回布尔数组"""
+        tickers = np.asarray(tickers, dtype=object)
+        dates = pd.DatetimeIndex(dates).values.astype("datetime64[D]")
+        return self._seg(index).contains(tickers, dates)
+
+    def index_group(self, tickers, dates, indices=DEFAULT_INDICES, other="Other"):
+        """Point-in-time 的 index_group 标签：按 indices 顺序取第一个命中的指数，否则 other"""
+        out = np.full(len(tickers), other, dtype=object)
+        for ix in reversed(indices):
+            out[self.contains(tickers, dates, ix)] = ix
+        return out
+
+    # ── 落盘 ────────────────────────────────────────────────────────────────
+    def save(self, path=CONSTITUENTS_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        self.intervals.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+        with open(_meta_path(path), "w", encoding="utf-8") as f:
+            json.dump({"covered_until": self.covered_until}, f, ensure_ascii=False, indent=2)
+        return path
+
+    @classmethod
+    def load(cls, path=CONSTITUENTS_PATH):
+        intervals = pd.read_parquet(path)
+        covered = {}
+        if os.path.exists(_meta_path(path)):
+            with open(_meta_path(path), "r", encoding="utf-8") as f:
+                covered = json.load(f).get("covered_until", {})
+        return cls(intervals, covered)
+
+
+# ── 由快照序列构建 / 延伸区间 ──────────────────────────────────────────────────
+def _empty_intervals():
+    return pd.DataFrame({"index": pd.Series(dtype=object), "ticker": pd.Series(dtype=object),
+                         "name": pd.Series(dtype=object), "start": pd.Series(dtype="datetime64[ns]"),
+                         "end": pd.Series(dtype="datetime64[ns]")})
+
+
+def apply_snapshots(intervals, index, snapshots):
+    """
+    把按生效日升序的快照 [(生效日, {ticker: name}), ...] 接到已有区间表之后：
+    新进入的标的开区间，被剔除的标的在该生效日关闭区间。
+    """
+    rows = intervals.to_dict("records")
+    open_rows = {r["ticker"]: r for r in rows if r["index"] == index and pd.isna(r["end"])}
+    for eff, members in snapshots:
+        eff = pd.Timestamp(eff)
+        for t in [t for t in open_rows if t not in members]:
+            open_rows.pop(t)["end"] = eff
+        for t, name in members.items():
+            if t not in open_rows:
+                row = {"index": index, "ticker": t, "name": name, "start": eff, "end": pd.NaT}
+                rows.append(row)
+                open_rows[t] = row
+    out = pd.DataFrame(rows, columns=["index", "ticker", "name", "start", "end"]) if rows else _empty_intervals()
+    out["start"] = pd.to_datetime(out["start"])
+    out["end"] = pd.to_datetime(out["end"])
+    return out
+
+
+def _query_snapshot(bs, index, d):
+    rs = getattr(bs, INDEX_QUERIES[index])(date=d)
+    if rs.error_code != "0":
+        raise RuntimeError(f"Baostock 查询 {index} 成分股失败 ({d}): {rs.error_code} {rs.error_msg}")
+    members, eff = {}, None
+    while rs.next():
+        r = rs.get_row_data()
+        eff = eff or r[0]
+        members[_bs_to_std(r[1])] = r[2]
+    return eff, members
+
+
+def refresh_constituents(indices=DEFAULT_INDICES, until=None, path=CONSTITUENTS_PATH, start=HISTORY_START):
+    """
+    增量刷新：每个指数只对 covered_until 之后的月末 (以及 until 当天) 查询快照，
+    快照生效日 (updateDate) 与上一次相同则跳过。全程只登录一次 Baostock。
+    covered_until 只推进到最后一个确实返回了快照的探测日；查询失败时保留已拿到的部分并落盘，
+    其余留待下次刷新。登录失败直接抛出 RuntimeError。
+    """
+    import baostock as bs
+
+    store = ConstituentStore.load(path) if os.path.exists(path) else None
+    intervals = store.intervals if store is not None else _empty_intervals()
+    covered = dict(store.covered_until) if store is not None else {}
+    until = pd.Timestamp(until or pd.Timestamp.today()).normalize()
+
+    lg = bs.login()
+    if lg.error_code != "0":
+        raise RuntimeError(f"Baostock 登录失败: {lg.error_code} {lg.error_msg}")
+    try:
+        for index in indices:
+            since = pd.Timestamp(covered[index]) + pd.Timedelta(days=1) if index in covered else pd.Timestamp(start)
+            if since > until:
+                continue
+            probe = list(pd.date_range(since, until, freq=pd.offsets.MonthEnd())) + [until]
+            last_eff = intervals.loc[intervals["index"] == index, "start"].max()
+            snapshots, reached = [], None
+            for d in probe:
+                try:
+                    eff, members = _query_snapshot(bs, index, d.strftime("%Y-%m-%d"))
+                except Exception as e:
+                    print(f"  ⚠️ [成分股] {index}: {e}，本次只覆盖到 {reached.date() if reached is not None else '无'}")
+                    break
+                if not members:
+                    continue
+                reached = d
+                eff = pd.Timestamp(eff) if eff else d
+                if pd.notna(last_eff) and eff <= last_eff:
+                    continue                        # 快照未变，仍确认覆盖到 d
+                snapshots.append((eff, members))
+                last_eff = eff
+            intervals = apply_snapshots(intervals, index, snapshots)
+            if reached is not None:
+                covered[index] = reached.strftime("%Y-%m-%d")
+            print(f"  [成分股] {index}: 新增 {len(snapshots)} 次调整，覆盖至 {covered.get(index, '无')}")
+    finally:
+        bs.logout()
+
+    store = ConstituentStore(intervals, covered)
+    store.save(path)
+    _CACHE.pop(os.path.abspath(path), None)
+    return store
+
+
+# ── 进程内缓存 ───────────────────────────────────────────────────────────────
+_CACHE = {}
+_LOCK = threading.Lock()
+_ATTEMPTED = {}         # {(路径, 指数组): 本进程已尝试刷新到的日期}，刷新失败 / 不足时不重复登录
+
+
+def load_constituents(path=CONSTITUENTS_PATH):
+    """读取区间库 (按文件 mtime 缓存)；文件不存在时返回 None"""
+    path = os.path.abspath(path)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    with _LOCK:
+        hit = _CACHE.get(path)
+        if hit is not None and hit[0] == mtime:
+            return hit[1]
+    store = ConstituentStore.load(path)
+    with _LOCK:
+        _CACHE[path] = (mtime, store)
+    return store
+
+
+def ensure_constituents(until=None, indices=DEFAULT_INDICES, path=CONSTITUENTS_PATH):
+    """
+    返回覆盖到 until (默认今天) 的区间库，覆盖不足时增量刷新。
+    刷新失败或仍未覆盖到 until 时沿用已有区间 (之后视为沿用最后一次快照) 并告警；
+    库中完全没有所需指数的数据时抛出 RuntimeError。
+    """
+    until = until or pd.Timestamp.today().strftime("%Y-%m-%d")
+    store = load_constituents(path)
+    attempt_key = (os.path.abspath(path), tuple(indices))
+    attempted = _ATTEMPTED.get(attempt_key)
+    # 已有区间库时同一进程只为同一覆盖目标尝试一次；完全没有库时每次都重试 (否则只能报错)
+    if store is None or (not store.covers(until, indices) and (attempted is None or _day(attempted) < _day(until))):
+        _ATTEMPTED[attempt_key] = until
+        try:
+            store = refresh_constituents(indices, until=until, path=path)
+        except Exception as e:
+            print(f"  ⚠️ [成分股] 区间库刷新失败: {e}")
+        if store is not None and not store.covers(until, indices):
+            print(f"  ⚠️ [成分股] 区间库仅覆盖至 {store.covered_until}，{until} 按最后一次快照处理")
+    missing = [ix for ix in indices if store is None or ix not in store.indices]
+    if missing:
+        raise RuntimeError(f"成分股区间库中没有 {missing} 的数据 (Baostock 刷新失败?)，无法确定成分股")
+    return store
+
+
+if __name__ == "__main__":
+    import time
+
+    store = ensure_constituents()
+    print(f"区间数: {len(store.intervals)}  指数: {store.indices}  覆盖: {store.covered_until}")
+    dates = pd.date_range("2015-01-01", "2024-12-31", freq=pd.offsets.MonthEnd())
+    t0 = time.perf_counter()
+    sizes = [len(store.members_on(d, "HS300")) for d in dates]
+    print(f"{len(dates)} 个月末 members_on: {(time.perf_counter() - t0) * 1e6 / len(dates):.1f} µs/次，"
+          f"成分股数 {min(sizes)}-{max(sizes)}")
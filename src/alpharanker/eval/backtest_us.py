@@ -17,7 +17,6 @@ backtest_us.py
 
 import os
 import sys
-import pickle
 import warnings
 import numpy as np
 import pandas as pd
@@ -31,6 +30,7 @@ warnings.filterwarnings("ignore")
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 from config import MODEL_DIR
+from alpharanker.model.scoring import load_model, feature_matrix
 
 FEATURES_PATH = r"C:\Data\Market\us\us_features.parquet"
 MODEL_PATH    = os.path.join(MODEL_DIR, "us_lgbm.pkl")
@@ -58,31 +58,27 @@ def run_backtest():
     df = pd.read_parquet(FEATURES_PATH)
     df["report_date"] = pd.to_datetime(df["report_date"])
 
-    with open(MODEL_PATH, "rb") as f:
-        payload = pickle.load(f)
-    model   = payload["model"]
-    features = payload["features"]
+    model = load_model(MODEL_PATH)
+    features = model.features
 
     # 只保留有标签的样本（model 对没标签的也可以预测，但评估需要标签）
     df_eval = df[df["label_3m_return"].notna()].copy()
     print(f"\n有效样本: {len(df_eval)} 行 | 截面: {df_eval['report_date'].nunique()} | 股票: {df_eval['ticker'].nunique()}")
 
-    dates = sorted(df_eval["report_date"].unique())
+    # ── 全历史面板一次性打分 ──────────────────────────────────────────────────
+    valid_feats = [c for c in features if c in df_eval.columns]
+    df_eval["score"] = model.predict(feature_matrix(df_eval, valid_feats))
 
-    # ── 逐截面预测 ────────────────────────────────────────────────────────────
+    # ── 逐截面评估 ────────────────────────────────────────────────────────────
     ic_records = []       # 每期IC
     quintile_rets = []    # 每期各分位组收益
     top_rets = []         # 每期 Top-N 组合收益
     bench_rets = []       # 每期等权基准收益
 
-    for date in dates:
-        grp = df_eval[df_eval["report_date"] == date].copy()
+    for date, grp in df_eval.groupby("report_date", sort=True):
         if len(grp) < N_GROUPS * 2:
             continue
-
-        valid_feats = [c for c in features if c in grp.columns]
-        X = grp[valid_feats].values.astype(np.float32)
-        grp["score"] = model.predict(X)
+        grp = grp.copy()
 
         # IC
         ic, _ = spearmanr(grp["score"], grp["label_3m_return"])
@@ -7,9 +7,9 @@ import statsmodels.api as sm
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 from config import CN_DIR
+from alpharanker.data.index_constituents import ensure_constituents
 
 FEATURES_PATH = os.path.join(CN_DIR, 'cn_features_enhanced.parquet')
-INDEX_MAP_PATH = os.path.join(CN_DIR, 'index_map.parquet')
 
 def calculate_ic_series(df, factor, target):
     ics = []
@@ -35,16 +35,14 @@ def main():
     print("  Alpha Genome: A 股基因时序衰减分析 (IC Decay)")
     print("="*80)
 
-    if not os.path.exists(FEATURES_PATH) or not os.path.exists(INDEX_MAP_PATH):
+    if not os.path.exists(FEATURES_PATH):
         print("❌ 缺少数据。")
         return
 
     df = pd.read_parquet(FEATURES_PATH)
-    index_map = pd.read_parquet(INDEX_MAP_PATH)
-    index_map['ticker'] = index_map['code'].str.split(".").str[1] + np.where(index_map['code'].str.startswith("sh"), ".SS", ".SZ")
-    
-    df = pd.merge(df, index_map[['ticker', 'index_group']], on='ticker', how='left')
-    df['index_group'] = df['index_group'].fillna('Other')
+    # Point-in-Time 分组：每个截面按当日实际成分股打标 (原 index_map 只有当前成分股，带生存偏差)
+    store = ensure_constituents(until=str(pd.Timestamp(df["date"].max()).date()))
+    df['index_group'] = store.index_group(df['ticker'].to_numpy(), df['date'])
     
     factors = ["sp_ratio_rank", "vol_60d_res_rank", "mom_60d_rank"]
     horizons = ["label_5d", "label_20d", "label_60d", "label_120d"]
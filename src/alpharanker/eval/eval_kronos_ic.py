@@ -74,7 +74,7 @@ def main():
                 
             try:
                 # 调用 Kronos API
-                pred_df = predict_market_trend(hist_df, pred_len=20, sample_count=3)
+                pred_df = predict_market_trend(hist_df, pred_len=20, sample_count=3, exchange="SSE")
                 if pred_df is None: continue
                 
                 kronos_return = pred_df.attrs.get('mean_return', 0)
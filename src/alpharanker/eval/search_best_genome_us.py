@@ -13,14 +13,14 @@ Alpha Genome 集成与消融实验 (Ablation Study)。
 
 import os
 import sys
-import pickle
 import numpy as np
 import pandas as pd
-import lightgbm as lgb
 from scipy.stats import spearmanr
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 from config import DATA_ROOT
+from alpharanker.data.feature_store import load_or_build_store
+from alpharanker.model.genome_harness import GenomeHarness
 
 FEAT_PATH = r"C:\Data\Market\us\us_features_enhanced.parquet"
 
@@ -39,67 +39,44 @@ GENOMES = {
                            "SP_sec_rank"]
 }
 
-def train_and_eval(df, features, genome_name):
-    # 类别特征处理
-    df_train = df[df['data_split'] == 'train'].copy()
-    df_val = df[df['data_split'] == 'val'].copy()
-    df_test = df[df['data_split'] == 'test'].copy()
-    
-    # 包含 regime_label 的话
-    use_features = features + ["regime_label"]
-    
-    for col in features:
-        df_train[col] = df_train[col].fillna(0.5)
-        df_val[col] = df_val[col].fillna(0.5)
-        df_test[col] = df_test[col].fillna(0.5)
-        
-    df_train["regime_label"] = df_train["regime_label"].astype('category')
-    df_val["regime_label"] = df_val["regime_label"].astype('category')
-    df_test["regime_label"] = df_test["regime_label"].astype('category')
-    
-    # Label
-    df_train['relevance'] = pd.cut(df_train.groupby("report_date")["label_excess_rank"].transform(lambda x: x.rank(pct=True)), 
-                                 bins=[0, 0.2, 0.4, 0.6, 0.8, 1.0], labels=[0,1,2,3,4], include_lowest=True).astype(int)
-    df_val['relevance'] = pd.cut(df_val.groupby("report_date")["label_excess_rank"].transform(lambda x: x.rank(pct=True)), 
-                               bins=[0, 0.2, 0.4, 0.6, 0.8, 1.0], labels=[0,1,2,3,4], include_lowest=True).astype(int)
+def load_store():
+    """
+    面板只落盘/映射一次，所有基因组合共享同一份 float32 矩阵。
+    预处理与原脚本一致：特征缺失直接填 0.5，regime_label 编码为类别 code，
+    label_excess_rank 截面分 5 档作为训练标签，label_3m_excess 保留用于 IC 评估。
+    """
+    union = list(dict.fromkeys(f for feats in GENOMES.values() for f in feats)) + ["regime_label"]
+    return load_or_build_store(
+        FEAT_PATH, union,
+        date_col="report_date", label_col="label_excess_rank", extra_label_cols=["label_3m_excess"],
+        categorical_cols=["regime_label"], fill_value=0.5, fill_median=False,
+    )
 
-    params = {
-        "objective": "lambdarank", "metric": "ndcg", "learning_rate": 0.03,
-        "num_leaves": 15, "min_child_samples": 5, "verbose": -1, "seed": 42
-    }
-    
-    # 填补 & 确保类型
-    X_train = df_train[use_features].fillna(0.5)
-    X_val = df_val[use_features].fillna(0.5)
-    X_test = df_test[use_features].fillna(0.5)
-    
-    lgb_train = lgb.Dataset(X_train, label=df_train['relevance'], group=df_train.groupby("report_date").size().values, categorical_feature=["regime_label"])
-    lgb_val = lgb.Dataset(X_val, label=df_val['relevance'], group=df_val.groupby("report_date").size().values, reference=lgb_train, categorical_feature=["regime_label"])
-    
-    model = lgb.train(params, lgb_train, num_boost_round=150, valid_sets=[lgb_val], 
-                      callbacks=[lgb.early_stopping(20), lgb.log_evaluation(0)])
-    
-    preds = model.predict(X_test)
-    df_test['preds'] = preds
-    
-    # 计算全时段 IC
+def _mean_ic(df):
     ic_list = []
-    for date, grp in df_test.groupby("report_date"):
+    for date, grp in df.groupby("report_date"):
         valid = grp.dropna(subset=['preds', 'label_3m_excess'])
         if len(valid) > 50 and valid['label_3m_excess'].std() > 1e-6:
             ic, _ = spearmanr(valid['preds'], valid['label_3m_excess'])
             ic_list.append(ic)
+    return ic_list
+
+PARAMS = {
+    "objective": "lambdarank", "metric": "ndcg", "learning_rate": 0.03,
+    "num_leaves": 15, "min_child_samples": 5, "verbose": -1, "seed": 42
+}
+
+def evaluate(te_df, preds):
+    te_df = te_df.copy()
+    te_df['preds'] = preds
+    
+    # 计算全时段 IC
+    ic_list = _mean_ic(te_df)
     
     # 分 Regime IC
     regime_results = {}
     for r in ['Bull', 'Bear']:
-        r_grp = df_test[df_test['regime_label'] == r]
-        ric_list = []
-        for date, grp in r_grp.groupby("report_date"):
-            valid = grp.dropna(subset=['preds', 'label_3m_excess'])
-            if len(valid) > 50 and valid['label_3m_excess'].std() > 1e-6:
-                ic, _ = spearmanr(valid['preds'], valid['label_3m_excess'])
-                ric_list.append(ic)
+        ric_list = _mean_ic(te_df[te_df['regime_label'] == r])
         regime_results[r] = np.mean(ric_list) if ric_list else np.nan
         
     return np.mean(ic_list), regime_results
@@ -109,30 +86,28 @@ def main():
     print("  Alpha Genome: 因子组合消融实验 (Ablation Study)")
     print("="*60)
     
-    df = pd.read_parquet(FEAT_PATH)
-    df["report_date"] = pd.to_datetime(df["report_date"])
-    dates = sorted(df["report_date"].unique())
-    n = len(dates)
-    train_dates = dates[:int(n*0.7)]
-    val_dates = dates[int(n*0.7):int(n*0.85)]
-    test_dates = dates[int(n*0.85):]
+    store = load_store()
+    
+    # 一次分箱，所有组合按特征子集并行训练 (包含 regime_label 作为类别特征)
+    harness = GenomeHarness(store, GENOMES, PARAMS, base_features=["regime_label"],
+                            categorical_cols=["regime_label"], num_boost_round=150, stopping_rounds=20)
+    runs = harness.run()
     
-    df.loc[df["report_date"].isin(train_dates), "data_split"] = "train"
-    df.loc[df["report_date"].isin(val_dates), "data_split"] = "val"
-    df.loc[df["report_date"].isin(test_dates), "data_split"] = "test"
+    te_df = harness.test_view().frame(features=["regime_label"], labels=["label_3m_excess"])
+    te_df["regime_label"] = pd.Categorical.from_codes(te_df["regime_label"].astype(int),
+                                                      store.categories["regime_label"])
     
     final_results = []
     
-    for name, feats in GENOMES.items():
-        print(f">> 正在测试组合: {name} ...")
-        mean_ic, r_ic = train_and_eval(df, feats, name)
+    for name in GENOMES:
+        mean_ic, r_ic = evaluate(te_df, runs[name].preds)
         final_results.append({
             "Genome": name,
             "Total_IC": mean_ic,
             "Bull_IC": r_ic['Bull'],
             "Bear_IC": r_ic['Bear']
         })
-        print(f"   [DONE] IC: {mean_ic:.4f} | Bull: {r_ic['Bull']:.4f} | Bear: {r_ic['Bear']:.4f}")
+        print(f">> {name}: IC: {mean_ic:.4f} | Bull: {r_ic['Bull']:.4f} | Bear: {r_ic['Bear']:.4f} (迭代: {runs[name].best_iteration})")
         
     print("\n" + "="*60)
     print("  Alpha Genome 消融实验最终榜单")
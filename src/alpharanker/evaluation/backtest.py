@@ -7,6 +7,7 @@ backtest.py
   - 累计收益率计算
   - 夏普比率、最大回撤
   - 与等权基准对比
+  - run_cost_aware_backtest: 基于日频价格矩阵的持仓级模拟 (换手 / 交易成本 / 整手)
 """
 
 import os
@@ -14,6 +15,8 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 
+from alpharanker.evaluation.simulator import simulate, topk_weights
+
 def run_backtest(df, top_k=50, label_col="label_next_month"):
     """
     运行 Top-K 回测
@@ -63,5 +66,28 @@ def run_backtest(df, top_k=50, label_col="label_next_month"):
     
     return results
 
+def run_cost_aware_backtest(df, prices, top_k=50, costs=None, lot_size=None,
+                            initial_capital=1_000_000.0, score_col="pred_rank"):
+    """
+    持仓级 Top-K 回测：df 中每个日期为调仓日 (Top-K 等权)，调仓日之间持仓随日频价格漂移，
+    计入佣金 / 印花税 / 滑点，可选 A 股 100 股整手取整。
+    prices: [交易日 × 标的] 收盘价矩阵
+    """
+    weights = topk_weights(df, prices.index, top_k=top_k, score_col=score_col)
+    result = simulate(weights, prices, initial_capital=initial_capital, costs=costs, lot_size=lot_size)
+    stats = result.summary()
+
+    print("\n" + "="*40)
+    print("   AlphaRanker 回测报告 (Top-K, 含成本)")
+    print("="*40)
+    print(f"持仓数量:  {top_k}  |  调仓次数: {stats['n_rebalance']}")
+    print(f"累计收益:  {stats['total_return']:.2%}")
+    print(f"夏普比率:  {stats['sharpe'] if stats['sharpe'] is not None else float('nan'):.2f}")
+    print(f"最大回撤:  {-stats['max_drawdown']:.2%}")
+    print(f"年化换手:  {stats['annual_turnover']:.2f}")
+    print(f"成本拖累:  {stats['cost_drag']:.2%} / 年")
+    print("="*40)
+    return result
+
 if __name__ == "__main__":
     print("回测引擎就绪。请在模型评估阶段调用 run_backtest(pred_df)。")
@@ -0,0 +1,290 @@
+"""
+simulator.py
+============
+向量化的日频组合模拟器：目标权重矩阵 + 价格矩阵 → 净值 / 换手 / 交易成本 / 持仓。
+
+原先 evaluation.backtest 只按月 groupby-mean 算 Top-K 收益，historical_backtest.performance
+用 Python 循环累乘净值，两者都不跟踪持仓、不计成本、不考虑 A 股 100 股一手的限制。
+
+约定:
+  - weights : [T × N] 目标权重 (DataFrame，index 为交易日，columns 为标的)。
+              某一行全部为 NaN 表示当日不调仓 (持仓随价格漂移)；
+              非全 NaN 的行为调仓日，行内 NaN 视为 0，1 - 行和为现金；
+              仅支持多头，负权重 (做空) 直接报错
+  - prices  : [T × N] 收盘价，调仓按当日收盘价成交；缺失价格向前填充，上市前的权重强制为 0
+  - 成本    : 佣金 + 滑点双边收取，印花税仅卖出收取 (均为 bp，按成交金额)
+
+两种模式:
+  - lot_size=None : 纯权重空间，全部时间 × 标的一次性向量化 (分段漂移 + 调仓日 cumprod)
+  - lot_size=100  : 按股数与现金逐日推进 (每日在标的维度上向量化)，调仓时目标股数向下取整到整手，
+                    佣金支持单笔最低收费 (如 5 元)，适用于 500 元小助手这类小资金 A 股路径；
+                    计入最低佣金后现金不足时，从买入金额最大的标的起逐手削减，保证不透支
+
+reference_simulate() 是逐日逐标的的 Python 参考实现，tests/test_simulator.py 用随机样例校验两者一致。
+"""
+
+import math
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class CostModel:
+    commission_bps: float = 2.5      # 佣金，双边
+    stamp_duty_bps: float = 5.0      # 印花税，仅卖出 (A 股 2023-08 起 0.05%)
+    slippage_bps: float = 5.0        # 滑点，双边
+    min_commission: float = 0.0      # 单笔最低佣金 (元)，仅整手模式生效
+
+    @property
+    def buy_rate(self):
+        return (self.commission_bps + self.slippage_bps) / 1e4
+
+    @property
+    def sell_rate(self):
+        return (self.commission_bps + self.slippage_bps + self.stamp_duty_bps) / 1e4
+
+
+A_SHARE_COSTS = CostModel(commission_bps=2.5, stamp_duty_bps=5.0, slippage_bps=5.0, min_commission=5.0)
+US_COSTS = CostModel(commission_bps=0.5, stamp_duty_bps=0.0, slippage_bps=5.0)
+NO_COSTS = CostModel(commission_bps=0.0, stamp_duty_bps=0.0, slippage_bps=0.0)
+
+
+@dataclass
+class SimResult:
+    daily: pd.DataFrame        # nav / ret / turnover / cost / cash_weight
+    weights: pd.DataFrame      # 每日收盘 (调仓后) 的实际持仓权重
+    shares: pd.DataFrame       # 每日收盘 (调仓后) 的持仓股数
+
+    @property
+    def nav(self):
+        return self.daily["nav"]
+
+    def summary(self, periods_per_year=252):
+        return summarize(self.daily, periods_per_year)
+
+
+def _align(weights, prices, rebalance=None):
+    """
+    行按 weights 的交易日，列取两者并集 (未出现在 weights 中的标的权重为 0)。
+    rebalance 为空时按 "非全 NaN 行" 推断调仓日，否则使用给定的布尔掩码 (长度同 weights 行数)。
+    """
+    columns = weights.columns.union(prices.columns, sort=False)
+    W = weights.reindex(columns=columns).to_numpy(dtype=np.float64)
+    P = prices.reindex(index=weights.index, columns=columns).ffill().to_numpy(dtype=np.float64)
+    if rebalance is None:
+        rebalance = ~np.isnan(W).all(axis=1)
+    else:
+        rebalance = np.asarray(rebalance, dtype=bool)
+        if rebalance.shape != (len(W),):
+            raise ValueError(f"rebalance 长度 {rebalance.shape} 与 weights 行数 {len(W)} 不一致")
+    W = np.where(np.isnan(P), 0.0, np.nan_to_num(W))
+    return W, P, rebalance, columns
+
+
+def _cost_rate(delta, costs):
+    """按 NAV 比例计的当日交易成本 (权重空间)"""
+    buys = np.clip(delta, 0, None).sum(axis=-1)
+    sells = np.clip(-delta, 0, None).sum(axis=-1)
+    return buys * costs.buy_rate + sells * costs.sell_rate
+
+
+def _simulate_weights(W, P, rebalance, costs, initial_capital):
+    T, N = W.shape
+    idx = np.arange(T)
+    last = np.maximum.accumulate(np.where(rebalance, idx, -1))    # 每日对应的最近一次调仓日
+    has_pos = last >= 0
+    r = np.maximum(last, 0)
+
+    # 分段漂移：自最近调仓日起，标的价值 = 调仓权重 × 价格相对变化，现金不变
+    w_reb = np.where(has_pos[:, None], W[r], 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rel = np.where(w_reb > 0, P / P[r], 0.0)
+    value = w_reb * rel
+    cash = 1.0 - w_reb.sum(axis=1)
+    growth = cash + value.sum(axis=1)                  # 相对调仓后净值的增长倍数
+
+    # 调仓日的调仓前权重 = 上一段漂移到当日的权重
+    prev = np.r_[-1, last[:-1]]                       # 当日调仓前对应的上一次调仓日
+    has_prev = prev >= 0
+    p = np.maximum(prev, 0)
+    w_prev = np.where(has_prev[:, None], W[p], 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        v_prev = np.where(w_prev > 0, w_prev * P / P[p], 0.0)
+    g_prev = np.where(has_prev, (1.0 - w_prev.sum(axis=1)) + v_prev.sum(axis=1), 1.0)
+    h = v_prev / g_prev[:, None]
+
+    delta = np.where(rebalance[:, None], W - h, 0.0)
+    cost = np.where(rebalance, _cost_rate(delta, costs), 0.0)
+
+    # 调仓后净值只在调仓日更新：V+(r_k) = V+(r_{k-1}) × G(r_k) × (1 - c)
+    step = np.where(rebalance, g_prev * (1.0 - cost), 1.0)
+    v_post = initial_capital * np.cumprod(step)
+    nav = np.where(has_pos, v_post[r] * growth, initial_capital)
+    nav = np.where(rebalance, v_post, nav)
+
+    weights = np.where(has_pos[:, None], value / growth[:, None], 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        shares = np.where(weights > 0, weights * nav[:, None] / P, 0.0)
+    turnover = 0.5 * np.abs(delta).sum(axis=1)
+    return nav, weights, shares, turnover, cost
+
+
+def _simulate_lots(W, P, rebalance, costs, initial_capital, lot_size):
+    T, N = W.shape
+    shares = np.zeros(N)
+    cash = float(initial_capital)
+    out_nav, out_sh, out_turn, out_cost = (np.empty(T), np.empty((T, N)), np.empty(T), np.empty(T))
+    Pz = np.nan_to_num(P)
+    for t in range(T):
+        px = Pz[t]
+        nav_pre = cash + shares @ px
+        turnover = cost = 0.0
+        if rebalance[t]:
+            # 目标金额预留买入成本，向下取整到整手
+            with np.errstate(invalid="ignore", divide="ignore"):
+                target = np.where(px > 0, np.floor(W[t] * nav_pre / (1.0 + costs.buy_rate) / (px * lot_size)) * lot_size, 0.0)
+            while True:
+                trade = target - shares
+                buy_val = np.clip(trade, 0, None) * px
+                sell_val = np.clip(-trade, 0, None) * px
+                comm = (buy_val + sell_val) * costs.commission_bps / 1e4
+                comm = np.where(trade != 0, np.maximum(comm, costs.min_commission), 0.0)
+                cost = comm.sum() + buy_val.sum() * costs.slippage_bps / 1e4 \
+                    + sell_val.sum() * (costs.slippage_bps + costs.stamp_duty_bps) / 1e4
+                # 预留比例只覆盖按比例的费用，单笔最低佣金可能让现金透支：削减买入额最大的标的一手再算
+                if cash + sell_val.sum() - buy_val.sum() - cost >= -1e-9 or not (trade > 0).any():
+                    break
+                target[np.argmax(np.where(trade > 0, buy_val, -1.0))] -= lot_size
+            cash += sell_val.sum() - buy_val.sum() - cost
+            shares = target
+            turnover = 0.5 * (buy_val.sum() + sell_val.sum()) / nav_pre if nav_pre > 0 else 0.0
+            cost = cost / nav_pre if nav_pre > 0 else 0.0
+        out_nav[t] = cash + shares @ px
+        out_sh[t] = shares
+        out_turn[t], out_cost[t] = turnover, cost
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weights = out_sh * Pz / out_nav[:, None]
+    return out_nav, np.nan_to_num(weights), out_sh, out_turn, out_cost
+
+
+def simulate(weights, prices, initial_capital=1_000_000.0, costs=None, lot_size=None, rebalance=None):
+    """
+    weights / prices : [T × N] DataFrame (prices 会对齐到 weights 的行列)
+    costs            : CostModel，默认 A_SHARE_COSTS
+    lot_size         : None 为权重空间模拟；100 为 A 股整手模式
+    rebalance        : 可选的调仓日布尔掩码 (与 weights 行对齐)；默认非全 NaN 的行为调仓日
+    """
+    costs = costs or A_SHARE_COSTS
+    W, P, rebalance, columns = _align(weights, prices, rebalance)
+    if (W < 0).any():
+        # 权重空间与整手两种模式都只跟踪多头持仓，负权重会被计入现金却不进入持仓
+        raise ValueError("simulate() 仅支持多头组合，weights 中存在负权重")
+    if lot_size:
+        nav, w, sh, turnover, cost = _simulate_lots(W, P, rebalance, costs, initial_capital, lot_size)
+    else:
+        nav, w, sh, turnover, cost = _simulate_weights(W, P, rebalance, costs, initial_capital)
+
+    index = weights.index
+    daily = pd.DataFrame({
+        "nav": nav,
+        "ret": np.r_[nav[0] / initial_capital - 1.0, nav[1:] / nav[:-1] - 1.0],
+        "turnover": turnover,
+        "cost": cost,
+        "cash_weight": 1.0 - w.sum(axis=1),
+        "rebalance": rebalance,
+    }, index=index)
+    return SimResult(daily, pd.DataFrame(w, index=index, columns=columns),
+                     pd.DataFrame(sh, index=index, columns=columns))
+
+
+def summarize(daily, periods_per_year=252):
+    nav = daily["nav"].to_numpy()
+    ret = daily["ret"].to_numpy()
+    initial = nav[0] / (1 + ret[0])
+    years = max(len(nav) / periods_per_year, 1e-9)
+    peak = np.maximum.accumulate(np.r_[initial, nav])[1:]
+    std = ret.std(ddof=1) if len(ret) > 1 else 0.0
+    return {
+        "total_return": round(float(nav[-1] / initial - 1), 6),
+        "annual_return": round(float((nav[-1] / initial) ** (1 / years) - 1), 6),
+        "sharpe": round(float(ret.mean() / std * math.sqrt(periods_per_year)), 4) if std > 1e-12 else None,
+        "max_drawdown": round(float((1 - nav / peak).max()), 6),
+        "annual_turnover": round(float(daily["turnover"].sum() / years), 4),
+        "cost_drag": round(float(daily["cost"].sum() / years), 6),
+        "n_rebalance": int(daily["rebalance"].sum()),
+    }
+
+
+def topk_weights(df, dates, top_k=50, date_col="date", ticker_col="ticker", score_col="pred_rank"):
+    """
+    由截面打分生成 Top-K 等权目标权重矩阵：打分所在日期为调仓日，其余交易日整行为 NaN (持有)。
+    dates : 模拟使用的交易日索引 (通常为价格矩阵的 index)
+    """
+    top = (df.sort_values([date_col, score_col], ascending=[True, False])
+             .groupby(date_col).head(top_k))
+    top = top.assign(_w=1.0 / top.groupby(date_col)[ticker_col].transform("size"))
+    wide = top.pivot_table(index=date_col, columns=ticker_col, values="_w", aggfunc="sum")
+    wide = wide.reindex(index=pd.DatetimeIndex(dates))
+    # 调仓日上未入选的标的显式置 0，其余日期保持全 NaN
+    reb = wide.index.isin(pd.to_datetime(top[date_col].unique()))
+    wide.loc[reb] = wide.loc[reb].fillna(0.0)
+    return wide
+
+
+# ── 参考实现与一致性校验 ─────────────────────────────────────
+def reference_simulate(weights, prices, initial_capital=1_000_000.0, costs=None, lot_size=None, rebalance=None):
+    """逐日逐标的的朴素循环实现，仅用于校验 simulate()。返回 (nav, turnover, cost) 三个列表。"""
+    costs = costs or A_SHARE_COSTS
+    W, P, rebalance, _ = _align(weights, prices, rebalance)
+    T, N = W.shape
+    shares = [0.0] * N
+    cash = float(initial_capital)
+    navs, turns, costs_out = [], [], []
+    for t in range(T):
+        px = [0.0 if math.isnan(P[t][i]) else P[t][i] for i in range(N)]
+        nav_pre = cash + sum(shares[i] * px[i] for i in range(N))
+        turnover = cost = 0.0
+        if rebalance[t] and lot_size:
+            targets = [0.0] * N
+            for i in range(N):
+                if px[i] > 0:
+                    targets[i] = math.floor(W[t][i] * nav_pre / (1.0 + costs.buy_rate) / (px[i] * lot_size)) * lot_size
+            while True:
+                traded = cost = flow = 0.0
+                for i in range(N):
+                    trade = targets[i] - shares[i]
+                    val = abs(trade) * px[i]
+                    if trade != 0:
+                        c = max(val * costs.commission_bps / 1e4, costs.min_commission)
+                        c += val * costs.slippage_bps / 1e4
+                        if trade < 0:
+                            c += val * costs.stamp_duty_bps / 1e4
+                        cost += c
+                    flow -= trade * px[i]
+                    traded += val
+                buys = [(targets[i] - shares[i]) * px[i] if targets[i] > shares[i] else -1.0 for i in range(N)]
+                if cash + flow - cost >= -1e-9 or max(buys, default=-1.0) < 0:
+                    break
+                targets[buys.index(max(buys))] -= lot_size
+            cash += flow - cost
+            shares = targets
+        elif rebalance[t]:
+            # 权重空间：成本从现金中扣除，调仓后权重按扣费后的净值对齐
+            traded = rate = 0.0
+            for i in range(N):
+                d = W[t][i] - shares[i] * px[i] / nav_pre
+                rate += d * costs.buy_rate if d > 0 else -d * costs.sell_rate
+                traded += abs(d) * nav_pre
+            nav_post = nav_pre * (1 - rate)
+            shares = [W[t][i] * nav_post / px[i] if px[i] > 0 and W[t][i] > 0 else 0.0 for i in range(N)]
+            cash = nav_post * (1 - sum(W[t]))
+            cost = rate * nav_pre
+        if rebalance[t]:
+            turnover = 0.5 * traded / nav_pre if nav_pre > 0 else 0.0
+            cost = cost / nav_pre if nav_pre > 0 else 0.0
+        navs.append(cash + sum(shares[i] * px[i] for i in range(N)))
+        turns.append(turnover)
+        costs_out.append(cost)
+    return navs, turns, costs_out
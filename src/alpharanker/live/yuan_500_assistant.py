@@ -4,56 +4,60 @@ import pandas as pd
 import numpy as np
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
-import pickle
 from config import CN_DIR, MODEL_DIR
 from alpharanker.configs.cap_aware_weights import get_weights
+from alpharanker.model.scoring import load_model, feature_matrix
+from alpharanker.evaluation.simulator import simulate, A_SHARE_COSTS
 
 FEATURES_PATH = os.path.join(CN_DIR, 'cn_features_enhanced.parquet')
 MACRO_PATH = os.path.join(CN_DIR, 'macro_regime.parquet')
 BUDGET = 500.0  # 500 RMB
+PRICE_LIMIT = 4.80
 
-def generate_signals(df, latest_macro, use_model=True):
-    print(f"\n[500元小助手] 正在基于 {df['date'].max().date()} 数据生成信号...")
-    print(f"当前市场状态: {latest_macro}")
-    
-    # 0. 准备 regime 编码 (用于模型输入)
-    df['regime'] = 1 if latest_macro == "Bull" else 0
-    
-    # 1. 价格过滤 (由于 100 股起购，本金 500 元意味着单价必须 < 5.0)
-    price_limit = 4.80 
-    candidates = df[df['raw_close'] <= price_limit].copy()
-    
-    if candidates.empty:
-        print("❌ 当前市场无单价 < 4.8 元的标的。")
-        return
-    
-    # 2. 获取权重 (静态版本备用)
+def score_candidates(candidates, use_model=True):
+    """静态权重评分 (始终计算用于对比) + LTR 模型评分，无模型时回滚至静态评分。"""
+    # 获取权重 (静态版本备用)
     weights = get_weights("ZZ500", horizon_days=20)
-    
-    # 3. 计算评分
-    # 静态评分 (始终计算用于对比)
+
     candidates['static_score'] = 0
     for f, w in weights.items():
         if f in candidates.columns:
             candidates['static_score'] += candidates[f] * w
-            
+
     # 模型评分
     if use_model:
         model_path = os.path.join(MODEL_DIR, "cn_regime_genome.pkl")
         if os.path.exists(model_path):
-            with open(model_path, "rb") as f:
-                model_obj = pickle.load(f)
-            model = model_obj["model"]
-            feature_cols = model_obj["features"]
-            
-            X = candidates[feature_cols].fillna(0.5).values.astype(np.float32)
+            # 进程内缓存：模型文件未更新时不重复 unpickle
+            model = load_model(model_path)
+            # 只对 NaN 填 0.5；模型特征列缺失说明数据与模型不匹配，直接报错而不是静默整列填充
+            X = feature_matrix(candidates, model.features, fill_value=0.5, fill_missing_cols=False)
             candidates['alpha_score'] = model.predict(X)
         else:
             print("⚠️ 未找到 LTR 模型，回滚至静态评分。")
             candidates['alpha_score'] = candidates['static_score']
     else:
         candidates['alpha_score'] = candidates['static_score']
-            
+    return candidates
+
+
+def generate_signals(df, latest_macro, use_model=True):
+    print(f"\n[500元小助手] 正在基于 {df['date'].max().date()} 数据生成信号...")
+    print(f"当前市场状态: {latest_macro}")
+    
+    # 0. 准备 regime 编码 (用于模型输入)
+    df['regime'] = 1 if latest_macro == "Bull" else 0
+    
+    # 1. 价格过滤 (由于 100 股起购，本金 500 元意味着单价必须 < 5.0)
+    candidates = df[df['raw_close'] <= PRICE_LIMIT].copy()
+    
+    if candidates.empty:
+        print("❌ 当前市场无单价 < 4.8 元的标的。")
+        return
+    
+    # 2-3. 静态评分 + 模型评分
+    candidates = score_candidates(candidates, use_model=use_model)
+
     # 4. 排名并选择 Top 2 (基于 alpha_score)
     top_picks = candidates.sort_values('alpha_score', ascending=False).head(2)
     
@@ -75,6 +79,41 @@ def generate_signals(df, latest_macro, use_model=True):
         print(f"静态权重评分:  {row.static_score:.4f}")
         print("-" * 20)
 
+def backtest_assistant(df, macro_df=None, top_n=2, budget=BUDGET, use_model=True, costs=A_SHARE_COSTS):
+    """
+    按历史每个截面重放小助手的选股 (单价过滤 → 评分 → Top-N 等权)，
+    用整手 (100 股) + A 股费率 (含 5 元最低佣金) 的模拟器估算小资金实际净值。
+    """
+    df = df.copy()
+    df['regime'] = 0
+    if macro_df is not None and not macro_df.empty:
+        macro = macro_df[['date', 'regime']].copy()
+        macro['date'] = pd.to_datetime(macro['date'])
+        df['date'] = pd.to_datetime(df['date'])
+        df = pd.merge_asof(df.drop(columns='regime').sort_values('date'), macro.sort_values('date'), on='date')
+        df['regime'] = (df['regime'] == 1).astype(int)
+
+    # 全历史候选一次性打分
+    candidates = score_candidates(df[df['raw_close'] <= PRICE_LIMIT].copy(), use_model=use_model)
+    picks = candidates.sort_values(['date', 'alpha_score'], ascending=[True, False]).groupby('date').head(top_n)
+
+    prices = df.pivot_table(index='date', columns='ticker', values='raw_close')
+    weights = picks.assign(w=1.0 / top_n).pivot_table(index='date', columns='ticker', values='w')
+    # 只有出现选股的截面才调仓 (未入选标的权重为 0)；其余日期持仓随价格漂移
+    rebalance = prices.index.isin(weights.index)
+    weights = weights.reindex(columns=prices.columns).fillna(0.0).reindex(index=prices.index)
+
+    result = simulate(weights, prices, initial_capital=budget, costs=costs, lot_size=100, rebalance=rebalance)
+    stats = result.summary(periods_per_year=12)
+    print("\n" + "-"*40)
+    print(f"小助手历史重放 ({prices.index.min().date()} → {prices.index.max().date()}, 本金 {budget:.0f} 元)")
+    print("-"*40)
+    print(f"累计收益: {stats['total_return']:.2%} | 最大回撤: {stats['max_drawdown']:.2%}")
+    print(f"年化换手: {stats['annual_turnover']:.2f} | 年化成本拖累: {stats['cost_drag']:.2%}")
+    print(f"平均现金占比: {result.daily['cash_weight'].mean():.1%} (整手约束导致的闲置资金)")
+    return result
+
+
 def main():
     if not os.path.exists(FEATURES_PATH):
         print("❌ 特征库不存在。")
@@ -94,4 +133,8 @@ def main():
     generate_signals(latest_df, regime)
 
 if __name__ == "__main__":
-    main()
+    if "--backtest" in sys.argv:
+        macro = pd.read_parquet(MACRO_PATH) if os.path.exists(MACRO_PATH) else None
+        backtest_assistant(pd.read_parquet(FEATURES_PATH), macro)
+    else:
+        main()
@@ -16,6 +16,9 @@ import numpy as np
 import lightgbm as lgb
 from sklearn.metrics import ndcg_score
 
+from alpharanker.model.scoring import score_panel
+from alpharanker.model.compiled_trees import export_compiled
+
 class AlphaRanker:
     def __init__(self, model_params=None):
         self.params = model_params or {
@@ -79,24 +82,25 @@ class AlphaRanker:
         return self
 
     def predict(self, df):
-        """对输入的横截面数据进行排名预测"""
+        """对输入的横截面数据进行排名预测 (可一次传入多日期面板)"""
         if self.model is None:
             raise ValueError("模型未训练！")
-        
-        X = df[self.feature_cols]
-        # 获取原始预测分 (Score)
-        scores = self.model.predict(X)
-        
-        # 将分数转化为横截面排名百分比 (0-1)
-        res_df = df.copy()
-        res_df['rank_score'] = scores
-        res_df['pred_rank'] = res_df.groupby('date')['rank_score'].rank(pct=True)
-        
-        return res_df
 
-    def save(self, path):
+        # 类别特征与 prepare_data 同口径编码；数值列直接拼成 float32 矩阵，不复制整张表
+        if self.categorical_cols:
+            df = df.assign(**{
+                col: df[col].astype('category').cat.codes
+                for col in self.categorical_cols if col in df.columns
+            })
+        # 整个面板一次 predict，再一次 groupby 得到逐日横截面排名百分比 (0-1)
+        return score_panel(self.model, df, self.feature_cols, date_col='date')
+
+    def save(self, path, export_trees=True):
         joblib.dump(self.model, path)
         print(f"模型已保存至: {path}")
+        # 同时导出实盘用的编译推理产物 (xxx.trees.npz)，导出前与 Booster 做一致性校验
+        if export_trees:
+            export_compiled(self.model, path)
 
     def load(self, path):
         self.model = joblib.load(path)
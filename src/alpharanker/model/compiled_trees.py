@@ -0,0 +1,264 @@
+"""
+compiled_trees.py
+=================
+LightGBM 树模型的 "编译" 推理产物 (*.trees.npz)。
+
+实盘路径 (500元小助手 / 仪表盘 / TUI) 原先每次都要 unpickle LGBMRanker / Booster，
+再经由 LightGBM 的 Python 调度逐次 predict。这里把 booster.dump_model() 展平成几组 NumPy 数组：
+
+  - 所有树的节点拼成一张全局节点表 (分裂特征 / 阈值 / 左右子节点 / 缺失值方向 / 叶子值)
+  - "所有样本 × 所有树" 展平后按深度同步下推，每层只是一次 gather + 比较，
+    已到达叶子的 (样本, 树) 对即时剔除，最后按叶子值求和
+  - 数值分裂的缺失值处理 (missing_type / default_left) 与类别分裂 (位图) 均与 LightGBM 语义一致
+
+落盘为未压缩 npz，加载即用，不依赖 lightgbm。导出时在阈值附近合成探针样本，
+与原 Booster 的预测做一致性校验，不一致则不写产物。
+
+用法:
+    export_compiled(booster, MODEL_PATH)          # 训练脚本保存模型后调用
+    ens = load_compiled(compiled_path(MODEL_PATH))
+    scores = ens.predict(X)
+"""
+
+import os
+import json
+
+import numpy as np
+
+K_ZERO_THRESHOLD = float(np.float32(1e-35))     # LightGBM kZeroThreshold (float 精度)
+
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+_MISSING_CODES = {"None": MISSING_NONE, "Zero": MISSING_ZERO, "NaN": MISSING_NAN}
+
+_ARRAY_KEYS = ("feature", "threshold", "left", "right", "default_left", "missing",
+               "cat_row", "value", "roots", "cat_bits")
+
+
+def compiled_path(model_path):
+    """模型文件对应的编译产物路径：xxx.pkl -> xxx.trees.npz"""
+    return os.path.splitext(model_path)[0] + ".trees.npz"
+
+
+def _booster_of(model):
+    return getattr(model, "booster_", model)
+
+
+class CompiledEnsemble:
+    """展平后的树集成。predict(X) 返回与 Booster.predict 一致的分数。"""
+
+    def __init__(self, arrays, meta):
+        for key in _ARRAY_KEYS:
+            setattr(self, key, arrays[key])
+        self.meta = meta
+        self.feature_names = list(meta["feature_names"])
+        self.max_depth = int(meta["max_depth"])
+        self.has_cat = bool(len(self.cat_bits))
+        self.is_leaf = self.left == np.arange(len(self.left))
+
+    # ── 构建 ────────────────────────────────────────────────────────────────
+    @classmethod
+    def from_booster(cls, model):
+        booster = _booster_of(model)
+        dump = booster.dump_model()
+        objective = str(dump.get("objective", ""))
+        if dump.get("num_tree_per_iteration", 1) != 1:
+            raise ValueError(f"暂不支持多输出模型: {objective}")
+        if dump.get("is_linear"):
+            raise ValueError("暂不支持 linear_tree 模型")
+
+        cols = {k: [] for k in ("feature", "threshold", "left", "right", "default_left",
+                                "missing", "cat_row", "value")}
+        cat_sets, roots, max_depth = [], [], 0
+
+        for tree in dump["tree_info"]:
+            # 显式栈做 DFS，父节点回填子节点下标
+            stack = [(tree["tree_structure"], -1, False, 0)]
+            while stack:
+                node, parent, is_left, depth = stack.pop()
+                idx = len(cols["feature"])
+                max_depth = max(max_depth, depth)
+                if parent < 0:
+                    roots.append(idx)
+                elif is_left:
+                    cols["left"][parent] = idx
+                else:
+                    cols["right"][parent] = idx
+
+                if "split_feature" not in node:
+                    # 叶子：左右子节点指向自身，下推时原地不动
+                    cols["feature"].append(0)
+                    cols["threshold"].append(0.0)
+                    cols["left"].append(idx)
+                    cols["right"].append(idx)
+                    cols["default_left"].append(True)
+                    cols["missing"].append(MISSING_NONE)
+                    cols["cat_row"].append(-1)
+                    cols["value"].append(float(node["leaf_value"]))
+                    continue
+
+                cols["feature"].append(int(node["split_feature"]))
+                cols["left"].append(-1)
+                cols["right"].append(-1)
+                cols["default_left"].append(bool(node["default_left"]))
+                cols["missing"].append(_MISSING_CODES[node["missing_type"]])
+                cols["value"].append(0.0)
+                if node["decision_type"] == "==":
+                    cols["threshold"].append(0.0)
+                    cols["cat_row"].append(len(cat_sets))
+                    cat_sets.append([int(c) for c in str(node["threshold"]).split("||")])
+                else:
+                    cols["threshold"].append(float(node["threshold"]))
+                    cols["cat_row"].append(-1)
+                stack.append((node["right_child"], idx, False, depth + 1))
+                stack.append((node["left_child"], idx, True, depth + 1))
+
+        width = max((max(s) for s in cat_sets), default=-1) + 1
+        cat_bits = np.zeros((len(cat_sets), width), dtype=bool)
+        for row, cats in enumerate(cat_sets):
+            cat_bits[row, cats] = True
+
+        arrays = {
+            "feature": np.asarray(cols["feature"], dtype=np.int32),
+            "threshold": np.asarray(cols["threshold"], dtype=np.float64),
+            "left": np.asarray(cols["left"], dtype=np.int32),
+            "right": np.asarray(cols["right"], dtype=np.int32),
+            "default_left": np.asarray(cols["default_left"], dtype=bool),
+            "missing": np.asarray(cols["missing"], dtype=np.int8),
+            "cat_row": np.asarray(cols["cat_row"], dtype=np.int32),
+            "value": np.asarray(cols["value"], dtype=np.float64),
+            "roots": np.asarray(roots, dtype=np.int32),
+            "cat_bits": cat_bits,
+        }
+        meta = {
+            "feature_names": dump["feature_names"],
+            "objective": objective,
+            "average_output": bool(dump.get("average_output", False)),
+            "max_depth": max_depth,
+            "num_trees": len(roots),
+        }
+        return cls(arrays, meta)
+
+    # ── 推理 ────────────────────────────────────────────────────────────────
+    def raw_score(self, X, chunk_rows=4096):
+        X = np.array(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != len(self.feature_names):
+            raise ValueError(f"输入维度 {X.shape} 与模型特征数 {len(self.feature_names)} 不符")
+        # LightGBM 构造预测输入时把 |x| <= kZeroThreshold 的值当作 0 丢弃
+        X[np.abs(X) <= K_ZERO_THRESHOLD] = 0.0
+        out = np.empty(len(X), dtype=np.float64)
+        for lo in range(0, len(X), chunk_rows):
+            out[lo:lo + chunk_rows] = self._raw_chunk(X[lo:lo + chunk_rows])
+        if self.meta["average_output"]:
+            out /= max(len(self.roots), 1)
+        return out
+
+    def _raw_chunk(self, X):
+        n, n_feat = X.shape
+        n_trees = len(self.roots)
+        flat_x = X.ravel()
+        # (样本, 树) 对展平；每层只下推仍停在内部节点的对，已到叶子的不再参与计算
+        cur = np.tile(self.roots, n)
+        base = np.repeat(np.arange(n, dtype=np.int64) * n_feat, n_trees)
+        active = np.flatnonzero(~self.is_leaf[cur])
+        while len(active):
+            node = cur[active]
+            v = flat_x[base[active] + self.feature[node]]
+            nan = np.isnan(v)
+            miss = self.missing[node]
+            # 数值分裂：missing_type 不是 NaN 时 NaN 按 0 处理；命中缺失走 default_left
+            v = np.where(nan & (miss != MISSING_NAN), 0.0, v)
+            is_missing = ((miss == MISSING_ZERO) & (v == 0.0)) | ((miss == MISSING_NAN) & nan)
+            go_left = np.where(is_missing, self.default_left[node], v <= self.threshold[node])
+
+            if self.has_cat:
+                cat_row = self.cat_row[node]
+                k = np.flatnonzero(cat_row >= 0)
+                if len(k):
+                    # 类别分裂：NaN / 负数 / 超出位图范围一律走右子树
+                    cv = np.trunc(v[k])
+                    ok = ~nan[k] & (cv >= 0) & (cv < self.cat_bits.shape[1])
+                    iv = np.where(ok, cv, 0).astype(np.int64)
+                    go_left[k] = ok & self.cat_bits[cat_row[k], iv]
+
+            nxt = np.where(go_left, self.left[node], self.right[node])
+            cur[active] = nxt
+            active = active[~self.is_leaf[nxt]]
+        return self.value[cur].reshape(n, n_trees).sum(axis=1)
+
+    def predict(self, X, chunk_rows=4096):
+        raw = self.raw_score(X, chunk_rows=chunk_rows)
+        objective = self.meta["objective"]
+        if objective.startswith("binary") or objective.startswith("cross_entropy"):
+            sigmoid = 1.0
+            for token in objective.split():
+                if token.startswith("sigmoid:"):
+                    sigmoid = float(token.split(":", 1)[1])
+            return 1.0 / (1.0 + np.exp(-sigmoid * raw))
+        return raw
+
+    # ── 落盘 ────────────────────────────────────────────────────────────────
+    def save(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, meta=np.array(json.dumps(self.meta)),
+                     **{k: getattr(self, k) for k in _ARRAY_KEYS})
+        os.replace(tmp, path)
+        return path
+
+
+def load_compiled(path):
+    with np.load(path, allow_pickle=False) as z:
+        arrays = {k: z[k] for k in _ARRAY_KEYS}
+        meta = json.loads(str(z["meta"]))
+    return CompiledEnsemble(arrays, meta)
+
+
+def probe_matrix(ens, n_samples=4096, seed=0):
+    """
+    合成一致性校验样本：每列取该特征所有分裂阈值的 ±微扰与阈值本身，
+    并混入 0 / NaN 与类别取值，保证覆盖每条分支与缺失值路径。
+    """
+    rng = np.random.default_rng(seed)
+    n_feat = len(ens.feature_names)
+    X = rng.normal(size=(n_samples, n_feat))
+    internal = ~ens.is_leaf
+    for j in range(n_feat):
+        mask = internal & (ens.feature == j)
+        num = mask & (ens.cat_row < 0)
+        cand = [0.0]
+        if num.any():
+            thr = ens.threshold[num]
+            cand.extend(np.r_[thr, np.nextafter(thr, -np.inf), np.nextafter(thr, np.inf), thr - 1, thr + 1])
+        if (mask & (ens.cat_row >= 0)).any():
+            cand.extend(range(ens.cat_bits.shape[1] + 1))
+            cand.append(-1.0)
+        cand = np.asarray(cand, dtype=np.float64)
+        X[:, j] = cand[rng.integers(0, len(cand), size=n_samples)]
+        X[rng.random(n_samples) < 0.05, j] = np.nan
+    return X
+
+
+def verify_parity(model, ens, X=None, atol=1e-9):
+    """与原 Booster 比较预测，返回最大绝对误差；X 为空时使用合成探针样本。"""
+    booster = _booster_of(model)
+    if X is None:
+        X = probe_matrix(ens)
+    X = np.asarray(X, dtype=np.float64)
+    ref = booster.predict(X)
+    diff = float(np.max(np.abs(ens.predict(X) - ref))) if len(X) else 0.0
+    if diff > atol:
+        raise AssertionError(f"编译模型与 Booster 预测不一致: max|diff|={diff:.3e}")
+    return diff
+
+
+def export_compiled(model, model_path, X=None):
+    """编译模型并在校验通过后写出 xxx.trees.npz；不支持的模型或校验失败时返回 None。"""
+    try:
+        ens = CompiledEnsemble.from_booster(model)
+        diff = verify_parity(model, ens, X)
+    except (ValueError, AssertionError) as e:
+        print(f"⚠️ 编译推理产物未生成: {e}")
+        return None
+    path = ens.save(compiled_path(model_path))
+    print(f"编译推理产物已保存至: {path} ({ens.meta['num_trees']} 棵树, 校验误差 {diff:.1e})")
+    return path
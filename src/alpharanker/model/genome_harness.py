@@ -0,0 +1,168 @@
+"""
+genome_harness.py
+=================
+因子组合 (Genome) / 消融实验的共享分箱训练框架。
+
+原先每个组合都要重新切分 DataFrame、fillna、pd.cut 生成 relevance、再构造 lgb.Dataset
+重新分箱，组合越多预处理开销越大。这里改为：
+  1. 基于特征库 (feature_store) 在所有组合特征的并集上构造一次分箱后的 lgb.Dataset，
+     以 LightGBM 二进制格式落盘 (train.bin / val.bin)，按 (数据指纹, 特征, 切分, 分箱参数) 缓存
+  2. 每个组合直接加载二进制数据集，通过 interaction_constraints 把可分裂特征限制在
+     该组合的子集内 —— 单特征分箱彼此独立，结果与只用子集构造 Dataset 完全一致
+  3. 各组合在进程池中并行训练，线程数按核数均分，避免超订
+
+用法:
+    harness = GenomeHarness(store, GENOMES, params=params, categorical_cols=["regime_label"])
+    results = harness.run()        # {name: GenomeResult(preds, best_iteration, features)}
+"""
+
+import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import lightgbm as lgb
+
+from alpharanker.data.feature_store import FeatureStore
+
+# 影响分箱结果的 Dataset 参数；训练参数中的这些键会同步给 Dataset 构造
+BIN_PARAM_KEYS = ("max_bin", "min_data_in_bin", "bin_construct_sample_cnt", "min_data_in_leaf",
+                  "min_child_samples", "use_missing", "zero_as_missing", "max_cat_threshold")
+
+
+@dataclass
+class GenomeResult:
+    name: str
+    features: list
+    preds: np.ndarray          # 测试集预测分，与 test 视图行顺序一致
+    best_iteration: int
+
+
+def _dataset_params(params):
+    ds = {k: params[k] for k in BIN_PARAM_KEYS if k in params}
+    # 关闭预过滤：同一份分箱要服务于不同 min_child_samples 的组合
+    ds.update({"feature_pre_filter": False, "verbose": -1})
+    return ds
+
+
+def _cache_key(store, features, split, categorical_cols, ds_params):
+    payload = json.dumps({
+        "data": store.fingerprint,
+        "features": list(features),
+        "split": list(split),
+        "categorical": list(categorical_cols),
+        "dataset_params": ds_params,
+    }, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+
+def _train_one(job):
+    """进程池 worker：加载共享二进制数据集，按特征子集约束训练并预测测试集。"""
+    (name, features, union, store_dir, train_bin, val_bin, test_pos,
+     params, num_boost_round, stopping_rounds, num_threads) = job
+
+    col_idx = [union.index(f) for f in features]
+    run_params = dict(params)
+    run_params["interaction_constraints"] = [col_idx]
+    run_params["num_threads"] = num_threads
+
+    lgb_train = lgb.Dataset(train_bin)
+    valid_sets, callbacks = [], [lgb.log_evaluation(0)]
+    if val_bin is not None:
+        valid_sets = [lgb.Dataset(val_bin, reference=lgb_train)]
+        callbacks.append(lgb.early_stopping(stopping_rounds, verbose=False))
+
+    model = lgb.train(run_params, lgb_train, num_boost_round=num_boost_round,
+                      valid_sets=valid_sets, callbacks=callbacks)
+
+    # 测试集直接读特征库的内存映射视图，按并集列顺序送入模型
+    store = FeatureStore(store_dir)
+    test = store.view_by_position(*test_pos, features=union)
+    preds = model.predict(test.X, num_threads=num_threads)
+    return GenomeResult(name, list(features), preds, model.best_iteration or num_boost_round)
+
+
+class GenomeHarness:
+    """
+    在同一面板上批量训练多个特征组合。
+
+    genomes          : {组合名: 特征列表}
+    base_features    : 每个组合都附带的公共特征 (如 regime_label)
+    split            : (train, val) 截面比例，剩余部分为测试集，与各脚本 split_by_time 一致
+    """
+
+    def __init__(self, store, genomes, params, base_features=(), categorical_cols=(),
+                 split=(0.70, 0.15), num_boost_round=150, stopping_rounds=20,
+                 cache_dir=None, n_jobs=None):
+        self.store = store
+        self.params = dict(params)
+        self.base_features = list(base_features)
+        self.genomes = {
+            name: store.available(list(feats) + [f for f in self.base_features if f not in feats])
+            for name, feats in genomes.items()
+        }
+        self.union = store.available(list(dict.fromkeys(f for feats in self.genomes.values() for f in feats)))
+        self.categorical_cols = [c for c in categorical_cols if c in self.union]
+        self.split = split
+        self.num_boost_round = num_boost_round
+        self.stopping_rounds = stopping_rounds
+        self.cache_dir = cache_dir or os.path.join(store.store_dir, "lgb_bins")
+        self.n_jobs = n_jobs or min(len(self.genomes), os.cpu_count() or 1)
+
+    def _split_positions(self):
+        return self.store.split_positions(*self.split)
+
+    def build_datasets(self):
+        """构造 (或复用) 并集特征上的分箱数据集，返回 (train.bin, val.bin) 路径。"""
+        ds_params = _dataset_params(self.params)
+        key = _cache_key(self.store, self.union, self.split, self.categorical_cols, ds_params)
+        train_bin = os.path.join(self.cache_dir, f"{key}_train.bin")
+        val_bin = os.path.join(self.cache_dir, f"{key}_val.bin")
+        if os.path.exists(train_bin) and os.path.exists(val_bin):
+            return train_bin, val_bin
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        (t0, t1), (v0, v1), _ = self._split_positions()
+        tr = self.store.view_by_position(t0, t1, features=self.union)
+        va = self.store.view_by_position(v0, v1, features=self.union)
+
+        cat = self.categorical_cols or "auto"
+        lgb_train = lgb.Dataset(tr.X, label=tr.relevance, group=tr.group_sizes,
+                                feature_name=self.union, categorical_feature=cat, params=ds_params)
+        lgb_val = lgb.Dataset(va.X, label=va.relevance, group=va.group_sizes,
+                              feature_name=self.union, categorical_feature=cat, reference=lgb_train)
+        # 先写临时文件再改名，防止并发进程读到半截文件
+        for ds, path in ((lgb_train, train_bin), (lgb_val, val_bin)):
+            ds.construct()
+            ds.save_binary(path + ".tmp")
+            os.replace(path + ".tmp", path)
+        print(f">> 分箱数据集已缓存: {self.cache_dir} (key={key}, 特征并集 {len(self.union)} 列)")
+        return train_bin, val_bin
+
+    def test_view(self, features=None):
+        """测试集视图，行顺序与 GenomeResult.preds 一致。"""
+        _, _, (s0, s1) = self._split_positions()
+        return self.store.view_by_position(s0, s1, features=features)
+
+    def run(self):
+        train_bin, val_bin = self.build_datasets()
+        _, (v0, v1), test_pos = self._split_positions()
+        if v1 <= v0:
+            val_bin = None
+
+        threads = max(1, (os.cpu_count() or 1) // self.n_jobs)
+        jobs = [
+            (name, feats, self.union, self.store.store_dir, train_bin, val_bin, test_pos,
+             self.params, self.num_boost_round, self.stopping_rounds, threads)
+            for name, feats in self.genomes.items()
+        ]
+        print(f">> 并行训练 {len(jobs)} 个组合 (进程数 {self.n_jobs} × 线程数 {threads})")
+
+        if self.n_jobs == 1:
+            results = [_train_one(job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=self.n_jobs) as pool:
+                results = list(pool.map(_train_one, jobs))
+        return {r.name: r for r in results}
@@ -0,0 +1,164 @@
+"""
+scoring.py
+==========
+AlphaRanker 批量打分服务。
+
+  - load_model()   : 统一加载各脚本落盘的模型 (pickle dict / 裸 Booster / joblib LGBMRanker)，
+                     进程内 LRU 缓存，按 (路径, mtime) 失效，重复调用不再反复 unpickle；
+                     同目录下存在不旧于模型文件的 *.trees.npz 编译产物时优先用它推理
+  - feature_matrix : 从 DataFrame 按列直接拼出连续的 float32 矩阵，不复制整张表
+  - score_panel()  : 整个多日期面板一次 predict，再用一次 groupby rank 得到逐日截面百分位
+
+回测与仪表盘对全历史打分只需要一次调用，而不是每个日期 predict 一次。
+"""
+
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from alpharanker.model.compiled_trees import compiled_path, load_compiled
+
+MAX_CACHED_MODELS = 8
+
+_MODEL_CACHE = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+class LoadedModel:
+    """已加载的模型及其特征列表。predict 统一接收 float32 矩阵，有编译产物时走编译产物。"""
+
+    def __init__(self, model, features, path=None, mtime_ns=None, extra=None, compiled=None):
+        self.model = model
+        self.features = list(features)
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.extra = extra or {}
+        self.compiled = compiled
+
+    def predict(self, X):
+        if self.compiled is not None:
+            return self.compiled.predict(X)
+        return np.asarray(_predictor(self.model).predict(X), dtype=np.float64)
+
+
+def _predictor(model):
+    """sklearn 包装 (LGBMRanker) 直接走底层 Booster，避免 ndarray 输入的列名检查开销与告警。"""
+    return getattr(model, "booster_", model)
+
+
+def _model_features(model):
+    return list(_predictor(model).feature_name())
+
+
+def _unpack(obj):
+    """兼容各训练脚本的落盘格式：{"model", "features"} 字典、裸 Booster、LGBMRanker。"""
+    if isinstance(obj, dict):
+        model = obj["model"]
+        features = obj.get("features") or _model_features(model)
+        extra = {k: v for k, v in obj.items() if k not in ("model", "features")}
+        return model, features, extra
+    return obj, _model_features(obj), {}
+
+
+def _read_model(path):
+    with open(path, "rb") as f:
+        try:
+            obj = pickle.load(f)
+        except Exception:
+            # AlphaRanker.save 使用 joblib 落盘
+            import joblib
+            obj = joblib.load(path)
+    return _unpack(obj)
+
+
+def _compiled_mtime(path, mtime_ns):
+    """编译产物存在且不旧于模型文件时返回其 mtime，否则 None (旧产物视为失效)。"""
+    try:
+        c_mtime = os.stat(compiled_path(path)).st_mtime_ns
+    except OSError:
+        return None
+    return c_mtime if c_mtime >= mtime_ns else None
+
+
+def load_model(path, use_cache=True, use_compiled=True):
+    """
+    加载模型。use_cache=True 时命中进程内 LRU：
+    key = (绝对路径, mtime_ns, 编译产物 mtime)，文件被重新训练覆盖后自动失效重载。
+    """
+    path = os.path.abspath(path)
+    mtime_ns = os.stat(path).st_mtime_ns
+    c_mtime = _compiled_mtime(path, mtime_ns) if use_compiled else None
+    key = (path, mtime_ns, c_mtime)
+
+    if use_cache:
+        with _CACHE_LOCK:
+            if key in _MODEL_CACHE:
+                _MODEL_CACHE.move_to_end(key)
+                return _MODEL_CACHE[key]
+
+    model, features, extra = _read_model(path)
+    compiled = load_compiled(compiled_path(path)) if c_mtime is not None else None
+    if compiled is not None and len(compiled.feature_names) != len(features):
+        compiled = None
+    loaded = LoadedModel(model, features, path=path, mtime_ns=mtime_ns, extra=extra, compiled=compiled)
+
+    if use_cache:
+        with _CACHE_LOCK:
+            # 同一路径的旧版本直接淘汰
+            for stale in [k for k in _MODEL_CACHE if k[0] == path]:
+                del _MODEL_CACHE[stale]
+            _MODEL_CACHE[key] = loaded
+            while len(_MODEL_CACHE) > MAX_CACHED_MODELS:
+                _MODEL_CACHE.popitem(last=False)
+    return loaded
+
+
+def clear_model_cache():
+    with _CACHE_LOCK:
+        _MODEL_CACHE.clear()
+
+
+def feature_matrix(df, feature_cols, fill_value=None, fill_missing_cols=True):
+    """
+    逐列写入预分配的 C 连续 float32 矩阵，避免 df[cols].copy() 的整表拷贝。
+    fill_value 不为 None 时：NaN 填充为 fill_value；fill_missing_cols 为 True 时缺失列也整列填充
+    (与仪表盘/实盘脚本口径一致)，为 False 时缺失列直接报 KeyError。
+    """
+    X = np.empty((len(df), len(feature_cols)), dtype=np.float32)
+    for j, col in enumerate(feature_cols):
+        if col in df.columns:
+            X[:, j] = df[col].to_numpy(dtype=np.float32, na_value=np.nan)
+        elif fill_value is not None and fill_missing_cols:
+            X[:, j] = fill_value
+        else:
+            raise KeyError(f"缺少特征列: {col}")
+    if fill_value is not None:
+        np.nan_to_num(X, copy=False, nan=fill_value)
+    return X
+
+
+def grouped_pct_rank(scores, groups):
+    """按组 (日期) 计算百分位排名 (0-1]，一次 groupby 完成。"""
+    return pd.Series(scores).groupby(np.asarray(groups)).rank(pct=True).to_numpy()
+
+
+def score_panel(model, df, feature_cols=None, date_col="date", fill_value=None,
+                score_col="rank_score", rank_col="pred_rank"):
+    """
+    对整个多日期面板一次性打分。
+
+    model : LoadedModel 或任何带 predict(X) 的模型对象
+    返回在 df 上追加 score_col / rank_col 两列的新 DataFrame (浅拷贝，不复制特征数据)。
+    """
+    if feature_cols is None:
+        feature_cols = model.features
+    X = feature_matrix(df, feature_cols, fill_value=fill_value)
+    scores = np.asarray(_predictor(model).predict(X), dtype=np.float64)
+    out = df.assign(**{score_col: scores})
+    if date_col is not None and rank_col is not None:
+        out[rank_col] = grouped_pct_rank(scores, df[date_col].to_numpy())
+    return out
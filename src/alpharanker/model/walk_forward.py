@@ -0,0 +1,251 @@
+"""
+walk_forward.py
+===============
+Regime 模型的滚动 / 扩张窗口 (Walk-Forward) 训练与样本外评估调度器。
+
+原先 train_cn_regime_model / train_us_regime_model 只训练一个固定切分 (train < 2024, OOS 2024+)，
+稳健性研究需要手工改日期反复重跑。这里：
+  1. 以月末截面为刻度定义窗口 (expanding: 训练起点固定；rolling: 固定长度滑动)
+  2. 每个窗口训练一个 LambdaRank 模型，窗口之间在进程池中并行
+  3. 每个窗口的模型按 (数据指纹, 特征, 参数, 窗口区间) 哈希缓存，重复运行直接复用
+  4. 落盘样本外预测面板 (oos_predictions.parquet) 与逐窗口指标表 (window_metrics.csv)
+
+用法:
+    windows = make_windows(store.dates, train_months=36, test_months=6, mode="rolling")
+    engine = WalkForwardEngine(store, FEATURE_COLS, params, num_boost_round=200)
+    oos_df, metrics_df = engine.run(windows)
+"""
+
+import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import lightgbm as lgb
+
+from alpharanker.data.feature_store import FeatureStore
+
+
+def month_start_positions(dates):
+    """返回 (月份数组, 每个月第一个截面的下标)。dates 需升序 (特征库保证)。"""
+    months = np.asarray(dates).astype("datetime64[M]")
+    uniq, first = np.unique(months, return_index=True)
+    return uniq, first
+
+
+def make_windows(dates, train_months=36, test_months=6, step_months=None, mode="expanding",
+                 val_months=0, embargo_months=0, start=None, end=None):
+    """
+    以月为刻度生成 walk-forward 窗口，返回截面下标区间 (左闭右开)。
+
+    train_months   : rolling 模式下的训练长度；expanding 模式下为首个窗口的最短训练长度
+    val_months     : 从训练段末尾切出的早停验证段 (0 = 不早停，固定轮数)
+    embargo_months : 训练段与测试段之间的隔离期，防止月度前瞻标签跨段泄露
+    start / end    : 仅保留测试起点落在 [start, end) 的窗口
+    """
+    if mode not in ("expanding", "rolling"):
+        raise ValueError(f"未知窗口模式: {mode}")
+    step_months = step_months or test_months
+    months, first = month_start_positions(dates)
+    n_months = len(months)
+    bounds = np.r_[first, len(dates)]       # 第 i 个月覆盖 [bounds[i], bounds[i+1])
+
+    windows = []
+    test_lo = train_months + embargo_months
+    while test_lo < n_months:
+        test_hi = min(test_lo + test_months, n_months)
+        train_hi = test_lo - embargo_months
+        train_lo = 0 if mode == "expanding" else max(0, train_hi - train_months)
+        fit_hi = train_hi - val_months
+        test_month = pd.Timestamp(months[test_lo])
+        if (start is None or test_month >= pd.Timestamp(start)) and (end is None or test_month < pd.Timestamp(end)):
+            if fit_hi > train_lo:
+                windows.append({
+                    "window_id": len(windows),
+                    "train": (int(bounds[train_lo]), int(bounds[fit_hi])),
+                    "val": (int(bounds[fit_hi]), int(bounds[train_hi])),
+                    "test": (int(bounds[test_lo]), int(bounds[test_hi])),
+                    "test_start": str(months[test_lo]),
+                    "test_end": str(months[test_hi - 1]),
+                })
+        test_lo += step_months
+    return windows
+
+
+def rank_ic_by_date(preds, labels, group_sizes, min_size=20):
+    """逐截面 Spearman Rank IC (组内排名后的 Pearson)，一次 groupby 完成，不逐日循环。
+    样本数不超过 min_size 的截面不计入，与各评估脚本 len(grp) > 20 的口径一致。"""
+    g = np.repeat(np.arange(len(group_sizes)), group_sizes)
+    df = pd.DataFrame({"g": g, "p": preds, "y": labels}).dropna()
+    df = df[df.groupby("g")["p"].transform("size") > min_size]
+    df["p"] = df.groupby("g")["p"].rank()
+    df["y"] = df.groupby("g")["y"].rank()
+    df["p"] -= df.groupby("g")["p"].transform("mean")
+    df["y"] -= df.groupby("g")["y"].transform("mean")
+    sums = pd.DataFrame({"py": df["p"] * df["y"], "pp": df["p"] ** 2, "yy": df["y"] ** 2, "g": df["g"]}).groupby("g").sum()
+    denom = np.sqrt(sums["pp"] * sums["yy"])
+    return (sums["py"] / denom.where(denom > 0)).dropna().values
+
+
+def ndcg_at_k_by_date(preds, relevance, group_sizes, k=10):
+    """逐截面 NDCG@k (增益 2^rel - 1)。"""
+    out = []
+    offsets = np.r_[0, np.cumsum(group_sizes)]
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    for lo, hi in zip(offsets[:-1], offsets[1:]):
+        if hi - lo <= 20:
+            continue
+        rel, p = relevance[lo:hi], preds[lo:hi]
+        kk = min(k, hi - lo)
+        top = np.argpartition(-p, kk - 1)[:kk]
+        top = top[np.argsort(-p[top], kind="stable")]
+        ideal = np.sort(rel)[::-1][:kk]
+        idcg = ((2.0 ** ideal - 1) * discounts[:kk]).sum()
+        if idcg > 0:
+            out.append(((2.0 ** rel[top] - 1) * discounts[:kk]).sum() / idcg)
+    return np.array(out)
+
+
+def _window_key(fingerprint, features, categorical_cols, params, num_boost_round, stopping_rounds, dates, window):
+    payload = json.dumps({
+        "data": fingerprint,
+        "features": list(features),
+        "categorical": list(categorical_cols),
+        "params": params,
+        "rounds": num_boost_round,
+        "stopping": stopping_rounds,
+        "train": [str(dates[i]) for i in (window["train"][0], window["train"][1] - 1)],
+        "val": [str(dates[i]) for i in (window["val"][0], window["val"][1] - 1)] if window["val"][1] > window["val"][0] else [],
+    }, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _run_window(job):
+    """进程池 worker：训练 (或从缓存加载) 单个窗口的模型，返回样本外预测与指标。"""
+    store_dir, features, categorical_cols, params, num_boost_round, stopping_rounds, window, model_path, num_threads, ic_label = job
+    store = FeatureStore(store_dir)
+
+    if os.path.exists(model_path):
+        model = lgb.Booster(model_file=model_path)
+        cached = True
+    else:
+        tr = store.view_by_position(*window["train"], features=features)
+        cat = categorical_cols or "auto"
+        lgb_train = lgb.Dataset(tr.X, label=tr.relevance, group=tr.group_sizes,
+                                feature_name=features, categorical_feature=cat)
+        run_params = {**params, "num_threads": num_threads}
+        valid_sets, callbacks = [], [lgb.log_evaluation(0)]
+        if window["val"][1] > window["val"][0]:
+            va = store.view_by_position(*window["val"], features=features)
+            valid_sets = [lgb.Dataset(va.X, label=va.relevance, group=va.group_sizes,
+                                      feature_name=features, categorical_feature=cat, reference=lgb_train)]
+            callbacks.append(lgb.early_stopping(stopping_rounds, verbose=False))
+        model = lgb.train(run_params, lgb_train, num_boost_round=num_boost_round,
+                          valid_sets=valid_sets, callbacks=callbacks)
+        # 先写临时文件再改名，避免中断后留下损坏的缓存
+        model.save_model(model_path + ".tmp", num_iteration=model.best_iteration or None)
+        os.replace(model_path + ".tmp", model_path)
+        cached = False
+
+    te = store.view_by_position(*window["test"], features=features)
+    preds = model.predict(te.X, num_threads=num_threads)
+    q = te.group_sizes
+    ics = rank_ic_by_date(preds, np.asarray(te.label(ic_label), dtype=np.float64), q)
+    ndcgs = ndcg_at_k_by_date(preds, np.asarray(te.relevance), q, k=10)
+
+    mean_ic = ics.mean() if len(ics) else np.nan
+    std_ic = ics.std() if len(ics) else np.nan
+    metrics = {
+        "window_id": window["window_id"],
+        "train_start": str(store.dates[window["train"][0]])[:10],
+        "train_end": str(store.dates[window["val"][1] - 1])[:10],
+        "test_start": str(te.dates[0])[:10],
+        "test_end": str(te.dates[-1])[:10],
+        "n_train": int(store.offsets[window["val"][1]] - store.offsets[window["train"][0]]),
+        "n_test": len(te),
+        "n_dates": len(q),
+        "mean_ic": mean_ic,
+        "std_ic": std_ic,
+        "icir": mean_ic / std_ic if std_ic else np.nan,
+        "ic_pos_ratio": (ics > 0).mean() if len(ics) else np.nan,
+        "mean_ndcg10": ndcgs.mean() if len(ndcgs) else np.nan,
+        "num_trees": model.num_trees(),
+        "cached": cached,
+    }
+    panel = te.frame(labels=[ic_label, "relevance"])
+    panel["window_id"] = window["window_id"]
+    panel["pred"] = preds
+    return metrics, panel
+
+
+class WalkForwardEngine:
+    """
+    在特征库上批量执行 walk-forward 训练。
+
+    store            : FeatureStore (或 load_or_build_store 的返回值)
+    ic_label         : 计算 Rank IC 使用的原始标签列 (默认为构建特征库时的 label_col)
+    out_dir          : 预测面板与指标表的落盘目录
+    cache_dir        : 窗口模型缓存目录，默认位于特征库目录下
+    """
+
+    def __init__(self, store, features, params, num_boost_round=200, stopping_rounds=50,
+                 categorical_cols=(), ic_label=None, out_dir=None, cache_dir=None, n_jobs=None):
+        self.store = store
+        self.features = store.available(features)
+        self.categorical_cols = [c for c in categorical_cols if c in self.features]
+        self.params = dict(params)
+        self.num_boost_round = num_boost_round
+        self.stopping_rounds = stopping_rounds
+        self.ic_label = ic_label or store.label_names[1]
+        self.out_dir = out_dir or os.path.join(store.store_dir, "walk_forward")
+        self.cache_dir = cache_dir or os.path.join(store.store_dir, "wf_models")
+        self.n_jobs = n_jobs or (os.cpu_count() or 1)
+
+    def run(self, windows):
+        if not windows:
+            raise ValueError("没有可运行的窗口，请检查日期范围与 train_months。")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        os.makedirs(self.out_dir, exist_ok=True)
+
+        n_jobs = min(self.n_jobs, len(windows))
+        threads = max(1, (os.cpu_count() or 1) // n_jobs)
+        jobs = []
+        for w in windows:
+            key = _window_key(self.store.fingerprint, self.features, self.categorical_cols, self.params,
+                              self.num_boost_round, self.stopping_rounds, self.store.dates, w)
+            jobs.append((self.store.store_dir, self.features, self.categorical_cols, self.params,
+                         self.num_boost_round, self.stopping_rounds, w,
+                         os.path.join(self.cache_dir, f"{key}.txt"), threads, self.ic_label))
+
+        print(f">> Walk-Forward: {len(windows)} 个窗口 (进程数 {n_jobs} × 线程数 {threads})")
+        if n_jobs == 1:
+            outputs = [_run_window(job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                outputs = list(pool.map(_run_window, jobs))
+
+        metrics_df = pd.DataFrame([m for m, _ in outputs])
+        oos_df = pd.concat([p for _, p in outputs], ignore_index=True)
+
+        metrics_path = os.path.join(self.out_dir, "window_metrics.csv")
+        oos_path = os.path.join(self.out_dir, "oos_predictions.parquet")
+        metrics_df.to_csv(metrics_path, index=False)
+        oos_df.to_parquet(oos_path, index=False)
+        print(f"[DONE] 窗口指标: {metrics_path}")
+        print(f"[DONE] 样本外预测面板: {oos_path} ({len(oos_df)} 行)")
+        return oos_df, metrics_df
+
+
+def summarize(metrics_df):
+    """逐窗口指标的汇总：IC 均值、窗口间 IC 稳定性与正 IC 窗口占比。"""
+    ic = metrics_df["mean_ic"].dropna()
+    return {
+        "n_windows": len(metrics_df),
+        "mean_ic": round(float(ic.mean()), 4),
+        "ic_std_across_windows": round(float(ic.std()), 4),
+        "positive_windows": round(float((ic > 0).mean()), 4),
+        "mean_ndcg10": round(float(metrics_df["mean_ndcg10"].mean()), 4),
+        "cached_windows": int(metrics_df["cached"].sum()),
+    }
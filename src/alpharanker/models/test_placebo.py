@@ -25,6 +25,7 @@ warnings.filterwarnings("ignore")
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 from config import MODEL_DIR
+from alpharanker.data.feature_store import load_or_build_store
 
 FEATURES_PATH = r"C:\Data\Market\us\us_features.parquet"
 MODEL_PATH    = os.path.join(MODEL_DIR, "us_lgbm.pkl")
@@ -52,49 +53,13 @@ FEATURE_COLS = [
     "Diluted EPS_YoY", "Total Revenue_YoY", "ROE_YoY", "Net_Margin_YoY"
 ]
 
-def prepare_data(df: pd.DataFrame):
-    """返回 (df_clean, X, y, q_sizes, valid_feats)。
+def load_store():
+    """打开 (或按需重建) 内存映射特征库。
     标签：截面内百分位排名 → 5档整数 (0=最差, 4=最佳)。
     """
-    df = df[df["label_rank"].notna()].copy().sort_values("report_date").reset_index(drop=True)
-
-    # 填充少量 NaN (如上市初期的某些长周期因子), 防止 lgbm 直接丢弃
-    for col in FEATURE_COLS:
-        if col in df.columns:
-            df[col] = df.groupby('report_date')[col].transform(lambda x: x.fillna(x.median()))
-            df[col] = df[col].fillna(0) # 如果整个截面都缺失则填0
-
-    # transform 保留列结构，不改变 index
-    pct = df.groupby("report_date")["label_rank"].transform(lambda x: x.rank(pct=True))
-    df["relevance"] = pd.cut(pct, bins=[0, 0.2, 0.4, 0.6, 0.8, 1.0],
-                             labels=[0, 1, 2, 3, 4], include_lowest=True).astype(int)
-
-    valid_feats = [c for c in FEATURE_COLS if c in df.columns]
-    
-    # 类别特征（若存在 sector/industry）目前脚本暂未加入，保持纯 float 数组
-    X = df[valid_feats].values.astype(np.float32)
-    y = df["relevance"].values.astype(np.int32)
-    q_sizes = df.groupby("report_date", sort=True).size().values
-
-    return df, X, y, q_sizes, valid_feats
-
-
-def split_by_time(df: pd.DataFrame):
-    dates = sorted(df["report_date"].unique())
-    n = len(dates)
-    # 按月频，共有 130 多个月。划分：前 70% 训练，中 15% 验证，后 15% 测试
-    n_train = int(n * 0.70)
-    n_val = int(n * 0.15)
-    
-    train_dates = dates[: n_train]
-    val_dates   = dates[n_train : n_train + n_val]
-    test_dates  = dates[n_train + n_val : ]
-    
-    return (
-        df[df["report_date"].isin(train_dates)],
-        df[df["report_date"].isin(val_dates)],
-        df[df["report_date"].isin(test_dates)],
-        train_dates, val_dates, test_dates,
+    return load_or_build_store(
+        FEATURES_PATH, FEATURE_COLS,
+        date_col="report_date", label_col="label_rank", fill_value=0.0,
     )
 
 
@@ -107,25 +72,28 @@ def main():
         print(f"[ERR] 特征文件不存在: {FEATURES_PATH}")
         return
 
-    df = pd.read_parquet(FEATURES_PATH)
-    df["report_date"] = pd.to_datetime(df["report_date"])
-    print(f"\n总样本: {len(df)} | 截面: {df['report_date'].nunique()} | 股票: {df['ticker'].nunique()}")
+    store = load_store()
+    print(f"\n总样本: {store.n_rows} | 截面: {len(store.dates)} | 股票: {len(np.unique(store.tickers))}")
 
-    train_df, val_df, test_df, train_dates, val_dates, test_dates = split_by_time(df)
-    print(f"\n训练集: {len(train_dates)} 截面 ({str(train_dates[0])[:7]} ~ {str(train_dates[-1])[:7]})")
-    print(f"验证集: {len(val_dates)} 截面 ({str(val_dates[0])[:7]} ~ {str(val_dates[-1])[:7]})")
-    print(f"测试集: {len(test_dates)} 截面 ({str(test_dates[0])[:7]} ~ {str(test_dates[-1])[:7]})")
+    valid_feats = store.available(FEATURE_COLS)
+    tr_view, va_view, te_view = store.split_by_ratio(0.70, 0.15, features=valid_feats)
+    print(f"\n训练集: {len(tr_view.dates)} 截面 ({str(tr_view.dates[0])[:7]} ~ {str(tr_view.dates[-1])[:7]})")
+    print(f"验证集: {len(va_view.dates)} 截面 ({str(va_view.dates[0])[:7]} ~ {str(va_view.dates[-1])[:7]})")
+    print(f"测试集: {len(te_view.dates)} 截面 ({str(te_view.dates[0])[:7]} ~ {str(te_view.dates[-1])[:7]})")
 
-    tr_df, X_train, y_train, q_train, valid_feats = prepare_data(train_df)
+    X_train, q_train = tr_view.X, tr_view.group_sizes
+    # 标签需要原地打乱，复制出可写副本 (特征矩阵仍为只读映射)
+    y_train = np.array(tr_view.relevance)
     
     print("\n[!!!] 正在进行安慰剂测试 (Placebo Test)：随机打乱训练集和验证集标签 [!!!]")
     np.random.seed(42)
     np.random.shuffle(y_train)
     
-    va_df, X_val,   y_val,   q_val,   _           = prepare_data(val_df)
+    X_val, q_val = va_view.X, va_view.group_sizes
+    y_val = np.array(va_view.relevance)
     np.random.shuffle(y_val)
     
-    te_df, X_test,  y_test,  q_test,  _           = prepare_data(test_df)
+    X_test, y_test = te_view.X, te_view.relevance
 
     print(f"\n特征: {len(valid_feats)} | 训练: {len(X_train)} | 验证: {len(X_val)} | 测试: {len(X_test)}")
 
@@ -175,7 +143,7 @@ def main():
         ic_total, _ = spearmanr(test_pred, y_test)
         print(f"\n测试集 IC (Spearman): {ic_total:.4f}")
 
-        te_df = te_df.copy()
+        te_df = te_view.frame()
         te_df["pred"] = test_pred
         ic_rows = []
         for date, grp in te_df.groupby("report_date"):
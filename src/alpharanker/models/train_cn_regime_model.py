@@ -20,6 +20,9 @@ from sklearn.metrics import ndcg_score
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 from config import BASE_DIR, MODEL_DIR, CN_DIR
+from alpharanker.data.feature_store import load_or_build_store
+from alpharanker.model.compiled_trees import export_compiled
+from alpharanker.model.walk_forward import make_windows, WalkForwardEngine, summarize
 
 # 特征路径
 FEATURES_PATH = os.path.join(CN_DIR, 'cn_features_enhanced.parquet')
@@ -32,6 +35,18 @@ FEATURE_COLS = [
     "turn_20d_rank"
 ]
 
+PARAMS = {
+    "objective": "lambdarank",
+    "metric": "ndcg",
+    "learning_rate": 0.05,
+    "num_leaves": 31,
+    "min_child_samples": 50,
+    "feature_fraction": 0.8,
+    "importance_type": "gain",
+    "verbose": -1,
+    "seed": 42
+}
+
 def add_regime_tags(df):
     """
     根据日期添加市场状态标签（A 股版）
@@ -56,23 +71,16 @@ def add_regime_tags(df):
     print(f">> 已注入宏观状态标签。样本包含 Bull/Bear 比例: {df['regime'].mean():.2%}")
     return df
 
-def prepare_data(df):
-    df = df[df["label_next_month"].notna()].copy().sort_values("date")
-    
-    # 填充
-    for col in FEATURE_COLS:
-        df[col] = df.groupby('date')[col].transform(lambda x: x.fillna(x.median())).fillna(0.5)
-
-    # 离散化标签
-    pct = df.groupby("date")["label_next_month"].transform(lambda x: x.rank(pct=True))
-    df["relevance"] = pd.cut(pct, bins=[0, 0.2, 0.4, 0.6, 0.8, 1.0], 
-                             labels=[0, 1, 2, 3, 4], include_lowest=True).astype(int)
-
-    X = df[FEATURE_COLS + ["regime"]].values.astype(np.float32)
-    y = df["relevance"].values.astype(np.int32)
-    q_sizes = df.groupby("date", sort=True).size().values
-    
-    return df, X, y, q_sizes
+def load_store():
+    """
+    打开 (或按需重建) A 股内存映射特征库，宏观标签在重建时注入一次。
+    预处理与原 prepare_data 一致：截面中位数填充 → 0.5 兜底，label_next_month 截面分 5 档。
+    """
+    return load_or_build_store(
+        FEATURES_PATH, FEATURE_COLS + ["regime"], transform=add_regime_tags,
+        depends=[os.path.join(CN_DIR, 'macro_regime.parquet')],
+        date_col="date", label_col="label_next_month", fill_value=0.5,
+    )
 
 def calculate_metrics(model, df, X, label_col='label_next_month'):
     preds = model.predict(X)
@@ -112,38 +120,26 @@ def main():
         print(f"❌ 缺少特征文件: {FEATURES_PATH}")
         return
 
-    df = pd.read_parquet(FEATURES_PATH)
-    df = add_regime_tags(df)
+    store = load_store()
+    model_feats = FEATURE_COLS + ["regime"]
     
-    # 按照用户要求：2024 为 OOS 核心评估期
-    df['date'] = pd.to_datetime(df['date'])
-    train_df = df[df['date'] < '2024-01-01']
-    test_df = df[(df['date'] >= '2024-01-01') & (df['date'] <= '2024-12-31')]
+    # 按照用户要求：2024 为 OOS 核心评估期 (日期区间 → 连续行段的零拷贝视图)
+    train_view = store.view(end='2024-01-01', features=model_feats)
+    test_view = store.view(start='2024-01-01', end='2025-01-01', features=model_feats)
     
-    if len(train_df) == 0 or len(test_df) == 0:
+    if len(train_view) == 0 or len(test_view) == 0:
         print("⚠️ 数据切分失败，检查日期范围。回滚使用 80/20 切分。")
-        all_dates = sorted(df["date"].unique())
-        n = len(all_dates)
-        train_dates = all_dates[:int(n*0.8)]
-        train_df = df[df["date"].isin(train_dates)]
-        test_df = df[~df["date"].isin(train_dates)]
+        n = len(store.dates)
+        train_view = store.view_by_position(0, int(n*0.8), model_feats)
+        test_view = store.view_by_position(int(n*0.8), n, model_feats)
     else:
-        print(f">> 切分完成: Train ({train_df['date'].min().date()} ~ {train_df['date'].max().date()}) | Test (2024 All)")
+        print(f">> 切分完成: Train ({str(train_view.dates[0])[:10]} ~ {str(train_view.dates[-1])[:10]}) | Test (2024 All)")
     
-    tr_df, X_train, y_train, q_train = prepare_data(train_df)
-    va_df, X_test, y_test, q_test = prepare_data(test_df)
+    X_train, y_train, q_train = train_view.X, train_view.relevance, train_view.group_sizes
+    X_test = test_view.X
+    tr_df, va_df = train_view.frame(), test_view.frame()
     
-    params = {
-        "objective": "lambdarank",
-        "metric": "ndcg",
-        "learning_rate": 0.05,
-        "num_leaves": 31,
-        "min_child_samples": 50,
-        "feature_fraction": 0.8,
-        "importance_type": "gain",
-        "verbose": -1,
-        "seed": 42
-    }
+    params = PARAMS
     
     lgb_train = lgb.Dataset(X_train, label=y_train, group=q_train)
     
@@ -173,6 +169,35 @@ def main():
     with open(MODEL_PATH, "wb") as f:
         pickle.dump({"model": model, "features": FEATURE_COLS + ["regime"]}, f)
     print(f"[DONE] 模型已保存: {MODEL_PATH}")
+    export_compiled(model, MODEL_PATH)     # 实盘推理用的编译产物
+
+def walk_forward_main(train_months=24, test_months=3, mode="expanding"):
+    """
+    稳健性研究：以月末为刻度滚动重训，替代单一的 2024 固定切分。
+    每个窗口的模型按 (数据指纹, 参数) 缓存，重复运行只补训新增窗口。
+    """
+    print("="*60)
+    print(f"  Alpha Genome: A 股 Walk-Forward ({mode}, 训练 {train_months}M / 测试 {test_months}M)")
+    print("="*60)
+
+    if not os.path.exists(FEATURES_PATH):
+        print(f"❌ 缺少特征文件: {FEATURES_PATH}")
+        return
+
+    store = load_store()
+    # label_next_month 跨月前瞻，训练与测试之间隔离 1 个月
+    windows = make_windows(store.dates, train_months=train_months, test_months=test_months,
+                           mode=mode, embargo_months=1)
+    engine = WalkForwardEngine(store, FEATURE_COLS + ["regime"], PARAMS, num_boost_round=200,
+                               ic_label="label_next_month",
+                               out_dir=os.path.join(MODEL_DIR, "walk_forward_cn_regime"))
+    _, metrics_df = engine.run(windows)
+
+    print(metrics_df[["window_id", "test_start", "test_end", "mean_ic", "icir", "mean_ndcg10", "cached"]].to_string(index=False))
+    print(f"\n[Summary] {summarize(metrics_df)}")
 
 if __name__ == "__main__":
-    main()
+    if "--walk-forward" in sys.argv:
+        walk_forward_main()
+    else:
+        main()
@@ -21,6 +21,8 @@ from validate_pipeline import l1_data_integrity_check
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 from config import MODEL_DIR
+from alpharanker.data.feature_store import load_or_build_store
+from alpharanker.model.walk_forward import make_windows, WalkForwardEngine, summarize
 
 FEATURES_PATH = r"C:\Data\Market\us\us_features_enhanced.parquet"
 MODEL_PATH    = os.path.join(MODEL_DIR, "us_lgbm_regime_v2.pkl")
@@ -39,6 +41,22 @@ FEATURE_COLS = [
     "regime_label"
 ]
 
+PARAMS = {
+    "objective":         "lambdarank",
+    "metric":            "ndcg",
+    "ndcg_eval_at":      [5, 10, 20],
+    "learning_rate":     0.05,
+    "num_leaves":        31,
+    "min_child_samples": 20,
+    "feature_fraction":  0.9,
+    "bagging_fraction":  0.9,
+    "bagging_freq":      1,
+    "lambda_l1":         0.1,
+    "lambda_l2":         0.1,
+    "verbose":           -1,
+    "seed":              42,
+}
+
 def prepare_data(df: pd.DataFrame):
      
     df = df[df["label_excess_rank"].notna()].copy().sort_values("report_date").reset_index(drop=True)
@@ -84,6 +102,17 @@ def split_by_time(df: pd.DataFrame):
         train_dates, val_dates, test_dates,
     )
 
+def load_store():
+    """
+    walk-forward 使用的内存映射特征库，预处理口径与 prepare_data 一致：
+    截面中位数填充 → 0.5 兜底，regime_label 编码为类别 code，label_excess_rank 截面分 5 档。
+    """
+    return load_or_build_store(
+        FEATURES_PATH, FEATURE_COLS,
+        date_col="report_date", label_col="label_excess_rank", extra_label_cols=["label_3m_excess"],
+        categorical_cols=["regime_label"], fill_value=0.5,
+    )
+
 def main():
     print("=" * 60)
     print("  AlphaRanker — 多模态演化: 环境自适应排序模型 (Regime-Aware)")
@@ -112,21 +141,7 @@ def main():
     lgb_train = lgb.Dataset(X_train, label=y_train, group=q_train, feature_name=valid_feats, categorical_feature=categorical_features, free_raw_data=False)
     lgb_val   = lgb.Dataset(X_val,   label=y_val,   group=q_val,   feature_name=valid_feats, reference=lgb_train, categorical_feature=categorical_features, free_raw_data=False)
 
-    params = {
-        "objective":         "lambdarank",
-        "metric":            "ndcg",
-        "ndcg_eval_at":      [5, 10, 20],
-        "learning_rate":     0.05,
-        "num_leaves":        31,
-        "min_child_samples": 20,
-        "feature_fraction":  0.9,
-        "bagging_fraction":  0.9,
-        "bagging_freq":      1,
-        "lambda_l1":         0.1,
-        "lambda_l2":         0.1,
-        "verbose":           -1,
-        "seed":              42,
-    }
+    params = PARAMS
 
     print("\n[Start Training] 启动状态感知神经键组拟合...")
     model = lgb.train(
@@ -175,5 +190,32 @@ def main():
         val = np.mean(r_ic_list) if r_ic_list else np.nan
         print(f"   [{regime:8s}]: {val:.4f}")
 
+def walk_forward_main(train_months=36, test_months=6, mode="expanding"):
+    """
+    稳健性研究：以月末为刻度滚动重训 Regime-Aware 模型，逐窗口输出样本外 IC。
+    标签为 3 个月前瞻收益，训练与测试之间隔离 3 个月防止泄露。
+    """
+    print("=" * 60)
+    print(f"  AlphaRanker — Regime-Aware Walk-Forward ({mode}, 训练 {train_months}M / 测试 {test_months}M)")
+    print("=" * 60)
+
+    if not os.path.exists(FEATURES_PATH):
+        print(f"[ERR] 特征文件不存在: {FEATURES_PATH}")
+        return
+
+    store = load_store()
+    windows = make_windows(store.dates, train_months=train_months, test_months=test_months,
+                           mode=mode, val_months=6, embargo_months=3)
+    engine = WalkForwardEngine(store, FEATURE_COLS, PARAMS, num_boost_round=100, stopping_rounds=10,
+                               categorical_cols=["regime_label"], ic_label="label_3m_excess",
+                               out_dir=os.path.join(MODEL_DIR, "walk_forward_us_regime"))
+    _, metrics_df = engine.run(windows)
+
+    print(metrics_df[["window_id", "test_start", "test_end", "mean_ic", "icir", "mean_ndcg10", "cached"]].to_string(index=False))
+    print(f"\n[Summary] {summarize(metrics_df)}")
+
 if __name__ == "__main__":
-    main()
+    if "--walk-forward" in sys.argv:
+        walk_forward_main()
+    else:
+        main()
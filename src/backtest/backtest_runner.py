@@ -1,3 +1,4 @@
+import bisect
 import sys
 import os
 import yfinance as yf
@@ -13,9 +14,12 @@ except ImportError:
 # 加入系统路径以引入主模块
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from trading_signal import generate_signal
+from trading_signal import generate_signal, SIGNAL_THRESHOLDS
+from core.kronos_engine import KronosEngine
 from backtest.config import BACKTEST_CONFIG
 from backtest.signal_recorder import SignalRecorder
+from backtest.result_journal import ResultJournal, STATUS_EMPTY, STATUS_ERROR, STATUS_OK
+from core.trading_calendar import get_calendar
 from backtest.performance_analyzer import analyze_performance
 
 def precompute_future_data(ticker: str, start_date: str, end_date: str, horizons: list) -> dict:
@@ -76,33 +80,69 @@ def precompute_future_data(ticker: str, start_date: str, end_date: str, horizons
         return {}
 
 
+def open_result_journal(config: dict = BACKTEST_CONFIG) -> ResultJournal:
+    """
+    逐 (ticker, date) 结果日志。config_hash 覆盖所有影响单条结果的参数：horizons、
+    Kronos 权重指纹与采样设置 (T / top_p / sample_count / lookback / pred_len / 集成轮数)、
+    信号阈值；只有股票池与回测区间不参与，扩展二者后重跑，已完成的 key 仍可复用。
+    """
+    journal_path = config.get("journal_path") or os.path.join(config["output_dir"], "result_journal.sqlite")
+    return ResultJournal(journal_path, run_id=config.get("run_id", "us_daily"),
+                         config={"horizons": config.get("horizons", [1, 5]),
+                                 "signal": "trading_signal.generate_signal",
+                                 "kronos": KronosEngine.settings(),
+                                 "thresholds": SIGNAL_THRESHOLDS})
+
+
 def process_single_ticker(args):
-    ticker, sample_dates, record_file_path = args
+    ticker, sample_dates, record_file_path, *rest = args
+    journal = rest[0] if rest else None
     print(f"\n[Worker] ========== Starting Backtest for {ticker} ==========")
-    stock_results = []
     
     if not sample_dates:
         return 0, None
 
-    start_dt_str = min(sample_dates)
-    end_dt_str = max(sample_dates)
-    # 【Vectorization Fix】预先提取向量化结果，极大减少网络 IO 与循环耗时
-    precomputed_data = precompute_future_data(ticker, start_dt_str, end_dt_str, horizons=[1, 5])
+    # 断点续跑：日志中已完成的日期直接复用，不再跑 Kronos
+    finished = journal.completed(ticker=ticker) if journal is not None else {}
+    stock_results = [finished[d] for d in sample_dates if finished.get(d)]
+    pending_dates = [d for d in sample_dates if d not in finished]
+    if finished:
+        print(f"[Worker] {ticker}: 日志中已完成 {len(sample_dates) - len(pending_dates)} 天，续跑 {len(pending_dates)} 天")
+
+    horizons = [1, 5]
+    precomputed_data = {}
+    if pending_dates:
+        start_dt_str = min(pending_dates)
+        end_dt_str = max(pending_dates)
+        # 【Vectorization Fix】预先提取向量化结果，极大减少网络 IO 与循环耗时
+        precomputed_data = precompute_future_data(ticker, start_dt_str, end_dt_str, horizons=horizons)
+    price_dates = sorted(precomputed_data)
+
+    def _journal(date, payload, status):
+        if journal is None:
+            return
+        # empty 视为最终结果，重跑不再计算；只有行情已越过该日 max(horizons) 个交易日仍缺前瞻收益时才记。
+        # 价格拉取整体失败、或前瞻窗口尚未走完 (数据末端附近) 的日期不记，留待下次重试
+        if status == STATUS_EMPTY and len(price_dates) - bisect.bisect_right(price_dates, date) <= max(horizons):
+            return
+        journal.put(ticker, date, payload, status)
 
     # 为了避免多个进程打印重叠，可以去掉 tqdm 或者简单降级，这里保留以看到进度
-    for date in tqdm(sample_dates, desc=f"Processing {ticker}", leave=False):
+    for date in tqdm(pending_dates, desc=f"Processing {ticker}", leave=False):
         try:
             signal = generate_signal(ticker=ticker, as_of_date=date)
             
             # 从预计算字典中极速获取
             day_data = precomputed_data.get(date)
             if not day_data:
+                _journal(date, None, STATUS_EMPTY)
                 continue
 
             fut_ret_1d, fut_vol_1d, fut_range_1d = day_data.get("fut_ret_1d"), day_data.get("fut_vol_1d"), day_data.get("fut_range_1d")
             fut_ret_5d, fut_vol_5d, fut_range_5d = day_data.get("fut_ret_5d"), day_data.get("fut_vol_5d"), day_data.get("fut_range_5d")
             
             if fut_ret_1d is None or fut_ret_5d is None:
+                _journal(date, None, STATUS_EMPTY)
                 continue
                 
             meta = signal.get("metadata", {})
@@ -126,11 +166,14 @@ def process_single_ticker(args):
                 "actual_range_5d": fut_range_5d
             }
             stock_results.append(record)
+            _journal(date, record, STATUS_OK)
             
         except Exception as e:
             tqdm.write(f"  [X] Failed processing {ticker} at {date}: {e}")
+            _journal(date, {"error": str(e)}, STATUS_ERROR)
             
     if stock_results:
+        stock_results.sort(key=lambda r: r["date"])
         # 为防止多线程锁冲突写坏 JSONL，各进程写自己的小独立卷文件
         import json
         ticker_file = record_file_path.replace(".jsonl", f"_{ticker}.jsonl")
@@ -152,14 +195,13 @@ def run_backtest():
     recorder = SignalRecorder(BACKTEST_CONFIG["output_dir"])
     record_file_path = recorder.record_file
     
-    print("Pre-fetching SPY calendar to determine trading days...")
-    spy = yf.Ticker("SPY")
-    spy_df = spy.history(start=start_date, end=end_date)
-    if spy_df.empty:
-        print("Failed to fetch trading days. Aborting.")
+    # 本地 NYSE 日历取交易日 (与 SPY history 相同的 [start, end) 区间，且不含今天之后的日期)
+    cal_end = min(end_date, datetime.now().strftime("%Y-%m-%d"))
+    trading_dates = [str(d) for d in get_calendar("NYSE").trading_days(start_date, cal_end, inclusive_end=False)]
+    if not trading_dates:
+        print("No trading days in range. Aborting.")
         return
         
-    trading_dates = spy_df.index.tz_localize(None).strftime("%Y-%m-%d").tolist()
     print(f"Found {len(trading_dates)} trading days from {start_date} to {end_date}.")
     sample_dates = trading_dates
     print(f"Selected {len(sample_dates)} sampling dates per stock for backtesting (Expected total: {len(sample_dates) * len(universe)}).")
@@ -169,7 +211,12 @@ def run_backtest():
     safe_workers = min(8, max(1, total_cores // 2))
     print(f"\n⚡ 核聚变引擎启动：检测到 {total_cores} 个逻辑核心，安全起见将挂载 {safe_workers} 个车道并发回测！\n")
 
-    tasks = [(ticker, sample_dates, record_file_path) for ticker in universe]
+    # 结果日志：中断后重跑只补算缺失的 (ticker, date)
+    journal = open_result_journal(BACKTEST_CONFIG)
+    print(f"Result journal: {journal.path} (run_id={journal.run_id}, config={journal.config_hash}, "
+          f"已有 {journal.counts()})")
+
+    tasks = [(ticker, sample_dates, record_file_path, journal) for ticker in universe]
     
     # 启用多进程池发包
     with concurrent.futures.ProcessPoolExecutor(max_workers=safe_workers) as executor:
@@ -0,0 +1,262 @@
+"""
+bootstrap_engine.py
+====================
+向量化重采样引擎（Bootstrap 稳定性检验通用组件）
+
+原先 o_score_stability_test 每次重采样都对 list[dict] 做一次 sorted()，
+signal_deep_test 的分位统计也全靠 statistics.mean；几百次还行，上万次 + 全历史面板就要几分钟。
+这里统一改为数组运算：
+
+  - draw_indices()       : 一次性从带种子的 Generator 抽出整张 [B × n] 下标矩阵
+                           iid（有放回）/ block（循环移动块）/ stationary（Politis-Romano 平稳自助法）
+  - long_short_spreads() : 对每一行重采样在二维数组上 argpartition 取 Top / Bottom k，得到多空价差
+  - bootstrap_means()    : 时间序列（逐期价差）的重采样均值
+  - bootstrap() / bootstrap_variants() : 按固定大小分块，多种重采样方式并行（进程池）计算，
+                           结果只取决于种子与分块大小，与 workers 数无关
+  - summarize_samples()  : 均值 / 标准差 / 胜率 / t / 置信区间，口径与原脚本一致
+  - decile_stats()       : 按排序键分桶的平均收益 / 胜率（分桶边界与原脚本一致）
+
+用法:
+    samples = bootstrap(ret, scores=o_score, n_boot=10000, pct=0.30, seed=2026)
+    by_method = bootstrap_variants(monthly_spreads, n_boot=10000, block_len=3, workers=4)
+"""
+
+from __future__ import annotations
+
+import math
+import concurrent.futures
+
+import numpy as np
+
+METHODS = ("iid", "block", "stationary")
+CHUNK_SIZE = 2000          # 每个任务的重采样次数，同时控制 [B × n] 临时矩阵的内存
+
+
+def default_block_len(n: int) -> int:
+    """块长经验值 n^(1/3)"""
+    return max(1, int(round(n ** (1 / 3))))
+
+
+# ── 重采样下标 ────────────────────────────────────────────────
+def draw_indices(n: int, n_boot: int, method: str = "iid", block_len: int | None = None,
+                 rng: np.random.Generator | None = None) -> np.ndarray:
+    """
+    一次性抽取 [n_boot × n] 的重采样下标矩阵。
+
+    iid        : 每个位置独立有放回抽样
+    block      : 循环移动块自助法，块长固定为 block_len，起点均匀分布
+    stationary : 平稳自助法，块长服从均值为 block_len 的几何分布（循环取数）
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    if method == "iid":
+        return rng.integers(0, n, size=(n_boot, n))
+
+    block_len = block_len or default_block_len(n)
+    if method == "block":
+        n_blocks = -(-n // block_len)
+        starts = rng.integers(0, n, size=(n_boot, n_blocks))
+        idx = (starts[:, :, None] + np.arange(block_len)) % n
+        return idx.reshape(n_boot, -1)[:, :n]
+
+    if method == "stationary":
+        pos = np.arange(n)
+        new_block = rng.random((n_boot, n)) < 1.0 / block_len
+        new_block[:, 0] = True
+        starts = rng.integers(0, n, size=(n_boot, n))
+        # 每个位置所在块的起始位置 = 之前最近一次 "开新块" 的位置
+        anchor = np.maximum.accumulate(np.where(new_block, pos, 0), axis=1)
+        return (np.take_along_axis(starts, anchor, axis=1) + (pos - anchor)) % n
+
+    raise ValueError(f"未知重采样方式: {method}")
+
+
+# ── 每行重采样的统计量 ─────────────────────────────────────────
+def tie_break_ranks(scores: np.ndarray, idx: np.ndarray) -> np.ndarray:
+    """
+    每行重采样内的排序键 [B, n] (越小越靠前)：先按分数降序，同分再按该条在行内出现的位置，
+    即与逐行 sorted(sample, reverse=True) 的稳定排序完全一致，行内键互不相同。
+    """
+    _, dense = np.unique(-np.asarray(scores, dtype=np.float64), return_inverse=True)
+    n = idx.shape[1]
+    return dense.astype(np.int64)[idx] * n + np.arange(n, dtype=np.int64)
+
+
+def long_short_spreads(scores: np.ndarray, returns: np.ndarray, idx: np.ndarray,
+                       pct: float = 0.30) -> np.ndarray:
+    """
+    对每一行重采样按分数降序取前 pct 做多、后 pct 做空，返回等权多空价差 [B]。
+    scores / returns 需为同长度的有限值数组（调用方先剔除缺失）。
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    n = idx.shape[1]
+    k = max(1, int(n * pct))
+    r = tie_break_ranks(scores, idx)
+    ret = returns[idx]
+    top = np.argpartition(r, k - 1, axis=1)[:, :k]
+    bottom = np.argpartition(-r, k - 1, axis=1)[:, :k]
+    long_ret = np.take_along_axis(ret, top, axis=1).mean(axis=1)
+    short_ret = np.take_along_axis(ret, bottom, axis=1).mean(axis=1)
+    return long_ret - short_ret
+
+
+def bootstrap_means(values: np.ndarray, idx: np.ndarray) -> np.ndarray:
+    """时间序列重采样均值 [B]"""
+    return np.asarray(values, dtype=np.float64)[idx].mean(axis=1)
+
+
+# ── 分块 / 并行调度 ───────────────────────────────────────────
+def _run_job(values, scores, method, n_boot, block_len, pct, seed_seq):
+    rng = np.random.default_rng(seed_seq)
+    idx = draw_indices(len(values), n_boot, method, block_len, rng)
+    if scores is None:
+        return bootstrap_means(values, idx)
+    return long_short_spreads(scores, values, idx, pct)
+
+
+def _jobs(n_boot, methods, seed, chunk_size):
+    """(方式, 本块次数, 种子) 列表：每种方式各自 spawn 子种子，分块与 workers 无关"""
+    root = np.random.SeedSequence(seed)
+    jobs = []
+    for method, method_seq in zip(methods, root.spawn(len(methods))):
+        sizes = [min(chunk_size, n_boot - lo) for lo in range(0, n_boot, chunk_size)]
+        jobs.extend((method, size, seq) for size, seq in zip(sizes, method_seq.spawn(len(sizes))))
+    return jobs
+
+
+def bootstrap_variants(values, scores=None, methods=METHODS, n_boot: int = 10000,
+                       block_len: int | None = None, pct: float = 0.30, seed: int = 2026,
+                       workers: int = 1, chunk_size: int = CHUNK_SIZE) -> dict[str, np.ndarray]:
+    """
+    多种重采样方式同时计算，返回 {方式: 重采样统计量 [n_boot]}。
+
+    scores 为空  : 对 values（逐期价差序列）做时间序列自助法，统计量为均值
+    scores 非空  : 对截面 (scores, values=收益) 重采样，统计量为 Top/Bottom pct 多空价差
+    workers > 1 时各分块交给进程池并行。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    scores = None if scores is None else np.asarray(scores, dtype=np.float64)
+    if scores is not None and len(scores) != len(values):
+        raise ValueError(f"scores 与 returns 长度不一致: {len(scores)} vs {len(values)}")
+    if len(values) == 0:
+        return {m: np.array([]) for m in methods}
+
+    jobs = _jobs(n_boot, list(methods), seed, chunk_size)
+    args = [(values, scores, m, size, block_len, pct, seq) for m, size, seq in jobs]
+    if workers > 1 and len(jobs) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+            parts = list(executor.map(_run_job, *zip(*args)))
+    else:
+        parts = [_run_job(*a) for a in args]
+
+    out = {m: [] for m in methods}
+    for (m, _, _), part in zip(jobs, parts):
+        out[m].append(part)
+    return {m: np.concatenate(v) for m, v in out.items()}
+
+
+def bootstrap(values, scores=None, method: str = "iid", n_boot: int = 10000,
+              block_len: int | None = None, pct: float = 0.30, seed: int = 2026,
+              workers: int = 1, chunk_size: int = CHUNK_SIZE) -> np.ndarray:
+    """单一重采样方式的 bootstrap_variants"""
+    return bootstrap_variants(values, scores, (method,), n_boot, block_len, pct, seed,
+                              workers, chunk_size)[method]
+
+
+# ── 汇总 ─────────────────────────────────────────────────────
+def summarize_samples(samples, ci: float = 0.95) -> dict:
+    """
+    重采样分布的均值 / 标准差 / 胜率 / t-stat / 置信区间。
+    置信区间取 sorted[int(n·α/2)] 与 sorted[int(n·(1-α/2))]，与原 confidence_interval 一致。
+    """
+    s = np.asarray(samples, dtype=np.float64)
+    n = len(s)
+    if n == 0:
+        return {"n": 0, "mean": None, "std": None, "win_rate": None, "t_stat": 0.0,
+                "ci_lo": None, "ci_hi": None}
+    mean = float(s.mean())
+    std = float(s.std(ddof=1)) if n > 1 else 0.0
+    t = mean / (std / math.sqrt(n)) if std > 1e-9 else 0.0
+    srt = np.sort(s)
+    lo = srt[min(int(n * (1 - ci) / 2), n - 1)]
+    hi = srt[min(int(n * (1 - (1 - ci) / 2)), n - 1)]
+    return {"n": n, "mean": mean, "std": std, "win_rate": float((s > 0).mean()), "t_stat": t,
+            "ci_lo": float(lo), "ci_hi": float(hi)}
+
+
+def decile_stats(keys, returns, n_buckets: int = 10) -> list[dict]:
+    """
+    按 keys 升序 (稳定排序) 等分为 n_buckets 桶，最后一桶吸收余数（与原脚本分桶一致），
+    返回每桶的 key 范围 / 只数 / 平均收益 / 胜率。样本数不足 n_buckets 时桶数降为样本数 (每桶 1 条)，
+    无样本时返回空列表。
+    """
+    keys = np.asarray(keys, dtype=np.float64)
+    returns = np.asarray(returns, dtype=np.float64)
+    order = np.argsort(keys, kind="stable")
+    k, r = keys[order], returns[order]
+    n = len(k)
+    n_buckets = min(n_buckets, n)
+    if n_buckets == 0:
+        return []
+    size = n // n_buckets
+    starts = np.arange(n_buckets) * size
+    ends = np.r_[starts[1:], n]
+    counts = ends - starts
+    sums = np.add.reduceat(r, starts)
+    wins = np.add.reduceat((r > 0).astype(np.int64), starts)
+    return [
+        {"bucket": i + 1, "key_lo": float(k[starts[i]]), "key_hi": float(k[ends[i] - 1]),
+         "count": int(counts[i]), "mean_ret": float(sums[i] / counts[i]),
+         "win_rate": float(wins[i] / counts[i])}
+        for i in range(n_buckets)
+    ]
+
+
+def reference_spreads(scores, returns, idx, pct: float = 0.30) -> np.ndarray:
+    """逐行 sorted() 的参考实现，仅用于 self_check 校验向量化结果"""
+    out = []
+    for row in idx:
+        sample = [(scores[i], returns[i]) for i in row]
+        srt = sorted(sample, key=lambda x: x[0], reverse=True)
+        k = max(1, int(len(srt) * pct))
+        out.append(np.mean([x[1] for x in srt[:k]]) - np.mean([x[1] for x in srt[-k:]]))
+    return np.asarray(out)
+
+
+def self_check(n: int = 237, n_boot: int = 300, seed: int = 0) -> float:
+    """与逐行排序参考实现对比（分数无重复 / 大量同分两种情形），返回最大绝对误差"""
+    rng = np.random.default_rng(seed)
+    distinct = rng.permutation(n) + rng.random(n) * 0.5
+    tied = rng.integers(0, 5, n).astype(np.float64)
+    returns = rng.normal(0, 0.05, n)
+    worst = 0.0
+    for scores in (distinct, tied):
+        for method in METHODS:
+            idx = draw_indices(n, n_boot, method, rng=np.random.default_rng(seed))
+            if idx.shape != (n_boot, n) or idx.min() < 0 or idx.max() >= n:
+                raise AssertionError(f"{method} 下标矩阵异常: {idx.shape}")
+            diff = np.abs(long_short_spreads(scores, returns, idx) - reference_spreads(scores, returns, idx))
+            worst = max(worst, float(diff.max()))
+    if worst > 1e-12:
+        raise AssertionError(f"向量化多空价差与参考实现不一致: max|diff|={worst:.3e}")
+    a = bootstrap_variants(returns, n_boot=5000, seed=seed, workers=1, chunk_size=1000)
+    b = bootstrap_variants(returns, n_boot=5000, seed=seed, workers=2, chunk_size=1000)
+    if any(not np.array_equal(a[m], b[m]) for m in METHODS):
+        raise AssertionError("并行结果与串行结果不一致")
+    small = decile_stats(returns[:3], returns[:3], 10)
+    if len(small) != 3 or any(b["count"] != 1 for b in small):
+        raise AssertionError(f"样本数少于桶数时分桶异常: {small}")
+    return worst
+
+
+if __name__ == "__main__":
+    import time
+
+    print(f"self_check max|diff| = {self_check():.2e}")
+    rng = np.random.default_rng(1)
+    sc, rt = rng.normal(size=5000), rng.normal(0, 0.05, 5000)
+    t0 = time.perf_counter()
+    res = bootstrap(rt, scores=sc, n_boot=10000, seed=1)
+    print(f"截面 5000 只 × 10000 次: {time.perf_counter() - t0:.2f}s  {summarize_samples(res)}")
+    t0 = time.perf_counter()
+    res = bootstrap_variants(rng.normal(0.01, 0.05, 240), n_boot=20000, block_len=3)
+    print(f"时间序列 240 期 × 3 种方式 × 20000 次: {time.perf_counter() - t0:.2f}s")
@@ -16,5 +16,9 @@ BACKTEST_CONFIG = {
     "horizons": [1, 5],
     
     # 结果落地目录
-    "output_dir": "src/backtest/results"
+    "output_dir": "src/backtest/results",
+
+    # 断点续跑日志：同一 run_id 下已完成的 (ticker, date) 重跑时跳过
+    "run_id": "us_daily",
+    "journal_path": "src/backtest/results/result_journal.sqlite"
 }
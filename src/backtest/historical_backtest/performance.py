@@ -17,6 +17,8 @@ from __future__ import annotations
 import math
 import statistics
 
+import numpy as np
+
 
 def compute_portfolio_spread(long_returns: list[float | None],
                              short_returns: list[float | None]) -> list[float]:
@@ -34,25 +36,16 @@ def compute_leg_return(returns: list[float | None]) -> float | None:
 
 def cumulative_nav(spreads: list[float]) -> list[float]:
     """从等权多空价差序列构建累计净值（初始 = 1）"""
-    nav = [1.0]
-    for r in spreads:
-        nav.append(nav[-1] * (1 + r))
-    return nav
+    return np.cumprod(np.r_[1.0, 1.0 + np.asarray(spreads, dtype=float)]).tolist()
 
 
 def max_drawdown(nav: list[float]) -> float:
     """最大回撤（正数，如 0.15 = -15%）"""
-    if not nav:
+    if not len(nav):
         return 0.0
-    peak = nav[0]
-    dd   = 0.0
-    for v in nav:
-        if v > peak:
-            peak = v
-        drawdown = (peak - v) / peak
-        if drawdown > dd:
-            dd = drawdown
-    return round(dd, 6)
+    nav  = np.asarray(nav, dtype=float)
+    peak = np.maximum.accumulate(nav)
+    return round(float(((peak - nav) / peak).max()), 6)
 
 
 def full_stats(spreads: list[float], freq: int = 12) -> dict:
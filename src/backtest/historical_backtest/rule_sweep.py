@@ -0,0 +1,230 @@
+"""
+rule_sweep.py
+==============
+两阶段回测 · 阶段二：在信号面板上向量化扫描组合规则（研究级回测）
+
+输入阶段一落盘的 signal_panel.parquet，全部在内存中以 [D × N] 矩阵计算：
+  - 组合规则 A / B / C 与 portfolio_builder 同口径，阈值、分位可任意网格化
+  - 持有期 × 去高波动过滤 × 规则 的所有组合一次性算出逐期多空价差
+  - 统计指标 (均值 / 胜率 / Sharpe / t / 最大回撤) 对所有组合同时向量化计算
+
+monthly_records() 产出与原 run_backtest 逐条循环完全相同的月度记录，
+sweep() 则输出一张 "一行一个配置" 的结果表，用于策略迭代；
+sweep_bootstrap() 对每个配置的逐期价差序列做 iid / 块 / 平稳自助法，给出均值置信区间。
+"""
+
+from __future__ import annotations
+
+import math
+
+import numpy as np
+import pandas as pd
+
+from backtest.bootstrap_engine import METHODS, bootstrap_variants, summarize_samples
+from backtest.historical_backtest.signal_panel import PanelMatrices
+
+# (规则, 参数)：与 build_all_portfolios 的三种默认组合一致
+DEFAULT_RULES = [("A", None), ("B", 1.5), ("C", 0.30)]
+DEFAULT_VOL_EXCLUDE = 0.10
+
+
+def rule_label(kind: str, param: float | None) -> str:
+    """与 portfolio_builder 各组合的 label 保持一致"""
+    if kind == "A":
+        return "A_all_longshort"
+    if kind == "B":
+        return f"B_strong_z{param}"
+    if kind == "C":
+        return f"C_top_bottom_{int(param * 100)}pct"
+    raise ValueError(f"未知组合规则: {kind}")
+
+
+def rule_grid(z_thresholds=(1.0, 1.5, 2.0), pcts=(0.1, 0.2, 0.3)) -> list[tuple]:
+    """常用扫描网格：A + 各 |z| 阈值的 B + 各分位的 C"""
+    return [("A", None)] + [("B", z) for z in z_thresholds] + [("C", p) for p in pcts]
+
+
+# ── 组合规则 (向量化版 portfolio_builder) ─────────────────────
+def rule_masks(m: PanelMatrices, kind: str, param: float | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """返回 (多头, 空头) 布尔矩阵 [D × N]"""
+    if kind == "A":
+        return m.valid & (m.direction > 0), m.valid & (m.direction < 0)
+    if kind == "B":
+        strong = m.valid & (np.abs(np.nan_to_num(m.z)) > param)
+        return strong & (m.direction > 0), strong & (m.direction < 0)
+    if kind == "C":
+        # 按 z 降序的稳定排序名次；无效格子排到最后
+        key = np.where(m.valid, -np.nan_to_num(m.z), np.inf)
+        order = np.argsort(key, axis=1, kind="stable")
+        pos = np.empty_like(order)
+        np.put_along_axis(pos, order, np.arange(order.shape[1])[None, :], axis=1)
+        n = m.valid.sum(axis=1, keepdims=True)
+        k = np.maximum(1, (n * param).astype(int))
+        return m.valid & (pos < k), m.valid & (pos >= n - k)
+    raise ValueError(f"未知组合规则: {kind}")
+
+
+def vol_keep_mask(m: PanelMatrices, top_pct_exclude: float) -> np.ndarray:
+    """
+    与 apply_volatility_filter 同口径：每个信号日在全体标的波动率中取
+    sorted[int(n × (1 - p))] 作阈值，保留严格低于阈值的标的；当日无波动率数据则不过滤。
+    """
+    vol = np.where(m.present, m.vol, np.nan)
+    has_vol = ~np.isnan(vol).all(axis=1)
+    n = m.present.sum(axis=1)
+    idx = (n * (1 - top_pct_exclude)).astype(int)
+    srt = np.sort(np.where(m.present, np.nan_to_num(vol), np.nan), axis=1)   # NaN 排在最后
+    thr = np.where(idx < n, srt[np.arange(len(n)), np.minimum(idx, srt.shape[1] - 1)], np.inf)
+    keep = np.nan_to_num(vol) < thr[:, None]
+    return keep | ~has_vol[:, None]
+
+
+def leg_returns(mask: np.ndarray, fwd: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """等权腿收益 (剔除缺失)：返回 (均值 [D]，无有效样本为 NaN；有效样本数 [D])"""
+    ok = mask & ~np.isnan(fwd)
+    cnt = ok.sum(axis=1)
+    total = np.where(ok, fwd, 0.0).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(cnt > 0, total / cnt, np.nan), cnt
+
+
+# ── 批量统计 ─────────────────────────────────────────────────
+def spread_stats(spreads: np.ndarray, freq: int = 12) -> pd.DataFrame:
+    """
+    对 [C × D] 价差矩阵逐行计算 performance.full_stats 的同名指标 (NaN 视为该期无数据)。
+    """
+    spreads = np.atleast_2d(spreads)
+    valid = ~np.isnan(spreads)
+    n = valid.sum(axis=1)
+    s0 = np.where(valid, spreads, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = s0.sum(axis=1) / n
+        dev = np.where(valid, spreads - mean[:, None], 0.0)
+        std = np.where(n > 1, np.sqrt((dev ** 2).sum(axis=1) / (n - 1)), 0.0)
+        ok = std > 1e-9
+        sharpe = np.where(ok, mean / std * math.sqrt(freq), np.nan)
+        t_stat = np.where(ok, mean / (std / np.sqrt(n)), np.nan)
+        win = (s0 > 0).sum(axis=1)
+        nav = np.cumprod(1.0 + s0, axis=1)
+        nav = np.hstack([np.ones((len(nav), 1)), nav])
+        mdd = (1.0 - nav / np.maximum.accumulate(nav, axis=1)).max(axis=1)
+        return pd.DataFrame({
+            "n": n,
+            "mean_spread": mean,
+            "mean_pct": mean * 100,
+            "win_rate": win / n,
+            "stdev": std,
+            "sharpe": sharpe,
+            "t_stat": t_stat,
+            "max_drawdown": mdd * 100,
+        })
+
+
+# ── 扫描入口 ─────────────────────────────────────────────────
+def config_spreads(m: PanelMatrices, rules: list[tuple] = DEFAULT_RULES, hold_periods: list[int] | None = None,
+                   vol_excludes: tuple = (None, DEFAULT_VOL_EXCLUDE)) -> tuple[list[dict], np.ndarray]:
+    """规则 × 波动率过滤 × 持有期 的全部配置及其逐期多空价差矩阵 [C × D]"""
+    hold_periods = hold_periods or m.hold_periods
+    keeps = {p: (None if p is None else vol_keep_mask(m, p)) for p in vol_excludes}
+
+    configs, spreads = [], []
+    for kind, param in rules:
+        long_m, short_m = rule_masks(m, kind, param)
+        for p, keep in keeps.items():
+            lm, sm = (long_m, short_m) if keep is None else (long_m & keep, short_m & keep)
+            for hold in hold_periods:
+                long_ret, _ = leg_returns(lm, m.fwd[hold])
+                short_ret, _ = leg_returns(sm, m.fwd[hold])
+                configs.append({"rule": kind, "param": param, "label": rule_label(kind, param),
+                                "vol_exclude": p, "hold_days": hold})
+                spreads.append(long_ret - short_ret)
+    return configs, np.vstack(spreads)
+
+
+def sweep(m: PanelMatrices, rules: list[tuple] = DEFAULT_RULES, hold_periods: list[int] | None = None,
+          vol_excludes: tuple = (None, DEFAULT_VOL_EXCLUDE), by_regime: bool = False,
+          freq: int = 12) -> pd.DataFrame:
+    """
+    对 规则 × 持有期 × 波动率过滤 的全部组合计算逐期多空价差与统计指标。
+    by_regime=True 时额外按市场机制 (bull / bear / ranging / unknown) 分段统计。
+    """
+    configs, spreads = config_spreads(m, rules, hold_periods, vol_excludes)
+    segments = [("all", np.ones(len(m.dates), dtype=bool))]
+    if by_regime:
+        segments += [(r, m.market_regime == r) for r in ("bull", "bear", "ranging", "unknown")]
+
+    frames = []
+    for name, sel in segments:
+        if not sel.any():
+            continue
+        stats = spread_stats(spreads[:, sel], freq=freq)
+        frames.append(pd.concat([pd.DataFrame(configs), stats.assign(regime=name)], axis=1))
+    return pd.concat(frames, ignore_index=True)
+
+
+def sweep_bootstrap(m: PanelMatrices, rules: list[tuple] = DEFAULT_RULES, hold_periods: list[int] | None = None,
+                    vol_excludes: tuple = (None, DEFAULT_VOL_EXCLUDE), n_boot: int = 10000,
+                    methods: tuple = METHODS, block_len: int | None = None, ci: float = 0.95,
+                    seed: int = 2026, workers: int = 1) -> pd.DataFrame:
+    """
+    每个配置的逐期价差序列 (剔除无数据的期) 做多种自助法重采样，
+    一行一个 (配置, 方式)：重采样均值的均值 / 标准差 / 正均值占比 / 置信区间。
+    块 / 平稳自助法保留月度价差的序列相关，区间通常比 iid 更宽。
+    """
+    configs, spreads = config_spreads(m, rules, hold_periods, vol_excludes)
+    rows = []
+    for cfg, series in zip(configs, spreads):
+        series = series[~np.isnan(series)]
+        samples = bootstrap_variants(series, methods=methods, n_boot=n_boot, block_len=block_len,
+                                     seed=seed, workers=workers)
+        for method, s in samples.items():
+            st = summarize_samples(s, ci)
+            rows.append({**cfg, "method": method, "n_periods": len(series), "n_boot": st["n"],
+                         "boot_mean": st["mean"], "boot_std": st["std"], "p_positive": st["win_rate"],
+                         "ci_lo": st["ci_lo"], "ci_hi": st["ci_hi"]})
+    return pd.DataFrame(rows)
+
+
+def monthly_records(m: PanelMatrices, rules: list[tuple] = DEFAULT_RULES,
+                    hold_periods: list[int] | None = None,
+                    vol_exclude: float = DEFAULT_VOL_EXCLUDE) -> list[dict]:
+    """
+    生成与原 run_backtest 逐条循环相同格式与顺序的月度记录：
+    每个信号日 × 每个组合 × 每个持有期，依次为主组合与去高波动版本。
+    """
+    hold_periods = hold_periods or m.hold_periods
+    keep = vol_keep_mask(m, vol_exclude)
+    has_vol = ~np.isnan(np.where(m.present, m.vol, np.nan)).all(axis=1)
+
+    legs = {}
+    for kind, param in rules:
+        long_m, short_m = rule_masks(m, kind, param)
+        for hold in hold_periods:
+            fwd = m.fwd[hold]
+            legs[(kind, param, hold)] = (leg_returns(long_m, fwd), leg_returns(short_m, fwd),
+                                         leg_returns(long_m & keep, fwd), leg_returns(short_m & keep, fwd))
+
+    def _r(x):
+        return None if np.isnan(x) else round(float(x), 6)
+
+    records = []
+    for d, sd in enumerate(m.dates):
+        for kind, param in rules:
+            label = rule_label(kind, param)
+            for hold in hold_periods:
+                (lr, lc), (sr, sc), (flr, flc), (fsr, fsc) = legs[(kind, param, hold)]
+                for lab, l_ret, l_cnt, s_ret, s_cnt in (
+                    (label, lr, lc, sr, sc),
+                    (label + "_vol_filtered" if has_vol[d] else label, flr, flc, fsr, fsc),
+                ):
+                    records.append({
+                        "signal_date":     str(sd),
+                        "regime":          str(m.market_regime[d]),
+                        "portfolio_label": lab,
+                        "hold_days":       hold,
+                        "long_count":      int(l_cnt[d]),
+                        "short_count":     int(s_cnt[d]),
+                        "long_ret":        _r(l_ret[d]),
+                        "short_ret":       _r(s_ret[d]),
+                    })
+    return records
@@ -3,40 +3,48 @@ run_backtest.py — 研究级历史回测主入口
 =========================================
 用法:
   python run_backtest.py [--start 2024-01] [--end 2025-12] [--workers 8]
-
-流程:
-  1. 生成每月末信号（断点续跑）
-  2. 单 session 批量拉取全部标的完整日线价格
-  3. 计算三种组合 × 三种持有期的月度收益
-  4. 统计评估（Sharpe / t-stat / 最大回撤 ...）
-  5. 压力测试（牛熊分段 / 市值分组 / 去高波动）
-  6. 输出 backtest_result.json + backtest_summary.txt
+  python run_backtest.py --eval-only            # 直接读已落盘的信号面板，跳过 Kronos / 拉价格
+  python run_backtest.py --eval-only --sweep    # 额外扫描规则网格，输出 rule_sweep.csv
+  python run_backtest.py --eval-only --bootstrap 10000   # 各组合月度价差的自助法置信区间，输出 bootstrap_ci.csv
+  python run_backtest.py --eval-only --stress   # 组合 × 机制 × 市值分组 × 去高波动 全组合压力测试，输出 stress_test.csv
+
+流程 (两阶段):
+  阶段一  signal_panel.materialize_signal_panel
+    1. 生成每月末信号（断点续跑）
+    2. 单 session 批量拉取全部标的完整日线价格
+    3. 落盘 [date × ticker] 信号面板 (信号字段 + 波动率 + 各持有期前瞻收益 + 市场机制)
+  阶段二  rule_sweep (纯内存向量化)
+    4. 计算三种组合 × 三种持有期的月度收益 (含去高波动版本)
+    5. 统计评估（Sharpe / t-stat / 最大回撤 ...）+ 压力测试（牛熊分段 / 市值分组 / 去高波动，分组聚合）
+    6. 输出 backtest_result.json + backtest_summary.txt
 """
 
 import sys
 import os
 import json
 import argparse
-import statistics
-from datetime import datetime, timedelta
-from collections import defaultdict
+from datetime import datetime
 
 # ── 路径设置 ─────────────────────────────────────────────────
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
 sys.path.insert(0, ROOT)
 
-from backtest.historical_backtest.signal_generator  import build_signal_dates, generate_monthly_signals
-from backtest.historical_backtest.price_fetcher     import fetch_close_matrix, compute_forward_return, get_volatility_60d
-from backtest.historical_backtest.portfolio_builder import build_all_portfolios, apply_volatility_filter
-from backtest.historical_backtest.performance       import full_stats, compute_portfolio_spread, summarize_results
-from backtest.historical_backtest.stress_test       import (
-    get_index_monthly_return, classify_regime, split_records_by_regime
+from backtest.historical_backtest.signal_generator  import build_signal_dates
+from backtest.historical_backtest.signal_panel      import (
+    HOLD_PERIODS, PANEL_PATH, PanelMatrices, load_panel, materialize_signal_panel
+)
+from backtest.historical_backtest.rule_sweep        import (
+    monthly_records as build_monthly_records, rule_grid, sweep, sweep_bootstrap
 )
+from backtest.historical_backtest.performance       import summarize_results
+from backtest.historical_backtest.stress_test       import regime_breakdown, stress_table
 
 HERE          = os.path.dirname(__file__)
 OUTPUT_JSON   = os.path.join(HERE, "backtest_result.json")
 SUMMARY_TXT   = os.path.join(HERE, "backtest_summary.txt")
-HOLD_PERIODS  = [10, 20, 30]
+SWEEP_CSV     = os.path.join(HERE, "rule_sweep.csv")
+BOOT_CSV      = os.path.join(HERE, "bootstrap_ci.csv")
+STRESS_CSV    = os.path.join(HERE, "stress_test.csv")
 
 
 # ── 月份边界辅助 ─────────────────────────────────────────────
@@ -61,141 +69,55 @@ def next_month_end(ym: str, price_matrix_all_dates: list) -> str | None:
 
 
 # ── 主函数 ────────────────────────────────────────────────────
-def main(start_ym: str, end_ym: str, workers: int):
+def main(start_ym: str, end_ym: str, workers: int, eval_only: bool = False, run_sweep: bool = False,
+         n_boot: int = 0, run_stress: bool = False):
     run_start = datetime.now().isoformat()
     print("=" * 72)
     print("  ECHO  研究级历史回测  — Kronos A 股 Alpha 验证")
     print(f"  区间: {start_ym} → {end_ym}   持有期: {HOLD_PERIODS}   线程: {workers}")
     print("=" * 72)
 
-    # ─ Step 1: 生成信号日列表 ──────────────────────────────────
-    sy, sm = int(start_ym[:4]), int(start_ym[5:])
-    ey, em = int(end_ym[:4]),   int(end_ym[5:])
-    print("\n[1/5] 生成信号日列表...")
-    signal_dates = build_signal_dates(sy, sm, ey, em)
-    print(f"      共 {len(signal_dates)} 个信号日: {signal_dates[0]} → {signal_dates[-1]}")
-
-    # ─ Step 2: 逐月生成/加载信号 ──────────────────────────────
-    print("\n[2/5] 生成月频信号（断点续跑）...")
-    all_signals_by_date: dict[str, list] = {}
-    all_tickers_set: set = set()
-
-    for sd in signal_dates:
-        sigs = generate_monthly_signals(sd, max_workers=workers)
-        all_signals_by_date[sd] = sigs
-        for s in sigs:
-            if not s.get("error") and s.get("ticker"):
-                all_tickers_set.add(s["ticker"])
-
-    print(f"\n      信号生成完毕，涉及 {len(all_tickers_set)} 只唯一标的")
-
-    # ─ Step 3: 批量拉取价格矩阵 ───────────────────────────────
-    print("\n[3/5] 单 session 批量拉取全历史价格...")
-    # 时间窗口：start_ym 往前多取 90 天（供 60 日波动率计算），
-    # end_ym 往后多取 45 天（供最后一个信号的 30 T-day 持有期）
-    price_start = f"{sy - 1 if sm == 1 else sy}-{12 if sm == 1 else sm - 1:02d}-01"
-    price_start = f"{sy}-01-01"   # 简化：直接从 2024-01-01
-    # end_ym + 2 months
-    end_m2 = em + 2
-    end_y2 = ey
-    if end_m2 > 12:
-        end_m2 -= 12
-        end_y2 += 1
-    price_end = f"{end_y2}-{end_m2:02d}-28"
-
-    all_tickers = sorted(all_tickers_set)
-    price_matrix = fetch_close_matrix(all_tickers, price_start, price_end)
-    print(f"      价格矩阵加载完毕，{sum(1 for v in price_matrix.values() if not v.empty)} 只有效")
-
-    # ─ Step 4: 计算月度组合收益 ───────────────────────────────
-    print("\n[4/5] 计算月度组合收益...")
-    monthly_records: list[dict] = []
-    regime_map:      dict[str, str] = {}
-
-    for sd in signal_dates:
-        sigs = all_signals_by_date[sd]
-        portfolios = build_all_portfolios(sigs)
-
-        ym = sd[:7]
-        # 计算该月市场机制
-        mstart = sd[:8] + "01"  # 月初
-        index_ret = get_index_monthly_return(mstart, sd)
-        regime_map[sd] = classify_regime(index_ret)
-
-        # 波动率过滤器（用于压力测试，不改变主组合）
-        vols = get_volatility_60d(all_tickers, sd, price_matrix)
-
-        for port in portfolios:
-            for hold in HOLD_PERIODS:
-                # 主组合
-                long_rets  = [compute_forward_return(price_matrix.get(t, __import__("pandas").Series(dtype=float)), sd, hold)
-                              for t in port["long"]]
-                short_rets = [compute_forward_return(price_matrix.get(t, __import__("pandas").Series(dtype=float)), sd, hold)
-                              for t in port["short"]]
-
-                valid_long  = [r for r in long_rets  if r is not None]
-                valid_short = [r for r in short_rets if r is not None]
-                long_ret_mean  = statistics.mean(valid_long)  if valid_long  else None
-                short_ret_mean = statistics.mean(valid_short) if valid_short else None
-
-                monthly_records.append({
-                    "signal_date":    sd,
-                    "regime":         regime_map[sd],
-                    "portfolio_label": port["label"],
-                    "hold_days":      hold,
-                    "long_count":     len(valid_long),
-                    "short_count":    len(valid_short),
-                    "long_ret":       round(long_ret_mean,  6) if long_ret_mean  is not None else None,
-                    "short_ret":      round(short_ret_mean, 6) if short_ret_mean is not None else None,
-                })
-
-                # 去高波动版本
-                filt_port  = apply_volatility_filter(port, vols)
-                fl_rets    = [compute_forward_return(price_matrix.get(t, __import__("pandas").Series(dtype=float)), sd, hold)
-                              for t in filt_port["long"]]
-                fs_rets    = [compute_forward_return(price_matrix.get(t, __import__("pandas").Series(dtype=float)), sd, hold)
-                              for t in filt_port["short"]]
-                fl_mean    = statistics.mean([r for r in fl_rets if r is not None]) if any(r is not None for r in fl_rets) else None
-                fs_mean    = statistics.mean([r for r in fs_rets if r is not None]) if any(r is not None for r in fs_rets) else None
-
-                monthly_records.append({
-                    "signal_date":    sd,
-                    "regime":         regime_map[sd],
-                    "portfolio_label": filt_port["label"],
-                    "hold_days":      hold,
-                    "long_count":     len([r for r in fl_rets if r is not None]),
-                    "short_count":    len([r for r in fs_rets if r is not None]),
-                    "long_ret":       round(fl_mean,  6) if fl_mean  is not None else None,
-                    "short_ret":      round(fs_mean,  6) if fs_mean  is not None else None,
-                })
-
-        print(f"    完成: {sd}  机制={regime_map[sd]}  组合×持有={len(portfolios)*len(HOLD_PERIODS)}", flush=True)
-
-    # ─ Step 5: 统计汇总 + 压力测试 ───────────────────────────
-    print("\n[5/5] 汇总统计与压力测试...")
+    # ─ 阶段一: 信号面板 ───────────────────────────────────────
+    if eval_only:
+        print(f"\n[1/3] 加载信号面板: {PANEL_PATH}")
+        panel = load_panel(PANEL_PATH)
+        panel = panel[(panel["signal_date"] >= start_ym) & (panel["signal_date"] < end_ym + "-32")]
+    else:
+        sy, sm = int(start_ym[:4]), int(start_ym[5:])
+        ey, em = int(end_ym[:4]),   int(end_ym[5:])
+        print("\n[1/3] 生成信号日列表并物化信号面板...")
+        signal_dates = build_signal_dates(sy, sm, ey, em)
+        print(f"      共 {len(signal_dates)} 个信号日: {signal_dates[0]} → {signal_dates[-1]}")
+        panel = materialize_signal_panel(signal_dates, workers=workers, hold_periods=HOLD_PERIODS)
+
+    m = PanelMatrices(panel)
+    signal_dates = [str(d) for d in m.dates]
+
+    # ─ 阶段二: 内存向量化评估 ─────────────────────────────────
+    print("\n[2/3] 计算月度组合收益...")
+    monthly_records = build_monthly_records(m, hold_periods=HOLD_PERIODS)
+
+    if run_sweep:
+        sweep_df = sweep(m, rules=rule_grid(), hold_periods=HOLD_PERIODS, by_regime=True)
+        sweep_df.to_csv(SWEEP_CSV, index=False, encoding="utf-8-sig")
+        print(f"      规则扫描: {len(sweep_df)} 行 → {SWEEP_CSV}")
+
+    if n_boot > 0:
+        boot_df = sweep_bootstrap(m, hold_periods=HOLD_PERIODS, n_boot=n_boot)
+        boot_df.to_csv(BOOT_CSV, index=False, encoding="utf-8-sig")
+        print(f"      自助法置信区间 (iid / block / stationary × {n_boot} 次): {len(boot_df)} 行 → {BOOT_CSV}")
+
+    # ─ 统计汇总 + 压力测试 ───────────────────────────────────
+    print("\n[3/3] 汇总统计与压力测试...")
     summary = summarize_results(monthly_records)
 
-    # 市场机制分段汇总
-    regime_summary = {}
-    for (label, hold), key in [(k.rsplit("__hold", 1)[0], k.rsplit("d", 1)[0].split("hold")[1])
-                                 for k in summary]:
-        pass  # 在 JSON 里已按 regime 字段可以二次分析
-    # 简化：对每个 key，按 regime 切分并单独统计
-    regime_detail = {}
-    groups_by_key: dict[str, list] = defaultdict(list)
-    for rec in monthly_records:
-        key = f"{rec['portfolio_label']}__hold{rec['hold_days']}d"
-        groups_by_key[key].append(rec)
-
-    for key, records in groups_by_key.items():
-        by_regime = split_records_by_regime(records, regime_map)
-        regime_detail[key] = {}
-        for r_name, r_recs in by_regime.items():
-            spreads = compute_portfolio_spread(
-                [r["long_ret"] for r in r_recs],
-                [r["short_ret"] for r in r_recs],
-            )
-            regime_detail[key][r_name] = full_stats(spreads)
+    # 市场机制分段汇总：对每个 key，按 regime 分组统计
+    regime_detail = regime_breakdown(monthly_records)
+
+    if run_stress:
+        stress_df = stress_table(m, hold_periods=HOLD_PERIODS)
+        stress_df.to_csv(STRESS_CSV, index=False, encoding="utf-8-sig")
+        print(f"      压力测试 (机制 × 市值分组 × 去高波动): {len(stress_df)} 行 → {STRESS_CSV}")
 
     # ─ 输出 JSON ─────────────────────────────────────────────
     output = {
@@ -206,7 +128,7 @@ def main(start_ym: str, end_ym: str, workers: int):
             "hold_periods":   HOLD_PERIODS,
             "run_start":      run_start,
             "run_end":        datetime.now().isoformat(),
-            "total_tickers":  len(all_tickers_set),
+            "total_tickers":  len(m.tickers),
         },
         "portfolio_stats":  summary,
         "regime_breakdown": regime_detail,
@@ -243,5 +165,10 @@ if __name__ == "__main__":
     parser.add_argument("--start",   default="2024-01", help="回测开始年月 YYYY-MM")
     parser.add_argument("--end",     default="2025-12", help="回测结束年月 YYYY-MM")
     parser.add_argument("--workers", type=int, default=8, help="并发线程数")
+    parser.add_argument("--eval-only", action="store_true", help="跳过阶段一，直接读取已落盘的信号面板")
+    parser.add_argument("--sweep", action="store_true", help="额外扫描规则 / 阈值网格，输出 rule_sweep.csv")
+    parser.add_argument("--bootstrap", type=int, default=0, help="各组合月度价差的自助法重采样次数 (0 = 不做)")
+    parser.add_argument("--stress", action="store_true", help="机制 × 市值分组 × 去高波动 全组合压力测试，输出 stress_test.csv")
     args = parser.parse_args()
-    main(args.start, args.end, args.workers)
+    main(args.start, args.end, args.workers, eval_only=args.eval_only, run_sweep=args.sweep,
+         n_boot=args.bootstrap, run_stress=args.stress)
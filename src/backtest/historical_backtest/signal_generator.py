@@ -4,28 +4,45 @@ signal_generator.py
 月频信号生成器（研究级回测）
 
 铁律遵守：
-  - 每个信号日使用当时的沪深 300 成分股（Baostock Point-in-Time）
+  - 每个信号日使用当时的沪深 300 成分股（Baostock Point-in-Time，经本地成分股区间库缓存）
   - 历史数据截止于信号日，不偷看未来
   - 模型参数固定不变
 
 并发设计：
   - ThreadPoolExecutor(8)：用于并发运行 Kronos 推理（CPU 密集）
-  - Baostock 的成分股/价格查询走全局锁串行（单一 TCP 连接）
-  - 断点续跑：每月完成后立即保存 signals_checkpoint/YYYY-MM.json
+  - Baostock 的成分股/价格查询走全局锁串行（单一 TCP 连接）；交易日来自本地交易日历 (core.trading_calendar)
+  - 断点续跑：每只标的完成即写入 signals_journal.sqlite (ResultJournal，标的 × 信号日粒度)，
+    月中中断重启只补跑缺失的标的；整月完成后另存 signals_checkpoint/YYYY-MM.json
 """
 
 import os
+import sys
 import json
 import threading
 from datetime import datetime, date, timedelta
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from backtest.result_journal import ResultJournal, STATUS_ERROR, STATUS_OK
+from core.trading_calendar import get_calendar
+from alpharanker.data.index_constituents import ensure_constituents
+
 # ── 全局 Baostock 锁 ─────────────────────────────────────────
 _BS_LOCK = threading.Lock()
 
 CHECKPOINT_DIR = os.path.join(os.path.dirname(__file__), "signals_checkpoint")
 os.makedirs(CHECKPOINT_DIR, exist_ok=True)
 
+JOURNAL_PATH   = os.path.join(CHECKPOINT_DIR, "signals_journal.sqlite")
+JOURNAL_RUN_ID = "hs300_monthly"
+# 影响单条信号结果的参数；修改后旧日志自动失效
+SIGNAL_CONFIG  = {"universe": "hs300", "signal": "trading_signal.generate_signal", "mode": "as_of_date"}
+
+
+def open_signal_journal(path: str = JOURNAL_PATH) -> ResultJournal:
+    return ResultJournal(path, run_id=JOURNAL_RUN_ID, config=SIGNAL_CONFIG)
+
 
 # ── Baostock 辅助 ────────────────────────────────────────────
 def _bs_to_std(bs_code: str) -> str:
@@ -38,7 +55,17 @@ def _bs_to_std(bs_code: str) -> str:
 
 
 def get_hs300_on_date(signal_date: str) -> list:
-    """返回 [(ticker, name), ...] 截至 signal_date 的沪深 300 成分股"""
+    """
+    返回 [(ticker, name), ...] 截至 signal_date 的沪深 300 成分股。
+    优先走本地 Point-in-Time 成分股区间库 (覆盖不足时增量刷新一次)，失败时退回 Baostock 直查。
+    """
+    try:
+        with _BS_LOCK:
+            store = ensure_constituents(until=signal_date, indices=("HS300",))
+        return [(t, store.names.get(t, "")) for t in store.members_on(signal_date, "HS300")]
+    except Exception as e:
+        print(f"  ⚠️ 成分股区间库不可用，直接查询 Baostock: {e}")
+
     import baostock as bs
     with _BS_LOCK:
         bs.login()
@@ -54,40 +81,18 @@ def get_hs300_on_date(signal_date: str) -> list:
 
 
 def get_last_trading_day(year: int, month: int) -> str:
-    """获取指定年月最后一个交易日（通过 Baostock 交易日历）"""
-    import baostock as bs
+    """获取指定年月最后一个交易日（本地交易日历，不再逐月登录 Baostock）"""
     import calendar
-    # 先取当月最后一天
-    last_day = calendar.monthrange(year, month)[1]
-    start = f"{year}-{month:02d}-01"
-    end   = f"{year}-{month:02d}-{last_day:02d}"
-    with _BS_LOCK:
-        bs.login()
-        try:
-            rs = bs.query_trade_dates(start_date=start, end_date=end)
-            trading_days = []
-            while rs.next():
-                row = rs.get_row_data()
-                # row[0] = date, row[1] = is_trading_day
-                if row[1] == "1":
-                    trading_days.append(row[0])
-        finally:
-            bs.logout()
-    return trading_days[-1] if trading_days else end
+    last = get_calendar("SSE", until=f"{year}-{month:02d}-28").last_trading_day(year, month)
+    return str(last) if last is not None else f"{year}-{month:02d}-{calendar.monthrange(year, month)[1]:02d}"
 
 
 def build_signal_dates(start_year: int, start_month: int,
                        end_year: int,   end_month: int) -> list:
     """生成所有月末最后交易日列表"""
-    dates = []
-    y, m = start_year, start_month
-    while (y, m) <= (end_year, end_month):
-        dates.append(get_last_trading_day(y, m))
-        m += 1
-        if m > 12:
-            m = 1
-            y += 1
-    return dates
+    cal = get_calendar("SSE", until=f"{end_year}-{end_month:02d}-28")
+    days = cal.month_end_trading_days(f"{start_year}-{start_month:02d}", f"{end_year}-{end_month:02d}")
+    return [str(d) for d in days]
 
 
 # ── 单标的信号（线程安全）───────────────────────────────────
@@ -127,10 +132,11 @@ def _generate_one(ticker: str, name: str, signal_date: str) -> dict:
 
 
 # ── 月频批量生成 ─────────────────────────────────────────────
-def generate_monthly_signals(signal_date: str, max_workers: int = 8) -> list:
+def generate_monthly_signals(signal_date: str, max_workers: int = 8,
+                             journal: ResultJournal | None = None) -> list:
     """
     对 signal_date 当日的沪深 300 成分股生成信号。
-    若该月检查点已存在，直接加载跳过。
+    若该月检查点已存在，直接加载跳过；否则从日志中恢复已完成的标的，只补跑其余标的。
     """
     ym = signal_date[:7]  # "2024-01"
     checkpoint_path = os.path.join(CHECKPOINT_DIR, f"{ym}.json")
@@ -143,17 +149,24 @@ def generate_monthly_signals(signal_date: str, max_workers: int = 8) -> list:
     print(f"\n  [SIGNAL] {signal_date} — 获取成分股...")
     tickers = get_hs300_on_date(signal_date)
     total   = len(tickers)
+
+    journal = journal or open_signal_journal()
+    finished = journal.completed(date=signal_date)
+    results  = [finished[t] for t, _ in tickers if t in finished]
+    pending  = [(t, n) for t, n in tickers if t not in finished]
+    if results:
+        print(f"           日志中已完成 {len(results)} 只，续跑剩余 {len(pending)} 只")
     print(f"           共 {total} 只，启动 {max_workers} 线程...")
 
-    results = []
-    done    = 0
+    done    = len(results)
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         futures = {
             executor.submit(_generate_one, t, n, signal_date): (t, n)
-            for t, n in tickers
+            for t, n in pending
         }
         for fut in as_completed(futures):
             res = fut.result()
+            journal.put(res["ticker"], signal_date, res, STATUS_ERROR if res["error"] else STATUS_OK)
             results.append(res)
             done += 1
             status = "OK " if not res["error"] else "ERR"
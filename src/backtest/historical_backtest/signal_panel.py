@@ -0,0 +1,194 @@
+"""
+signal_panel.py
+================
+两阶段回测 · 阶段一：信号面板物化（研究级回测）
+
+原先 run_backtest 把 "Kronos 推理 → 拉价格 → 组合评估" 绑在一个脚本里，
+每换一个组合规则 / 阈值 / 持有期都要把整条链路重跑一遍。这里把阶段一单独拆出：
+
+  - 每个信号日、每只标的一行的 [date × ticker] 长表面板
+    (direction / z_score / uncertainty / o_score / regime / adjusted_position_strength)
+  - 同时落盘评估所需的全部价格衍生量：60 日波动率、市值代理、各持有期前瞻收益、当月指数机制
+  - 写出 signal_panel.parquet 后，阶段二 (rule_sweep) 只读面板，不再触网、不再跑 Kronos
+
+backtest_runner 逐日回测产出的 JSONL 也可以经 panel_from_records 转成同一格式。
+"""
+
+from __future__ import annotations
+
+import os
+
+import numpy as np
+import pandas as pd
+
+HERE         = os.path.dirname(__file__)
+PANEL_PATH   = os.path.join(HERE, "signal_panel.parquet")
+HOLD_PERIODS = [10, 20, 30]
+
+SIGNAL_FIELDS = ["direction", "z_score", "uncertainty", "o_score", "regime",
+                 "adjusted_position_strength"]
+DIRECTION_CODES = {"BUY": 1, "SELL": -1}
+
+
+def fwd_col(hold: int) -> str:
+    return f"fwd_ret_{hold}d"
+
+
+# ── 阶段一：物化 ─────────────────────────────────────────────
+def _price_window(signal_dates: list[str]) -> tuple[str, str]:
+    """与原 run_backtest 相同的价格窗口：起始年 1 月 1 日 → 末信号月 +2 月的 28 日"""
+    sy = int(signal_dates[0][:4])
+    ey, em = int(signal_dates[-1][:4]), int(signal_dates[-1][5:7])
+    end_m2, end_y2 = em + 2, ey
+    if end_m2 > 12:
+        end_m2 -= 12
+        end_y2 += 1
+    return f"{sy}-01-01", f"{end_y2}-{end_m2:02d}-28"
+
+
+def _close_on(series: pd.Series, signal_date: str) -> float | None:
+    """信号日当日或之前最近的收盘价 (与 price_fetcher.get_market_cap_on_date 相同，以股价作市值排序代理)"""
+    hist = series[series.index <= pd.Timestamp(signal_date)]
+    return float(hist.iloc[-1]) if len(hist) else None
+
+
+def materialize_signal_panel(signal_dates: list[str], workers: int = 8,
+                             hold_periods: list[int] = HOLD_PERIODS,
+                             path: str = PANEL_PATH) -> pd.DataFrame:
+    """
+    生成 (或断点续跑) 全部信号日的信号，批量拉价格，计算评估所需的全部衍生量，
+    写出 [date × ticker] 面板。面板覆盖所有出现过的标的，当日无信号的格子 direction 为空。
+    """
+    from backtest.historical_backtest.signal_generator import generate_monthly_signals
+    from backtest.historical_backtest.price_fetcher    import (
+        fetch_close_matrix, compute_forward_return, get_volatility_60d
+    )
+    from backtest.historical_backtest.stress_test      import market_regimes
+
+    print("\n  [PANEL 1/3] 生成月频信号（断点续跑）...")
+    signals_by_date: dict[str, dict[str, dict]] = {}
+    for sd in signal_dates:
+        sigs = generate_monthly_signals(sd, max_workers=workers)
+        signals_by_date[sd] = {s["ticker"]: s for s in sigs if not s.get("error") and s.get("ticker")}
+    all_tickers = sorted({t for sigs in signals_by_date.values() for t in sigs})
+    print(f"      信号生成完毕，涉及 {len(all_tickers)} 只唯一标的")
+
+    print("\n  [PANEL 2/3] 单 session 批量拉取全历史价格...")
+    price_start, price_end = _price_window(signal_dates)
+    price_matrix = fetch_close_matrix(all_tickers, price_start, price_end)
+    print(f"      价格矩阵加载完毕，{sum(1 for v in price_matrix.values() if not v.empty)} 只有效")
+
+    print("\n  [PANEL 3/3] 计算波动率 / 前瞻收益 / 市场机制...")
+    regimes = market_regimes(signal_dates).set_index("signal_date")
+    empty = pd.Series(dtype=float)
+    rows = []
+    for sd in signal_dates:
+        index_ret = regimes.at[sd, "index_ret"]
+        index_ret = None if pd.isna(index_ret) else float(index_ret)
+        market_regime = regimes.at[sd, "market_regime"]
+        vols = get_volatility_60d(all_tickers, sd, price_matrix)
+        sigs = signals_by_date[sd]
+        for t in all_tickers:
+            sig = sigs.get(t, {})
+            row = {"signal_date": sd, "ticker": t, "name": sig.get("name"),
+                   "market_regime": market_regime, "index_ret": index_ret,
+                   "vol_60d": vols.get(t, 0.0)}
+            row.update({f: sig.get(f) for f in SIGNAL_FIELDS})
+            series = price_matrix.get(t, empty)
+            row["cap_proxy"] = _close_on(series, sd)
+            for hold in hold_periods:
+                row[fwd_col(hold)] = compute_forward_return(series, sd, hold)
+            rows.append(row)
+        print(f"    完成: {sd}  机制={market_regime}  有效信号={len(sigs)}", flush=True)
+
+    panel = normalize_panel(pd.DataFrame(rows))
+    save_panel(panel, path)
+    return panel
+
+
+def panel_from_records(records: list[dict] | str, date_col: str = "date",
+                       return_cols: dict[int, str] | None = None) -> pd.DataFrame:
+    """
+    把 backtest_runner 的逐日记录 (list 或 JSONL 路径) 转成面板格式。
+    return_cols: {持有期: 原始列名}，默认 {1: future_return_1d, 5: future_return_5d}
+    """
+    df = pd.read_json(records, lines=True) if isinstance(records, str) else pd.DataFrame(records)
+    return_cols = return_cols or {1: "future_return_1d", 5: "future_return_5d"}
+    df = df.rename(columns={date_col: "signal_date", **{v: fwd_col(h) for h, v in return_cols.items()}})
+    for col in ("market_regime", "index_ret", "vol_60d", "cap_proxy", "name"):
+        if col not in df.columns:
+            df[col] = None
+    for f in SIGNAL_FIELDS:
+        if f not in df.columns:
+            df[f] = None
+    return normalize_panel(df)
+
+
+def normalize_panel(df: pd.DataFrame) -> pd.DataFrame:
+    """统一列类型并按 (signal_date, ticker) 排序"""
+    df = df.copy()
+    df["signal_date"] = df["signal_date"].astype(str).str[:10]
+    if "cap_proxy" not in df.columns:
+        df["cap_proxy"] = np.nan    # 旧版面板没有市值代理列，市值分组统一归为 unknown
+    for col in ["z_score", "uncertainty", "o_score", "adjusted_position_strength", "index_ret", "vol_60d",
+                "cap_proxy"] + [c for c in df.columns if c.startswith("fwd_ret_")]:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    df["market_regime"] = df["market_regime"].fillna("unknown")
+    return df.sort_values(["signal_date", "ticker"], kind="stable").reset_index(drop=True)
+
+
+def save_panel(panel: pd.DataFrame, path: str = PANEL_PATH) -> str:
+    tmp = path + ".tmp"
+    panel.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+    print(f"  [SAVED] 信号面板: {path} ({panel['signal_date'].nunique()} 个信号日 × "
+          f"{panel['ticker'].nunique()} 只标的)")
+    return path
+
+
+def load_panel(path: str = PANEL_PATH) -> pd.DataFrame:
+    return normalize_panel(pd.read_parquet(path))
+
+
+# ── 阶段二使用的宽矩阵视图 ──────────────────────────────────
+class PanelMatrices:
+    """
+    面板的 [D × N] 宽矩阵视图，供阶段二向量化评估。
+
+    valid     : 与 portfolio_builder._valid 同口径 (direction ∈ BUY/SELL 且 z_score 非空)
+    direction : +1 BUY / -1 SELL / 0 其他
+    vol       : 60 日波动率 (物化面板无缺失；由逐日记录转换的面板可能整行缺失)
+    cap       : 市值代理 (信号日收盘价)，缺失为 NaN
+    fwd[h]    : 持有 h 日的前瞻收益，缺失为 NaN
+    """
+
+    def __init__(self, panel: pd.DataFrame):
+        self.dates   = np.array(sorted(panel["signal_date"].unique()))
+        self.tickers = np.array(sorted(panel["ticker"].unique()))
+        di = np.searchsorted(self.dates, panel["signal_date"].to_numpy())
+        ti = np.searchsorted(self.tickers, panel["ticker"].to_numpy())
+        shape = (len(self.dates), len(self.tickers))
+
+        def _wide(values, fill, dtype):
+            out = np.full(shape, fill, dtype=dtype)
+            out[di, ti] = values
+            return out
+
+        self.present = _wide(True, False, bool)
+        self.z = _wide(panel["z_score"].to_numpy(dtype=np.float64), np.nan, np.float64)
+        codes = panel["direction"].map(DIRECTION_CODES).fillna(0).to_numpy(dtype=np.int8)
+        self.direction = _wide(codes, 0, np.int8)
+        self.valid = (self.direction != 0) & ~np.isnan(self.z)
+        self.vol = _wide(panel["vol_60d"].to_numpy(dtype=np.float64), np.nan, np.float64)
+        cap = panel["cap_proxy"] if "cap_proxy" in panel.columns else pd.Series(np.nan, index=panel.index)
+        self.cap = _wide(cap.to_numpy(dtype=np.float64), np.nan, np.float64)
+        self.fwd = {
+            int(c[len("fwd_ret_"):-1]): _wide(panel[c].to_numpy(dtype=np.float64), np.nan, np.float64)
+            for c in panel.columns if c.startswith("fwd_ret_")
+        }
+        regimes = panel.drop_duplicates("signal_date").set_index("signal_date")["market_regime"]
+        self.market_regime = regimes.reindex(self.dates).fillna("unknown").to_numpy()
+
+    @property
+    def hold_periods(self) -> list[int]:
+        return sorted(self.fwd)
@@ -8,80 +8,178 @@ stress_test.py
      牛: >+3%  震荡: [-3%, +3%]  熊: <-3%
 
 2. 市值分组（大/中/小盘）
-   调用 price_fetcher.split_by_market_cap
+   与 portfolio_builder.split_by_market_cap 同口径 (降序三等份，k = max(1, n // 3))
 
 3. 去除高波动
-   调用 portfolio_builder.apply_volatility_filter (排除前 10%)
+   与 portfolio_builder.apply_volatility_filter 同口径 (排除前 10%)
+
+向量化实现：
+  - 指数日线只读一次：本地价格库 C:\\Data\\Market\\cn\\prices\\000300.SS.parquet，
+    覆盖不到回测区间时才用单个 Baostock session 补齐并写回本地库
+  - 全部信号日的月涨跌幅 / 机制用数组运算一次算出 (market_regimes)
+  - 持仓展开成 [信号日 × 标的 × 组合 × 多空 × 波动率过滤] 长表 (position_table)，
+    机制 / 市值分组只是长表上的列，stress_table 用 groupby 一次聚合出
+    组合 × 持有期 × 波动率过滤 × 机制 × 市值分组 的全部统计；
+    新增压力维度 = 长表多一列、dims 多一项，不增加网络请求和 Python 循环
 """
 
 from __future__ import annotations
 
+import os
+import math
+import threading
+from datetime import date
 
-# ── 沪深 300 指数月涨跌幅 ─────────────────────────────────────
-def get_index_monthly_return(month_start: str, month_end: str) -> float | None:
+import numpy as np
+import pandas as pd
+
+DATA_ROOT        = r'C:\Data\Market'
+INDEX_TICKER     = "000300.SS"    # 沪深 300 指数 (sh.000300)，按本地价格库的命名规则存放
+INDEX_PRICE_PATH = os.path.join(DATA_ROOT, 'cn', 'prices', f"{INDEX_TICKER}.parquet")
+
+BULL_THRESH = 0.03
+BEAR_THRESH = -0.03
+REGIMES     = ("bull", "bear", "ranging", "unknown")
+CAP_TIERS   = ("large", "mid", "small")
+ALL         = "all"               # 汇总层 (不分段)
+
+_BS_LOCK = threading.Lock()
+
+
+# ── 沪深 300 指数日线 (本地库 + 一次性补齐) ──────────────────────
+def _read_index_store(path: str) -> pd.Series:
+    if not os.path.exists(path):
+        return pd.Series(dtype=float)
+    df = pd.read_parquet(path)
+    if "date" in df.columns:
+        df = df.set_index("date")
+    s = pd.to_numeric(df["close"], errors="coerce").dropna()
+    s.index = pd.to_datetime(s.index)
+    return s[~s.index.duplicated(keep="last")].sort_index()
+
+
+def _fetch_index_daily(start: str, end: str) -> pd.Series:
+    """单个 Baostock session 拉取 sh.000300 在 [start, end] 的日线收盘价 (不复权)"""
+    import baostock as bs
+
+    with _BS_LOCK:
+        bs.login()
+        try:
+            rs = bs.query_history_k_data_plus(
+                "sh.000300", "date,close",
+                start_date=start, end_date=end,
+                frequency="d", adjustflag="3",
+            )
+            rows = []
+            while (rs.error_code == '0') & rs.next():
+                rows.append(rs.get_row_data())
+        finally:
+            bs.logout()
+
+    if not rows:
+        return pd.Series(dtype=float)
+    df = pd.DataFrame(rows, columns=["date", "close"])
+    return pd.Series(pd.to_numeric(df["close"], errors="coerce").to_numpy(),
+                     index=pd.to_datetime(df["date"]), name="close").dropna()
+
+
+def _store_covers(closes: pd.Series, start: str, end: str) -> bool:
+    """本地序列是否覆盖 [start, min(end, 今天)] 内的首个与最后一个交易日"""
+    if closes.empty:
+        return False
+    from core.trading_calendar import get_calendar
+
+    until = min(pd.Timestamp(end), pd.Timestamp(date.today()))
+    cal = get_calendar("SSE", until=until)
+    # start 常为月初 (如 1 月 1 日、5 月 1 日等节假日)，要求的是其后首个交易日
+    first_needed = pd.Timestamp(start)
+    if cal.covers(first_needed):
+        days = cal.trading_days(first_needed, until)
+        first_needed = pd.Timestamp(days[0]) if len(days) else until
+    if closes.index[0] > first_needed:
+        return False
+    last_needed = pd.Timestamp(cal.offset(until, 0))
+    return closes.index[-1] >= last_needed
+
+
+def load_index_closes(start: str, end: str, path: str = INDEX_PRICE_PATH,
+                      refresh: bool = True) -> pd.Series:
     """
-    用 Baostock 查询沪深 300 指数（000300.XSHG → sh.000300）
-    在 [month_start, month_end] 的涨跌幅。
+    沪深 300 指数日线收盘价 pd.Series(close, index=DatetimeIndex)，截取 [start, end]。
+    本地库覆盖不到时 (refresh=True) 整段补拉一次并合并写回；网络失败则用本地已有部分。
     """
-    import threading
-    import baostock as bs
+    closes = _read_index_store(path)
+    if refresh and not _store_covers(closes, start, end):
+        fetch_start = min(pd.Timestamp(start), closes.index[0]) if not closes.empty else pd.Timestamp(start)
+        try:
+            fresh = _fetch_index_daily(fetch_start.strftime("%Y-%m-%d"), str(end)[:10])
+        except Exception as e:
+            print(f"  [WARN] 沪深 300 指数日线补齐失败，使用本地数据: {e}")
+            fresh = pd.Series(dtype=float)
+        if not fresh.empty:
+            closes = pd.concat([closes, fresh])
+            closes = closes[~closes.index.duplicated(keep="last")].sort_index()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            out = closes.rename("close").rename_axis("date").to_frame().assign(ticker=INDEX_TICKER)
+            tmp = path + ".tmp"
+            out.to_parquet(tmp)
+            os.replace(tmp, path)
+    return closes[(closes.index >= pd.Timestamp(start)) & (closes.index <= pd.Timestamp(end))]
 
-    _lock = threading.Lock()
-    idx_code = "sh.000300"
 
-    try:
-        with _lock:
-            bs.login()
-            try:
-                rs = bs.query_history_k_data_plus(
-                    idx_code, "date,close",
-                    start_date=month_start,
-                    end_date=month_end,
-                    frequency="m",   # 月频
-                    adjustflag="3",
-                )
-                rows = []
-                while rs.next():
-                    rows.append(rs.get_row_data())
-            finally:
-                bs.logout()
-
-        if not rows:
-            return None
-
-        # 如果是月频只会有一行; 若用日频取首尾也行
-        # 这里用首行 close 和尾行 close 计算区间收益
-        # 简化：直接查日频首尾
-        with _lock:
-            bs.login()
-            try:
-                rs2 = bs.query_history_k_data_plus(
-                    idx_code, "date,close",
-                    start_date=month_start,
-                    end_date=month_end,
-                    frequency="d",
-                    adjustflag="3",
-                )
-                daily = []
-                while rs2.next():
-                    daily.append(rs2.get_row_data())
-            finally:
-                bs.logout()
-
-        if len(daily) < 2:
-            return None
-
-        start_close = float(daily[0][1])
-        end_close   = float(daily[-1][1])
-        return (end_close / start_close) - 1.0
+# ── 月涨跌幅与机制 (数组运算) ─────────────────────────────────
+def period_returns(starts, ends, closes: pd.Series) -> np.ndarray:
+    """
+    每个 [start_i, end_i] 区间内首个与最后一个收盘价之间的涨跌幅，区间内不足 2 个交易日为 NaN。
+    """
+    dates = closes.index.values.astype("datetime64[D]")
+    px = closes.to_numpy(dtype=np.float64)
+    lo = np.searchsorted(dates, pd.to_datetime(pd.Index(starts)).values.astype("datetime64[D]"), side="left")
+    hi = np.searchsorted(dates, pd.to_datetime(pd.Index(ends)).values.astype("datetime64[D]"), side="right") - 1
+    ok = hi - lo >= 1
+    out = np.full(len(lo), np.nan)
+    out[ok] = px[hi[ok]] / px[lo[ok]] - 1.0
+    return out
+
 
+def classify_regimes(rets, bull_thresh: float = BULL_THRESH,
+                     bear_thresh: float = BEAR_THRESH) -> np.ndarray:
+    """classify_regime 的数组版本，NaN → unknown"""
+    rets = np.asarray(rets, dtype=np.float64)
+    return np.select([np.isnan(rets), rets > bull_thresh, rets < bear_thresh],
+                     ["unknown", "bull", "bear"], default="ranging").astype(object)
+
+
+def market_regimes(signal_dates: list[str], closes: pd.Series | None = None,
+                   bull_thresh: float = BULL_THRESH, bear_thresh: float = BEAR_THRESH) -> pd.DataFrame:
+    """
+    全部信号日的 (signal_date, index_ret, market_regime)。
+    月涨跌幅口径与原逐月查询相同：当月 1 日 → 信号日之间首尾收盘价。
+    """
+    ends = [str(sd)[:10] for sd in signal_dates]
+    starts = [sd[:8] + "01" for sd in ends]
+    if closes is None:
+        closes = load_index_closes(min(starts), max(ends)) if ends else pd.Series(dtype=float)
+    rets = period_returns(starts, ends, closes)
+    return pd.DataFrame({"signal_date": ends, "index_ret": rets,
+                         "market_regime": classify_regimes(rets, bull_thresh, bear_thresh)})
+
+
+def get_index_monthly_return(month_start: str, month_end: str) -> float | None:
+    """
+    沪深 300 指数在 [month_start, month_end] 的涨跌幅 (首尾日收盘价)。
+    单区间查询保留原接口，批量场景请用 market_regimes。
+    """
+    try:
+        ret = period_returns([month_start], [month_end], load_index_closes(month_start, month_end))[0]
     except Exception:
         return None
+    return None if np.isnan(ret) else float(ret)
 
 
 def classify_regime(monthly_ret: float | None,
-                    bull_thresh: float = 0.03,
-                    bear_thresh: float = -0.03) -> str:
+                    bull_thresh: float = BULL_THRESH,
+                    bear_thresh: float = BEAR_THRESH) -> str:
     """牛/震荡/熊 分段"""
     if monthly_ret is None:
         return "unknown"
@@ -93,6 +191,162 @@ def classify_regime(monthly_ret: float | None,
         return "ranging"
 
 
+# ── 市值三等份 ───────────────────────────────────────────────
+def cap_tier_codes(cap: np.ndarray, eligible: np.ndarray) -> np.ndarray:
+    """
+    每个信号日在 eligible 标的中按市值代理降序三等份 (k = max(1, n // 3))，
+    返回 [D × N] 代码：0 大盘 / 1 中盘 / 2 小盘 / -1 无市值或不参与。
+    """
+    ok = eligible & ~np.isnan(cap)
+    key = np.where(ok, -cap, np.inf)
+    order = np.argsort(key, axis=1, kind="stable")
+    pos = np.empty_like(order)
+    np.put_along_axis(pos, order, np.arange(order.shape[1])[None, :], axis=1)
+    k = np.maximum(1, ok.sum(axis=1, keepdims=True) // 3)
+    codes = np.select([pos < k, pos < 2 * k], [0, 1], default=2)
+    return np.where(ok, codes, -1).astype(np.int8)
+
+
+# ── 持仓长表 ─────────────────────────────────────────────────
+def position_table(m, rules: list[tuple] | None = None, hold_periods: list[int] | None = None,
+                   vol_excludes: tuple | None = None) -> pd.DataFrame:
+    """
+    把每个规则的多空持仓展开成长表，一行 = (信号日, 标的, 组合, 多空, 波动率过滤)：
+      portfolio_label / vol_exclude / side (+1 多 -1 空) / regime / cap_tier / fwd_ret_{h}d
+    市值分组在全部有效信号标的中截面三等份，组合之间口径一致。
+    """
+    from backtest.historical_backtest.rule_sweep import (
+        DEFAULT_RULES, DEFAULT_VOL_EXCLUDE, rule_label, rule_masks, vol_keep_mask
+    )
+    from backtest.historical_backtest.signal_panel import fwd_col
+
+    rules = rules or DEFAULT_RULES
+    hold_periods = hold_periods or m.hold_periods
+    vol_excludes = vol_excludes if vol_excludes is not None else (None, DEFAULT_VOL_EXCLUDE)
+
+    tiers = np.array(CAP_TIERS + ("unknown",), dtype=object)[cap_tier_codes(m.cap, m.valid)]
+    keeps = {p: (None if p is None else vol_keep_mask(m, p)) for p in vol_excludes}
+
+    frames = []
+    for kind, param in rules:
+        long_m, short_m = rule_masks(m, kind, param)
+        for p, keep in keeps.items():
+            held = np.where(long_m, 1, 0) - np.where(short_m, 1, 0)
+            if keep is not None:
+                held = np.where(keep, held, 0)
+            d, n = np.nonzero(held)
+            frame = pd.DataFrame({
+                "signal_date":     m.dates[d],
+                "ticker":          m.tickers[n],
+                "portfolio_label": rule_label(kind, param),
+                "vol_exclude":     "none" if p is None else f"top{int(round(p * 100))}pct",
+                "side":            held[d, n].astype(np.int8),
+                "regime":          m.market_regime[d],
+                "cap_tier":        tiers[d, n],
+            })
+            for hold in hold_periods:
+                frame[fwd_col(hold)] = m.fwd[hold][d, n]
+            frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+# ── 分组统计 ─────────────────────────────────────────────────
+def grouped_spread_stats(df: pd.DataFrame, keys: list[str], value: str = "spread",
+                         freq: int = 12, with_nav: bool = False) -> pd.DataFrame:
+    """
+    按 keys 分组、每组按 signal_date 排序后的价差序列，计算 performance.full_stats 的同名指标
+    (全部为 groupby 聚合 / 累积运算，无逐组 Python 循环)。value 为 NaN 的期视为无数据。
+    """
+    df = df[df[value].notna()].sort_values(keys + ["signal_date"], kind="stable")
+    s = df[value].astype(np.float64)
+    by = [df[k] for k in keys]
+
+    g = s.groupby(by, sort=True)
+    out = pd.DataFrame({"n": g.count(), "mean_spread": g.mean(), "stdev": g.std(ddof=1)})
+    out["stdev"] = out["stdev"].fillna(0.0)
+    out["positive_months"] = (s > 0).groupby(by, sort=True).sum()
+
+    nav = (1.0 + s).groupby(by, sort=True).cumprod()
+    peak = np.maximum(nav.groupby(by, sort=True).cummax(), 1.0)
+    out["max_drawdown"] = (1.0 - nav / peak).clip(lower=0.0).groupby(by, sort=True).max() * 100
+
+    ok = out["stdev"] > 1e-9
+    out["mean_pct"] = out["mean_spread"] * 100
+    out["win_rate"] = out["positive_months"] / out["n"]
+    out["sharpe"] = (out["mean_spread"] / out["stdev"] * math.sqrt(freq)).where(ok)
+    out["t_stat"] = (out["mean_spread"] / (out["stdev"] / np.sqrt(out["n"]))).where(ok)
+    out["negative_months"] = out["n"] - out["positive_months"]
+    if with_nav:
+        out["nav_series"] = nav.groupby(by, sort=True).agg(lambda x: [1.0] + x.round(6).tolist())
+
+    cols = ["n", "mean_spread", "mean_pct", "win_rate", "stdev", "sharpe", "t_stat",
+            "max_drawdown", "positive_months", "negative_months"] + (["nav_series"] if with_nav else [])
+    return out[cols].reset_index()
+
+
+def _with_rollup(df: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
+    """为每个分段列追加一份取值为 all 的副本 (笛卡尔展开：2^len(cols) 份)"""
+    for col in cols:
+        df = pd.concat([df, df.assign(**{col: ALL})], ignore_index=True)
+    return df
+
+
+def stress_table(m, rules: list[tuple] | None = None, hold_periods: list[int] | None = None,
+                 vol_excludes: tuple | None = None, dims: tuple = ("regime", "cap_tier"),
+                 freq: int = 12) -> pd.DataFrame:
+    """
+    组合 × 持有期 × 波动率过滤 × dims (默认 机制 × 市值分组，均含 all 汇总层) 的全部统计，一行一个组合。
+    日期级维度 (regime) 在价差序列上切片；标的级维度 (cap_tier) 先分组求腿收益再算价差。
+    """
+    pos = position_table(m, rules, hold_periods, vol_excludes)
+    fwd_cols = [c for c in pos.columns if c.startswith("fwd_ret_")]
+    date_dims = [d for d in dims if d == "regime"]
+    name_dims = [d for d in dims if d not in date_dims]
+
+    # 1) 标的级维度：持仓行展开 all 层后按 (组合, 过滤, 分组, 日期, 多空) 求等权腿收益
+    pos = _with_rollup(pos, name_dims)
+    leg_keys = ["portfolio_label", "vol_exclude"] + name_dims + ["signal_date", "regime", "side"]
+    legs = pos.groupby(leg_keys, sort=False)[fwd_cols].mean()
+
+    # 2) 多空价差 (任一腿无有效收益 → 该期无数据)
+    side = legs.index.get_level_values("side")
+    spreads = legs[side == 1].droplevel("side").sub(legs[side == -1].droplevel("side"))
+    spreads = spreads.reset_index().melt(id_vars=leg_keys[:-1], value_vars=fwd_cols,
+                                         var_name="fwd_col", value_name="spread")
+    spreads["hold_days"] = spreads["fwd_col"].str[len("fwd_ret_"):-1].astype(int)
+
+    # 3) 日期级维度展开 all 层，再对每个组合的价差序列做分组统计
+    spreads = _with_rollup(spreads, date_dims)
+    keys = ["portfolio_label", "hold_days", "vol_exclude"] + list(dims)
+    return grouped_spread_stats(spreads, keys, freq=freq)
+
+
+def regime_breakdown(monthly_records: list[dict]) -> dict[str, dict]:
+    """
+    rule_sweep.monthly_records 的机制分段统计：{label__hold{h}d: {regime: stats}}，
+    stats 的字段与取整口径同 performance.full_stats；没有样本的机制给出 n = 0 的空统计。
+    """
+    from backtest.historical_backtest.performance import full_stats
+
+    df = pd.DataFrame(monthly_records)
+    df["key"] = df["portfolio_label"] + "__hold" + df["hold_days"].astype(str) + "d"
+    df["spread"] = pd.to_numeric(df["long_ret"], errors="coerce") - pd.to_numeric(df["short_ret"], errors="coerce")
+    stats = grouped_spread_stats(df, ["key", "regime"], with_nav=True)
+
+    rounding = {"mean_spread": 6, "mean_pct": 4, "win_rate": 4, "stdev": 6,
+                "sharpe": 4, "t_stat": 4, "max_drawdown": 4}
+    for col, nd in rounding.items():
+        stats[col] = stats[col].round(nd).astype(object).where(stats[col].notna(), None)
+    for col in ("n", "positive_months", "negative_months"):
+        stats[col] = stats[col].astype(int)
+    found = {(r.pop("key"), r.pop("regime")): r for r in stats.to_dict("records")}
+
+    empty = full_stats([])
+    return {key: {r: found.get((key, r), dict(empty)) for r in REGIMES}
+            for key in df["key"].drop_duplicates()}
+
+
+# ── 旧接口 (list[dict] 记录) ─────────────────────────────────
 def split_records_by_regime(monthly_records: list[dict],
                              regime_map: dict[str, str]) -> dict[str, list]:
     """
@@ -4,8 +4,8 @@ o_score_stability_test.py
 O-Score 策略稳定性验证（Bootstrap 重采样）
 
 测试逻辑：
-  1. 对已有 237 只股票样本做 Bootstrap 重采样（有放回，N=500 次）
-  2. 每次 Top/Bottom 30% 构建多空组合，计算多空价差
+  1. 对已有 237 只股票样本做 Bootstrap 重采样（有放回，默认 N=500 次，--n-boot 可调到 1 万次以上）
+  2. 每次 Top/Bottom 30% 构建多空组合，计算多空价差（bootstrap_engine 一次性向量化计算）
   3. 统计 spread 的均值、std、胜率、95% 置信区间
   4. t-stat 判断是否显著异于零
   5. 再做因子贡献拆解：哪个子分（value/quality/momentum）才是真正驱动力
@@ -14,17 +14,27 @@ O-Score 策略稳定性验证（Bootstrap 重采样）
   6. 单独测试各子因子的选股效果（用原始子分替换 overall_score 排名）
 """
 
+import sys
 import json
 import os
-import random
-import math
+import argparse
 import statistics
 
+import numpy as np
+
 BASE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.abspath(os.path.join(BASE, "..")))
+
+from backtest.bootstrap_engine import bootstrap, summarize_samples
+
 SIGNAL_JSON = os.path.join(BASE, "hs300_cross_section.json")
 RETURN_JSON = os.path.join(BASE, "long_short_alpha.json")
+SEED = 2026
 
-random.seed(2026)
+parser = argparse.ArgumentParser()
+parser.add_argument("--n-boot", type=int, default=500, help="Bootstrap 重采样次数")
+args = parser.parse_args()
+N_BOOT = args.n_boot
 
 # ── 数据加载 ──────────────────────────────────────────────────
 with open(SIGNAL_JSON, "r", encoding="utf-8") as f:
@@ -65,65 +75,28 @@ N = len(records)
 print(f"有效样本: {N} 只")
 
 
-# ── 工具函数 ───────────────────────────────────────────────────
-def run_strategy(sample: list, score_key: str = "o_score", pct: float = 0.30) -> float | None:
-    """对 sample 按 score_key 排序，前 pct 做多，后 pct 做空，返回多空价差"""
-    valid = [x for x in sample if x.get(score_key) is not None]
-    if not valid:
-        return None
-    sorted_s = sorted(valid, key=lambda x: x[score_key], reverse=True)
-    n = len(sorted_s)
-    k = max(1, int(n * pct))
-    longs  = sorted_s[:k]
-    shorts = sorted_s[-k:]
-    if not longs or not shorts:
-        return None
-    lr = statistics.mean(x["actual_ret"] for x in longs)
-    sr = statistics.mean(x["actual_ret"] for x in shorts)
-    return lr - sr
-
-
-def t_stat(values: list[float]) -> float:
-    n = len(values)
-    if n < 2:
-        return 0.0
-    m = statistics.mean(values)
-    s = statistics.stdev(values)
-    return m / (s / math.sqrt(n)) if s > 1e-9 else 0.0
-
-
-def confidence_interval(values: list[float], ci: float = 0.95) -> tuple:
-    sv = sorted(values)
-    n  = len(sv)
-    lo = sv[int(n * (1 - ci) / 2)]
-    hi = sv[int(n * (1 - (1 - ci) / 2))]
-    return lo, hi
-
-
 # ════════════════════════════════════════════════════════════
 # 测试 1: Bootstrap 稳定性（overall O-Score）
 # ════════════════════════════════════════════════════════════
 print("\n" + "=" * 72)
-print("  测试 1: Bootstrap 重采样稳定性（N=500，Top/Bottom 30%）")
+print(f"  测试 1: Bootstrap 重采样稳定性（N={N_BOOT}，Top/Bottom 30%）")
 print("=" * 72)
 
-N_BOOT = 500
-boot_spreads = []
-for _ in range(N_BOOT):
-    sample = random.choices(records, k=N)  # 有放回采样
-    spread = run_strategy(sample, "o_score", 0.30)
-    if spread is not None:
-        boot_spreads.append(spread)
+o_scores = np.array([x["o_score"] for x in records], dtype=np.float64)
+returns  = np.array([x["actual_ret"] for x in records], dtype=np.float64)
+boot_spreads = bootstrap(returns, scores=o_scores, method="iid", n_boot=N_BOOT,
+                         pct=0.30, seed=SEED)
 
-boot_mean = statistics.mean(boot_spreads)
-boot_std  = statistics.stdev(boot_spreads)
-boot_wr   = sum(1 for s in boot_spreads if s > 0) / len(boot_spreads)
-boot_t    = t_stat(boot_spreads)
-ci_lo, ci_hi = confidence_interval(boot_spreads, 0.95)
+boot = summarize_samples(boot_spreads, 0.95)
+boot_mean = boot["mean"]
+boot_std  = boot["std"]
+boot_wr   = boot["win_rate"]
+boot_t    = boot["t_stat"]
+ci_lo, ci_hi = boot["ci_lo"], boot["ci_hi"]
 
 print(f"\n  Bootstrap 均值价差:  {boot_mean*100:+.2f}%")
 print(f"  Bootstrap 标准差:    {boot_std*100:.2f}%")
-print(f"  Bootstrap 胜率:      {boot_wr:.1%}  （{sum(1 for s in boot_spreads if s>0)}/{len(boot_spreads)} 次正价差）")
+print(f"  Bootstrap 胜率:      {boot_wr:.1%}  （{int((boot_spreads > 0).sum())}/{len(boot_spreads)} 次正价差）")
 print(f"  95% 置信区间:        [{ci_lo*100:+.2f}%, {ci_hi*100:+.2f}%]")
 print(f"  t-statistic:         {boot_t:.3f}  {'✅ 显著 (|t|>2)' if abs(boot_t)>2 else '⚠️  不显著 (|t|<2)'}")
 print(f"  原始样本实际价差:    +5.02%  {'（在置信区间内）' if ci_lo <= 0.0502 <= ci_hi else '（在置信区间外）'}")
@@ -0,0 +1,152 @@
+"""
+result_journal.py
+==================
+回测结果日志（SQLite WAL，断点续跑粒度 = 标的 × 日期）
+
+原先 signal_generator 按月写 signals_checkpoint/YYYY-MM.json，月中崩溃会丢掉已完成的几百次 Kronos 推理；
+backtest_runner 更是要等单只标的整段日期跑完才落盘。这里把每个 (run_id, ticker, date, config_hash)
+的结果在完成的瞬间写入 SQLite：
+
+  - WAL 模式 + busy_timeout：多进程 / 多线程可同时写，读不阻塞写
+  - 只追加：状态为 ok / empty 的记录不会被覆盖；error 记录在重跑成功后被替换
+  - config_hash 由影响单条结果的参数算出，参数一变自动视为新任务，旧结果互不干扰
+  - 对象可 pickle（连接按线程懒创建），可以直接作为参数传进进程池
+
+用法:
+    journal = ResultJournal(path, run_id="us_daily", config={"horizons": [1, 5]})
+    done = journal.completed(ticker="AAPL")          # {date: payload}，重启时跳过这些 key
+    journal.put("AAPL", "2024-01-02", record)
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime
+
+STATUS_OK    = "ok"       # 正常结果
+STATUS_EMPTY = "empty"    # 已完成但无可用结果（如缺少前瞻收益），重跑同样跳过
+STATUS_ERROR = "error"    # 失败，重跑时重新计算
+DONE_STATUSES = (STATUS_OK, STATUS_EMPTY)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    run_id      TEXT NOT NULL,
+    ticker      TEXT NOT NULL,
+    date        TEXT NOT NULL,
+    config_hash TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    payload     TEXT,
+    created_at  TEXT NOT NULL,
+    PRIMARY KEY (run_id, config_hash, ticker, date)
+) WITHOUT ROWID
+"""
+
+_UPSERT = """
+INSERT INTO results (run_id, ticker, date, config_hash, status, payload, created_at)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (run_id, config_hash, ticker, date) DO UPDATE SET
+    status = excluded.status, payload = excluded.payload, created_at = excluded.created_at
+WHERE results.status = 'error'
+"""
+
+
+def config_hash(config: dict | None) -> str:
+    """参数字典 → 12 位短哈希 (键排序后序列化，顺序无关)"""
+    blob = json.dumps(config or {}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()[:12]
+
+
+class ResultJournal:
+    """按 (run_id, ticker, date, config_hash) 记录单条结果的崩溃安全日志"""
+
+    def __init__(self, path: str, run_id: str, config: dict | None = None, timeout: float = 60.0):
+        self.path = os.path.abspath(path)
+        self.run_id = run_id
+        self.config_hash = config_hash(config)
+        self.timeout = timeout
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(_SCHEMA)
+
+    # ── 连接管理 (每线程一个，可 pickle) ────────────────────────
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_local")
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ── 写入 ──────────────────────────────────────────────────
+    def _row(self, ticker, date, payload, status):
+        blob = None if payload is None else json.dumps(payload, ensure_ascii=False, default=str)
+        return (self.run_id, ticker, str(date)[:10], self.config_hash, status, blob,
+                datetime.now().isoformat(timespec="seconds"))
+
+    def put(self, ticker: str, date: str, payload: dict | None, status: str = STATUS_OK):
+        """写入一条结果并立即提交；已完成 (ok / empty) 的 key 保持不变"""
+        self.put_many([(ticker, date, payload, status)])
+
+    def put_many(self, rows: list[tuple]):
+        """rows: [(ticker, date, payload, status), ...]，单个事务提交"""
+        if not rows:
+            return
+        with self._conn() as conn:
+            conn.executemany(_UPSERT, [self._row(*r) for r in rows])
+
+    # ── 读取 ──────────────────────────────────────────────────
+    def _select(self, ticker=None, date=None, statuses=DONE_STATUSES):
+        sql = (f"SELECT ticker, date, status, payload FROM results "
+               f"WHERE run_id = ? AND config_hash = ? AND status IN ({','.join('?' * len(statuses))})")
+        params = [self.run_id, self.config_hash, *statuses]
+        if ticker is not None:
+            sql += " AND ticker = ?"
+            params.append(ticker)
+        if date is not None:
+            sql += " AND date = ?"
+            params.append(str(date)[:10])
+        return self._conn().execute(sql + " ORDER BY ticker, date", params).fetchall()
+
+    def completed(self, ticker: str | None = None, date: str | None = None) -> dict:
+        """
+        已完成的 key → payload (empty 状态为 None)。
+        指定 ticker 时键为 date，指定 date 时键为 ticker，否则键为 (ticker, date)。
+        """
+        out = {}
+        for t, d, _, blob in self._select(ticker, date):
+            key = d if ticker is not None else t if date is not None else (t, d)
+            out[key] = None if blob is None else json.loads(blob)
+        return out
+
+    def records(self, ticker: str | None = None, date: str | None = None) -> list[dict]:
+        """状态为 ok 的全部结果，按 (ticker, date) 排序"""
+        return [json.loads(blob) for *_, blob in self._select(ticker, date, (STATUS_OK,))]
+
+    def counts(self) -> dict:
+        """当前 run_id + config_hash 下各状态的条数"""
+        rows = self._conn().execute(
+            "SELECT status, COUNT(*) FROM results WHERE run_id = ? AND config_hash = ? GROUP BY status",
+            (self.run_id, self.config_hash)).fetchall()
+        return dict(rows)
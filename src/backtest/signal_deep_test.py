@@ -16,11 +16,18 @@ signal_deep_test.py
   - 判断 O-Score 策略是否在不同分档口径下都稳定正收益
 """
 
+import sys
 import json
 import os
 import statistics
 
+import numpy as np
+
 BASE = os.path.dirname(__file__)
+sys.path.insert(0, os.path.abspath(os.path.join(BASE, "..")))
+
+from backtest.bootstrap_engine import decile_stats
+
 SIGNAL_JSON = os.path.join(BASE, "hs300_cross_section.json")
 RETURN_JSON = os.path.join(BASE, "long_short_alpha.json")
 
@@ -71,25 +78,21 @@ print("=" * 72)
 print(f"  {'十分位':6s} {'Z范围':26s} {'只数':5s} {'平均收益':10s} {'胜率':8s} {'方向'}  {'图示'}")
 print("-" * 72)
 
+z_arr   = np.array([x["z_score"] for x in records], dtype=np.float64)
+ret_arr = np.array([x["actual_ret"] for x in records], dtype=np.float64)
+
 deciles = []
-bucket_size = N // 10
-for i in range(10):
-    start = i * bucket_size
-    end   = start + bucket_size if i < 9 else N
-    bucket = records[start:end]
-    rets   = [x["actual_ret"] for x in bucket]
-    z_lo   = bucket[0]["z_score"]
-    z_hi   = bucket[-1]["z_score"]
-    mean_r = statistics.mean(rets)
-    win_r  = sum(1 for r in rets if r > 0) / len(rets)
+for b in decile_stats(z_arr, ret_arr, 10):
+    i, z_lo, z_hi = b["bucket"] - 1, b["key_lo"], b["key_hi"]
+    mean_r, win_r = b["mean_ret"], b["win_rate"]
     arrow  = "↑" if z_lo > 0 else "↓" if z_hi < 0 else "→"
     bar_len = int((mean_r + 0.12) * 200)
     bar = "█" * max(0, bar_len)
     label = f"D{i+1:02d} (低→高 {i+1}/10)"
     print(f"  {label:16s} [{z_lo:+8.2f} ~ {z_hi:+8.2f}]  "
-          f"{len(bucket):3d}只  {mean_r*100:+7.2f}%   {win_r:.0%}   {arrow}   {bar}")
+          f"{b['count']:3d}只  {mean_r*100:+7.2f}%   {win_r:.0%}   {arrow}   {bar}")
     deciles.append({"decile": i+1, "z_lo": z_lo, "z_hi": z_hi,
-                    "count": len(bucket), "mean_ret": mean_r, "win_rate": win_r})
+                    "count": b["count"], "mean_ret": mean_r, "win_rate": win_r})
 
 print()
 # 相关性判断
@@ -18,10 +18,11 @@ class GridGenerator:
     """
     
     @staticmethod
-    def generate_grid(ticker: str, grid_lines: int = 5, as_of_date: str = None) -> dict:
+    def generate_grid(ticker: str, grid_lines: int = 5, as_of_date: str = None, n_samples: int = 0) -> dict:
         """
         生成一整套网格区间
         网格级数默认为 5 档 (即上下各分档)
+        n_samples > 0 时用 Kronos 多路径情景估计每档价位在预测区间内的触达概率 (touch_prob)
         """
         ticker = ticker.strip().upper()
         try:
@@ -70,8 +71,20 @@ class GridGenerator:
                     "distance_from_p0": round((current_level - p0) / p0 * 100, 2)
                 })
                 current_level -= grid_step
+
+            touch = {}
+            if n_samples > 0:
+                from core.scenario_engine import ScenarioEngine
+                scenarios = ScenarioEngine.simulate([ticker], as_of_date=as_of_date, n_samples=n_samples)
+                if ticker in scenarios["tickers"]:
+                    probs = ScenarioEngine.touch_probabilities(
+                        scenarios, ticker, [lv["price"] for lv in levels], base_price=p0)
+                    for lv, prob in zip(levels, probs):
+                        lv["touch_prob"] = round(float(prob), 4)
+                    touch = {"touch_samples": n_samples}
                 
             return {
+                **touch,
                 "ticker": ticker,
                 "base_price": round(p0, 3),
                 "predicted_high": round(p_max, 3),
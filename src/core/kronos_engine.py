@@ -3,23 +3,76 @@ import pandas as pd
 from datetime import datetime, timedelta
 from crawlers.data_gateway import gateway
 from kronos.api import predict_market_trend
+from core.trading_calendar import exchange_for_ticker
 
 # Kronos 模型训练时的固定上下文窗口长度 (context_length = 84 个交易日)
 # 不同市场节假日导致 A 股实际返回交易日数量不同，必须统一
 _KRONOS_SEQ_LEN = 84
 
+# 单点预测的步长与采样参数 (透传给 predict_market_trend)
+_PRED_LEN = 30
+_SAMPLING = {"temperature": 1.0, "top_p": 0.9, "sample_count": 1}
+_NOISE_FLOOR = 0.005     # Regime Strength 分母的最低噪声地板，防止极高杠杆
+_DEFAULT_STD = 0.0309    # 预测结果缺少 std_return 时的默认降级波动率
+
 class KronosEngine:
     """
     底层数学量化引擎的封装层：负责拉取历史OHLCV数据并驱动基础大语言/统计模型生成预测曲线。
     """
     
     @staticmethod
-    def get_raw_prediction(ticker: str, target_date: str, pred_len: int = 30) -> dict:
+    def get_raw_prediction(ticker: str, target_date: str, pred_len: int = _PRED_LEN) -> dict:
         """
         获取原始预测数据，不含 LLM 文字解析
         @param target_date: YYYY-MM-DD，预测起点
         @return: {"z_score": float, "expected_return": float, "uncertainty": float}
         """
+        df = KronosEngine.load_history(ticker, target_date)
+
+        # 调用底层统一预测接口（基于集成采样，包含 z-score 边界判定逻辑）
+        prediction_df = predict_market_trend(df, pred_len=pred_len, exchange=exchange_for_ticker(ticker), **_SAMPLING)
+        
+        if prediction_df is None or prediction_df.empty:
+             raise RuntimeError("Kronos engine returned empty prediction.")
+             
+        mean_ret = prediction_df.attrs.get('mean_return', 0.0)
+        std_ret = prediction_df.attrs.get('std_return', _DEFAULT_STD)
+        
+        # 计算 Regime Strength (原 Z-Score)，设定一个最低噪声地板防止极高杠杆
+        regime_strength = float(mean_ret / max(std_ret, _NOISE_FLOOR))
+        
+        return {
+            "expected_return": float(mean_ret),
+            "uncertainty": float(std_ret),
+            "z_score": regime_strength,
+            "regime_strength": regime_strength
+        }
+
+    @staticmethod
+    def settings() -> dict:
+        """
+        决定 get_raw_prediction 输出的全部参数：权重目录指纹、上下文窗口、步长、采样与集成设置。
+        供逐日结果缓存做 config key，任何一项变化都应视为另一组结果。
+        """
+        from kronos import api
+        return {
+            "checkpoint": api.model_fingerprint(),
+            "lookback": _KRONOS_SEQ_LEN,
+            "pred_len": _PRED_LEN,
+            **_SAMPLING,
+            "ensemble": {"initial": api.ENSEMBLE_INITIAL, "extra": api.ENSEMBLE_EXTRA,
+                         "z_boundaries": list(api.Z_BOUNDARIES), "epsilon": api.BOUNDARY_EPSILON,
+                         "noise_std": api.BOUNDARY_NOISE_STD},
+            "noise_floor": _NOISE_FLOOR,
+            "default_std": _DEFAULT_STD,
+        }
+
+    @staticmethod
+    def load_history(ticker: str, target_date: str) -> pd.DataFrame:
+        """
+        拉取 target_date 之前 (不含) 的 OHLCV，并截取 / 填充到固定的 _KRONOS_SEQ_LEN 行，
+        作为 Kronos 的输入上下文 (单点预测与多路径情景采样共用)。
+        """
         try:
             target_dt = datetime.strptime(target_date, "%Y-%m-%d")
             # 提取最近 150 天数据，足够裁出 84 个交易日的窗口
@@ -32,21 +85,29 @@ class KronosEngine:
             start_date_str = start_dt.strftime("%Y-%m-%d")
             fetch_end_date = target_dt.strftime("%Y-%m-%d")
             
-        raw_data_str = gateway.get_stock_data(ticker, start_date_str, fetch_end_date)
-        
-        lines = raw_data_str.strip().split('\n')
-        csv_lines = [line for line in lines if not line.startswith('#') and line.strip()]
-        
-        if not csv_lines or "Error" in raw_data_str or "No data" in raw_data_str:
-             raise ValueError(f"Failed to fetch historical data for {ticker}. Detail: {raw_data_str}")
-             
-        csv_str = '\n'.join(csv_lines)
-        df = pd.read_csv(io.StringIO(csv_str), index_col="Date", parse_dates=True)
+        if gateway.offline_mode and gateway.replay_engine().has_symbol(ticker):
+            # 离线重播：直接取 mmap 缓冲视图，省去 CSV 文本往返
+            df = gateway.get_stock_frame(ticker, start_date_str, fetch_end_date)
+            if df.empty:
+                df = gateway.get_stock_frame(ticker, None, None)   # 与文本接口一致：区间为空时退回游标前全部数据
+            if df.empty:
+                raise ValueError(f"Failed to fetch historical data for {ticker}. Detail: offline replay window is empty")
+        else:
+            raw_data_str = gateway.get_stock_data(ticker, start_date_str, fetch_end_date)
+
+            lines = raw_data_str.strip().split('\n')
+            csv_lines = [line for line in lines if not line.startswith('#') and line.strip()]
+
+            if not csv_lines or "Error" in raw_data_str or "No data" in raw_data_str:
+                 raise ValueError(f"Failed to fetch historical data for {ticker}. Detail: {raw_data_str}")
+
+            csv_str = '\n'.join(csv_lines)
+            df = pd.read_csv(io.StringIO(csv_str), index_col="Date", parse_dates=True)
         
-        df.rename(columns={
+        df = df.rename(columns={
             "Open": "open", "High": "high", "Low": "low", 
             "Close": "close", "Volume": "volume"
-        }, inplace=True)
+        })
         
         # ── 【Fix Look-ahead Bias】剔除未来函数：强制切断 target_date 及之后的数据 ──
         # 消除不同数据源（YFinance exclusive vs Baostock inclusive）带来的对齐重叠问题
@@ -74,23 +135,4 @@ class KronosEngine:
             )
             df = pd.concat([pad_df, df])
         # ─────────────────────────────────────────────────────────────────
-        
-        # 调用底层统一预测接口（基于集成采样，包含 z-score 边界判定逻辑）
-        prediction_df = predict_market_trend(df, pred_len=pred_len)
-        
-        if prediction_df is None or prediction_df.empty:
-             raise RuntimeError("Kronos engine returned empty prediction.")
-             
-        mean_ret = prediction_df.attrs.get('mean_return', 0.0)
-        std_ret = prediction_df.attrs.get('std_return', 0.0309)  # 默认降级波动率
-        
-        # 计算 Regime Strength (原 Z-Score)，设定一个最低噪声地板防止极高杠杆
-        noise_floor = 0.005 
-        regime_strength = float(mean_ret / max(std_ret, noise_floor))
-        
-        return {
-            "expected_return": float(mean_ret),
-            "uncertainty": float(std_ret),
-            "z_score": regime_strength,
-            "regime_strength": regime_strength
-        }
+        return df
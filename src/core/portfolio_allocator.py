@@ -1,6 +1,8 @@
 import sys
 import os
 import json
+from concurrent.futures import ThreadPoolExecutor
+from statistics import NormalDist
 
 curr_dir = os.path.dirname(os.path.abspath(__file__))
 src_dir = os.path.abspath(os.path.join(curr_dir, "../.."))
@@ -14,76 +16,130 @@ class PortfolioAllocator:
     智能投资组合优化器 (Risk Parity + O-Score)
     根据输入的股票组，调用底层信令获取 O-Score 与 不确定性，
     计算避险最优的饼图拆分比例。
+    scenario_risk=True 时风险分母改用 Kronos 多路径情景下的单标的 CVaR，
+    并附带整个组合的情景风险报告 (VaR / CVaR / 回撤分布)。
+    method 选择权重算法 (见 core/portfolio_optimizer.py)：
+      "score"         — O-Score / 风险 的原始打分公式 (默认)
+      "risk_parity"   — Ledoit-Wolf 收缩协方差上的风险预算，预算 ∝ O-Score
+      "mean_variance" — 以 Kronos 预期收益为 μ 的均值-方差
+    后两者支持单票上下限与相对 prev_weights 的换手上限。
     """
-    
+
+    METHODS = ("score", "risk_parity", "mean_variance")
+
     @staticmethod
-    def allocate(tickers: list, as_of_date: str = None) -> dict:
-        results = {}
-        valid_tickets = []
+    def _evaluate(ticker: str, as_of_date: str = None) -> dict:
+        """单标的信令 → allocation 条目"""
+        try:
+            # 调取生成信令，获取 O-Score 和 Uncertainty，或者暴雷封杀
+            signal = generate_signal(ticker, as_of_date=as_of_date)
+            meta = signal['metadata']
+
+            if meta.get('fundamental_bust_triggered', False):
+                # 极度危险资产直接一票否决
+                return {
+                    "status": "BUST",
+                    "weight": 0.0,
+                    "o_score": meta.get('multi_factor_o_score', 0),
+                    "uncertainty": signal['uncertainty'],
+                    "reason": "财务指标严重恶化或破产预警，系统强制摘除。"
+                }
+
+            return {
+                "status": "OK",
+                "o_score": meta.get('multi_factor_o_score', 50.0),
+                "uncertainty": signal['uncertainty'],
+                "expected_return": signal.get('mean_return', 0.0),
+                "regime": signal['regime']
+            }
+        except Exception as e:
+            return {
+                "status": "ERROR",
+                "weight": 0.0,
+                "reason": str(e)
+            }
+
+    @staticmethod
+    def allocate(tickers: list, as_of_date: str = None, scenario_risk: bool = False,
+                 n_samples: int = 64, alpha: float = 0.95, method: str = "score",
+                 min_weight: float = None, max_weight: float = None, prev_weights: dict = None,
+                 max_turnover: float = None, risk_aversion: float = 5.0, max_workers: int = 8) -> dict:
+        if method not in PortfolioAllocator.METHODS:
+            raise ValueError(f"未知配资方法: {method}，可选 {PortfolioAllocator.METHODS}")
         raw_weights = {}
         total_raw_weight = 0.0
-        
-        for ticker in tickers:
-            ticker = ticker.strip().upper()
-            if not ticker: continue
-            
-            try:
-                # 调取生成信令，获取 O-Score 和 Uncertainty，或者暴雷封杀
-                signal = generate_signal(ticker, as_of_date=as_of_date)
-                meta = signal['metadata']
-                
-                if meta.get('fundamental_bust_triggered', False):
-                    # 极度危险资产直接一票否决
-                    results[ticker] = {
-                        "status": "BUST",
-                        "weight": 0.0,
-                        "o_score": meta.get('multi_factor_o_score', 0),
-                        "uncertainty": signal['uncertainty'],
-                        "reason": "财务指标严重恶化或破产预警，系统强制摘除。"
-                    }
-                    continue
-                    
-                o_score = meta.get('multi_factor_o_score', 50.0)
-                uncertainty = signal['uncertainty']
-                
-                # 核心配资算法：类风险平价（Risk Parity）结合多因子护城河
-                # 分子是护城河得分（越优质权重越大），分母是波动风险（越动荡权重越小）
-                # + 0.005 是为了防止不确定性太小导致除以 0 的极值放大
-                w = max(0, o_score) / (uncertainty + 0.005)
-                
-                raw_weights[ticker] = w
-                total_raw_weight += w
-                valid_tickets.append(ticker)
-                
-                results[ticker] = {
-                    "status": "OK",
-                    "raw_weight": w,
-                    "o_score": o_score,
-                    "uncertainty": uncertainty,
-                    "regime": signal['regime']
-                }
-            except Exception as e:
-                 results[ticker] = {
-                    "status": "ERROR",
-                    "weight": 0.0,
-                    "reason": str(e)
-                 }
 
-        # 归一化分配 100% 仓位
-        if total_raw_weight > 0:
+        # 各标的信令互相独立 (Kronos 推理 + 本地因子)，并发拉取；结果按输入顺序回填
+        ordered = list(dict.fromkeys(t.strip().upper() for t in tickers if t.strip()))
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(ordered) or 1))) as executor:
+            evaluated = list(executor.map(lambda t: PortfolioAllocator._evaluate(t, as_of_date), ordered))
+        results = dict(zip(ordered, evaluated))
+        valid_tickets = [t for t in ordered if results[t]["status"] == "OK"]
+
+        # 风险分母：默认为 Kronos 集成收益的标准差；情景模式下为多路径 CVaR
+        risk = {t: results[t]['uncertainty'] for t in valid_tickets}
+        scenarios = None
+        if scenario_risk and valid_tickets:
+            from core.scenario_engine import ScenarioEngine
+            scenarios = ScenarioEngine.simulate(valid_tickets, as_of_date=as_of_date, n_samples=n_samples)
+            _, cvar = ScenarioEngine.var_cvar(ScenarioEngine.path_returns(scenarios)[:, :, -1], alpha, axis=1)
+            sampled = dict(zip(scenarios['tickers'], cvar))
+            # 采样失败的标的用正态近似 CVaR = σ·φ(z)/(1-α)，与情景 CVaR 同量纲
+            normal_cvar = NormalDist().pdf(NormalDist().inv_cdf(alpha)) / (1 - alpha)
+            for t in valid_tickets:
+                risk[t] = max(0.0, float(sampled[t])) if t in sampled else risk[t] * normal_cvar
+                results[t]['cvar'] = risk[t]
+
+        portfolio = None
+        if method == "score" or not valid_tickets:
+            # 核心配资算法：类风险平价（Risk Parity）结合多因子护城河
+            # 分子是护城河得分（越优质权重越大），分母是波动风险（越动荡权重越小）
+            # + 0.005 是为了防止不确定性太小导致除以 0 的极值放大
             for t in valid_tickets:
-                w_pct = raw_weights[t] / total_raw_weight
-                results[t]['weight'] = w_pct
+                w = max(0, results[t]['o_score']) / (risk[t] + 0.005)
+                raw_weights[t] = w
+                total_raw_weight += w
+                results[t]['raw_weight'] = w
+
+            # 归一化分配 100% 仓位
+            if total_raw_weight > 0:
+                for t in valid_tickets:
+                    w_pct = raw_weights[t] / total_raw_weight
+                    results[t]['weight'] = w_pct
+            else:
+                # 万一全部计算失败或都是 0，则平分或皆 0
+                for t in valid_tickets:
+                    results[t]['weight'] = 0.0
         else:
-            # 万一全部计算失败或都是 0，则平分或皆 0
+            # 组合优化：协方差来自本地价格库，Kronos 风险 (不确定性 / 情景 CVaR) 叠加为特质方差
+            from core.portfolio_optimizer import optimize
+            portfolio = optimize(
+                valid_tickets,
+                expected_returns=[results[t]['expected_return'] for t in valid_tickets],
+                uncertainty=[risk[t] for t in valid_tickets],
+                budgets=[max(0.0, results[t]['o_score']) + 1e-6 for t in valid_tickets],
+                method=method, as_of_date=as_of_date,
+                min_weight=min_weight, max_weight=max_weight,
+                prev_weights=prev_weights, max_turnover=max_turnover, risk_aversion=risk_aversion,
+            )
             for t in valid_tickets:
-                results[t]['weight'] = 0.0
-                
-        return {
+                results[t]['weight'] = portfolio['weights'][t]
+                results[t]['risk_contribution'] = portfolio['risk_contributions'][t]
+
+        out = {
             "allocation": results,
             "valid_count": len(valid_tickets),
-            "total_evaluated": len(tickers)
+            "total_evaluated": len(tickers),
+            "method": method
         }
+        if portfolio is not None:
+            out["portfolio"] = {k: v for k, v in portfolio.items() if k not in ("weights", "risk_contributions")}
+        if scenarios is not None:
+            from core.scenario_engine import ScenarioEngine
+            weights = {t: results[t]['weight'] for t in valid_tickets}
+            out["scenario_risk"] = ScenarioEngine.evaluate(weights, scenarios, alpha=alpha)
+            out["scenario_risk"]["errors"] = scenarios['errors']
+        return out
 
 if __name__ == "__main__":
     test_pool = ["AAPL", "TSLA", "KO", "600519.SS"]
@@ -0,0 +1,198 @@
+"""
+scenario_engine.py — Kronos 采样路径上的蒙特卡洛情景引擎
+==========================================================
+职责：
+  1. 对一批标的一次性采样 Kronos 完整路径张量 [标的 × 样本 × 步长 × OHLCVA]
+  2. 在全部路径上向量化计算组合风险：VaR / CVaR、亏损概率、最大回撤分布
+  3. 网格价位的触达概率 (路径最高 / 最低价是否穿越该价位)
+
+接口：
+  ScenarioEngine.simulate(tickers, as_of_date)          → dict (kronos.api.predict_paths 的输出)
+  ScenarioEngine.portfolio_paths(weights, scenarios)    → ndarray [样本 × 步长] 组合累计收益
+  ScenarioEngine.evaluate(weights, scenarios, alpha)    → dict (组合 + 单标的风险报告)
+  ScenarioEngine.touch_probabilities(scenarios, ticker, levels, base_price) → ndarray [价位]
+
+说明：
+  predict_market_trend 只保留集成平均后的一条曲线和 std_return 一个标量，
+  这里的风险量全部直接来自模型自身的路径分布；所有统计都对样本轴做一次数组运算，
+  样本数 / 标的数 / 价位数增加不会引入逐路径循环。
+  收益均以各标的历史最后收盘价 (last_close) 为基准，买入持有、期初权重不再平衡。
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+
+import numpy as np
+
+CLOSE, HIGH, LOW = 3, 1, 2   # kronos.api.PATH_FIELDS 中的下标
+
+
+class ScenarioEngine:
+    """Kronos 多路径情景分析 (纯 numpy，静态方法)"""
+
+    # ── 采样 ──────────────────────────────────────────────────
+    @staticmethod
+    def simulate(tickers: list, as_of_date: Optional[str] = None, pred_len: int = 30,
+                 n_samples: int = 64) -> dict:
+        """
+        拉取各标的截至 as_of_date (不含) 的固定长度上下文，批量采样 n_samples 条路径。
+        单个标的数据失败不影响其他标的，失败原因记录在 errors。
+        """
+        from datetime import datetime
+        from core.kronos_engine import KronosEngine
+        from core.trading_calendar import exchange_for_ticker
+        from kronos.api import predict_paths
+
+        target_date = as_of_date or datetime.now().strftime("%Y-%m-%d")
+        histories, errors = {}, {}
+        for ticker in tickers:
+            ticker = ticker.strip().upper()
+            if not ticker:
+                continue
+            try:
+                histories[ticker] = KronosEngine.load_history(ticker, target_date)
+            except Exception as e:
+                errors[ticker] = str(e)
+
+        scenarios = predict_paths(histories, pred_len=pred_len, n_samples=n_samples,
+                                  exchange={t: exchange_for_ticker(t) for t in histories})
+        scenarios["errors"] = {**errors, **scenarios["errors"]}
+        scenarios["as_of_date"] = target_date
+        return scenarios
+
+    # ── 路径变换 ──────────────────────────────────────────────
+    @staticmethod
+    def path_returns(scenarios: dict, field: int = CLOSE) -> np.ndarray:
+        """[标的 × 样本 × 步长] 相对 last_close 的累计收益"""
+        return scenarios["paths"][..., field] / scenarios["last_close"][:, None, None] - 1.0
+
+    @staticmethod
+    def portfolio_paths(weights, scenarios: dict) -> np.ndarray:
+        """
+        买入持有组合的逐路径累计收益 [样本 × 步长]。
+        weights: 与 scenarios["tickers"] 对齐的数组，或 {ticker: 权重} (缺失视为 0)；不要求和为 1 (剩余视为现金)。
+        """
+        w = ScenarioEngine._weight_vector(weights, scenarios)
+        return np.einsum("t,tsh->sh", w, ScenarioEngine.path_returns(scenarios))
+
+    @staticmethod
+    def _weight_vector(weights, scenarios: dict) -> np.ndarray:
+        if isinstance(weights, dict):
+            return np.array([float(weights.get(t, 0.0)) for t in scenarios["tickers"]])
+        w = np.asarray(weights, dtype=np.float64)
+        if w.shape != (len(scenarios["tickers"]),):
+            raise ValueError(f"权重长度 {w.shape} 与标的数 {len(scenarios['tickers'])} 不一致")
+        return w
+
+    # ── 风险指标 (沿样本轴向量化) ──────────────────────────────
+    @staticmethod
+    def var_cvar(returns: np.ndarray, alpha: float = 0.95, axis: int = 0) -> tuple:
+        """
+        历史模拟法 VaR / CVaR (以正数表示亏损)，沿 axis 对样本求，其余维度保持。
+        VaR = -quantile(r, 1-alpha)；CVaR = 尾部 (r <= -VaR) 亏损的均值。
+        """
+        r = np.moveaxis(np.asarray(returns, dtype=np.float64), axis, 0)
+        q = np.quantile(r, 1.0 - alpha, axis=0)
+        tail = r <= q
+        cvar = -(np.where(tail, r, 0.0).sum(axis=0) / np.maximum(tail.sum(axis=0), 1))
+        return -q, cvar
+
+    @staticmethod
+    def max_drawdowns(cum_returns: np.ndarray) -> np.ndarray:
+        """逐路径最大回撤 (正数)；cum_returns 最后一维为步长，净值起点 1"""
+        nav = 1.0 + np.asarray(cum_returns, dtype=np.float64)
+        peak = np.maximum(np.maximum.accumulate(nav, axis=-1), 1.0)
+        return (1.0 - nav / peak).max(axis=-1).clip(min=0.0)
+
+    @staticmethod
+    def touch_probabilities(scenarios: dict, ticker: str, levels, base_price: Optional[float] = None) -> np.ndarray:
+        """
+        各价位在预测区间内被触达的概率：高于基准价的价位看路径最高价，低于的看最低价。
+        base_price 为价位所用的现价 (如实时行情)；路径以 last_close 为基准按比例换算，二者可来自不同数据源。
+        """
+        i = scenarios["tickers"].index(ticker)
+        p0 = float(base_price) if base_price is not None else float(scenarios["last_close"][i])
+        ratios = np.asarray(levels, dtype=np.float64) / p0
+        paths = scenarios["paths"][i] / scenarios["last_close"][i]          # [样本 × 步长 × 字段]
+        hi = paths[..., HIGH].max(axis=1)                                    # [样本]
+        lo = paths[..., LOW].min(axis=1)
+        up = hi[:, None] >= ratios[None, :]
+        down = lo[:, None] <= ratios[None, :]
+        return np.where(ratios >= 1.0, up.mean(axis=0), down.mean(axis=0))
+
+    # ── 汇总报告 ──────────────────────────────────────────────
+    @staticmethod
+    def evaluate(weights, scenarios: dict, alpha: float = 0.95, horizon: Optional[int] = None) -> dict:
+        """
+        组合与各标的在 horizon 步 (默认全区间) 末的情景风险报告。
+        回撤分布取整条路径 (前 horizon 步) 的最大回撤。
+        """
+        if not scenarios["tickers"]:
+            return {"n_paths": 0, "tickers": []}
+        h = scenarios["paths"].shape[2] if horizon is None else int(horizon)
+        asset = ScenarioEngine.path_returns(scenarios)[:, :, :h]               # [标的 × 样本 × 步长]
+        w = ScenarioEngine._weight_vector(weights, scenarios)
+        port = np.einsum("t,tsh->sh", w, asset)                                # [样本 × 步长]
+
+        final = port[:, -1]
+        var, cvar = ScenarioEngine.var_cvar(final, alpha)
+        mdd = ScenarioEngine.max_drawdowns(port)
+        a_var, a_cvar = ScenarioEngine.var_cvar(asset[:, :, -1], alpha, axis=1)
+        a_mdd = ScenarioEngine.max_drawdowns(asset)                           # [标的 × 样本]
+
+        return {
+            "n_paths": int(port.shape[0]),
+            "horizon": h,
+            "alpha": alpha,
+            "expected_return": float(final.mean()),
+            "volatility": float(final.std(ddof=1)) if len(final) > 1 else 0.0,
+            "var": float(var),
+            "cvar": float(cvar),
+            "prob_loss": float((final < 0).mean()),
+            "drawdown_p50": float(np.quantile(mdd, 0.50)),
+            "drawdown_p95": float(np.quantile(mdd, 0.95)),
+            "drawdown_mean": float(mdd.mean()),
+            "tickers": {
+                t: {
+                    "weight": float(w[i]),
+                    "expected_return": float(asset[i, :, -1].mean()),
+                    "var": float(a_var[i]),
+                    "cvar": float(a_cvar[i]),
+                    "drawdown_p95": float(np.quantile(a_mdd[i], 0.95)),
+                }
+                for i, t in enumerate(scenarios["tickers"])
+            },
+        }
+
+
+if __name__ == "__main__":
+    # 合成路径自检：与逐路径循环实现的结果一致
+    rng = np.random.default_rng(0)
+    T, S, H = 3, 500, 20
+    rets = rng.normal(0.0005, 0.02, (T, S, H))
+    close = 100 * np.cumprod(1 + rets, axis=2)
+    paths = np.stack([close, close * 1.01, close * 0.99, close, np.ones_like(close), close], axis=-1)
+    scen = {"tickers": ["A", "B", "C"], "paths": paths, "last_close": np.full(T, 100.0)}
+    w = np.array([0.5, 0.3, 0.2])
+
+    rep = ScenarioEngine.evaluate(w, scen)
+    port = ScenarioEngine.portfolio_paths(w, scen)
+    loop_final = [sum(w[t] * (close[t, s, -1] / 100 - 1) for t in range(T)) for s in range(S)]
+    assert np.allclose(port[:, -1], loop_final)
+    q = np.quantile(loop_final, 0.05)
+    assert abs(rep["var"] + q) < 1e-12
+    assert abs(rep["cvar"] + np.mean([x for x in loop_final if x <= q])) < 1e-12
+    loop_mdd = []
+    for s in range(S):
+        nav, peak, dd = 1.0 + port[s], 1.0, 0.0
+        for v in nav:
+            peak = max(peak, v)
+            dd = max(dd, 1 - v / peak)
+        loop_mdd.append(dd)
+    assert np.allclose(ScenarioEngine.max_drawdowns(port), loop_mdd)
+    probs = ScenarioEngine.touch_probabilities(scen, "A", [90, 100, 110])
+    assert np.isclose(probs[2], np.mean([(close[0, s] * 1.01).max() >= 110 for s in range(S)]))
+    assert np.isclose(probs[0], np.mean([(close[0, s] * 0.99).min() <= 90 for s in range(S)]))
+    print({k: v for k, v in rep.items() if k != "tickers"})
+    print("touch probabilities @ 90/100/110:", probs)
@@ -0,0 +1,398 @@
+"""
+trading_calendar.py
+====================
+本地交易日历服务（SSE/SZSE、NYSE）
+
+原先各处各取各的日历：signal_generator 每个月登录一次 Baostock 查交易日，
+backtest_runner 为了拿美股交易日把整段 SPY 行情下载一遍，predict_market_trend 则直接
+freq='B'，把节假日也当作交易日喂给 Kronos 的时间特征。这里统一成一个本地服务：
+
+  - NYSE      : 按交易所规则本地生成假日表（含观察日、耶稣受难日、Juneteenth 及历史临时休市），不触网
+  - SSE/SZSE  : 假日由国务院逐年公布，无法按规则推算，首次使用时从 Baostock 拉取
+                (失败时退回 akshare)，落盘为 npz；之后只补拉缺失的年份（增量刷新）
+  - 查询全部是 O(1)：以覆盖区间起点为 0 的逐日位图 + 累计计数数组，
+    is_trading_day / next_n_trading_days / offset 都只是一次下标运算
+  - 超出官方日历覆盖范围的日期 (如尚未公布的下一年) 按工作日外推
+
+用法:
+    cal = get_calendar("SSE")
+    cal.is_trading_day("2024-10-01")                  # False
+    cal.next_n_trading_days("2024-09-27", 5)          # 跳过国庆长假
+    cal.month_end_trading_days("2024-01", "2024-12")  # 每月最后一个交易日
+"""
+
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+CALENDAR_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "calendar")
+CN_HISTORY_START = "2005-01-01"
+EXTRAPOLATE_DAYS = 400          # 覆盖区间之后按工作日外推的天数
+
+_EXCHANGE_ALIASES = {
+    "SSE": "CN", "SZSE": "CN", "CN": "CN", "XSHG": "CN", "XSHE": "CN", "A": "CN",
+    "NYSE": "NYSE", "NASDAQ": "NYSE", "US": "NYSE", "XNYS": "NYSE", "XNAS": "NYSE",
+}
+
+# NYSE 规则之外的临时休市
+_NYSE_SPECIAL_CLOSURES = [
+    "2001-09-11", "2001-09-12", "2001-09-13", "2001-09-14",   # 9·11
+    "2004-06-11",                                             # 里根国葬
+    "2007-01-02",                                             # 福特国葬
+    "2012-10-29", "2012-10-30",                               # 飓风桑迪
+    "2018-12-05",                                             # 老布什国葬
+    "2025-01-09",                                             # 卡特国葬
+]
+
+
+def _day(d) -> np.datetime64:
+    if isinstance(d, str) and len(d) >= 10:
+        return np.datetime64(d[:10], "D")
+    if isinstance(d, np.datetime64):
+        return d.astype("datetime64[D]")
+    return np.datetime64(pd.Timestamp(d).date(), "D")
+
+
+def normalize_exchange(exchange: str) -> str:
+    key = str(exchange).upper()
+    if key not in _EXCHANGE_ALIASES:
+        raise ValueError(f"未知交易所: {exchange}")
+    return _EXCHANGE_ALIASES[key]
+
+
+def exchange_for_ticker(ticker: str) -> str:
+    """600519.SS / 000001.SZ / sh.600519 / 纯 6 位代码 → CN，其余 → NYSE"""
+    t = str(ticker).upper()
+    if t.endswith((".SS", ".SH", ".SZ")) or t.startswith(("SH.", "SZ.")) or (t.isdigit() and len(t) == 6):
+        return "CN"
+    return "NYSE"
+
+
+# ── NYSE 规则假日 ─────────────────────────────────────────────
+def _easter(year: int) -> date:
+    """公历复活节 (Anonymous Gregorian algorithm)"""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = (h + l - 7 * m + 114) % 31 + 1
+    return date(year, month, day)
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """当月第 n 个星期 weekday (0=周一)；n=-1 表示最后一个"""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = (date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1))
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _observed(d: date) -> date:
+    """周六假日提前到周五，周日顺延到周一"""
+    if d.weekday() == 5:
+        return d - timedelta(days=1)
+    if d.weekday() == 6:
+        return d + timedelta(days=1)
+    return d
+
+
+def nyse_holidays(start_year: int, end_year: int) -> list[date]:
+    out = []
+    for y in range(start_year, end_year + 1):
+        # 元旦落在周六时不在前一年 12/31 补休 (NYSE Rule 7.2)
+        ny = date(y, 1, 1)
+        if ny.weekday() != 5:
+            out.append(_observed(ny))
+        if y >= 1998:
+            out.append(_nth_weekday(y, 1, 0, 3))                 # 马丁·路德·金纪念日
+        out.append(_nth_weekday(y, 2, 0, 3))                     # 总统日
+        out.append(_easter(y) - timedelta(days=2))               # 耶稣受难日
+        out.append(_nth_weekday(y, 5, 0, -1))                    # 阵亡将士纪念日
+        if y >= 2022:
+            out.append(_observed(date(y, 6, 19)))                # Juneteenth
+        out.append(_observed(date(y, 7, 4)))                     # 独立日
+        out.append(_nth_weekday(y, 9, 0, 1))                     # 劳动节
+        out.append(_nth_weekday(y, 11, 3, 4))                    # 感恩节
+        out.append(_observed(date(y, 12, 25)))                   # 圣诞节
+    out.extend(pd.Timestamp(d).date() for d in _NYSE_SPECIAL_CLOSURES
+               if start_year <= int(d[:4]) <= end_year)
+    return sorted(set(out))
+
+
+def nyse_trading_days(start, end) -> np.ndarray:
+    start, end = _day(start), _day(end)
+    days = np.arange(start, end + 1, dtype="datetime64[D]")
+    days = days[np.is_busday(days)]
+    y0, y1 = start.astype(object).year, end.astype(object).year
+    holidays = np.array(nyse_holidays(y0, y1), dtype="datetime64[D]")
+    return days[~np.isin(days, holidays)]
+
+
+# ── SSE/SZSE 在线拉取 ─────────────────────────────────────────
+def _fetch_cn_baostock(start: str, end: str) -> tuple[np.ndarray, np.ndarray]:
+    """返回 (交易日, 已知日期)：Baostock 对区间内每个自然日给出是否交易"""
+    import baostock as bs
+    bs.login()
+    try:
+        rs = bs.query_trade_dates(start_date=start, end_date=end)
+        known, trading = [], []
+        while rs.next():
+            row = rs.get_row_data()
+            known.append(row[0])
+            if row[1] == "1":
+                trading.append(row[0])
+    finally:
+        bs.logout()
+    if not known:
+        raise RuntimeError(f"Baostock 未返回交易日历: {start} → {end}")
+    return np.array(trading, dtype="datetime64[D]"), np.array(known, dtype="datetime64[D]")
+
+
+def _fetch_cn_akshare(start: str, end: str) -> tuple[np.ndarray, np.ndarray]:
+    import akshare as ak
+    df = ak.tool_trade_date_hist_sina()
+    days = np.sort(pd.to_datetime(df["trade_date"]).to_numpy().astype("datetime64[D]"))
+    known_end = min(days[-1], _day(end))
+    sel = (days >= _day(start)) & (days <= known_end)
+    return days[sel], np.arange(_day(start), known_end + 1, dtype="datetime64[D]")
+
+
+def fetch_cn_trading_days(start: str, end: str) -> tuple[np.ndarray, np.ndarray]:
+    errors = []
+    for fetch in (_fetch_cn_baostock, _fetch_cn_akshare):
+        try:
+            return fetch(start, end)
+        except Exception as e:
+            errors.append(f"{fetch.__name__}: {e}")
+    raise RuntimeError("A 股交易日历拉取失败 — " + "; ".join(errors))
+
+
+# ── 日历对象 ─────────────────────────────────────────────────
+class TradingCalendar:
+    """
+    days         : 已排序的交易日 datetime64[D] 数组
+    known_start / known_end : 官方日历覆盖区间；之后 EXTRAPOLATE_DAYS 天按工作日外推
+    """
+
+    def __init__(self, exchange: str, days: np.ndarray, known_start, known_end):
+        self.exchange = exchange
+        self.known_start = _day(known_start)
+        self.known_end = _day(known_end)
+        tail = np.arange(self.known_end + 1, self.known_end + 1 + EXTRAPOLATE_DAYS, dtype="datetime64[D]")
+        days = np.asarray(days, dtype="datetime64[D]")
+        days = days[(days >= self.known_start) & (days <= self.known_end)]
+        self.days = np.concatenate([np.unique(days), tail[np.is_busday(tail)]])
+        self.start = self.known_start
+        self.end = self.known_end + EXTRAPOLATE_DAYS
+        # 位图与累计计数：_open[k] 表示 start+k 是否交易日，_cum[k] = start..start+k 中的交易日数
+        offsets = (self.days - self.start).astype(np.int64)
+        self._open = np.zeros(int((self.end - self.start).astype(np.int64)) + 1, dtype=bool)
+        self._open[offsets] = True
+        self._cum = np.cumsum(self._open)
+
+    def __repr__(self):
+        return (f"TradingCalendar({self.exchange}, {self.known_start} → {self.known_end}, "
+                f"{int((self.days <= self.known_end).sum())} 个交易日)")
+
+    def _offset(self, d) -> int:
+        k = int((_day(d) - self.start).astype(np.int64))
+        if k < 0 or k >= len(self._open):
+            raise ValueError(f"{_day(d)} 超出 {self.exchange} 日历范围 [{self.start}, {self.end}]")
+        return k
+
+    def covers(self, d) -> bool:
+        return self.start <= _day(d) <= self.known_end
+
+    # ── O(1) 查询 ─────────────────────────────────────────────
+    def is_trading_day(self, d) -> bool:
+        return bool(self._open[self._offset(d)])
+
+    def is_trading_days(self, dates) -> np.ndarray:
+        """批量版本；dates 可为任意日期序列"""
+        k = (np.asarray(pd.DatetimeIndex(dates).values.astype("datetime64[D]")) - self.start).astype(np.int64)
+        if len(k) and (k.min() < 0 or k.max() >= len(self._open)):
+            raise ValueError(f"日期超出 {self.exchange} 日历范围 [{self.start}, {self.end}]")
+        return self._open[k]
+
+    def position(self, d) -> int:
+        """d 及之前最后一个交易日在 days 中的下标 (d 早于首个交易日时为 -1)"""
+        return int(self._cum[self._offset(d)]) - 1
+
+    def offset(self, d, n: int) -> np.datetime64:
+        """
+        第 n 个交易日：n > 0 为 d 之后 (不含 d) 第 n 个，n < 0 为 d 之前 (不含 d) 第 |n| 个，
+        n = 0 为 d 当日或之前最近的交易日。
+        """
+        pos = self.position(d)
+        if n > 0:
+            idx = pos + n
+        elif n < 0:
+            idx = pos + n + (0 if self.is_trading_day(d) else 1)
+        else:
+            idx = pos
+        if idx < 0 or idx >= len(self.days):
+            raise ValueError(f"{_day(d)} 偏移 {n} 个交易日超出 {self.exchange} 日历范围")
+        return self.days[idx]
+
+    def next_trading_day(self, d) -> np.datetime64:
+        return self.offset(d, 1)
+
+    def prev_trading_day(self, d) -> np.datetime64:
+        return self.offset(d, -1)
+
+    def next_n_trading_days(self, d, n: int) -> np.ndarray:
+        """d 之后 (不含 d) 的 n 个交易日"""
+        lo = self.position(d) + 1
+        if lo + n > len(self.days):
+            raise ValueError(f"{_day(d)} 之后 {n} 个交易日超出 {self.exchange} 日历范围")
+        return self.days[lo:lo + n]
+
+    def prev_n_trading_days(self, d, n: int) -> np.ndarray:
+        """d 之前 (不含 d) 的 n 个交易日，升序"""
+        hi = self.position(d) + (0 if self.is_trading_day(d) else 1)
+        if hi - n < 0:
+            raise ValueError(f"{_day(d)} 之前 {n} 个交易日超出 {self.exchange} 日历范围")
+        return self.days[hi - n:hi]
+
+    def trading_days(self, start, end, inclusive_end: bool = True) -> np.ndarray:
+        """[start, end] (或 [start, end)) 区间内的交易日"""
+        lo = np.searchsorted(self.days, _day(start), side="left")
+        hi = np.searchsorted(self.days, _day(end), side="right" if inclusive_end else "left")
+        return self.days[lo:hi]
+
+    def count(self, start, end) -> int:
+        """[start, end] 区间内的交易日数"""
+        return max(0, self.position(end) - self.position(_day(start) - 1))
+
+    def month_end_trading_days(self, start, end) -> np.ndarray:
+        """
+        start / end 可写作 YYYY-MM 或 YYYY-MM-DD，返回区间内每个月的最后一个交易日。
+        """
+        s = pd.Period(str(start)[:7], freq="M")
+        e = pd.Period(str(end)[:7], freq="M")
+        days = self.trading_days(s.start_time, e.end_time)
+        if not len(days):
+            return days
+        months = days.astype("datetime64[M]")
+        last = np.r_[months[1:] != months[:-1], True]
+        return days[last]
+
+    def last_trading_day(self, year: int, month: int) -> np.datetime64 | None:
+        days = self.month_end_trading_days(f"{year}-{month:02d}", f"{year}-{month:02d}")
+        return days[0] if len(days) else None
+
+
+# ── 服务：持久化 + 增量刷新 + 进程内缓存 ─────────────────────
+_CALENDARS: dict[str, TradingCalendar] = {}
+_ATTEMPTED: dict[str, np.datetime64] = {}       # 本进程已尝试刷新到的日期，失败 / 官方未公布时不重复触网
+_LOCK = threading.Lock()
+
+
+def _calendar_path(exchange: str, directory: str) -> str:
+    return os.path.join(directory, f"{exchange.lower()}_trading_days.npz")
+
+
+def _load_cn(directory: str):
+    path = _calendar_path("CN", directory)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as z:
+        return z["days"], z["known_start"][()], z["known_end"][()]
+
+
+def _save_cn(days, known_start, known_end, directory: str):
+    os.makedirs(directory, exist_ok=True)
+    path = _calendar_path("CN", directory)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, days=days, known_start=np.datetime64(known_start, "D"),
+                 known_end=np.datetime64(known_end, "D"))
+    os.replace(tmp, path)
+
+
+def _build_cn(need_end: np.datetime64, directory: str) -> TradingCalendar:
+    """读取本地 A 股日历；未覆盖到 need_end 时只补拉缺失区间并落盘"""
+    cached = _load_cn(directory)
+    if cached is not None:
+        days, known_start, known_end = cached
+    else:
+        days, known_start, known_end = np.array([], dtype="datetime64[D]"), _day(CN_HISTORY_START), None
+
+    if known_end is None or known_end < need_end:
+        fetch_start = _day(CN_HISTORY_START) if known_end is None else known_end + 1
+        # 交易所一次公布全年安排，直接拉到年底
+        fetch_end = np.datetime64(f"{need_end.astype(object).year}-12-31", "D")
+        try:
+            new_days, known = fetch_cn_trading_days(str(fetch_start), str(fetch_end))
+            days = np.union1d(days, new_days)
+            known_end = known.max() if known_end is None else max(known_end, known.max())
+            _save_cn(days, known_start, known_end, directory)
+        except Exception as e:
+            if known_end is None:
+                # 完全离线：只能退回工作日规则，不落盘，下次进程启动再重试
+                print(f"⚠️ {e}，A 股日历暂按工作日处理")
+                weekdays = np.arange(known_start, need_end + 1, dtype="datetime64[D]")
+                return TradingCalendar("CN", weekdays[np.is_busday(weekdays)], known_start, need_end)
+            print(f"⚠️ A 股日历增量刷新失败，沿用本地日历 (覆盖至 {known_end}): {e}")
+    return TradingCalendar("CN", days, known_start, known_end)
+
+
+def _build_nyse(need_end: np.datetime64) -> TradingCalendar:
+    end = np.datetime64(f"{need_end.astype(object).year + 1}-12-31", "D")
+    return TradingCalendar("NYSE", nyse_trading_days("1990-01-01", end), "1990-01-01", end)
+
+
+def get_calendar(exchange: str = "SSE", until=None, directory: str = CALENDAR_DIR) -> TradingCalendar:
+    """
+    返回覆盖到 until (默认今天所在年末) 的交易日历，进程内缓存。
+    已缓存的日历覆盖不到 until 时才重建 / 增量刷新；本进程已为该区间刷新过 (拉取失败，
+    或官方日历只公布到 known_end) 时不再重试，超出部分按工作日外推。
+    """
+    ex = normalize_exchange(exchange)
+    need_end = _day(until) if until is not None else np.datetime64(f"{date.today().year}-12-31", "D")
+    with _LOCK:
+        cal = _CALENDARS.get(ex)
+        attempted = _ATTEMPTED.get(ex)
+        if cal is None or (cal.known_end < need_end and (attempted is None or attempted < need_end)):
+            fresh = _build_cn(need_end, directory) if ex == "CN" else _build_nyse(need_end)
+            # _build_cn 一次拉到 need_end 所在年末
+            year_end = np.datetime64(f"{need_end.astype(object).year}-12-31", "D")
+            _ATTEMPTED[ex] = year_end if attempted is None else max(attempted, year_end)
+            # 刷新失败时不要用更短的日历覆盖已有缓存
+            if cal is None or fresh.known_end >= cal.known_end:
+                cal = fresh
+            _CALENDARS[ex] = cal
+    return cal
+
+
+def clear_calendar_cache():
+    with _LOCK:
+        _CALENDARS.clear()
+        _ATTEMPTED.clear()
+
+
+def future_trading_index(last_date, periods: int, exchange: str = "NYSE") -> pd.DatetimeIndex:
+    """last_date 之后 periods 个交易日的 DatetimeIndex (Kronos y_timestamp 用)"""
+    cal = get_calendar(exchange)
+    days = cal.next_n_trading_days(last_date, periods).astype("datetime64[ns]")
+    return pd.DatetimeIndex(days, name="date")
+
+
+if __name__ == "__main__":
+    nyse = get_calendar("NYSE")
+    print(nyse)
+    print("2024 NYSE 交易日数:", nyse.count("2024-01-01", "2024-12-31"))
+    print("2024-11-27 之后 3 个交易日:", nyse.next_n_trading_days("2024-11-27", 3))
+    print("2024 月末交易日:", nyse.month_end_trading_days("2024-01", "2024-12"))
+    t0 = datetime.now()
+    cn = get_calendar("SSE")
+    print(cn, f"({(datetime.now() - t0).total_seconds():.2f}s)")
@@ -8,7 +8,9 @@
 1. Agent 不与具体网站协议打交道，只向 Gateway 提出 "What I need"。
 2. Gateway 封装所有的重试、网络格式转换细节。
 3. 【Phase 24】通过后缀 .SS/.SZ 自动识别 A 股，路由至 AKShare 供应商。
+4. 离线模式由 OfflineReplayEngine 承接：每个事件只加载一次，查询截断在重播游标之前。
 """
+import os
 from typing import Optional, Dict
 from crawlers.providers.yfinance_provider import (
     get_YFin_data_online,
@@ -40,12 +42,35 @@ class DataGateway:
     offline_mode: bool = False
     offline_data_dir: str = "src/backtest/extreme_data"
     offline_event_name: str = "2008_Subprime_Crisis" # or 2020_Covid_Crash
+    _replay_engines: Dict[tuple, "OfflineReplayEngine"] = {}
     
     @staticmethod
     def _log_fetch(msg):
         from rich.console import Console
         Console().print(f"[dim grey]   ↳ 🕸️ {msg}[/dim grey]")
 
+    @staticmethod
+    def replay_engine():
+        """当前 (offline_data_dir, offline_event_name) 对应的重播引擎，首次访问时加载并缓存"""
+        from crawlers.offline_replay import OfflineReplayEngine
+
+        key = (os.path.abspath(DataGateway.offline_data_dir), DataGateway.offline_event_name)
+        engine = DataGateway._replay_engines.get(key)
+        if engine is None:
+            engine = OfflineReplayEngine(*key)
+            DataGateway._replay_engines[key] = engine
+        return engine
+
+    @staticmethod
+    def set_replay_cursor(date) -> None:
+        """离线重播时间游标：之后的行情 / 新闻查询只能看到 date 当日及之前的数据 (None = 取消)"""
+        DataGateway.replay_engine().set_cursor(date)
+
+    @staticmethod
+    def get_stock_frame(symbol: str, start_date: str, end_date: str):
+        """离线模式专用：直接返回重播缓冲的 DataFrame 视图，免去文本序列化 / 反解析"""
+        return DataGateway.replay_engine().stock_frame(symbol, start_date, end_date)
+
     @staticmethod
     def get_stock_data(symbol: str, start_date: str, end_date: str) -> str:
         """获取股票 OHLCV 数据。
@@ -54,29 +79,9 @@ class DataGateway:
         - 美股 / 其他: 默认 yfinance
         """
         if DataGateway.offline_mode:
-            import os
-            import pandas as pd
-            from datetime import datetime
-            
             DataGateway._log_fetch(f"[OFFLINE] 正在从本地封闭舱 {DataGateway.offline_event_name} 提取 {symbol} 的重播数据...")
-            file_path = os.path.join(DataGateway.offline_data_dir, DataGateway.offline_event_name, f"{symbol}_price.csv")
-            if not os.path.exists(file_path):
-                return f"No local data found for symbol '{symbol}' in event {DataGateway.offline_event_name}"
-            
             try:
-                df = pd.read_csv(file_path, index_col='Date', parse_dates=True)
-                start_dt = pd.to_datetime(start_date)
-                mask = (df.index >= start_dt)
-                if end_date:
-                    end_dt = pd.to_datetime(end_date)
-                    mask = mask & (df.index <= end_dt)
-                sliced_df = df.loc[mask].copy()
-                if sliced_df.empty:
-                     sliced_df = df.copy()
-                csv_string = sliced_df.to_csv()
-                header = f"# [OFFLINE MOCK] Stock data for {symbol.upper()} from {start_date} to {end_date}\n"
-                header += f"# Total records: {len(sliced_df)}\n\n"
-                return header + csv_string
+                return DataGateway.replay_engine().get_stock_data(symbol, start_date, end_date)
             except Exception as e:
                 return f"Error reading mock offline data: {e}"
 
@@ -129,22 +134,11 @@ class DataGateway:
     def get_stock_news(ticker: str, start_date: str, end_date: str) -> str:
         """获取新闻 (支持黑天鹅恐慌假新闻播报)"""
         if DataGateway.offline_mode:
-            import os
-            import json
             DataGateway._log_fetch(f"[OFFLINE] 正在从避难所提取 {DataGateway.offline_event_name} 期间的恐慌性新闻快照...")
-            news_file = os.path.join(DataGateway.offline_data_dir, DataGateway.offline_event_name, "news.json")
-            if os.path.exists(news_file):
-                try:
-                    with open(news_file, "r", encoding='utf-8') as f:
-                        news_data = json.load(f)
-                        output = f"# MOCK NEWS for {DataGateway.offline_event_name}\n"
-                        for item in news_data:
-                            output += f"- [{item['date']}] {item['title']} : {item['summary']}\n"
-                        return output
-                except Exception as e:
-                    return f"Error reading offline news: {e}"
-            else:
-                return f"[OFFLINE] No panic news file found for {DataGateway.offline_event_name}"
+            try:
+                return DataGateway.replay_engine().get_stock_news(ticker, start_date, end_date)
+            except Exception as e:
+                return f"Error reading offline news: {e}"
         else:
             DataGateway._log_fetch(f"正在检索 {ticker} 相关媒体报道与社盟讨论...")
             return get_news_yfinance(ticker, start_date, end_date)
@@ -0,0 +1,200 @@
+"""
+离线重播引擎 (Offline Replay Engine)
+====================================
+为 DataGateway 黑天鹅封闭测试舱提供事件级的内存重播。
+
+原先离线模式每次 get_stock_data / get_stock_news 调用都要重新 read_csv 整个
+{symbol}_price.csv、重新 json.load news.json，再切片、再序列化。这里改为：
+
+1. 每个事件只解析一次：价格 CSV → 结构化 .npy 列式缓冲 (.replay_cache/，按源文件 mtime/size 失效)，
+   之后以 mmap_mode="r" 映射，跨进程 / 多次运行都不再解析 CSV。
+2. 新闻一次性读入，按日期排序后预渲染为文本行。
+3. 时间游标 (cursor)：set_cursor / advance / replay 逐日推进，所有查询都被截断在游标当日及之前，
+   封闭舱内天然不存在未来函数。
+4. stock_frame 返回 mmap 缓冲的零拷贝切片视图；get_stock_data / get_stock_news 保持 DataGateway 原有的文本格式。
+
+用法:
+    engine = OfflineReplayEngine("src/backtest/extreme_data", "2020_Covid_Crash")
+    for day in engine.replay("2020-03-02", "2020-03-20"):
+        df = engine.stock_frame("KO", "2019-10-01", day)
+"""
+from __future__ import annotations
+
+import os
+import json
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIRNAME = ".replay_cache"
+PRICE_SUFFIX = "_price.csv"
+DATE_FIELD = "Date"
+
+
+def _day(d) -> np.datetime64:
+    return np.datetime64(pd.Timestamp(d).date(), "D")
+
+
+def _source_stamp(path: str) -> list:
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+class OfflineReplayEngine:
+    """单个黑天鹅事件的价格 / 新闻内存重播器，带逐日推进的时间游标"""
+
+    def __init__(self, data_dir: str, event_name: str, cursor=None):
+        self.data_dir = data_dir
+        self.event_name = event_name
+        self.event_dir = os.path.join(data_dir, event_name)
+        if not os.path.isdir(self.event_dir):
+            raise FileNotFoundError(f"离线事件目录不存在: {self.event_dir}")
+
+        self._prices: dict[str, np.ndarray] = {}
+        self._load_prices()
+        self._load_news()
+
+        days = [arr[DATE_FIELD] for arr in self._prices.values()] + [self._news_dates]
+        self.trading_days = np.unique(np.concatenate(days)) if days else np.array([], dtype="datetime64[D]")
+        self.cursor: Optional[np.datetime64] = None
+        if cursor is not None:
+            self.set_cursor(cursor)
+
+    def __repr__(self):
+        cur = "—" if self.cursor is None else str(self.cursor)
+        return f"OfflineReplayEngine({self.event_name}, {len(self._prices)} 个标的, 游标={cur})"
+
+    # ── 一次性加载 ─────────────────────────────────────────────
+    def _load_prices(self):
+        cache_dir = os.path.join(self.event_dir, CACHE_DIRNAME)
+        manifest_path = os.path.join(cache_dir, "manifest.json")
+        manifest = {}
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                manifest = {}
+
+        changed = False
+        for name in sorted(os.listdir(self.event_dir)):
+            if not name.endswith(PRICE_SUFFIX):
+                continue
+            symbol = name[:-len(PRICE_SUFFIX)].upper()
+            src = os.path.join(self.event_dir, name)
+            buf = os.path.join(cache_dir, f"{symbol}.npy")
+            stamp = _source_stamp(src)
+            if manifest.get(symbol) != stamp or not os.path.exists(buf):
+                os.makedirs(cache_dir, exist_ok=True)
+                self._build_buffer(src, buf)
+                manifest[symbol] = stamp
+                changed = True
+            self._prices[symbol] = np.load(buf, mmap_mode="r")
+
+        if changed:
+            tmp = manifest_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            os.replace(tmp, manifest_path)
+
+    @staticmethod
+    def _build_buffer(csv_path: str, npy_path: str):
+        """CSV → 结构化数组 (Date: datetime64[D] + 原始列顺序与 dtype)，原子写出"""
+        df = pd.read_csv(csv_path, index_col=DATE_FIELD, parse_dates=True).sort_index()
+        dtype = [(DATE_FIELD, "datetime64[D]")] + [(c, df[c].dtype.str) for c in df.columns]
+        arr = np.empty(len(df), dtype=dtype)
+        arr[DATE_FIELD] = df.index.values.astype("datetime64[D]")
+        for c in df.columns:
+            arr[c] = df[c].to_numpy()
+        tmp = npy_path + ".tmp.npy"
+        np.save(tmp, arr)
+        os.replace(tmp, npy_path)
+
+    def _load_news(self):
+        self._news_path = os.path.join(self.event_dir, "news.json")
+        items = []
+        if os.path.exists(self._news_path):
+            with open(self._news_path, "r", encoding="utf-8") as f:
+                items = json.load(f)
+        order = sorted(range(len(items)), key=lambda i: items[i]["date"])   # 稳定排序，同日保持原顺序
+        self._news_dates = np.array([_day(items[i]["date"]) for i in order], dtype="datetime64[D]")
+        self._news_lines = [f"- [{items[i]['date']}] {items[i]['title']} : {items[i]['summary']}\n" for i in order]
+
+    # ── 时间游标 ──────────────────────────────────────────────
+    def set_cursor(self, d) -> np.datetime64:
+        """把游标移动到 d (None = 取消截断)；之后的查询只能看到 d 当日及之前的数据"""
+        self.cursor = None if d is None else _day(d)
+        return self.cursor
+
+    def advance(self, n: int = 1) -> Optional[np.datetime64]:
+        """游标前进 n 个事件交易日；未设置游标时从首个交易日开始，越过末日返回 None"""
+        if not len(self.trading_days):
+            return None
+        if self.cursor is None:
+            idx = n - 1
+        else:
+            idx = np.searchsorted(self.trading_days, self.cursor, side="right") + n - 1
+        if idx >= len(self.trading_days):
+            return None
+        self.cursor = self.trading_days[max(idx, 0)]
+        return self.cursor
+
+    def replay(self, start=None, end=None) -> Iterator[np.datetime64]:
+        """在 [start, end] 的事件交易日上逐日推进游标并 yield 当日；结束后游标停在最后一天"""
+        lo = 0 if start is None else np.searchsorted(self.trading_days, _day(start), side="left")
+        hi = len(self.trading_days) if end is None else np.searchsorted(self.trading_days, _day(end), side="right")
+        for d in self.trading_days[lo:hi]:
+            self.cursor = d
+            yield d
+
+    def _upper(self, end_date) -> Optional[np.datetime64]:
+        bounds = [b for b in (None if not end_date else _day(end_date), self.cursor) if b is not None]
+        return min(bounds) if bounds else None
+
+    # ── 查询 ──────────────────────────────────────────────────
+    @property
+    def symbols(self) -> list[str]:
+        return sorted(self._prices)
+
+    def has_symbol(self, symbol: str) -> bool:
+        return symbol.upper() in self._prices
+
+    def price_slice(self, symbol: str, start_date=None, end_date=None) -> np.ndarray:
+        """[start_date, min(end_date, 游标)] 区间的结构化数组视图 (mmap 切片，零拷贝)"""
+        arr = self._prices[symbol.upper()]
+        dates = arr[DATE_FIELD]
+        lo = 0 if start_date is None else np.searchsorted(dates, _day(start_date), side="left")
+        upper = self._upper(end_date)
+        hi = len(arr) if upper is None else np.searchsorted(dates, upper, side="right")
+        return arr[lo:max(lo, hi)]
+
+    def stock_frame(self, symbol: str, start_date=None, end_date=None) -> pd.DataFrame:
+        """price_slice 的 DataFrame 视图 (index=Date，列名与原 CSV 一致)"""
+        arr = self.price_slice(symbol, start_date, end_date)
+        cols = [c for c in arr.dtype.names if c != DATE_FIELD]
+        index = pd.DatetimeIndex(arr[DATE_FIELD], name=DATE_FIELD)
+        return pd.DataFrame({c: arr[c] for c in cols}, index=index, copy=False)
+
+    def get_stock_data(self, symbol: str, start_date: str, end_date: str) -> str:
+        """与原离线模式相同的文本格式；区间为空时退回游标之前的全部数据"""
+        if not self.has_symbol(symbol):
+            return f"No local data found for symbol '{symbol}' in event {self.event_name}"
+        df = self.stock_frame(symbol, start_date, end_date)
+        if df.empty:
+            df = self.stock_frame(symbol)
+        header = f"# [OFFLINE MOCK] Stock data for {symbol.upper()} from {start_date} to {end_date}\n"
+        header += f"# Total records: {len(df)}\n\n"
+        return header + df.to_csv()
+
+    def news_count(self, end_date=None) -> int:
+        upper = self._upper(end_date)
+        if upper is None:
+            return len(self._news_lines)
+        return int(np.searchsorted(self._news_dates, upper, side="right"))
+
+    def get_stock_news(self, ticker: str = "", start_date: str = None, end_date: str = None) -> str:
+        """事件新闻快照，截断在 min(end_date, 游标) 当日及之前"""
+        if not os.path.exists(self._news_path):
+            return f"[OFFLINE] No panic news file found for {self.event_name}"
+        return f"# MOCK NEWS for {self.event_name}\n" + "".join(self._news_lines[:self.news_count(end_date)])
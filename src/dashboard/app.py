@@ -11,9 +11,13 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from flask import Flask, render_template, jsonify, request
 import pandas as pd
-import glob
 import json
-import pickle
+import threading
+
+from dashboard import ohlcv_pyramid
+from dashboard.file_catalog import FileCatalog
+from dashboard.signal_service import SignalService
+from dashboard.fund_slicer import slice_field, list_fields, plan_export, stream_export, EXPORT_FORMATS
 
 app = Flask(__name__, template_folder='templates', static_folder='static')
 
@@ -22,50 +26,43 @@ DATA_ROOT = r'C:\Data\Market'
 LEGACY_DATA = r'C:\AlphaRanker\data'
 
 
-def build_tree(root_path, rel=""):
-    """递归构建目录树 JSON"""
-    result = []
-    if not os.path.exists(root_path):
-        return result
-    try:
-        entries = sorted(os.listdir(root_path))
-    except PermissionError:
-        return result
-
-    for entry in entries:
-        full = os.path.join(root_path, entry)
-        node_path = (rel + "/" + entry) if rel else entry
-
-        if os.path.isdir(full):
-            children = build_tree(full, node_path)
-            file_count = sum(1 for c in children if c.get("type") == "file")
-            dir_count = sum(1 for c in children if c.get("type") == "dir")
-            # Count all files recursively
-            total_files = 0
-            for c in children:
-                if c.get("type") == "file":
-                    total_files += 1
-                elif c.get("type") == "dir":
-                    total_files += c.get("totalFiles", 0)
-
-            result.append({
-                "name": entry,
-                "path": node_path,
-                "type": "dir",
-                "children": children[:200],  # cap for large dirs
-                "totalFiles": total_files,
-                "truncated": len(children) > 200,
-            })
-        elif entry.endswith('.parquet'):
-            size = os.path.getsize(full)
-            result.append({
-                "name": entry,
-                "path": node_path,
-                "type": "file",
-                "size": size,
-                "sizeStr": f"{size/1024:.0f}KB" if size < 1048576 else f"{size/1048576:.1f}MB",
-            })
-    return result
+LEGACY_LABEL = "_legacy"
+CATALOG_INDEX = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'file_catalog.json')
+TREE_PAGE = 200
+EXPORT_MAX_ROWS = 1_000_000    # /api/slicer/export 单次响应的原始行数上限，更多用 cursor 续传
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """进程内唯一的文件目录索引；首次调用时加载 / 扫描并启动后台监视"""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = FileCatalog({"": DATA_ROOT, LEGACY_LABEL: LEGACY_DATA}, CATALOG_INDEX).start()
+    return _catalog
+
+
+_signal_services = {}
+_signal_lock = threading.Lock()
+
+
+def get_signal_service(model_path, features_path, info_path):
+    """按 (模型, 特征, 基本面) 路径复用同一个 SignalService，所有请求线程共享一份内存"""
+    key = (os.path.abspath(model_path), os.path.abspath(features_path), os.path.abspath(info_path))
+    with _signal_lock:
+        if key not in _signal_services:
+            _signal_services[key] = SignalService(model_path, features_path, info_path)
+        return _signal_services[key]
+
+
+def _split_tree_path(path):
+    """树节点路径 → (索引标签, 根内相对目录)"""
+    path = path.strip("/")
+    if path == LEGACY_LABEL or path.startswith(LEGACY_LABEL + "/"):
+        return LEGACY_LABEL, path[len(LEGACY_LABEL) + 1:]
+    return "", path
 
 
 def resolve_path(rel_path):
@@ -129,22 +126,51 @@ def index():
 
 @app.route("/api/tree")
 def api_tree():
-    """返回完整目录树"""
-    tree = []
-    # New data center
-    if os.path.exists(DATA_ROOT):
-        tree = build_tree(DATA_ROOT)
-    # Also include legacy data still being fetched
-    legacy_items = build_tree(LEGACY_DATA)
-    if legacy_items:
-        tree.append({
-            "name": "(legacy - fetching)",
-            "path": "_legacy",
-            "type": "dir",
-            "children": legacy_items,
-            "totalFiles": sum(c.get("totalFiles", 0) if c["type"]=="dir" else 1 for c in legacy_items),
-        })
-    return jsonify(tree)
+    """
+    目录树 (来自内存索引，按需展开)。
+    参数: path=目录 (空为顶层), offset / limit 分页, depth=内联展开层数 (默认 1)。
+    """
+    catalog = get_catalog()
+    path = request.args.get("path", "")
+    offset = max(0, request.args.get("offset", 0, type=int))
+    limit = min(max(1, request.args.get("limit", TREE_PAGE, type=int)), 5000)
+    depth = min(max(1, request.args.get("depth", 1, type=int)), 8)
+
+    label, rel = _split_tree_path(path)
+    nodes, total = catalog.children(label, rel, offset, limit, depth)
+    if not path:
+        # 新数据中心之后附上仍在抓取中的旧目录 (作为一个虚拟节点，不参与分页)
+        if catalog.has_dir(LEGACY_LABEL) and catalog.children(LEGACY_LABEL, "", 0, 1)[1]:
+            legacy = {
+                "name": "(legacy - fetching)",
+                "path": LEGACY_LABEL,
+                "type": "dir",
+                "totalFiles": catalog.total_files(LEGACY_LABEL),
+                "childCount": catalog.children(LEGACY_LABEL, "", 0, 1)[1],
+            }
+            if depth > 1:
+                legacy["children"], n = catalog.children(LEGACY_LABEL, "", 0, limit, depth - 1)
+                legacy["truncated"] = n > limit
+            nodes.append(legacy)
+    return jsonify({
+        "path": path,
+        "nodes": nodes,
+        "offset": offset,
+        "total": total,
+        "hasMore": offset + limit < total,
+        "version": catalog.version,
+    })
+
+
+@app.route("/api/catalog")
+def api_catalog():
+    """单个文件的索引信息 (大小 / mtime / 行数 / 列名)，不读取数据"""
+    path = request.args.get("path", "").strip("/")
+    catalog = get_catalog()
+    entry = catalog.lookup("", path) or catalog.lookup(LEGACY_LABEL, path)
+    if entry is None:
+        return jsonify({"error": "Not in catalog"})
+    return jsonify(entry)
 
 
 @app.route("/api/preview")
@@ -176,49 +202,24 @@ def api_preview():
 
 @app.route("/api/candlestick")
 def api_candlestick():
-    """返回 K 线数据 (OHLCV)"""
+    """
+    返回 K 线数据 (OHLCV + MA5/MA20)，来自内存金字塔，点数不超过 width。
+    参数: start / end 视口日期, width 像素宽度 (默认 500), freq=auto|D|W|M, method=lttb|minmax。
+    """
     rel = request.args.get("path", "")
     path = resolve_path(rel)
     if not os.path.exists(path):
         return jsonify({"error": "Not found"})
 
+    freq = request.args.get("freq", "auto")
+    method = request.args.get("method", "lttb")
+    if freq not in ("auto",) + ohlcv_pyramid.LEVELS or method not in ("lttb", "minmax"):
+        return jsonify({"error": f"Unsupported freq/method: {freq}/{method}"})
+    width = min(max(10, request.args.get("width", 500, type=int)), 5000)
     try:
-        df = pd.read_parquet(path)
-        if isinstance(df.columns, pd.MultiIndex):
-            df.columns = [col[0] for col in df.columns]
-            df = df.loc[:, ~df.columns.duplicated()]
-        if isinstance(df.index, pd.DatetimeIndex):
-            df.index = df.index.strftime("%Y-%m-%d")
-
-        # Map column names (case insensitive)
-        col_map = {}
-        for c in df.columns:
-            cl = c.lower()
-            if cl in ('open',): col_map['open'] = c
-            elif cl in ('high',): col_map['high'] = c
-            elif cl in ('low',): col_map['low'] = c
-            elif cl in ('close',): col_map['close'] = c
-            elif cl in ('volume',): col_map['volume'] = c
-
-        if 'close' not in col_map:
-            return jsonify({"error": "No OHLC columns"})
-
-        # Downsample for large datasets
-        step = max(1, len(df) // 500)
-        df = df.iloc[::step]
-
-        result = {"dates": df.index.tolist()}
-        for key in ['open', 'high', 'low', 'close', 'volume']:
-            if key in col_map:
-                result[key] = pd.to_numeric(df[col_map[key]], errors='coerce').fillna(0).tolist()
-
-        # MA lines
-        if 'close' in col_map:
-            close_s = pd.to_numeric(df[col_map['close']], errors='coerce')
-            result['ma5'] = close_s.rolling(5, min_periods=1).mean().fillna(0).tolist()
-            result['ma20'] = close_s.rolling(20, min_periods=1).mean().fillna(0).tolist()
-
-        return jsonify(result)
+        return jsonify(ohlcv_pyramid.query(path, start=request.args.get("start") or None,
+                                           end=request.args.get("end") or None,
+                                           width=width, freq=freq, method=method))
     except Exception as e:
         return jsonify({"error": str(e)})
 
@@ -261,154 +262,126 @@ def _get_fund_dirs(market, report_type):
     return dirs
 
 
+def _slicer_args():
+    """切片请求参数：market / type / field，可选 tickers (逗号分隔) 与 start / end 报告期区间"""
+    tickers = [t.strip().upper() for t in request.args.get("tickers", "").split(",") if t.strip()]
+    return {
+        "market": request.args.get("market", "us"),
+        "report_type": request.args.get("type", "income"),
+        "field": request.args.get("field", ""),
+        "tickers": tickers or None,
+        "start": request.args.get("start") or None,
+        "end": request.args.get("end") or None,
+    }
+
+
+def _slice(args):
+    return slice_field(_get_fund_dirs(args["market"], args["report_type"]), args["field"],
+                       tickers=args["tickers"], start=args["start"], end=args["end"])
+
+
 @app.route("/api/slicer/fields")
 def api_slicer_fields():
-    """获取可用字段列表 — 从第一个文件中读取列名"""
+    """获取可用字段列表 — 只读第一个文件的 schema"""
     market = request.args.get("market", "us")
     report_type = request.args.get("type", "income")
-    dirs = _get_fund_dirs(market, report_type)
-
-    for d, pattern in dirs:
-        files = glob.glob(os.path.join(d, pattern))
-        if files:
-            try:
-                df = pd.read_parquet(files[0])
-                cols = [c for c in df.columns if c != 'ticker']
-                return jsonify({"fields": cols, "count": len(files)})
-            except:
-                continue
-    return jsonify({"fields": [], "count": 0})
+    try:
+        fields, count = list_fields(_get_fund_dirs(market, report_type))
+    except Exception:
+        fields, count = [], 0
+    return jsonify({"fields": fields, "count": count})
 
 
 @app.route("/api/slicer/extract")
 def api_slicer_extract():
-    """跨股票提取指定字段并拼接"""
-    market = request.args.get("market", "us")
-    report_type = request.args.get("type", "income")
-    field = request.args.get("field", "")
-    if not field:
+    """跨股票提取指定字段并拼接 (rows=tickers, cols=dates)"""
+    args = _slicer_args()
+    if not args["field"]:
         return jsonify({"error": "Missing field parameter"})
+    try:
+        all_dates, rows = _slice(args)
+    except Exception as e:
+        return jsonify({"error": str(e)})
 
-    dirs = _get_fund_dirs(market, report_type)
-    rows = []
-
-    for d, pattern in dirs:
-        files = sorted(glob.glob(os.path.join(d, pattern)))
-        for f in files:
-            try:
-                df = pd.read_parquet(f)
-                if field not in df.columns:
-                    continue
-                # Extract ticker from filename
-                basename = os.path.basename(f)
-                if market == 'us':
-                    ticker = basename.split('_')[0]
-                else:
-                    ticker = basename.replace('_fundamental.parquet', '')
-
-                series = df[field]
-                if isinstance(df.index, pd.DatetimeIndex):
-                    dates = df.index.strftime("%Y-%m-%d").tolist()
-                else:
-                    dates = [str(x) for x in df.index.tolist()]
-
-                values = pd.to_numeric(series, errors='coerce').fillna(0).tolist()
-                rows.append({"ticker": ticker, "dates": dates, "values": values})
-            except:
-                continue
-
-    # Build pivot table: rows=tickers, cols=dates
-    all_dates = sorted(set(d for r in rows for d in r["dates"]), reverse=True)
-    table_data = []
-    for r in rows:
-        date_map = dict(zip(r["dates"], r["values"]))
-        row_vals = [date_map.get(d, 0) for d in all_dates]
-        table_data.append({"ticker": r["ticker"], "values": row_vals})
-
+    table_data = [{"ticker": t, "values": [date_map.get(d, 0) for d in all_dates]} for t, date_map in rows]
     return jsonify({
-        "field": field,
+        "field": args["field"],
         "dates": all_dates,
         "data": table_data,
         "totalStocks": len(table_data),
     })
 
 
+def _export_response(args, fmt="csv", layout="wide", cursor=0, limit=None):
+    """分块流式响应；续传信息放在响应头 (X-Next-Cursor 缺省表示已导出到末尾)"""
+    from flask import Response, stream_with_context
+
+    sources = _get_fund_dirs(args["market"], args["report_type"])
+    plan = plan_export(sources, args["field"], tickers=args["tickers"], cursor=cursor, limit=limit)
+    mimetype, ext = EXPORT_FORMATS[fmt]
+    filename = f"slicer_{args['market']}_{args['report_type']}_{args['field']}"
+    if plan["cursor"] or plan["next_cursor"] is not None:
+        filename += f"_{plan['cursor']}-{plan['stop']}"
+    headers = {
+        "Content-Disposition": f"attachment; filename={filename}.{ext}",
+        "X-Total-Files": str(plan["total_files"]),
+        "X-Planned-Rows": str(plan["planned_rows"]),
+    }
+    if plan["next_cursor"] is not None:
+        headers["X-Next-Cursor"] = str(plan["next_cursor"])
+    chunks = stream_export(plan, args["field"], args["start"], args["end"], fmt=fmt, layout=layout)
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
+
 @app.route("/api/slicer/csv")
 def api_slicer_csv():
-    """导出切片数据为 CSV"""
+    """导出切片数据为 CSV (宽表，分批流式输出)"""
     from flask import Response
-    import io
 
-    market = request.args.get("market", "us")
-    report_type = request.args.get("type", "income")
-    field = request.args.get("field", "")
-    if not field:
+    args = _slicer_args()
+    if not args["field"]:
         return Response("Missing field", status=400)
+    try:
+        return _export_response(args)
+    except Exception as e:
+        return Response(str(e), status=500)
+
+
+@app.route("/api/slicer/export")
+def api_slicer_export():
+    """
+    大切片流式导出。
+    参数: 同 /api/slicer/extract，另有 format=csv|parquet|arrow, layout=wide|long,
+          limit=单次最多导出的原始行数 (上限 EXPORT_MAX_ROWS), cursor=上次响应头里的 X-Next-Cursor。
+    """
+    from flask import Response
 
-    # Reuse extraction logic
-    dirs = _get_fund_dirs(market, report_type)
-    rows = []
-    for d, pattern in dirs:
-        files = sorted(glob.glob(os.path.join(d, pattern)))
-        for f in files:
-            try:
-                df = pd.read_parquet(f)
-                if field not in df.columns:
-                    continue
-                basename = os.path.basename(f)
-                if market == 'us':
-                    ticker = basename.split('_')[0]
-                else:
-                    ticker = basename.replace('_fundamental.parquet', '')
-                series = df[field]
-                if isinstance(df.index, pd.DatetimeIndex):
-                    dates = df.index.strftime("%Y-%m-%d").tolist()
-                else:
-                    dates = [str(x) for x in df.index.tolist()]
-                values = pd.to_numeric(series, errors='coerce').fillna(0).tolist()
-                rows.append({"ticker": ticker, "dates": dates, "values": values})
-            except:
-                continue
-
-    all_dates = sorted(set(d for r in rows for d in r["dates"]), reverse=True)
-
-    # Build CSV
-    buf = io.StringIO()
-    buf.write("Ticker," + ",".join(all_dates) + "\n")
-    for r in rows:
-        date_map = dict(zip(r["dates"], r["values"]))
-        vals = [str(date_map.get(d, 0)) for d in all_dates]
-        buf.write(r["ticker"] + "," + ",".join(vals) + "\n")
-
-    csv_content = buf.getvalue()
-    filename = f"slicer_{market}_{report_type}_{field}.csv"
-    return Response(
-        csv_content,
-        mimetype="text/csv",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
+    args = _slicer_args()
+    fmt = request.args.get("format", "csv")
+    layout = request.args.get("layout", "wide")
+    if not args["field"]:
+        return Response("Missing field", status=400)
+    if fmt not in EXPORT_FORMATS or layout not in ("wide", "long"):
+        return Response(f"Unsupported format/layout: {fmt}/{layout}", status=400)
+    limit = min(max(1, request.args.get("limit", EXPORT_MAX_ROWS, type=int)), EXPORT_MAX_ROWS)
+    cursor = max(0, request.args.get("cursor", 0, type=int))
+    try:
+        return _export_response(args, fmt, layout, cursor, limit)
+    except Exception as e:
+        return Response(str(e), status=500)
 
 
 @app.route("/api/stats")
 def api_stats():
-    """数据统计"""
-    def count_files(d, pattern="*.parquet"):
-        if not os.path.exists(d): return 0
-        return len(glob.glob(os.path.join(d, pattern)))
-
-    cn_p = os.path.join(DATA_ROOT, 'cn', 'prices')
-    cn_f = os.path.join(DATA_ROOT, 'cn', 'fundamentals')
-    cn_f_legacy = os.path.join(LEGACY_DATA, 'fundamentals')
-    us_p = os.path.join(DATA_ROOT, 'us', 'prices')
-    us_p_legacy = os.path.join(LEGACY_DATA, 'us_prices')
-    us_f = os.path.join(DATA_ROOT, 'us', 'fundamentals')
-    us_f_legacy = os.path.join(LEGACY_DATA, 'us_fundamentals')
+    """数据统计 (来自内存索引，按索引版本缓存)"""
+    catalog = get_catalog()
+    count = catalog.count
 
     return jsonify({
-        "cn_prices": count_files(cn_p),
-        "cn_fundamentals": count_files(cn_f) + count_files(cn_f_legacy),
-        "us_prices": count_files(us_p) + count_files(us_p_legacy),
-        "us_fundamentals": count_files(us_f, "*_income*") + count_files(us_f_legacy, "*_income*"),
+        "cn_prices": count("", "cn/prices"),
+        "cn_fundamentals": count("", "cn/fundamentals") + count(LEGACY_LABEL, "fundamentals"),
+        "us_prices": count("", "us/prices") + count(LEGACY_LABEL, "us_prices"),
+        "us_fundamentals": count("", "us/fundamentals", "*_income*") + count(LEGACY_LABEL, "us_fundamentals", "*_income*"),
     })
 
 
@@ -427,55 +400,8 @@ def api_model_signals():
         return jsonify({"error": "Model or Features not found. Please train first."})
         
     try:
-        # Load model
-        with open(model_path, 'rb') as f:
-            model_data = pickle.load(f)
-        model = model_data['model']
-        valid_feats = model_data['features']
-        
-        # Load latest features
-        df = pd.read_parquet(features_path)
-        latest_date = df['report_date'].max()
-        df_latest = df[df['report_date'] == latest_date].copy()
-        
-        # Check if all features exist
-        for col in valid_feats:
-            if col not in df_latest.columns:
-                df_latest[col] = 0.0
-                
-        X = df_latest[valid_feats].fillna(0).values
-        preds = model.predict(X)
-        df_latest['score'] = preds
-        
-        # Sort by score
-        df_latest = df_latest.sort_values('score', ascending=False)
-        df_latest['rank'] = range(1, len(df_latest) + 1)
-        
-        # Merge basic fundamentals for filtering (PE, Mkt Cap, Sector)
-        base_cols = ['ticker', 'score', 'rank', 'mom_6m', 'vol_60d']
-        for col in valid_feats:
-            if col not in base_cols:
-                base_cols.append(col)
-                
-        out_df = df_latest[base_cols].copy()
-        
-        if os.path.exists(info_path):
-            info = pd.read_parquet(info_path)
-            # info contains: marketCap, trailingPE, forwardPE, priceToBook, sector, industry...
-            out_df = out_df.merge(info, on='ticker', how='left')
-            
-        out_df = out_df.fillna({
-            'trailingPE': -1, 'forwardPE': -1, 'priceToBook': -1, 'marketCap': 0, 'sector': 'Unknown'
-        })
-        
-        # Convert to records
-        results = out_df.to_dict(orient='records')
-        
-        return jsonify({
-            "report_date": str(latest_date)[:10],
-            "total_stocks": len(results),
-            "data": results
-        })
+        # 模型 / 最新特征截面 / 打分结果均常驻内存，文件 mtime 变化后自动重载
+        return jsonify(get_signal_service(model_path, features_path, info_path).signals())
     except Exception as e:
         return jsonify({"error": str(e)})
 
@@ -486,4 +412,5 @@ if __name__ == "__main__":
     print("  http://localhost:5000")
     print(f"  Data Root: {DATA_ROOT}")
     print("=" * 50)
+    get_catalog()
     app.run(debug=False, port=5000)
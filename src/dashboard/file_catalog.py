@@ -0,0 +1,331 @@
+"""
+file_catalog.py — 数据湖文件目录索引 (常驻内存 + 持久化 + 后台监视)
+=====================================================================
+职责：
+  1. 一次性扫描各数据根目录 (os.scandir，Windows 下 stat 随目录枚举免费返回)，
+     建立 {路径: (大小, mtime)} 与 目录 → 子项 的内存索引，并预聚合每个目录的递归文件数
+  2. 后台线程补齐 parquet 元数据 (行数 / 列名，只读文件尾部 footer，不读数据)
+  3. 索引持久化到 JSON (列名表去重存储)，重启后直接加载，再由后台增量校正
+  4. 监视线程：装有 watchdog 时文件系统事件立即唤醒重扫，否则按 poll_interval 轮询；
+     重扫只比对 (大小, mtime)，未变化的文件沿用已知元数据
+
+接口：
+  FileCatalog(roots, index_path).start()
+  catalog.children(label, rel_dir, offset, limit, depth) → (节点列表, 子项总数)
+  catalog.count(label, rel_dir, pattern)                → 目录下 (不递归) 匹配 pattern 的文件数
+  catalog.lookup(label, rel)                           → dict | None (单文件大小 / 行数 / 列名)
+
+说明：
+  roots 为 {标签: 绝对路径}，标签 "" 表示主数据根；树节点路径与 /api/tree 原有约定一致。
+  请求路径上只读内存快照 (整体替换，无锁读)，目录再大也只是切片操作。
+"""
+
+import os
+import json
+import fnmatch
+import threading
+import time
+
+INDEX_VERSION = 1
+FILE_SUFFIX = ".parquet"
+
+
+def size_str(size: int) -> str:
+    return f"{size/1024:.0f}KB" if size < 1048576 else f"{size/1048576:.1f}MB"
+
+
+def _join(rel: str, name: str) -> str:
+    return f"{rel}/{name}" if rel else name
+
+
+class FileEntry:
+    __slots__ = ("size", "mtime", "rows", "columns")
+
+    def __init__(self, size, mtime, rows=None, columns=None):
+        self.size = size
+        self.mtime = mtime
+        self.rows = rows
+        self.columns = columns
+
+
+class _Snapshot:
+    """一次完整扫描的只读结果：files / dirs 的键均为 (标签, 相对路径)"""
+
+    def __init__(self, files: dict, dirs: dict):
+        self.files = files                      # (label, rel) → FileEntry
+        self.dirs = dirs                        # (label, rel_dir) → 排序后的子项名
+        self.totals = {}                        # (label, rel_dir) → 递归文件数
+        for key in sorted(dirs, key=lambda k: -k[1].count("/") - (1 if k[1] else 0)):
+            label, rel = key
+            total = 0
+            for name in dirs[key]:
+                child = (label, _join(rel, name))
+                total += self.totals.get(child, 0) if child in dirs else 1
+            self.totals[key] = total
+
+
+class FileCatalog:
+    """数据湖文件索引；线程安全的读，写只发生在监视线程里"""
+
+    def __init__(self, roots: dict, index_path: str, poll_interval: float = 10.0, suffix: str = FILE_SUFFIX):
+        self.roots = dict(roots)
+        self.index_path = index_path
+        self.poll_interval = poll_interval
+        self.suffix = suffix
+        self.version = 0
+        self._snap = _Snapshot({}, {})
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._observer = None
+        self._count_cache = {}
+
+    # ── 生命周期 ──────────────────────────────────────────────
+    def start(self):
+        """加载持久化索引 (没有则同步扫描一次)，然后启动监视线程"""
+        if self._thread is not None:
+            return self
+        if not self._load():
+            self.refresh(metadata=False)
+        self._start_observer()
+        self._thread = threading.Thread(target=self._run, name="file-catalog", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._observer is not None:
+            self._observer.stop()
+
+    def invalidate(self):
+        """请求尽快重扫 (文件系统事件 / 外部写入后调用)"""
+        self._wake.set()
+
+    def _start_observer(self):
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            return
+
+        catalog = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                catalog.invalidate()
+
+        observer = Observer()
+        for root in self.roots.values():
+            if os.path.isdir(root):
+                observer.schedule(_Handler(), root, recursive=True)
+        observer.daemon = True
+        observer.start()
+        self._observer = observer
+        self.poll_interval = max(self.poll_interval, 300.0)   # 有事件驱动时轮询只作兜底
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[FileCatalog] 重扫失败: {e}")
+            self._wake.wait(self.poll_interval)
+            if self._wake.is_set():
+                self._wake.clear()
+                time.sleep(0.5)                 # 合并一批连续写入产生的事件
+
+    # ── 扫描 ──────────────────────────────────────────────────
+    def _scan(self) -> _Snapshot:
+        old = self._snap.files
+        files, dirs = {}, {}
+        for label, root in self.roots.items():
+            if not os.path.isdir(root):
+                continue
+            stack = [""]
+            while stack:
+                rel = stack.pop()
+                try:
+                    with os.scandir(os.path.join(root, rel) if rel else root) as it:
+                        entries = list(it)
+                except OSError:
+                    continue
+                names = []
+                for e in entries:
+                    if e.name.startswith("."):
+                        continue
+                    child = _join(rel, e.name)
+                    try:
+                        if e.is_dir():
+                            stack.append(child)
+                        elif e.name.endswith(self.suffix):
+                            st = e.stat()
+                            prev = old.get((label, child))
+                            if prev is not None and prev.size == st.st_size and prev.mtime == st.st_mtime_ns:
+                                files[(label, child)] = prev
+                            else:
+                                files[(label, child)] = FileEntry(st.st_size, st.st_mtime_ns)
+                        else:
+                            continue
+                    except OSError:
+                        continue
+                    names.append(e.name)
+                dirs[(label, rel)] = sorted(names)
+        return _Snapshot(files, dirs)
+
+    def refresh(self, metadata: bool = True) -> bool:
+        """重扫一遍；结构有变化时替换快照并持久化。metadata=True 时顺带补齐行数 / 列名"""
+        snap = self._scan()
+        old = self._snap
+        changed = snap.dirs != old.dirs or any(old.files.get(k) is not v for k, v in snap.files.items())
+        if changed:
+            self._snap = snap
+            self.version += 1
+            self._count_cache = {}
+        filled = self._fill_metadata(self._snap) if metadata else 0
+        if changed or filled:
+            self._save()
+        return changed
+
+    def _fill_metadata(self, snap: _Snapshot, batch: int = 500) -> int:
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            return 0
+        filled = 0
+        for (label, rel), entry in snap.files.items():
+            if entry.rows is not None:
+                continue
+            if self._stop.is_set() or snap is not self._snap:
+                break
+            try:
+                md = pq.read_metadata(os.path.join(self.roots[label], rel.replace("/", os.sep)))
+                entry.columns = list(md.schema.names)
+                entry.rows = md.num_rows
+            except Exception:
+                entry.rows, entry.columns = -1, []      # 损坏 / 正在写入：等文件变化后再读
+            filled += 1
+            if filled % batch == 0:
+                self._save()
+        return filled
+
+    # ── 持久化 ────────────────────────────────────────────────
+    def _save(self):
+        snap = self._snap
+        schemas, schema_ids, rows = [], {}, []
+        for (label, rel), e in snap.files.items():
+            sid = None
+            if e.columns is not None:
+                key = tuple(e.columns)
+                if key not in schema_ids:
+                    schema_ids[key] = len(schemas)
+                    schemas.append(e.columns)
+                sid = schema_ids[key]
+            rows.append([label, rel, e.size, e.mtime, e.rows, sid])
+        payload = {
+            "version": INDEX_VERSION,
+            "roots": self.roots,
+            "schemas": schemas,
+            "dirs": [[label, rel, names] for (label, rel), names in snap.dirs.items()],
+            "files": rows,
+        }
+        try:
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            tmp = self.index_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp, self.index_path)
+        except OSError as e:
+            print(f"[FileCatalog] 索引写入失败: {e}")
+
+    def _load(self) -> bool:
+        if not os.path.exists(self.index_path):
+            return False
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if payload.get("version") != INDEX_VERSION or payload.get("roots") != self.roots:
+            return False
+        schemas = payload["schemas"]
+        files = {
+            (label, rel): FileEntry(size, mtime, rows, None if sid is None else schemas[sid])
+            for label, rel, size, mtime, rows, sid in payload["files"]
+        }
+        dirs = {(label, rel): names for label, rel, names in payload["dirs"]}
+        self._snap = _Snapshot(files, dirs)
+        self.version += 1
+        return True
+
+    # ── 查询 (只读快照) ───────────────────────────────────────
+    def has_dir(self, label: str, rel: str = "") -> bool:
+        return (label, rel) in self._snap.dirs
+
+    def total_files(self, label: str, rel: str = "") -> int:
+        return self._snap.totals.get((label, rel), 0)
+
+    def node(self, label: str, rel: str, name: str, snap: _Snapshot = None) -> dict:
+        """单个树节点 (不含子项)；标签非空时目录路径带 "标签/" 前缀，文件路径保持相对其根目录"""
+        snap = snap or self._snap
+        key = (label, _join(rel, name))
+        if key in snap.dirs:
+            return {
+                "name": name,
+                "path": _join(label, key[1]),
+                "type": "dir",
+                "totalFiles": snap.totals.get(key, 0),
+                "childCount": len(snap.dirs[key]),
+            }
+        e = snap.files[key]
+        out = {"name": name, "path": key[1], "type": "file", "size": e.size, "sizeStr": size_str(e.size)}
+        if e.rows is not None and e.rows >= 0:
+            out["rows"] = e.rows
+        return out
+
+    def children(self, label: str, rel: str = "", offset: int = 0, limit: int = 200, depth: int = 1) -> tuple:
+        """
+        目录的直接子项 [offset, offset + limit) 及子项总数。
+        depth > 1 时为子目录内联前 limit 个子项 (children / truncated 字段)，其余留给前端按需展开。
+        """
+        snap = self._snap
+        names = snap.dirs.get((label, rel), [])
+        nodes = [self.node(label, rel, name, snap) for name in names[offset:offset + limit]]
+        if depth > 1:
+            for n in nodes:
+                if n["type"] == "dir":
+                    sub = n["path"][len(label) + 1:] if label else n["path"]
+                    n["children"], total = self.children(label, sub, 0, limit, depth - 1)
+                    n["truncated"] = total > limit
+        return nodes, len(names)
+
+    def count(self, label: str, rel: str, pattern: str = "*" + FILE_SUFFIX) -> int:
+        """目录下直接文件中匹配 pattern 的个数 (glob 语义，不递归)；按快照版本缓存"""
+        key = (self.version, label, rel, pattern)
+        if key not in self._count_cache:
+            snap = self._snap
+            self._count_cache[key] = sum(
+                1 for name in fnmatch.filter(snap.dirs.get((label, rel), []), pattern)
+                if (label, _join(rel, name)) in snap.files
+            )
+        return self._count_cache[key]
+
+    def lookup(self, label: str, rel: str):
+        e = self._snap.files.get((label, rel))
+        if e is None:
+            return None
+        return {"path": rel, "size": e.size, "mtime_ns": e.mtime, "rows": e.rows, "columns": e.columns}
+
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+    root = sys.argv[1] if len(sys.argv) > 1 else os.getcwd()
+    t0 = time.perf_counter()
+    cat = FileCatalog({"": root}, os.path.join(tempfile.mkdtemp(), "file_catalog.json"))
+    cat.refresh(metadata=False)
+    print(f"扫描 {root}: {len(cat._snap.files)} 个文件, {len(cat._snap.dirs)} 个目录, "
+          f"{1e3 * (time.perf_counter() - t0):.0f} ms")
+    t0 = time.perf_counter()
+    nodes, total = cat.children("", "", limit=50)
+    print(f"顶层 {total} 项, 查询 {1e3 * (time.perf_counter() - t0):.2f} ms")
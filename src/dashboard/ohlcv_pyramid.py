@@ -0,0 +1,249 @@
+"""
+ohlcv_pyramid.py — K 线多分辨率金字塔 + 视口降采样
+===================================================
+职责：
+  1. 价格 parquet 解码一次 → 日 / 周 / 月 三级 OHLCV 聚合 (open 首、high 最大、low 最小、close 末、volume 求和)，
+     连同各级 MA5 / MA20 一起常驻内存
+  2. 进程内 LRU (按 绝对路径 + mtime_ns + 文件大小 失效)，同一标的重复打开 / 缩放不再读盘
+  3. 按视口 [start, end] 与像素宽度返回有界点数：
+       freq="auto"  选区间内 bar 数不超过 width 的最细一级 (日 → 周 → 月)
+       仍超出时按 method 降采样：
+         "lttb"   Largest-Triangle-Three-Buckets，保留折线形状
+         "minmax" 每桶保留最高价与最低价所在的 bar，保留极值
+
+接口：
+  query(path, start=None, end=None, width=500, freq="auto", method="lttb") → dict (与 /api/candlestick 字段一致)
+  load_symbol(path)                                                       → Pyramid (带缓存)
+
+说明：
+  周 / 月 bar 的日期取桶内最后一个交易日 (真实存在的日期)；均线在所选级别的完整序列上计算后再按选中下标取值，
+  降采样不会改变均线口径。
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+FIELDS = ("open", "high", "low", "close", "volume")
+LEVELS = ("D", "W", "M")
+MAX_CACHED_SYMBOLS = 64
+
+_CACHE = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+class Level:
+    """单一分辨率的 OHLCV 列式数组 (dates 为 datetime64[D]，缺失值为 NaN)"""
+
+    def __init__(self, dates: np.ndarray, cols: dict):
+        self.dates = dates
+        self.cols = cols
+        close = pd.Series(cols["close"]) if "close" in cols else None
+        self.ma = {} if close is None else {
+            "ma5": close.rolling(5, min_periods=1).mean().to_numpy(),
+            "ma20": close.rolling(20, min_periods=1).mean().to_numpy(),
+        }
+
+    def __len__(self):
+        return len(self.dates)
+
+
+class Pyramid:
+    def __init__(self, daily: Level):
+        self.levels = {"D": daily}
+        if len(daily):
+            days = daily.dates.astype("datetime64[D]").astype(np.int64)
+            self.levels["W"] = _aggregate(daily, (days + 3) // 7)          # 1970-01-01 为周四，+3 后按周一切分
+            self.levels["M"] = _aggregate(daily, daily.dates.astype("datetime64[M]").astype(np.int64))
+        else:
+            self.levels["W"] = self.levels["M"] = daily
+
+    @property
+    def fields(self):
+        return [f for f in FIELDS if f in self.levels["D"].cols]
+
+
+def _aggregate(daily: Level, keys: np.ndarray) -> Level:
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)] - 1
+    cols = {}
+    for f, arr in daily.cols.items():
+        if f == "open":
+            cols[f] = arr[starts]
+        elif f == "close":
+            cols[f] = arr[ends]
+        elif f == "high":
+            cols[f] = np.fmax.reduceat(arr, starts)
+        elif f == "low":
+            cols[f] = np.fmin.reduceat(arr, starts)
+        else:
+            cols[f] = np.add.reduceat(np.nan_to_num(arr), starts)
+    return Level(daily.dates[ends], cols)
+
+
+def _decode(path: str) -> Pyramid:
+    df = pd.read_parquet(path)
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = [col[0] for col in df.columns]
+    df = df.loc[:, ~df.columns.duplicated()]
+    if not isinstance(df.index, pd.DatetimeIndex):
+        date_col = next((c for c in df.columns if str(c).lower() == "date"), None)
+        df.index = pd.to_datetime(df[date_col] if date_col is not None else df.index, errors="coerce")
+    df = df[df.index.notna()]
+    df = df[~df.index.duplicated(keep="last")].sort_index()
+
+    # Map column names (case insensitive)
+    cols = {}
+    for c in df.columns:
+        cl = str(c).lower()
+        if cl in FIELDS and cl not in cols:
+            cols[cl] = pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=np.float64)
+    if "close" not in cols:
+        raise ValueError("No OHLC columns")
+    return Pyramid(Level(df.index.values.astype("datetime64[D]"), cols))
+
+
+def load_symbol(path: str) -> Pyramid:
+    """解码后的金字塔；key = (绝对路径, mtime_ns, 大小)，文件被重写后自动失效"""
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    key = (path, st.st_mtime_ns, st.st_size)
+    with _CACHE_LOCK:
+        if key in _CACHE:
+            _CACHE.move_to_end(key)
+            return _CACHE[key]
+
+    pyramid = _decode(path)
+
+    with _CACHE_LOCK:
+        for stale in [k for k in _CACHE if k[0] == path]:
+            del _CACHE[stale]
+        _CACHE[key] = pyramid
+        while len(_CACHE) > MAX_CACHED_SYMBOLS:
+            _CACHE.popitem(last=False)
+    return pyramid
+
+
+def clear_cache():
+    with _CACHE_LOCK:
+        _CACHE.clear()
+
+
+# ── 降采样 ───────────────────────────────────────────────────
+def lttb_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets：返回保留点的下标 (含首尾)，x 轴取等距下标"""
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.linspace(0, n - 1, max(n_out, 1)).astype(np.int64)
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)       # 中间 n_out-2 个桶的边界
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = hi, (edges[i + 2] if i + 2 < len(edges) else n)
+        cx, cy = 0.5 * (nlo + nhi - 1), y[nlo:nhi].mean()               # 下一桶质心
+        xs = np.arange(lo, hi)
+        area = np.abs((a - cx) * (y[lo:hi] - y[a]) - (a - xs) * (cy - y[a]))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+def minmax_indices(high: np.ndarray, low: np.ndarray, n_out: int) -> np.ndarray:
+    """n_out/2 个等长桶，每桶保留最高价 / 最低价所在 bar (按时间顺序)；首尾 bar 总是保留"""
+    n = len(high)
+    if n_out >= n:
+        return np.arange(n)
+    buckets = max(1, (n_out - 2) // 2)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    hi = np.nan_to_num(high, nan=-np.inf)
+    lo = np.nan_to_num(low, nan=np.inf)
+    keep = [0, n - 1]
+    for s, e in zip(edges[:-1], edges[1:]):
+        if e > s:
+            keep.append(s + int(hi[s:e].argmax()))
+            keep.append(s + int(lo[s:e].argmin()))
+    return np.unique(keep)
+
+
+# ── 查询 ─────────────────────────────────────────────────────
+def _day(d):
+    return np.datetime64(pd.Timestamp(d).date(), "D")
+
+
+def query(path: str, start=None, end=None, width: int = 500, freq: str = "auto", method: str = "lttb") -> dict:
+    pyramid = load_symbol(path)
+    width = max(10, int(width))
+
+    def window(level: Level):
+        lo = 0 if not start else int(np.searchsorted(level.dates, _day(start), side="left"))
+        hi = len(level) if not end else int(np.searchsorted(level.dates, _day(end), side="right"))
+        return lo, max(lo, hi)
+
+    if freq == "auto":
+        for freq in LEVELS:
+            lo, hi = window(pyramid.levels[freq])
+            if hi - lo <= width:
+                break
+    level = pyramid.levels[freq]
+    lo, hi = window(level)
+
+    idx = np.arange(lo, hi)
+    downsampled = hi - lo > width
+    if downsampled:
+        if method == "minmax" and "high" in level.cols and "low" in level.cols:
+            idx = lo + minmax_indices(level.cols["high"][lo:hi], level.cols["low"][lo:hi], width)
+        else:
+            method = "lttb"
+            idx = lo + lttb_indices(level.cols["close"][lo:hi], width)
+
+    daily = pyramid.levels["D"]
+    result = {
+        "dates": np.datetime_as_string(level.dates[idx], unit="D").tolist(),
+        "freq": freq,
+        "method": method if downsampled else None,
+        "total": int(hi - lo),
+        "points": int(len(idx)),
+        "range": [str(daily.dates[0]), str(daily.dates[-1])] if len(daily) else None,
+    }
+    for f in pyramid.fields:
+        result[f] = np.nan_to_num(level.cols[f][idx]).tolist()
+    for k, arr in level.ma.items():
+        result[k] = np.nan_to_num(arr[idx]).tolist()
+    return result
+
+
+if __name__ == "__main__":
+    # 合成数据自检：聚合与 pandas resample 一致、点数有界
+    import tempfile
+    import time
+
+    rng = np.random.default_rng(0)
+    idx = pd.bdate_range("1990-01-01", periods=9000)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(idx))))
+    df = pd.DataFrame({"Open": close * 0.99, "High": close * 1.02, "Low": close * 0.97,
+                       "Close": close, "Volume": rng.integers(1, 1000, len(idx)).astype(float)}, index=idx)
+    path = os.path.join(tempfile.mkdtemp(), "TEST.parquet")
+    df.to_parquet(path)
+
+    ref = df.resample("ME").agg({"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"})
+    m = load_symbol(path).levels["M"]
+    assert np.allclose(m.cols["high"], ref["High"]) and np.allclose(m.cols["volume"], ref["Volume"])
+    assert np.allclose(m.cols["close"], ref["Close"]) and np.allclose(m.cols["open"], ref["Open"])
+    refw = df.resample("W-SUN").agg({"Low": "min", "Close": "last"})
+    w = load_symbol(path).levels["W"]
+    assert np.allclose(w.cols["low"], refw["Low"]) and np.allclose(w.cols["close"], refw["Close"])
+
+    for kw in ({}, {"freq": "D"}, {"freq": "D", "method": "minmax"}, {"start": "2010-01-01", "end": "2011-06-30"}):
+        t0 = time.perf_counter()
+        out = query(path, width=400, **kw)
+        assert out["points"] <= 400 and len(out["dates"]) == len(out["close"])
+        print(kw, out["freq"], out["method"], out["total"], "->", out["points"],
+              f"{1e3 * (time.perf_counter() - t0):.2f} ms")
@@ -0,0 +1,122 @@
+"""
+signal_service.py — /api/model/signals 常驻打分服务
+====================================================
+职责：
+  1. 模型：复用 scoring.load_model 的进程内 LRU (按 mtime 失效，同一模型全进程只 unpickle 一次)
+  2. 特征：只读最新 report_date 的截面 —— 先只读 report_date 一列求最大值，再按该值过滤读取
+     (pyarrow dataset 过滤，按 row group 统计跳过旧日期)，按 (路径, mtime, 大小) 缓存
+  3. 预测结果按 (模型版本, 特征文件版本, 基本面文件版本, 截面日期) 记忆，命中时只是一次字典查找
+  4. 构建过程持锁 (single-flight)：并发请求同时未命中时只有一个线程读盘 / 预测，其余等待后共享同一份结果
+
+接口：
+  SignalService(model_path, features_path, info_path).signals() → dict (/api/model/signals 的响应体)
+"""
+
+import os
+import threading
+
+import pandas as pd
+
+from alpharanker.model.scoring import load_model, feature_matrix
+
+MAX_MEMO = 4
+
+
+def _stamp(path):
+    """(路径, mtime_ns, 大小)；文件不存在时为 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+
+def read_latest_slice(path, date_col="report_date"):
+    """只读最新一期截面：第一遍只读 date_col 一列，第二遍按最大日期过滤读取"""
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(path, format="parquet")
+    latest = pc.max(dataset.to_table(columns=[date_col])[date_col])
+    table = dataset.to_table(filter=ds.field(date_col) == latest)
+    return latest.as_py(), table.to_pandas()
+
+
+class SignalService:
+    """模型 + 最新特征截面 + 打分结果 的常驻缓存"""
+
+    def __init__(self, model_path, features_path, info_path=None):
+        self.model_path = model_path
+        self.features_path = features_path
+        self.info_path = info_path
+        self._lock = threading.Lock()
+        self._features = (None, None, None)     # (stamp, latest_date, df_latest)
+        self._info = (None, None)               # (stamp, df)
+        self._memo = {}
+
+    def _latest_features(self):
+        stamp = _stamp(self.features_path)
+        if self._features[0] != stamp:
+            latest_date, df_latest = read_latest_slice(self.features_path)
+            self._features = (stamp, latest_date, df_latest)
+        return self._features
+
+    def _stock_info(self):
+        stamp = _stamp(self.info_path) if self.info_path else None
+        if stamp is None:
+            return None, None
+        if self._info[0] != stamp:
+            self._info = (stamp, pd.read_parquet(self.info_path))
+        return self._info
+
+    def signals(self) -> dict:
+        with self._lock:
+            model = load_model(self.model_path)
+            f_stamp, latest_date, df_latest = self._latest_features()
+            i_stamp, info = self._stock_info()
+            key = (model.path, model.mtime_ns, id(model.compiled), f_stamp, i_stamp, str(latest_date))
+            if key not in self._memo:
+                self._memo[key] = self._score(model, latest_date, df_latest, info)
+                while len(self._memo) > MAX_MEMO:
+                    self._memo.pop(next(iter(self._memo)))
+            return self._memo[key]
+
+    @staticmethod
+    def _score(model, latest_date, df_latest, info) -> dict:
+        valid_feats = model.features
+        df_latest = df_latest.copy()
+
+        # Check if all features exist
+        for col in valid_feats:
+            if col not in df_latest.columns:
+                df_latest[col] = 0.0
+
+        df_latest['score'] = model.predict(feature_matrix(df_latest, valid_feats, fill_value=0.0))
+
+        # Sort by score
+        df_latest = df_latest.sort_values('score', ascending=False)
+        df_latest['rank'] = range(1, len(df_latest) + 1)
+
+        # Merge basic fundamentals for filtering (PE, Mkt Cap, Sector)
+        base_cols = ['ticker', 'score', 'rank', 'mom_6m', 'vol_60d']
+        for col in valid_feats:
+            if col not in base_cols:
+                base_cols.append(col)
+
+        out_df = df_latest[base_cols].copy()
+
+        if info is not None:
+            # info contains: marketCap, trailingPE, forwardPE, priceToBook, sector, industry...
+            out_df = out_df.merge(info, on='ticker', how='left')
+
+        out_df = out_df.fillna({
+            'trailingPE': -1, 'forwardPE': -1, 'priceToBook': -1, 'marketCap': 0, 'sector': 'Unknown'
+        })
+
+        # Convert to records
+        results = out_df.to_dict(orient='records')
+        return {
+            "report_date": str(latest_date)[:10],
+            "total_stocks": len(results),
+            "data": results
+        }
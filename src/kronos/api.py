@@ -7,8 +7,14 @@ Kronos 本地预测 API
 用法：
     from kronos.api import predict_market_trend
     prediction_df = predict_market_trend(historical_df, pred_len=30)
+
+    # 完整采样路径 (情景分析用)，一批标的一次推理
+    from kronos.api import predict_paths
+    scen = predict_paths({"AAPL": df_aapl, "KO": df_ko}, pred_len=30, n_samples=64)
+    scen["paths"].shape   # [标的 × 样本 × 步长 × OHLCVA]
 """
 
+import os
 import pandas as pd
 import numpy as np
 from datetime import timedelta
@@ -21,6 +27,22 @@ warnings.filterwarnings('ignore', category=UserWarning)
 # 全局缓存储存实例化后的模型，避免重复加载
 _kronos_predictor = None
 
+# predict_paths 输出张量最后一维的字段顺序
+PATH_FIELDS = ['open', 'high', 'low', 'close', 'volume', 'amount']
+
+# 本地权重目录 (官方仓库：NeoQuasar/Kronos-Tokenizer-2k + NeoQuasar/Kronos-mini)
+KRONOS_TOKENIZER_PATH = "C:/Users/lbw15/Desktop/Dev_Workspace/models/kronos/tokenizer"
+KRONOS_MODEL_PATH = "C:/Users/lbw15/Desktop/Dev_Workspace/models/kronos/model"
+KRONOS_MAX_CONTEXT = 512
+
+# predict_market_trend 自适应集成采样：先跑 ENSEMBLE_INITIAL 轮，
+# 若 Z 落在决策边界 ±BOUNDARY_EPSILON 的纠结区间内，追加 ENSEMBLE_EXTRA 轮
+ENSEMBLE_INITIAL = 3
+ENSEMBLE_EXTRA = 2
+Z_BOUNDARIES = (0.5, 1.0, 1.5)
+BOUNDARY_EPSILON = 0.1
+BOUNDARY_NOISE_STD = 0.0309    # 预采样边界判定用的噪声估计
+
 class StatisticalPredictor:
     """
     一个基于线性趋势和滚动波动率的纯量化预测平替类。
@@ -62,6 +84,32 @@ class StatisticalPredictor:
         
         return pd.DataFrame(results, index=y_timestamp)
 
+    def predict_paths(self, df_list, x_timestamp_list, y_timestamp_list, pred_len, T=1.0, top_k=0, top_p=0.9,
+                      sample_count=1, verbose=False):
+        """
+        与 KronosPredictor.predict_paths 同接口：[B, sample_count, pred_len, 6]，
+        每条路径 = 线性趋势 + 独立噪音 (与 predict 单次采样同分布)。
+        """
+        out = np.zeros((len(df_list), sample_count, pred_len, len(PATH_FIELDS)))
+        for b, df in enumerate(df_list):
+            window = min(len(df), 20)
+            recent_df = df.iloc[-window:]
+            x = np.arange(window)
+            future_x = np.arange(window, window + pred_len)
+            for j, col in enumerate(self.price_cols):
+                if col not in df.columns:
+                    continue
+                y = recent_df[col].values
+                slope, intercept = np.polyfit(x, y, 1)
+                volatility = recent_df[col].pct_change().std()
+                if np.isnan(volatility): volatility = 0.01
+                noise = np.random.normal(0, volatility * recent_df[col].iloc[-1] * 0.3, (sample_count, pred_len))
+                out[b, :, :, j] = intercept + slope * future_x + noise
+            avg_vol = df[self.vol_col].mean() if self.vol_col in df.columns else 0.0
+            out[b, :, :, 4] = avg_vol
+            out[b, :, :, 5] = avg_vol * out[b, :, :1, 3]
+        return out
+
 def _get_predictor():
     """懒加载 KronosPredictor 或 StatisticalPredictor 实例"""
     global _kronos_predictor
@@ -72,10 +120,9 @@ def _get_predictor():
             print("[Kronos] Initializing prediction model (this might take a few seconds)...")
             
             try:
-                # 官方仓库：NeoQuasar/Kronos-Tokenizer-2k + NeoQuasar/Kronos-mini
-                tokenizer = KronosTokenizer.from_pretrained("C:/Users/lbw15/Desktop/Dev_Workspace/models/kronos/tokenizer")
-                model = Kronos.from_pretrained("C:/Users/lbw15/Desktop/Dev_Workspace/models/kronos/model")
-                _kronos_predictor = KronosPredictor(model, tokenizer, device="cpu", max_context=512)
+                tokenizer = KronosTokenizer.from_pretrained(KRONOS_TOKENIZER_PATH)
+                model = Kronos.from_pretrained(KRONOS_MODEL_PATH)
+                _kronos_predictor = KronosPredictor(model, tokenizer, device="cpu", max_context=KRONOS_MAX_CONTEXT)
                 print("[Kronos] Real model loaded successfully! [Mode: Kronos-mini on CPU]")
             except Exception as e:
                 print(f"[Kronos] Load failed: {e}")
@@ -90,14 +137,54 @@ def _get_predictor():
     return _kronos_predictor
 
 
+def model_fingerprint() -> dict:
+    """
+    权重目录的身份：路径 + 目录下各文件的 (大小, 修改时间)，不加载模型。
+    目录不存在时记为 None —— 此时 _get_predictor 会退回 StatisticalPredictor。
+    """
+    def _files(path):
+        if not os.path.isdir(path):
+            return None
+        return {name: [st.st_size, st.st_mtime_ns]
+                for name in sorted(os.listdir(path))
+                for st in [os.stat(os.path.join(path, name))]}
+
+    return {"tokenizer": KRONOS_TOKENIZER_PATH, "tokenizer_files": _files(KRONOS_TOKENIZER_PATH),
+            "model": KRONOS_MODEL_PATH, "model_files": _files(KRONOS_MODEL_PATH),
+            "max_context": KRONOS_MAX_CONTEXT}
+
+
+def _future_timestamps(df: pd.DataFrame, pred_len: int, exchange: str = None) -> pd.DatetimeIndex:
+    """
+    预测区间的时间戳：按交易所日历取最后一根 K 线之后的 pred_len 个交易日，
+    使 Kronos 的时间特征不落在节假日上。未指定交易所时按历史 K 线推断
+    (A 股历史中必然出现 NYSE 节假日当天的 K 线)；日历不可用时退回 freq='B'。
+    """
+    last_date = df.index[-1]
+    try:
+        from core.trading_calendar import get_calendar, future_trading_index
+        if exchange is None:
+            nyse = get_calendar("NYSE")
+            hist = df.index[df.index.dayofweek < 5]
+            exchange = "SSE" if (~nyse.is_trading_days(hist)).any() else "NYSE"
+        return future_trading_index(last_date, pred_len, exchange)
+    except Exception as e:
+        print(f"[Kronos] Trading calendar unavailable ({e}), falling back to business days")
+        return pd.date_range(start=last_date + timedelta(days=1), periods=pred_len, freq='B')
+
+
 def predict_market_trend(
     df: pd.DataFrame, 
     pred_len: int = 30,
     temperature: float = 1.0,
     top_p: float = 0.9,
-    sample_count: int = 1
+    sample_count: int = 1,
+    exchange: str = None
 ) -> pd.DataFrame:
-    """接收历史 K 线数据，输出未来预测走势。"""
+    """
+    接收历史 K 线数据，输出未来预测走势。
+    exchange: "SSE" / "SZSE" / "NYSE"，决定预测区间时间戳所用的交易日历；为空时自动推断。
+    """
     
     if df.empty:
         raise ValueError("Historical data is empty.")
@@ -112,7 +199,7 @@ def predict_market_trend(
     x_timestamp_series = pd.Series(df.index, name='date')
     
     last_date = df.index[-1]
-    y_timestamp_index = pd.date_range(start=last_date + timedelta(days=1), periods=pred_len, freq='B')
+    y_timestamp_index = _future_timestamps(df, pred_len, exchange)
     y_timestamp_series = pd.Series(y_timestamp_index, name='date')
     
     # 准备传给模型的 DF：重置索引并生成 'date' 列
@@ -121,12 +208,12 @@ def predict_market_trend(
         df_for_model = df_for_model.reset_index().rename(columns={df.index.name if df.index.name else 'index': 'date'})
 
     # --- V13.0+ 自适应 Ensemble 采样 (Boundary-Aware) ---
-    # 先跑 3 轮，若结果 Z 落在决策边界 ±0.1 的纠结区间内，追加 2 轮精准采样
-    initial_count = 3
+    # 先跑 ENSEMBLE_INITIAL 轮，若结果 Z 落在决策边界的纠结区间内，追加 ENSEMBLE_EXTRA 轮精准采样
+    initial_count = ENSEMBLE_INITIAL
     valid_predictions = []
-    boundaries = [0.5, 1.0, 1.5]  # Z-Score 决策边界
-    epsilon = 0.1                  # 纠结区间宽度
-    noise_std = 0.0309             # 预采样边界判定用的噪声估计
+    boundaries = Z_BOUNDARIES        # Z-Score 决策边界
+    epsilon = BOUNDARY_EPSILON       # 纠结区间宽度
+    noise_std = BOUNDARY_NOISE_STD
     
     print(f"[Kronos] Predicting next {pred_len} steps from {last_date.date()} [Mode: Adaptive Ensemble]")
     
@@ -164,9 +251,9 @@ def predict_market_trend(
     near_boundary = any(abs(z_3 - b) < epsilon for b in boundaries)
     
     if near_boundary and len(valid_predictions) == initial_count:
-        print(f"[Kronos] Boundary detected (Z={z_3:.2f}). Running 2 additional samples for precision...")
-        for i in range(2):
-            print(f"  Extra Sampling {i+4}/5...")
+        print(f"[Kronos] Boundary detected (Z={z_3:.2f}). Running {ENSEMBLE_EXTRA} additional samples for precision...")
+        for i in range(ENSEMBLE_EXTRA):
+            print(f"  Extra Sampling {initial_count + i + 1}/{initial_count + ENSEMBLE_EXTRA}...")
             try:
                 sample_df = predictor.predict(
                     df=df_for_model.set_index('date'), 
@@ -225,3 +312,92 @@ def predict_market_trend(
     print(f"         Mean Return: {mean_return:.2%}, Std: {std_return:.2%}, Range: {predicted_range_pct:.2%}")
     
     return prediction_df
+
+
+def _model_input(df: pd.DataFrame):
+    """predict_market_trend 同口径的模型输入：(去索引的 df, x 时间戳 Series)"""
+    if not isinstance(df.index, pd.DatetimeIndex):
+        df = df.copy()
+        df.index = pd.to_datetime(df.index)
+    df_for_model = df.copy()
+    if 'date' not in df_for_model.columns:
+        df_for_model = df_for_model.reset_index().rename(columns={df.index.name if df.index.name else 'index': 'date'})
+    return df, df_for_model.set_index('date'), pd.Series(df.index, name='date')
+
+
+def predict_paths(
+    histories: dict,
+    pred_len: int = 30,
+    n_samples: int = 32,
+    temperature: float = 1.0,
+    top_p: float = 0.9,
+    exchange=None,
+    max_batch: int = 256,
+) -> dict:
+    """
+    对一批标的输出 Kronos 的完整采样路径 (不做集成平均)。
+    histories: {ticker: 历史 K 线 DataFrame}；exchange 为字符串 (全体共用) / {ticker: 交易所} / None (自动推断)。
+    上下文长度相同的标的合并为一次自回归推理，每批 标的数 × n_samples 不超过 max_batch。
+
+    返回:
+        tickers    : 成功采样的标的 (顺序与 paths 第 0 维一致)
+        fields     : PATH_FIELDS
+        paths      : ndarray [标的 × n_samples × pred_len × 6]
+        last_close : ndarray [标的]，各标的历史最后一根 K 线收盘价 (情景收益的基准)
+        timestamps : {ticker: 预测区间 DatetimeIndex}
+        errors     : {ticker: 失败原因}
+    """
+    predictor = _get_predictor()
+    prepared, timestamps, errors = {}, {}, {}
+    for ticker, df in histories.items():
+        if df is None or df.empty:
+            errors[ticker] = "Historical data is empty."
+            continue
+        ex = exchange.get(ticker) if isinstance(exchange, dict) else exchange
+        df, model_df, x_ts = _model_input(df)
+        timestamps[ticker] = _future_timestamps(df, pred_len, ex)
+        prepared[ticker] = (model_df, x_ts, pd.Series(timestamps[ticker], name='date'), float(df['close'].iloc[-1]))
+
+    # 按上下文长度分组，组内再按 max_batch 切块
+    groups: dict[int, list] = {}
+    for ticker, item in prepared.items():
+        groups.setdefault(len(item[0]), []).append(ticker)
+    chunk = max(1, max_batch // max(1, n_samples))
+
+    print(f"[Kronos] Sampling {n_samples} paths x {pred_len} steps for {len(prepared)} tickers "
+          f"({len(groups)} context-length groups)")
+    sampled = {}
+    for members in groups.values():
+        for i in range(0, len(members), chunk):
+            batch = members[i:i + chunk]
+            try:
+                if hasattr(predictor, "predict_paths"):
+                    arr = predictor.predict_paths(
+                        [prepared[t][0] for t in batch], [prepared[t][1] for t in batch],
+                        [prepared[t][2] for t in batch], pred_len=pred_len, T=temperature, top_p=top_p,
+                        sample_count=n_samples, verbose=False,
+                    )
+                else:
+                    arr = np.stack([
+                        np.stack([predictor.predict(df=prepared[t][0], x_timestamp=prepared[t][1],
+                                                    y_timestamp=prepared[t][2], pred_len=pred_len, T=temperature,
+                                                    top_p=top_p, sample_count=1, verbose=False)[PATH_FIELDS].values
+                                  for _ in range(n_samples)])
+                        for t in batch
+                    ])
+                for t, a in zip(batch, np.asarray(arr, dtype=np.float64)):
+                    sampled[t] = a
+            except Exception as e:
+                print(f"  ❌ Path sampling error ({', '.join(batch)}): {e}")
+                errors.update({t: str(e) for t in batch})
+
+    tickers = [t for t in histories if t in sampled]
+    return {
+        "tickers": tickers,
+        "fields": list(PATH_FIELDS),
+        "paths": np.stack([sampled[t] for t in tickers]) if tickers
+                 else np.zeros((0, n_samples, pred_len, len(PATH_FIELDS))),
+        "last_close": np.array([prepared[t][3] for t in tickers], dtype=np.float64),
+        "timestamps": {t: timestamps[t] for t in tickers},
+        "errors": errors,
+    }
@@ -384,7 +384,7 @@ def sample_from_logits(logits, temperature=1.0, top_k=None, top_p=None, sample_l
     return x
 
 
-def auto_regressive_inference(tokenizer, model, x, x_stamp, y_stamp, max_context, pred_len, clip=5, T=1.0, top_k=0, top_p=0.99, sample_count=5, verbose=False):
+def auto_regressive_inference(tokenizer, model, x, x_stamp, y_stamp, max_context, pred_len, clip=5, T=1.0, top_k=0, top_p=0.99, sample_count=5, verbose=False, reduce=True):
     with torch.no_grad():
         x = torch.clip(x, -clip, clip)
 
@@ -462,7 +462,8 @@ def auto_regressive_inference(tokenizer, model, x, x_stamp, y_stamp, max_context
         z = tokenizer.decode(input_tokens, half=True)
         z = z.reshape(-1, sample_count, z.size(1), z.size(2))
         preds = z.cpu().numpy()
-        preds = np.mean(preds, axis=1)
+        if reduce:
+            preds = np.mean(preds, axis=1)
 
         return preds
 
@@ -503,15 +504,15 @@ class KronosPredictor:
         self.tokenizer = self.tokenizer.to(self.device)
         self.model = self.model.to(self.device)
 
-    def generate(self, x, x_stamp, y_stamp, pred_len, T, top_k, top_p, sample_count, verbose):
+    def generate(self, x, x_stamp, y_stamp, pred_len, T, top_k, top_p, sample_count, verbose, reduce=True):
 
         x_tensor = torch.from_numpy(np.array(x).astype(np.float32)).to(self.device)
         x_stamp_tensor = torch.from_numpy(np.array(x_stamp).astype(np.float32)).to(self.device)
         y_stamp_tensor = torch.from_numpy(np.array(y_stamp).astype(np.float32)).to(self.device)
 
         preds = auto_regressive_inference(self.tokenizer, self.model, x_tensor, x_stamp_tensor, y_stamp_tensor, self.max_context, pred_len,
-                                          self.clip, T, top_k, top_p, sample_count, verbose)
-        preds = preds[:, -pred_len:, :]
+                                          self.clip, T, top_k, top_p, sample_count, verbose, reduce)
+        preds = preds[..., -pred_len:, :]
         return preds
 
     def predict(self, df, x_timestamp, y_timestamp, pred_len, T=1.0, top_k=0, top_p=0.9, sample_count=1, verbose=True):
@@ -555,3 +556,39 @@ class KronosPredictor:
 
         pred_df = pd.DataFrame(preds, columns=self.price_cols + [self.vol_col, self.amt_vol], index=y_timestamp)
         return pred_df
+
+    def predict_paths(self, df_list, x_timestamp_list, y_timestamp_list, pred_len, T=1.0, top_k=0, top_p=0.9, sample_count=1, verbose=False):
+        """
+        Batched multi-path sampling: one autoregressive pass over len(df_list) series x sample_count paths.
+        All series must share the same context length. Returns [B, sample_count, pred_len, 6] in price units
+        (columns: price_cols + [volume, amount]), without averaging across samples.
+        """
+        xs, x_stamps, y_stamps, means, stds = [], [], [], [], []
+        for df, x_timestamp, y_timestamp in zip(df_list, x_timestamp_list, y_timestamp_list):
+            if not all(col in df.columns for col in self.price_cols):
+                raise ValueError(f"Price columns {self.price_cols} not found in DataFrame.")
+            df = df.copy()
+            if self.vol_col not in df.columns:
+                df[self.vol_col] = 0.0
+                df[self.amt_vol] = 0.0
+            if self.amt_vol not in df.columns and self.vol_col in df.columns:
+                df[self.amt_vol] = df[self.vol_col] * df[self.price_cols].mean(axis=1)
+            if df[self.price_cols + [self.vol_col, self.amt_vol]].isnull().values.any():
+                raise ValueError("Input DataFrame contains NaN values in price or volume columns.")
+
+            x = df[self.price_cols + [self.vol_col, self.amt_vol]].values.astype(np.float32)
+            x_mean, x_std = np.mean(x, axis=0), np.std(x, axis=0)
+            xs.append(np.clip((x - x_mean) / (x_std + 1e-5), -self.clip, self.clip))
+            x_stamps.append(calc_time_stamps(x_timestamp).values.astype(np.float32))
+            y_stamps.append(calc_time_stamps(y_timestamp).values.astype(np.float32))
+            means.append(x_mean)
+            stds.append(x_std)
+
+        if len({len(x) for x in xs}) > 1:
+            raise ValueError("predict_paths requires equal context lengths across the batch.")
+
+        preds = self.generate(np.stack(xs), np.stack(x_stamps), np.stack(y_stamps), pred_len, T, top_k, top_p,
+                              sample_count, verbose, reduce=False)
+        means = np.stack(means)[:, None, None, :]
+        stds = np.stack(stds)[:, None, None, :]
+        return preds * (stds + 1e-5) + means
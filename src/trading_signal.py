@@ -8,6 +8,18 @@ from core.multi_factor.factor_extractor import extract_raw_factors
 from core.multi_factor.scoring_engine import ScoringEngine
 from core.factor_engine import FactorEngine
 
+# generate_signal 的门控 / 仓位阈值 (回测结果缓存以此做 config key 的一部分)
+SIGNAL_THRESHOLDS = {
+    "trend_z": 2.0,               # |regime_strength| 超过该值且 uncertainty 足够低时判为强趋势
+    "trend_max_uncertainty": 0.05,
+    "high_vol_uncertainty": 0.06, # uncertainty 超过该值判为高波动，关闭门控
+    "vol_discount_free": 0.03,    # uncertainty 低于该值不打折
+    "vol_discount_slope": 10.0,   # 折扣 = exp(-slope · (uncertainty - free))
+    "gate_off_scale": 0.3,        # 门控关闭时的强度倍数
+    "ranging_scale": 0.7,         # 震荡态的强度倍数
+    "sentiment_weight": 0.3,
+}
+
 def get_llm_adjustments(ticker: str) -> Tuple[float, float]:
     """
     [Phase 2 留白]
@@ -44,13 +56,14 @@ def generate_signal(ticker: str, as_of_date: str = None, ext_sentiment: float =
     # 2. Kronos 不再决定方向 —— 仅输出市场机制判断和波动门控
     # regime: STRONG_TREND_UP / STRONG_TREND_DOWN / RANGING / HIGH_VOL
     # kronos_gate: True = 当前势能贸易，False = 认为情局不明画，建议谨慎
-    if abs(regime_strength) > 2.0 and uncertainty < 0.05:
+    th = SIGNAL_THRESHOLDS
+    if abs(regime_strength) > th["trend_z"] and uncertainty < th["trend_max_uncertainty"]:
         if regime_strength > 0:
             regime = "STRONG_TREND_UP"
         else:
             regime = "STRONG_TREND_DOWN"
         kronos_gate = True   # 高确信度趋势，允许信号执行
-    elif uncertainty > 0.06:
+    elif uncertainty > th["high_vol_uncertainty"]:
         regime = "HIGH_VOL"      # 波动过大，谨慎
         kronos_gate = False
     else:
@@ -69,17 +82,17 @@ def generate_signal(ticker: str, as_of_date: str = None, ext_sentiment: float =
     # 4. 基于波动的资金管控层 —— Kronos 作为择时门控
     # base_kronos_gate: Kronos 火力强度 tanh(|z|) 乘以波动折扣
     base_momentum_strength = math.tanh(abs(regime_strength))
-    volatility_discount_factor = math.exp(-10.0 * max(0, uncertainty - 0.03))
+    volatility_discount_factor = math.exp(-th["vol_discount_slope"] * max(0, uncertainty - th["vol_discount_free"]))
 
     # Kronos 控制简化为 「是否执行门控」 + 「投资强度上限」
     # （不再乘以 O-Score 乘数，两者独立）
     kronos_position_cap = base_momentum_strength * volatility_discount_factor
     if not kronos_gate:
-        kronos_position_cap *= 0.3   # 门控关闭时减小强度至 30%
+        kronos_position_cap *= th["gate_off_scale"]   # 门控关闭时减小强度
     if "RANGING" in regime:
-        kronos_position_cap *= 0.7   # 震荡态再进一步折口
+        kronos_position_cap *= th["ranging_scale"]    # 震荡态再进一步折口
 
-    final_confidence = max(0.0, min(1.0, kronos_position_cap * (1 + 0.3 * sentiment_score) * (1 - risk_factor)))
+    final_confidence = max(0.0, min(1.0, kronos_position_cap * (1 + th["sentiment_weight"] * sentiment_score) * (1 - risk_factor)))
 
     # ===== Phase 11: 引入 Fama-French 多因子选股底牌 (O-Score) =====
     # 在非 Offline 隔离时，且非历史回测穿越时，提取并打分该股票的财务多因子
@@ -7,6 +7,11 @@ from langgraph.prebuilt import ToolNode
 from langgraph.graph import END, StateGraph, START, MessagesState
 
 
+def merge_analyst_outputs(left: Optional[dict], right: Optional[dict]) -> dict:
+    """并行分析师分支的合并规则：各分支只写自己的键，同一超步内的多次写入按键合并而不是互相覆盖"""
+    return {**(left or {}), **(right or {})}
+
+
 # Analyst structured report format for traceability and noise reduction
 class AnalystReport(TypedDict):
     analyst_name: str
@@ -48,6 +53,9 @@ class AgentState(MessagesState):
     # Structured storage for analyst outputs (The primary source of truth for managers)
     structured_reports: Annotated[Dict[str, AnalystReport], "Repository for all processed node outputs"]
 
+    # Per-branch outputs of the parallel analyst fan-out ({analyst_type: {field: value}}), merged by "Analyst Join"
+    analyst_outputs: Annotated[Dict[str, dict], merge_analyst_outputs]
+
     # legacy/preview fields (kept for backward compatibility where nodes haven't been refactored)
     market_report: Annotated[str, "Report from the Market Analyst"]
     sentiment_report: Annotated[str, "Report from the Social Media Analyst"]
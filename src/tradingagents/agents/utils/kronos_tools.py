@@ -3,6 +3,7 @@ from typing import Annotated
 import pandas as pd
 from crawlers.data_gateway import gateway
 from kronos.api import predict_market_trend
+from core.trading_calendar import exchange_for_ticker
 
 @tool
 def get_market_prediction(
@@ -46,7 +47,7 @@ def get_market_prediction(
         }, inplace=True)
         
         # 2. Run Kronos predict
-        prediction_df = predict_market_trend(df, pred_len=pred_len)
+        prediction_df = predict_market_trend(df, pred_len=pred_len, exchange=exchange_for_ticker(symbol))
         
         # 3. Format output
         uncertainty = prediction_df.attrs.get('model_uncertainty', 0.0)
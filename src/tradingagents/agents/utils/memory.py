@@ -2,27 +2,69 @@
 
 Uses BM25 (Best Matching 25) algorithm for retrieval - no API calls,
 no token limits, works offline with any LLM provider.
+
+The index is an in-memory inverted index (term -> postings of doc ids / term
+frequencies) that is updated incrementally on every insert instead of being
+rebuilt, and scored only over the postings of the query terms. Scores are the
+same BM25Okapi variant (k1, b, epsilon idf floor) as rank_bm25.
+
+When ``config["memory_dir"]`` is set (it is None by default), situations are also
+persisted to a SQLite log (``<memory_dir>/<name>.sqlite``), reloaded on start, and
+shared between processes: every add / query first pulls the rows other writers
+appended since the last sync. Persisted memories outlive the run that wrote them, so
+use a separate directory per backtest to avoid look-ahead across runs.
 """
 
-from rank_bm25 import BM25Okapi
-from typing import List, Tuple
+import os
 import re
+import sqlite3
+import threading
+from array import array
+from collections import Counter
+from typing import List, Tuple
+
+import numpy as np
 
 
 class FinancialSituationMemory:
     """Memory system for storing and retrieving financial situations using BM25."""
 
-    def __init__(self, name: str, config: dict = None):
+    def __init__(self, name: str, config: dict = None, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
         """Initialize the memory system.
 
         Args:
             name: Name identifier for this memory instance
-            config: Configuration dict (kept for API compatibility, not used for BM25)
+            config: Configuration dict; ``memory_dir`` enables on-disk persistence
+                (without it the memory lives only in this process)
+            k1, b, epsilon: BM25Okapi parameters
         """
         self.name = name
-        self.documents: List[str] = []
-        self.recommendations: List[str] = []
-        self.bm25 = None
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+
+        memory_dir = (config or {}).get("memory_dir")
+        if memory_dir:
+            os.makedirs(memory_dir, exist_ok=True)
+            self.path = os.path.join(memory_dir, f"{name}.sqlite")
+        else:
+            self.path = ":memory:"
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        if memory_dir:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS situations ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, situation TEXT, recommendation TEXT)"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+
+        self._reset_index()
+        self._generation = None
+        with self._lock:
+            self._sync()
 
     def _tokenize(self, text: str) -> List[str]:
         """Tokenize text for BM25 indexing.
@@ -33,13 +75,65 @@ class FinancialSituationMemory:
         tokens = re.findall(r'\b\w+\b', text.lower())
         return tokens
 
-    def _rebuild_index(self):
-        """Rebuild the BM25 index after adding documents."""
-        if self.documents:
-            tokenized_docs = [self._tokenize(doc) for doc in self.documents]
-            self.bm25 = BM25Okapi(tokenized_docs)
-        else:
-            self.bm25 = None
+    def _reset_index(self):
+        self.documents: List[str] = []
+        self.recommendations: List[str] = []
+        self._vocab = {}                # term -> term id
+        self._post_docs = []            # term id -> array of doc ids
+        self._post_tf = []              # term id -> array of term frequencies
+        self._doc_len = array("i")
+        self._total_len = 0
+        self._last_id = 0
+        self._stats_n = -1              # corpus size the cached idf / length norms belong to
+
+    def _index(self, rows):
+        """Append documents to the postings (O(unique terms) per document, nothing is rebuilt)."""
+        vocab, post_docs, post_tf = self._vocab, self._post_docs, self._post_tf
+        for situation, recommendation in rows:
+            doc = len(self.documents)
+            self.documents.append(situation)
+            self.recommendations.append(recommendation)
+            tokens = self._tokenize(situation)
+            self._doc_len.append(len(tokens))
+            self._total_len += len(tokens)
+            for term, tf in Counter(tokens).items():
+                tid = vocab.get(term)
+                if tid is None:
+                    tid = vocab[term] = len(post_docs)
+                    post_docs.append(array("i"))
+                    post_tf.append(array("i"))
+                post_docs[tid].append(doc)
+                post_tf[tid].append(tf)
+
+    def _sync(self):
+        """Pull rows appended (by this or another process) since the last sync; full reload after a clear."""
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        generation = row[0] if row else 0
+        if generation != self._generation:
+            self._reset_index()
+            self._generation = generation
+        rows = self._conn.execute(
+            "SELECT id, situation, recommendation FROM situations WHERE id > ? ORDER BY id",
+            (self._last_id,),
+        ).fetchall()
+        if rows:
+            self._index((situation, recommendation) for _, situation, recommendation in rows)
+            self._last_id = rows[-1][0]
+
+    def _corpus_stats(self):
+        """idf per term id (with the BM25Okapi epsilon floor) and per-document length norms, cached per corpus size."""
+        n = len(self.documents)
+        if self._stats_n != n:
+            df = np.fromiter(map(len, self._post_docs), dtype=np.float64, count=len(self._post_docs))
+            idf = np.log(n - df + 0.5) - np.log(df + 0.5)
+            if len(idf):
+                idf[idf < 0] = self.epsilon * idf.mean()
+            doc_len = np.asarray(self._doc_len, dtype=np.float64)
+            avgdl = self._total_len / n
+            self._idf = idf
+            self._norm = self.k1 * (1 - self.b + self.b * doc_len / avgdl) if avgdl > 0 else np.zeros(n)
+            self._stats_n = n
+        return self._idf, self._norm
 
     def add_situations(self, situations_and_advice: List[Tuple[str, str]]):
         """Add financial situations and their corresponding advice.
@@ -47,12 +141,14 @@ class FinancialSituationMemory:
         Args:
             situations_and_advice: List of tuples (situation, recommendation)
         """
-        for situation, recommendation in situations_and_advice:
-            self.documents.append(situation)
-            self.recommendations.append(recommendation)
-
-        # Rebuild BM25 index with new documents
-        self._rebuild_index()
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO situations (situation, recommendation) VALUES (?, ?)",
+                    list(situations_and_advice),
+                )
+            # Index the new rows (and anything other processes appended meanwhile)
+            self._sync()
 
     def get_memories(self, current_situation: str, n_matches: int = 1) -> List[dict]:
         """Find matching recommendations using BM25 similarity.
@@ -64,38 +160,59 @@ class FinancialSituationMemory:
         Returns:
             List of dicts with matched_situation, recommendation, and similarity_score
         """
-        if not self.documents or self.bm25 is None:
-            return []
-
-        # Tokenize query
-        query_tokens = self._tokenize(current_situation)
+        with self._lock:
+            self._sync()
+            n = len(self.documents)
+            if not n:
+                return []
+            idf, norm = self._corpus_stats()
 
-        # Get BM25 scores for all documents
-        scores = self.bm25.get_scores(query_tokens)
+            # Score only the postings of the query terms (repeated query terms weigh in repeatedly)
+            scores = np.zeros(n)
+            for term, qf in Counter(self._tokenize(current_situation)).items():
+                tid = self._vocab.get(term)
+                if tid is None or not idf[tid]:
+                    continue
+                docs = np.asarray(self._post_docs[tid], dtype=np.intp)
+                tf = np.asarray(self._post_tf[tid], dtype=np.float64)
+                scores[docs] += qf * idf[tid] * (tf * (self.k1 + 1) / (tf + norm[docs]))
 
-        # Get top-n indices sorted by score (descending)
-        top_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:n_matches]
+            # Top-n without sorting the corpus; ties keep insertion order like a stable sort
+            k = min(max(n_matches, 0), n)
+            if k == 0:
+                return []
+            if k < n:
+                kth = np.partition(scores, n - k)[n - k]
+                candidates = np.flatnonzero(scores >= kth)
+            else:
+                candidates = np.arange(n)
+            top_indices = candidates[np.lexsort((candidates, -scores[candidates]))][:k]
 
-        # Build results
-        results = []
-        max_score = max(scores) if max(scores) > 0 else 1  # Normalize scores
+            # Build results
+            results = []
+            max_score = scores.max() if scores.max() > 0 else 1  # Normalize scores
 
-        for idx in top_indices:
-            # Normalize score to 0-1 range for consistency
-            normalized_score = scores[idx] / max_score if max_score > 0 else 0
-            results.append({
-                "matched_situation": self.documents[idx],
-                "recommendation": self.recommendations[idx],
-                "similarity_score": normalized_score,
-            })
+            for idx in top_indices:
+                # Normalize score to 0-1 range for consistency
+                normalized_score = scores[idx] / max_score if max_score > 0 else 0
+                results.append({
+                    "matched_situation": self.documents[idx],
+                    "recommendation": self.recommendations[idx],
+                    "similarity_score": normalized_score,
+                })
 
-        return results
+            return results
 
     def clear(self):
-        """Clear all stored memories."""
-        self.documents = []
-        self.recommendations = []
-        self.bm25 = None
+        """Clear all stored memories (for every process sharing this memory)."""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM situations")
+                self._conn.execute(
+                    "INSERT INTO meta (key, value) VALUES ('generation', 1) "
+                    "ON CONFLICT(key) DO UPDATE SET value = value + 1"
+                )
+            self._sync()
 
 
 if __name__ == "__main__":
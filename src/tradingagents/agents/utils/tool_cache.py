@@ -0,0 +1,197 @@
+"""Memoisation layer for the analyst ToolNode tools.
+
+Identical gateway calls inside one ``propagate`` (tool-loop retries, several analysts
+asking for the same news, ...) are served once:
+
+- arguments are normalised first (schema defaults filled in, tickers upper-cased,
+  dates rewritten as YYYY-MM-DD), so ``get_news("aapl", "2024/1/5", ...)`` and
+  ``get_news("AAPL", "2024-01-05", ...)`` share one entry;
+- concurrent identical calls (parallel analyst branches) are coalesced onto the
+  first in-flight request instead of hitting yfinance / Baostock twice;
+- results live in a run-scoped memo (cleared by ``new_run``) and, optionally, in a
+  SQLite store with a TTL that survives across runs. Failure replies (the providers'
+  "Error ...", "Failed to fetch ...", "No news found ..." strings, empty results) are never
+  persisted, and neither are results produced while the gateway is in offline replay mode.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from datetime import date, datetime
+from typing import Any, Dict, Optional
+
+from langchain_core.tools import BaseTool, StructuredTool
+
+TICKER_ARGS = ("symbol", "ticker")
+# Leading text of the failure strings the gateway providers return instead of raising, e.g.
+# "Error retrieving fundamentals for X", "Failed to fetch historical data for X",
+# "No fundamentals data found for symbol 'X'", "No news found for X", "No data returned
+# from Baostock", "Kronos prediction failed ...", "[OFFLINE] No panic news file found"
+_FAILURE_RE = re.compile(
+    r"(error|fail(ed|ure)?\b|no\b[^\n]{0,60}?\b(found|returned|available)\b|no data\b"
+    r"|kronos prediction failed|\[offline\] no\b)",
+    re.IGNORECASE,
+)
+
+
+def is_failure(result: Any) -> bool:
+    """True for provider failure replies: blank output or a known error / no-data message."""
+    if not isinstance(result, str):
+        return False
+    text = result.lstrip()
+    return not text or _FAILURE_RE.match(text) is not None
+
+
+def _normalise_date(value):
+    if isinstance(value, (date, datetime)):
+        return value.strftime("%Y-%m-%d")
+    if not isinstance(value, str) or not value.strip():
+        return value
+    text = value.strip()
+    for fmt in ("%Y-%m-%d", "%Y/%m/%d", "%Y%m%d", "%Y.%m.%d", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(text, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return text
+
+
+def normalise_args(tool: BaseTool, args: Dict[str, Any]) -> Dict[str, Any]:
+    """Canonical keyword arguments for a tool call (defaults filled, tickers / dates normalised)."""
+    schema = tool.args_schema
+    if schema is not None and hasattr(schema, "model_validate"):
+        args = schema.model_validate(args).model_dump()
+    out = {}
+    for name, value in args.items():
+        if name in TICKER_ARGS and isinstance(value, str):
+            value = value.strip().upper()
+        elif name.endswith("date"):
+            value = _normalise_date(value)
+        elif name == "indicator" and isinstance(value, str):
+            value = ",".join(p.strip().lower() for p in value.split(",") if p.strip())
+        out[name] = value
+    return out
+
+
+def _gateway_scope() -> Optional[str]:
+    """Namespace for persisted results; None while the gateway replays offline data."""
+    try:
+        from crawlers.data_gateway import DataGateway
+    except ImportError:
+        return "live"
+    return None if DataGateway.offline_mode else "live"
+
+
+class ToolMemo:
+    """Run-scoped + optional persistent memo of tool results, with in-flight coalescing.
+
+    Args:
+        path: SQLite file for cross-run persistence; None keeps results for the current run only
+        ttl: Seconds a persisted result stays valid; None never expires
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: Optional[float] = None):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._results: Dict[str, Any] = {}
+        self._inflight: Dict[str, Future] = {}
+        self._local = threading.local()
+        self.stats = {"calls": 0, "hits": 0, "persisted_hits": 0, "coalesced": 0, "misses": 0}
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with self._conn() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS tool_results ("
+                    " key TEXT PRIMARY KEY, tool TEXT, created REAL, result TEXT)"
+                )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def new_run(self) -> Dict[str, int]:
+        """Start a new request scope; returns the counters of the finished one."""
+        with self._lock:
+            finished = dict(self.stats)
+            self._results.clear()
+            self.stats = {k: 0 for k in self.stats}
+        return finished
+
+    def _load(self, key: str):
+        row = self._conn().execute(
+            "SELECT created, result FROM tool_results WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or (self.ttl is not None and time.time() - row[0] > self.ttl):
+            return None
+        return row[1]
+
+    def _store(self, key: str, tool_name: str, result: str):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO tool_results (key, tool, created, result) VALUES (?, ?, ?, ?)",
+                (key, tool_name, time.time(), result),
+            )
+
+    def call(self, tool: BaseTool, args: Dict[str, Any]):
+        """Run ``tool`` with ``args`` unless an identical call is cached or already in flight."""
+        args = normalise_args(tool, args)
+        scope = _gateway_scope()
+        key = json.dumps([scope or "offline", tool.name, args], sort_keys=True, default=str)
+        with self._lock:
+            self.stats["calls"] += 1
+            if key in self._results:
+                self.stats["hits"] += 1
+                return self._results[key]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+            else:
+                self.stats["coalesced"] += 1
+        if not owner:
+            return future.result()
+
+        try:
+            result = self._load(key) if self.path and scope else None
+            if result is not None:
+                with self._lock:
+                    self.stats["persisted_hits"] += 1
+            else:
+                with self._lock:
+                    self.stats["misses"] += 1
+                result = tool.func(**args)
+                if self.path and scope and isinstance(result, str) and not is_failure(result):
+                    self._store(key, tool.name, result)
+            with self._lock:
+                self._results[key] = result
+                del self._inflight[key]
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+
+
+def memoize_tool(tool: BaseTool, memo: ToolMemo) -> BaseTool:
+    """Same name / description / schema as ``tool``; calls go through ``memo``."""
+
+    def run(**kwargs):
+        return memo.call(tool, kwargs)
+
+    return StructuredTool.from_function(
+        func=run,
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+    )
@@ -15,10 +15,32 @@ DEFAULT_CONFIG = {
     # Provider-specific thinking configuration
     "google_thinking_level": None,      # "high", "minimal", etc.
     "openai_reasoning_effort": None,    # "medium", "high", "low"
+    # LLM response cache (content-addressed by model/messages/tools/temperature).
+    # Set llm_provider to "replay" to run offline from the recorded responses.
+    "llm_cache": True,
+    "llm_cache_path": os.path.join(
+        os.path.abspath(os.path.join(os.path.dirname(__file__), ".")),
+        "dataflows/data_cache/llm_cache.sqlite",
+    ),
+    "llm_cache_ttl": 30 * 24 * 3600,    # seconds; None = never expires
+    # Analyst tool results: memoised per propagate; tool_cache_path (None = run-scoped only) persists across runs
+    "tool_cache": True,
+    "tool_cache_path": os.path.join(
+        os.path.abspath(os.path.join(os.path.dirname(__file__), ".")),
+        "dataflows/data_cache/tool_cache.sqlite",
+    ),
+    "tool_cache_ttl": 12 * 3600,
+    # Reflection memories (BM25 situation stores). None keeps them in-process only, so
+    # lessons from one run (possibly about later dates) never leak into another backtest.
+    # Opt in with a directory, e.g. dataflows/data_cache/memory, to persist per memory name.
+    "memory_dir": None,
     # Debate and discussion settings
     "max_debate_rounds": 1,
     "max_risk_discuss_rounds": 1,
     "max_recur_limit": 100,
+    # Analyst fan-out: run selected analysts as parallel branches (False = legacy sequential chain)
+    "parallel_analysts": True,
+    "max_parallel_analysts": 4,         # concurrent analyst branches (bounds simultaneous LLM / data calls)
     # Data vendor configuration (now handled intrinsically by Gateway)
     "data_vendors": {},
     "tool_vendors": {},
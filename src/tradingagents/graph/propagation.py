@@ -41,6 +41,7 @@ class Propagator:
             "news_report": "",
             "kronos_report": "",
             "structured_reports": {},
+            "analyst_outputs": {},
         }
 
     def get_graph_args(self, callbacks: Optional[List] = None) -> Dict[str, Any]:
@@ -1,5 +1,6 @@
 # TradingAgents/graph/setup.py
 
+import threading
 from typing import Dict, Any
 from langchain_openai import ChatOpenAI
 from langgraph.graph import END, StateGraph, START
@@ -10,6 +11,15 @@ from tradingagents.agents.utils.agent_states import AgentState
 
 from .conditional_logic import ConditionalLogic
 
+# Report fields an analyst branch may write back to the shared state
+ANALYST_REPORT_FIELDS = (
+    "market_report",
+    "sentiment_report",
+    "news_report",
+    "fundamentals_report",
+    "kronos_report",
+)
+
 
 class GraphSetup:
     """Handles the setup and configuration of the agent graph."""
@@ -37,8 +47,75 @@ class GraphSetup:
         self.risk_manager_memory = risk_manager_memory
         self.conditional_logic = conditional_logic
 
+    def _analyst_branch(self, analyst_type, analyst_node, tool_node, semaphore):
+        """Wrap one analyst's tool loop into a node with its own private message channel.
+
+        The analyst and its ToolNode run as a compiled sub-graph on a fresh
+        ``[("human", ticker)]`` conversation, so parallel branches never see or
+        clear each other's messages. Only the report fields (and the analyst's
+        structured report) are written back, under ``analyst_outputs[analyst_type]``.
+        """
+        name = analyst_type.capitalize()
+        branch = StateGraph(AgentState)
+        branch.add_node(f"{name} Analyst", analyst_node)
+        branch.add_node(f"tools_{analyst_type}", tool_node)
+        branch.add_edge(START, f"{name} Analyst")
+        branch.add_conditional_edges(
+            f"{name} Analyst",
+            getattr(self.conditional_logic, f"should_continue_{analyst_type}"),
+            {f"tools_{analyst_type}": f"tools_{analyst_type}", f"Msg Clear {name}": END},
+        )
+        branch.add_edge(f"tools_{analyst_type}", f"{name} Analyst")
+        branch = branch.compile()
+
+        def run_branch(state, config):
+            private = {
+                **state,
+                "messages": [("human", state["company_of_interest"])],
+                "structured_reports": {},
+            }
+            with semaphore:
+                result = branch.invoke(private, config)
+            output = {
+                field: result[field]
+                for field in ANALYST_REPORT_FIELDS
+                if result.get(field) and result.get(field) != state.get(field)
+            }
+            output["structured_reports"] = result.get("structured_reports", {})
+            return {"analyst_outputs": {analyst_type: output}}
+
+        return run_branch
+
+    @staticmethod
+    def _analyst_join(selected_analysts):
+        """Merge the parallel branch outputs into AgentState, in selection order, before the debate."""
+        delete_messages = create_msg_delete()
+
+        def join(state):
+            outputs = state.get("analyst_outputs", {})
+            structured_reports = dict(state.get("structured_reports") or {})
+            update = {}
+            for analyst_type in selected_analysts:
+                output = dict(outputs.get(analyst_type, {}))
+                structured_reports.update(output.pop("structured_reports", {}))
+                update.update(output)
+            update["structured_reports"] = structured_reports
+            # Same de-noised summary the sequential chain hands to the researchers
+            update.update(
+                delete_messages(
+                    {"messages": state["messages"], "structured_reports": structured_reports}
+                )
+            )
+            return update
+
+        return join
+
     def setup_graph(
-        self, selected_analysts=["market", "social", "news", "fundamentals"], test_mode=False
+        self,
+        selected_analysts=["market", "social", "news", "fundamentals"],
+        test_mode=False,
+        parallel=True,
+        max_parallel=4,
     ):
         """Set up and compile the agent workflow graph.
 
@@ -48,6 +125,10 @@ class GraphSetup:
                 - "social": Social media analyst
                 - "news": News analyst
                 - "fundamentals": Fundamentals analyst
+            test_mode (bool): Kronos-only quant path, no LLM analysts.
+            parallel (bool): Run the analysts as parallel branches joined before
+                the debate; False keeps the original sequential chain.
+            max_parallel (int): Maximum number of analyst branches running at once.
         """
         if len(selected_analysts) == 0:
             raise ValueError("Trading Agents Graph Setup Error: no analysts selected!")
@@ -106,7 +187,19 @@ class GraphSetup:
         workflow = StateGraph(AgentState)
 
         # Add analyst nodes to the graph
-        for analyst_type, node in analyst_nodes.items():
+        parallel = parallel and not test_mode
+        if parallel:
+            semaphore = threading.BoundedSemaphore(max(1, int(max_parallel or 1)))
+            for analyst_type, node in analyst_nodes.items():
+                workflow.add_node(
+                    f"{analyst_type.capitalize()} Analyst",
+                    self._analyst_branch(
+                        analyst_type, node, tool_nodes[analyst_type], semaphore
+                    ),
+                )
+            workflow.add_node("Analyst Join", self._analyst_join(selected_analysts))
+
+        for analyst_type, node in ([] if parallel else analyst_nodes.items()):
             workflow.add_node(f"{analyst_type.capitalize()} Analyst", node)
             workflow.add_node(
                 f"Msg Clear {analyst_type.capitalize()}", delete_nodes[analyst_type]
@@ -161,12 +254,20 @@ class GraphSetup:
         # --------------------------------------------------
 
         # Define edges
-        # Start with the first analyst
-        first_analyst = selected_analysts[0]
-        workflow.add_edge(START, f"{first_analyst.capitalize()} Analyst")
+        if parallel:
+            # Fan out: every analyst starts at once; the join waits for all branches
+            branch_names = [f"{a.capitalize()} Analyst" for a in selected_analysts]
+            for name in branch_names:
+                workflow.add_edge(START, name)
+            workflow.add_edge(branch_names, "Analyst Join")
+            workflow.add_edge("Analyst Join", "Bull Researcher")
+        else:
+            # Start with the first analyst
+            first_analyst = selected_analysts[0]
+            workflow.add_edge(START, f"{first_analyst.capitalize()} Analyst")
 
         # Connect analysts in sequence
-        for i, analyst_type in enumerate(selected_analysts):
+        for i, analyst_type in enumerate([] if parallel else selected_analysts):
             current_analyst = f"{analyst_type.capitalize()} Analyst"
             current_tools = f"tools_{analyst_type}"
             current_clear = f"Msg Clear {analyst_type.capitalize()}"
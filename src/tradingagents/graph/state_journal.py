@@ -0,0 +1,143 @@
+# TradingAgents/graph/state_journal.py
+
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+class StateJournal:
+    """Append-only JSONL journal of logged graph states, one record per (ticker, trade_date).
+
+    Each ``append`` writes a single line to ``<name>.jsonl`` and its byte range to the
+    ``<name>.idx`` sidecar, so the write cost per decision is constant and no state is
+    kept in memory; only the (ticker, date) -> (offset, length) index is. Re-logging a
+    key appends a newer record and the index points at it; the superseded bytes are
+    reclaimed by ``compact`` once they outweigh the live records (amortised O(1)).
+    """
+
+    def __init__(self, directory: str, name: str = "full_states_log", min_compact_bytes: int = 1 << 20):
+        """Open (or create) the journal in directory and load its index.
+
+        Args:
+            directory: Directory holding the journal and index files
+            name: Base file name
+            min_compact_bytes: Dead bytes tolerated before automatic compaction
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{name}.jsonl")
+        self.index_path = os.path.join(directory, f"{name}.idx")
+        self.min_compact_bytes = min_compact_bytes
+        self._index: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        self._dead_bytes = 0
+        self._live_bytes = 0
+        self._load_index()
+
+    # ── index ────────────────────────────────────────────────
+    def _load_index(self):
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        entries = []
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        break               # torn last line after a crash
+        end = entries[-1][2] + entries[-1][3] if entries else 0
+        if end != size:
+            entries = self._scan()          # index missing or out of step: rebuild from the data
+            self._write_index(entries)
+        self._index.clear()
+        self._dead_bytes = self._live_bytes = 0
+        for ticker, trade_date, offset, length in entries:
+            self._track((ticker, trade_date), offset, length)
+
+    def _track(self, key: Tuple[str, str], offset: int, length: int):
+        previous = self._index.get(key)
+        if previous is not None:
+            self._dead_bytes += previous[1]
+            self._live_bytes -= previous[1]
+        self._live_bytes += length
+        self._index[key] = (offset, length)
+
+    def _scan(self) -> List[list]:
+        entries = []
+        if not os.path.exists(self.path):
+            return entries
+        offset = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break                   # torn trailing write, truncated below
+                entries.append([record["ticker"], record["trade_date"], offset, len(line)])
+                offset += len(line)
+        if offset != os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+        return entries
+
+    def _write_index(self, entries: List[list]):
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(e) + "\n" for e in entries)
+        os.replace(tmp, self.index_path)
+
+    # ── writes ───────────────────────────────────────────────
+    def append(self, ticker: str, trade_date: str, state: Dict[str, Any]):
+        """Record the state logged for (ticker, trade_date); a later append for the same key wins."""
+        key = (str(ticker), str(trade_date))
+        line = (json.dumps({"ticker": key[0], "trade_date": key[1], "state": state}, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            f.write(line)
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps([key[0], key[1], offset, len(line)]) + "\n")
+
+        self._track(key, offset, len(line))
+        if self._dead_bytes > max(self.min_compact_bytes, self._live_bytes):
+            self.compact()
+
+    def compact(self):
+        """Rewrite the journal with only the latest record per key, ordered by (ticker, trade_date)."""
+        tmp = self.path + ".tmp"
+        entries = []
+        offset = 0
+        with open(self.path, "rb") as src, open(tmp, "wb") as dst:
+            for key in sorted(self._index):
+                start, length = self._index[key]
+                src.seek(start)
+                dst.write(src.read(length))
+                entries.append([key[0], key[1], offset, length])
+                offset += length
+        os.replace(tmp, self.path)
+        self._write_index(entries)
+        self._index = {(t, d): (o, n) for t, d, o, n in entries}
+        self._dead_bytes, self._live_bytes = 0, offset
+
+    # ── reads ────────────────────────────────────────────────
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key) -> bool:
+        return (str(key[0]), str(key[1])) in self._index
+
+    def dates(self, ticker: Optional[str] = None) -> List[str]:
+        """Logged trade dates (sorted), optionally for one ticker."""
+        return sorted({d for t, d in self._index if ticker is None or t == ticker})
+
+    def get(self, ticker: str, trade_date: str) -> Optional[Dict[str, Any]]:
+        """Logged state for (ticker, trade_date) via a single seek, or None."""
+        entry = self._index.get((str(ticker), str(trade_date)))
+        if entry is None:
+            return None
+        with open(self.path, "rb") as f:
+            f.seek(entry[0])
+            return json.loads(f.read(entry[1]))["state"]
+
+    def items(self, ticker: Optional[str] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """(trade_date, state) pairs in date order, read one record at a time."""
+        for t, trade_date in sorted(self._index, key=lambda k: (k[1], k[0])):
+            if ticker is None or t == ticker:
+                yield trade_date, self.get(t, trade_date)
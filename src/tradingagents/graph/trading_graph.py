@@ -19,6 +19,7 @@ from tradingagents.agents.utils.agent_states import (
     RiskDebateState,
 )
 from tradingagents.agent_config import set_config
+from tradingagents.agents.utils.tool_cache import ToolMemo, memoize_tool
 
 # Import the new abstract tool methods from agent_utils
 from tradingagents.agents.utils.agent_utils import (
@@ -38,6 +39,7 @@ from .setup import GraphSetup
 from .propagation import Propagator
 from .reflection import Reflector
 from .signal_processing import SignalProcessor
+from .state_journal import StateJournal
 
 
 class TradingAgentsGraph:
@@ -79,6 +81,11 @@ class TradingAgentsGraph:
         if self.callbacks:
             llm_kwargs["callbacks"] = self.callbacks
 
+        # Content-addressed response cache; the "replay" provider reads it offline
+        if self.config.get("llm_cache") or self.config["llm_provider"].lower() == "replay":
+            llm_kwargs["cache_path"] = self.config.get("llm_cache_path")
+            llm_kwargs["cache_ttl"] = self.config.get("llm_cache_ttl")
+
         deep_client = create_llm_client(
             provider=self.config["llm_provider"],
             model=self.config["deep_think_llm"],
@@ -102,7 +109,13 @@ class TradingAgentsGraph:
         self.invest_judge_memory = FinancialSituationMemory("invest_judge_memory", self.config)
         self.risk_manager_memory = FinancialSituationMemory("risk_manager_memory", self.config)
 
-        # Create tool nodes
+        # Create tool nodes (gateway calls memoised per run, optionally persisted across runs)
+        self.tool_memo = None
+        if self.config.get("tool_cache", True):
+            self.tool_memo = ToolMemo(
+                self.config.get("tool_cache_path"), self.config.get("tool_cache_ttl")
+            )
+        self.tool_stats = {}
         self.tool_nodes = self._create_tool_nodes()
 
         # Initialize components
@@ -126,10 +139,15 @@ class TradingAgentsGraph:
         # State tracking
         self.curr_state = None
         self.ticker = None
-        self.log_states_dict = {}  # date to full state dict
+        self._journals = {}  # log directory -> StateJournal (states live on disk, not in memory)
 
         # Set up the graph
-        self.graph = self.graph_setup.setup_graph(selected_analysts, test_mode=test_mode)
+        self.graph = self.graph_setup.setup_graph(
+            selected_analysts,
+            test_mode=test_mode,
+            parallel=self.config.get("parallel_analysts", True),
+            max_parallel=self.config.get("max_parallel_analysts", 4),
+        )
 
     def _get_provider_kwargs(self) -> Dict[str, Any]:
         """Get provider-specific kwargs for LLM client creation."""
@@ -146,48 +164,56 @@ class TradingAgentsGraph:
             if reasoning_effort:
                 kwargs["reasoning_effort"] = reasoning_effort
 
+        elif provider == "replay":
+            # Replay keys must carry the same options the recording provider was given
+            if self.config.get("google_thinking_level"):
+                kwargs["thinking_level"] = self.config["google_thinking_level"]
+            if self.config.get("openai_reasoning_effort"):
+                kwargs["reasoning_effort"] = self.config["openai_reasoning_effort"]
+
         return kwargs
 
     def _create_tool_nodes(self) -> Dict[str, ToolNode]:
         """Create tool nodes for different data sources using abstract methods."""
-        return {
-            "market": ToolNode(
-                [
-                    # Core stock data tools
-                    get_stock_data,
-                    # Technical indicators
-                    get_indicators,
-                ]
-            ),
-            "social": ToolNode(
-                [
-                    # News tools for social media analysis
-                    get_news,
-                ]
-            ),
-            "news": ToolNode(
-                [
-                    # News and insider information
-                    get_news,
-                    get_global_news,
-                    get_insider_transactions,
-                ]
-            ),
-            "fundamentals": ToolNode(
-                [
-                    # Fundamental analysis tools
-                    get_fundamentals,
-                    get_balance_sheet,
-                    get_cashflow,
-                    get_income_statement,
-                ]
-            ),
+        tools = {
+            "market": [
+                # Core stock data tools
+                get_stock_data,
+                # Technical indicators
+                get_indicators,
+            ],
+            "social": [
+                # News tools for social media analysis
+                get_news,
+            ],
+            "news": [
+                # News and insider information
+                get_news,
+                get_global_news,
+                get_insider_transactions,
+            ],
+            "fundamentals": [
+                # Fundamental analysis tools
+                get_fundamentals,
+                get_balance_sheet,
+                get_cashflow,
+                get_income_statement,
+            ],
         }
+        if self.tool_memo is not None:
+            wrapped = {}
+            tools = {
+                analyst: [wrapped.setdefault(t.name, memoize_tool(t, self.tool_memo)) for t in group]
+                for analyst, group in tools.items()
+            }
+        return {analyst: ToolNode(group) for analyst, group in tools.items()}
 
     def propagate(self, company_name, trade_date):
         """Run the trading agents graph for a company on a specific date."""
 
         self.ticker = company_name
+        if self.tool_memo is not None:
+            self.tool_memo.new_run()
 
         # Initialize state
         init_agent_state = self.propagator.create_initial_state(
@@ -242,6 +268,8 @@ class TradingAgentsGraph:
 
         # Store current state for reflection
         self.curr_state = final_state
+        if self.tool_memo is not None:
+            self.tool_stats = dict(self.tool_memo.stats)
 
         # Log state
         self._log_state(trade_date, final_state)
@@ -249,12 +277,19 @@ class TradingAgentsGraph:
         # Return decision and processed signal
         return final_state, self.process_signal(final_state["final_trade_decision"])
 
+    def state_journal(self, ticker=None) -> StateJournal:
+        """Append-only journal of logged states for ticker (default: the current one)."""
+        directory = f"eval_results/{ticker or self.ticker}/TradingAgentsStrategy_logs/"
+        if directory not in self._journals:
+            self._journals[directory] = StateJournal(directory)
+        return self._journals[directory]
+
     def _log_state(self, trade_date, final_state):
-        """Log the final state to a JSON file."""
+        """Append the final state to the ticker's state journal (one record per trade date)."""
         invest_debate = final_state.get("investment_debate_state", {})
         
         if not invest_debate.get("bull_history"):
-            self.log_states_dict[str(trade_date)] = {
+            entry = {
                 "company_of_interest": final_state.get("company_of_interest", ""),
                 "trade_date": final_state.get("trade_date", ""),
                 "kronos_report": final_state.get("kronos_report", ""),
@@ -262,7 +297,7 @@ class TradingAgentsGraph:
                 "final_trade_decision": final_state.get("final_trade_decision", ""),
             }
         else:
-            self.log_states_dict[str(trade_date)] = {
+            entry = {
                 "company_of_interest": final_state["company_of_interest"],
                 "trade_date": final_state["trade_date"],
                 "market_report": final_state["market_report"],
@@ -292,14 +327,7 @@ class TradingAgentsGraph:
                 "final_trade_decision": final_state["final_trade_decision"],
             }
 
-        directory = Path(f"eval_results/{self.ticker}/TradingAgentsStrategy_logs/")
-        directory.mkdir(parents=True, exist_ok=True)
-
-        with open(
-            f"eval_results/{self.ticker}/TradingAgentsStrategy_logs/full_states_log_{trade_date}.json",
-            "w",
-        ) as f:
-            json.dump(self.log_states_dict, f, indent=4)
+        self.state_journal().append(self.ticker, str(trade_date), entry)
 
     def reflect_and_remember(self, returns_losses):
         """Reflect on decisions and update memory based on returns."""
@@ -1,4 +1,11 @@
 from .base_client import BaseLLMClient
+from .cache import LLMResponseCache, CachedChatModel, ReplayMissError
 from .factory import create_llm_client
 
-__all__ = ["BaseLLMClient", "create_llm_client"]
+__all__ = [
+    "BaseLLMClient",
+    "create_llm_client",
+    "LLMResponseCache",
+    "CachedChatModel",
+    "ReplayMissError",
+]
@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+
+class ReplayMissError(KeyError):
+    """Raised by a strict replay model when no recorded response exists for a request."""
+
+
+def _message_key(message: BaseMessage) -> Dict[str, Any]:
+    """Stable view of a message for hashing.
+
+    Run-specific noise (message ids, token usage, response metadata) is dropped so the
+    same conversation hashes identically across runs.
+    """
+    out = {"type": message.type, "content": message.content}
+    if getattr(message, "name", None):
+        out["name"] = message.name
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        out["tool_calls"] = [
+            {"name": c.get("name"), "args": c.get("args"), "id": c.get("id")} for c in tool_calls
+        ]
+    tool_call_id = getattr(message, "tool_call_id", None)
+    if tool_call_id:
+        out["tool_call_id"] = tool_call_id
+    return out
+
+
+def request_key(
+    model: str,
+    messages: List[BaseMessage],
+    tools: Optional[list] = None,
+    temperature: Optional[float] = None,
+    stop: Optional[List[str]] = None,
+    options: Optional[Dict[str, Any]] = None,
+    **params,
+) -> str:
+    """Content address of an LLM request: sha256 over (model, messages, tools, temperature, options, params).
+
+    ``options`` are output-changing client settings such as ``reasoning_effort`` or
+    ``thinking_level``; ``params`` are the per-call kwargs bound on the runnable.
+    """
+    payload = {
+        "model": model,
+        "messages": [_message_key(m) for m in messages],
+        "tools": tools or [],
+        "temperature": temperature,
+        "stop": stop,
+        "params": params,
+    }
+    if options:
+        payload["options"] = options
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """SQLite-backed store of LLM responses keyed by ``request_key``.
+
+    Safe to share between threads (one connection per thread, WAL journal), so the
+    parallel analyst branches can read and write concurrently.
+
+    Args:
+        path: SQLite file; parent directories are created on demand
+        ttl: Seconds a recorded response stays valid; None never expires
+    """
+
+    def __init__(self, path: str, ttl: Optional[float] = None):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, model TEXT, created REAL, response TEXT)"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, field: str):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def get(self, key: str) -> Optional[BaseMessage]:
+        """Recorded response for key, or None when absent / expired."""
+        row = self._conn().execute(
+            "SELECT created, response FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or (self.ttl is not None and time.time() - row[0] > self.ttl):
+            self._count("misses")
+            return None
+        self._count("hits")
+        return messages_from_dict([json.loads(row[1])])[0]
+
+    def put(self, key: str, model: str, message: BaseMessage):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, created, response) VALUES (?, ?, ?, ?)",
+                (key, model, time.time(), json.dumps(message_to_dict(message), ensure_ascii=False)),
+            )
+        self._count("writes")
+
+    def purge_expired(self) -> int:
+        """Delete responses older than ttl; returns the number of rows removed."""
+        if self.ttl is None:
+            return 0
+        with self._conn() as conn:
+            cur = conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+        return cur.rowcount
+
+    def clear(self):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit / miss / write counters of this process plus the number of stored responses."""
+        entries = self._conn().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "entries": entries,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class CachedChatModel(BaseChatModel):
+    """Chat model that answers from ``response_cache`` (an LLMResponseCache) before calling ``inner``.
+
+    With ``inner`` set, misses are forwarded to the wrapped provider model and recorded.
+    With ``inner=None`` the model is a pure replay client: misses raise ``ReplayMissError``
+    when ``strict``, otherwise a deterministic stand-in reply (derived from the request
+    hash, no tool calls) is returned, so the graph can run without any endpoint.
+
+    ``temperature`` and ``options`` only feed the cache key; they must be the values the
+    caller configured (not provider defaults) so recording and replay hash identically.
+    """
+
+    response_cache: Any
+    model_name: str
+    inner: Optional[Any] = None
+    temperature: Optional[float] = None
+    options: Dict[str, Any] = {}
+    strict: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "cached-chat" if self.inner is not None else "replay-chat"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name, "temperature": self.temperature, **self.options}
+
+    def bind_tools(self, tools, *, tool_choice: Optional[str] = None, **kwargs):
+        """Bind tools in OpenAI format so they take part in the cache key (and serialise cleanly)."""
+        formatted = [convert_to_openai_tool(t) for t in tools]
+        if tool_choice is not None:
+            kwargs["tool_choice"] = tool_choice
+        return self.bind(tools=formatted, **kwargs)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        tools = kwargs.pop("tools", None)
+        key = request_key(self.model_name, messages, tools, self.temperature, stop, self.options, **kwargs)
+        message = self.response_cache.get(key)
+        if message is None:
+            if self.inner is not None:
+                runnable = self.inner
+                if tools:
+                    runnable = runnable.bind_tools(tools, **kwargs)
+                elif kwargs:
+                    runnable = runnable.bind(**kwargs)
+                message = runnable.invoke(messages, stop=stop)
+                self.response_cache.put(key, self.model_name, message)
+            elif self.strict:
+                raise ReplayMissError(f"No recorded response for {self.model_name} request {key[:12]}")
+            else:
+                message = AIMessage(
+                    content=f"[replay {key[:12]}] 离线回放无录制结果，按中性处理。\n"
+                    "FINAL TRANSACTION PROPOSAL: **HOLD**"
+                )
+        return ChatResult(generations=[ChatGeneration(message=message)])
@@ -0,0 +1,85 @@
+from typing import Any, Optional
+
+from .base_client import BaseLLMClient
+from .cache import CachedChatModel, LLMResponseCache
+
+_CACHES = {}
+
+# Client settings that change the model output and therefore take part in the cache key
+KEY_OPTIONS = ("reasoning_effort", "thinking_level")
+
+
+def _key_settings(kwargs: dict) -> dict:
+    """Temperature and output-changing options exactly as the caller configured them.
+
+    Provider defaults (e.g. ChatGoogleGenerativeAI's temperature) are deliberately left
+    out: the replay client never sees them, so keys would not match across the two.
+    """
+    return {
+        "temperature": kwargs.get("temperature"),
+        "options": {k: kwargs[k] for k in KEY_OPTIONS if kwargs.get(k) is not None},
+    }
+
+
+def get_response_cache(path: str, ttl: Optional[float] = None) -> LLMResponseCache:
+    """One LLMResponseCache per (path, ttl), shared by the deep and quick thinking models."""
+    key = (path, ttl)
+    if key not in _CACHES:
+        _CACHES[key] = LLMResponseCache(path, ttl)
+    return _CACHES[key]
+
+
+class CachingClient(BaseLLMClient):
+    """Wraps another client so that identical requests are served from the response cache."""
+
+    def __init__(self, client: BaseLLMClient, cache_path: str, cache_ttl: Optional[float] = None):
+        super().__init__(client.model, client.base_url, **client.kwargs)
+        self.client = client
+        self.cache = get_response_cache(cache_path, cache_ttl)
+
+    def get_llm(self) -> Any:
+        """Return the provider LLM wrapped in a CachedChatModel."""
+        inner = self.client.get_llm()
+        return CachedChatModel(
+            response_cache=self.cache,
+            model_name=self.model,
+            inner=inner,
+            **_key_settings(self.kwargs),
+        )
+
+    def validate_model(self) -> bool:
+        return self.client.validate_model()
+
+
+class ReplayClient(BaseLLMClient):
+    """Offline client serving responses recorded by CachingClient (provider "replay").
+
+    Requests that were never recorded get a deterministic stand-in reply, or raise
+    ReplayMissError when ``strict=True``.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        base_url: Optional[str] = None,
+        cache_path: Optional[str] = None,
+        cache_ttl: Optional[float] = None,
+        **kwargs,
+    ):
+        super().__init__(model, base_url, **kwargs)
+        if not cache_path:
+            raise ValueError("Replay provider requires cache_path (config['llm_cache_path'])")
+        # Replay serves whatever was recorded, regardless of the recording TTL
+        self.cache = get_response_cache(cache_path)
+
+    def get_llm(self) -> Any:
+        """Return a CachedChatModel without a provider behind it."""
+        return CachedChatModel(
+            response_cache=self.cache,
+            model_name=self.model,
+            **_key_settings(self.kwargs),
+            strict=bool(self.kwargs.get("strict", False)),
+        )
+
+    def validate_model(self) -> bool:
+        return True
@@ -4,20 +4,27 @@ from .base_client import BaseLLMClient
 from .openai_client import OpenAIClient
 from .anthropic_client import AnthropicClient
 from .google_client import GoogleClient
+from .cached_client import CachingClient, ReplayClient
 
 
 def create_llm_client(
     provider: str,
     model: str,
     base_url: Optional[str] = None,
+    cache_path: Optional[str] = None,
+    cache_ttl: Optional[float] = None,
     **kwargs,
 ) -> BaseLLMClient:
     """Create an LLM client for the specified provider.
 
     Args:
-        provider: LLM provider (openai, anthropic, google, xai, ollama, openrouter)
+        provider: LLM provider (openai, anthropic, google, xai, ollama, openrouter,
+            or "replay" to serve recorded responses offline)
         model: Model name/identifier
         base_url: Optional base URL for API endpoint
+        cache_path: Optional SQLite response cache; identical requests are answered
+            from it instead of the provider (required for "replay")
+        cache_ttl: Seconds a cached response stays valid (None = never expires)
         **kwargs: Additional provider-specific arguments
 
     Returns:
@@ -28,16 +35,20 @@ def create_llm_client(
     """
     provider_lower = provider.lower()
 
-    if provider_lower in ("openai", "ollama", "openrouter"):
-        return OpenAIClient(model, base_url, provider=provider_lower, **kwargs)
-
-    if provider_lower == "xai":
-        return OpenAIClient(model, base_url, provider="xai", **kwargs)
-
-    if provider_lower == "anthropic":
-        return AnthropicClient(model, base_url, **kwargs)
+    if provider_lower == "replay":
+        return ReplayClient(model, base_url, cache_path=cache_path, **kwargs)
 
-    if provider_lower == "google":
-        return GoogleClient(model, base_url, **kwargs)
-
-    raise ValueError(f"Unsupported LLM provider: {provider}")
+    if provider_lower in ("openai", "ollama", "openrouter"):
+        client = OpenAIClient(model, base_url, provider=provider_lower, **kwargs)
+    elif provider_lower == "xai":
+        client = OpenAIClient(model, base_url, provider="xai", **kwargs)
+    elif provider_lower == "anthropic":
+        client = AnthropicClient(model, base_url, **kwargs)
+    elif provider_lower == "google":
+        client = GoogleClient(model, base_url, **kwargs)
+    else:
+        raise ValueError(f"Unsupported LLM provider: {provider}")
+
+    if cache_path:
+        return CachingClient(client, cache_path, cache_ttl)
+    return client
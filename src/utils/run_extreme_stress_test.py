@@ -28,10 +28,13 @@ def run_stress_test(event_name: str, target_dates: list, ticker: str):
     DataGateway.offline_mode = True
     DataGateway.offline_data_dir = os.path.join(src_dir, "backtest", "extreme_data")
     DataGateway.offline_event_name = event_name
+    # 事件行情 / 新闻只加载一次 (mmap 列式缓冲)，之后按时间游标逐点重播
+    replay = DataGateway.replay_engine()
 
     results = []
     
     for date in target_dates:
+        replay.set_cursor(date)
         console.print(f"\n[bold cyan]▶ 模拟时间坐标跃迁至恐慌回溯点: {date}[/bold cyan]")
         console.print("[dim]隔离舱启用：系统直接捕获黑天鹅新闻情绪因子并将历史 K 线导入数学分析器...[/dim]")
         
@@ -223,6 +223,9 @@ elif app_mode == "💼 AI 投资组合配资":
     with st.sidebar:
         st.subheader("模式专属参数")
         pool_input = st.text_area("股票群落代码 (以逗号或空格分隔)", value="AAPL, MSFT, NVDA, TSLA, 600519.SS", placeholder="AAPL, MSFT...", help="多支股票代码，系统将进行横向比对和配比测算")
+        port_methods = {"O-Score 打分": "score", "风险平价 (收缩协方差)": "risk_parity", "均值-方差": "mean_variance"}
+        port_method_label = st.selectbox("配资算法", list(port_methods), help="风险平价 / 均值-方差 使用本地价格库的 Ledoit-Wolf 收缩协方差，叠加 Kronos 不确定性")
+        port_max_weight = st.slider("单票权重上限 (%)", 1, 100, 100, help="仅对 风险平价 / 均值-方差 生效") / 100.0
 
         is_port_disabled = not bool(pool_input.strip())
         btn_port_help = "请输入至少一个股票代码" if is_port_disabled else "基于 O-Score 进行资金组合最优配比测算"
@@ -235,15 +238,22 @@ elif app_mode == "💼 AI 投资组合配资":
         else:
             with st.spinner(f"正在分析 {len(tickers)} 支股票的质量与波动防线..."):
                 try:
-                    out = PortfolioAllocator.allocate(tickers, as_of_date=as_of_date)
+                    out = PortfolioAllocator.allocate(tickers, as_of_date=as_of_date, method=port_methods[port_method_label],
+                                                      max_weight=port_max_weight if port_max_weight < 1.0 else None)
                     alloc_data = out["allocation"]
                     
                     valid_labels = []
                     valid_values = []
                     
-                    # 报告卡显示
-                    cols = st.columns(len(tickers))
+                    if "portfolio" in out:
+                        p = out["portfolio"]
+                        st.info(f"组合 {p['horizon_days']} 日波动率: **{p['volatility']*100:.2f}%** | "
+                                f"协方差收缩强度: {p['shrinkage']:.3f} | 有本地历史的标的: {p['covered']}/{out['valid_count']}")
+
+                    # 报告卡显示 (大股票池时每行 5 张卡)
+                    cols = st.columns(min(len(tickers), 5))
                     for i, t in enumerate(tickers):
+                        t = t.upper()
                         d = alloc_data.get(t, {})
                         with cols[i % len(cols)]:
                             if d.get("status") == "BUST":
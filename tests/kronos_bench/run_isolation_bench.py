@@ -18,7 +18,8 @@ OUTPUT_FILE = os.path.join(RESULTS_DIR, f"bench_results_{TIMESTAMP}.json")
 
 # 使用系统默认配置并覆盖 LLM 部分
 CONFIG = DEFAULT_CONFIG.copy()
-CONFIG["llm_provider"] = "ollama"
+# BENCH_LLM_PROVIDER=replay 时从 LLM 响应缓存回放，无需在线端点
+CONFIG["llm_provider"] = os.getenv("BENCH_LLM_PROVIDER", "ollama")
 CONFIG["backend_url"] = "http://localhost:11434"
 CONFIG["deep_think_llm"] = "qwen2.5:3b"
 CONFIG["quick_think_llm"] = "qwen2.5:3b"
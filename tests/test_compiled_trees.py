@@ -0,0 +1,69 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+lgb = pytest.importorskip("lightgbm")
+
+from alpharanker.model.compiled_trees import CompiledEnsemble, load_compiled, probe_matrix
+
+
+def _train(objective="regression", categorical=False, seed=0):
+    rng = np.random.default_rng(seed)
+    n = 2000
+    X = rng.normal(size=(n, 4))
+    if categorical:
+        X[:, 3] = rng.integers(0, 12, size=n)
+    X[rng.random(X.shape) < 0.1] = np.nan
+    y = np.nan_to_num(X[:, 0]) * 2 + np.nan_to_num(X[:, 1]) ** 2 + rng.normal(scale=0.1, size=n)
+    if categorical:
+        y += np.isin(X[:, 3], [1, 4, 7]) * 3.0
+    params = {"objective": objective, "num_leaves": 15, "min_data_in_leaf": 5, "verbose": -1, "seed": seed}
+    kwargs = {}
+    if objective == "lambdarank":
+        y = np.clip(np.round(y - np.nanmin(y)), 0, 30).astype(int)
+        kwargs["group"] = [100] * (n // 100)
+        params["label_gain"] = list(range(31))
+    ds = lgb.Dataset(X, y, categorical_feature=[3] if categorical else "auto", **kwargs)
+    return lgb.train(params, ds, num_boost_round=30)
+
+
+def _assert_parity(booster, X):
+    ens = CompiledEnsemble.from_booster(booster)
+    np.testing.assert_allclose(ens.predict(X), booster.predict(X), rtol=0, atol=1e-9)
+    return ens
+
+
+@pytest.mark.parametrize("objective", ["regression", "lambdarank"])
+def test_parity_with_nan_inputs(objective):
+    booster = _train(objective)
+    rng = np.random.default_rng(1)
+    X = rng.normal(size=(500, 4))
+    X[rng.random(X.shape) < 0.2] = np.nan
+    X[:50, :] = np.nan
+    X[50:100, :] = 0.0
+    ens = _assert_parity(booster, X)
+    _assert_parity(booster, probe_matrix(ens))
+
+
+def test_parity_with_categorical_inputs():
+    booster = _train(categorical=True)
+    rng = np.random.default_rng(2)
+    X = rng.normal(size=(500, 4))
+    # 训练中出现 / 未出现的类别、负数、NaN 都要走与 LightGBM 一致的分支
+    X[:, 3] = rng.choice([0, 1, 4, 7, 11, 12, 40, -1, np.nan], size=500)
+    ens = _assert_parity(booster, X)
+    assert (ens.cat_row >= 0).any()
+    _assert_parity(booster, probe_matrix(ens))
+
+
+def test_saved_artefact_roundtrip(tmp_path):
+    booster = _train(categorical=True)
+    ens = CompiledEnsemble.from_booster(booster)
+    X = probe_matrix(ens, n_samples=512)
+    loaded = load_compiled(ens.save(str(tmp_path / "model.trees.npz")))
+    np.testing.assert_allclose(loaded.predict(X), booster.predict(X), rtol=0, atol=1e-9)
@@ -0,0 +1,65 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from core.portfolio_optimizer import _bounds, risk_contributions, risk_parity
+
+
+def _random_cov(rng, n):
+    A = rng.normal(size=(n + 5, n))
+    vol = rng.uniform(0.2, 5.0, n)
+    return A.T @ A / n * 1e-4 * np.outer(vol, vol) + np.eye(n) * 1e-6
+
+
+def _assert_budgets(w, cov, budgets, lb, ub):
+    """未触界标的 RC ∝ b；触上限者不高于、触下限者不低于共同水平"""
+    assert abs(w.sum() - 1.0) < 1e-9
+    assert (w >= lb - 1e-9).all() and (w <= ub + 1e-9).all()
+    per_budget = w * (cov @ w) / budgets
+    free = (w > lb + 1e-9) & (w < ub - 1e-9)
+    assert free.sum() >= 1
+    level = per_budget[free].mean()
+    np.testing.assert_allclose(per_budget[free], level, rtol=1e-6)
+    assert (per_budget[w >= ub - 1e-9] <= level * (1 + 1e-6)).all()
+    assert (per_budget[w <= lb + 1e-9] >= level * (1 - 1e-6)).all()
+
+
+def test_unconstrained_budgets_hold():
+    rng = np.random.default_rng(0)
+    cov = _random_cov(rng, 20)
+    budgets = rng.uniform(0.2, 1.0, 20)
+    budgets /= budgets.sum()
+    w, _ = risk_parity(cov, budgets)
+    np.testing.assert_allclose(risk_contributions(w, cov), budgets, rtol=1e-8)
+
+
+def test_max_weight_keeps_equal_risk_among_uncapped():
+    # 低波动标的在无约束风险平价下会超过 30%，投影到 box 会打乱其余标的的风险贡献
+    vol = np.array([0.05, 0.20, 0.22, 0.25, 0.30])
+    corr = np.full((5, 5), 0.3) + 0.7 * np.eye(5)
+    cov = corr * np.outer(vol, vol)
+    assert risk_parity(cov)[0].max() > 0.3
+
+    w, _ = risk_parity(cov, max_weight=0.3)
+    assert w[0] == pytest.approx(0.3)
+    rc = risk_contributions(w, cov)
+    np.testing.assert_allclose(rc[1:], rc[1:].mean(), rtol=1e-8)
+    assert rc[0] < rc[1]
+    _assert_budgets(w, cov, np.full(5, 0.2), *_bounds(5, None, 0.3))
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_box_constrained_budgets_random(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(4, 30))
+    cov = _random_cov(rng, n)
+    budgets = rng.uniform(0.2, 1.0, n)
+    budgets /= budgets.sum()
+    min_weight, max_weight = 0.3 / n, 1.5 / n
+    w, _ = risk_parity(cov, budgets, min_weight, max_weight)
+    _assert_budgets(w, cov, budgets, *_bounds(n, min_weight, max_weight))
@@ -0,0 +1,75 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from alpharanker.evaluation.simulator import (
+    A_SHARE_COSTS, CostModel, reference_simulate, simulate,
+)
+
+
+def _random_case(rng):
+    T, N = rng.integers(5, 40), rng.integers(1, 8)
+    dates = pd.bdate_range("2024-01-01", periods=T)
+    cols = [f"S{i}" for i in range(N)]
+    px = 3 + np.cumprod(1 + rng.normal(0, 0.03, (T, N)), axis=0)
+    px[: rng.integers(0, 3), 0] = np.nan                   # 上市前无价格
+    raw = rng.random((T, N)) * (rng.random((T, N)) > 0.3)
+    raw = raw / np.maximum(raw.sum(axis=1, keepdims=True), 1e-9) * rng.uniform(0.5, 1.0, (T, 1))
+    raw[rng.random(T) < 0.5] = np.nan                     # 非调仓日
+    costs = CostModel(commission_bps=rng.uniform(0, 5), stamp_duty_bps=rng.uniform(0, 10),
+                      slippage_bps=rng.uniform(0, 10), min_commission=float(rng.choice([0.0, 5.0])))
+    return pd.DataFrame(raw, index=dates, columns=cols), pd.DataFrame(px, index=dates, columns=cols), costs
+
+
+def _assert_matches_reference(weights, prices, capital, costs, lot, rebalance=None):
+    res = simulate(weights, prices, capital, costs, lot_size=lot, rebalance=rebalance)
+    nav, turn, cost = reference_simulate(weights, prices, capital, costs, lot_size=lot, rebalance=rebalance)
+    np.testing.assert_allclose(res.daily["nav"], nav, rtol=1e-9, atol=1e-6)
+    np.testing.assert_allclose(res.daily["turnover"], turn, rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(res.daily["cost"], cost, rtol=1e-9, atol=1e-12)
+    return res
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("lot", [None, 100])
+def test_matches_reference_loop(seed, lot):
+    rng = np.random.default_rng(seed)
+    weights, prices, costs = _random_case(rng)
+    capital = 1_000_000.0 if lot is None else float(rng.choice([500.0, 20_000.0]))
+    res = _assert_matches_reference(weights, prices, capital, costs, lot)
+    if lot:
+        assert (res.daily["cash_weight"] >= -1e-12).all()
+
+
+def test_small_account_min_commission_never_overdraws():
+    # 500 元、两只 2.45 元各半仓：按比例预留的费用不够付两笔 5 元最低佣金，必须削减一手
+    dates = pd.bdate_range("2024-01-01", periods=3)
+    prices = pd.DataFrame({"A": [2.45] * 3, "B": [2.45] * 3}, index=dates)
+    weights = pd.DataFrame({"A": [0.5, np.nan, np.nan], "B": [0.5, np.nan, np.nan]}, index=dates)
+    res = _assert_matches_reference(weights, prices, 500.0, A_SHARE_COSTS, 100)
+    assert (res.daily["cash_weight"] >= 0).all()
+    assert res.shares.iloc[0].sum() == 100
+
+
+def test_explicit_rebalance_mask_holds_between_rebalances():
+    dates = pd.bdate_range("2024-01-01", periods=4)
+    prices = pd.DataFrame({"A": [10.0, 11.0, 12.0, 13.0]}, index=dates)
+    weights = pd.DataFrame({"A": [1.0, 0.0, 0.0, 0.0]}, index=dates)
+    rebalance = np.array([True, False, False, False])
+    res = _assert_matches_reference(weights, prices, 1_000_000.0, A_SHARE_COSTS, None, rebalance)
+    assert res.daily["turnover"].iloc[1:].eq(0).all()
+    assert res.nav.iloc[-1] > res.nav.iloc[0]
+
+
+def test_negative_weights_rejected():
+    dates = pd.bdate_range("2024-01-01", periods=2)
+    prices = pd.DataFrame({"A": [1.0, 1.0], "B": [1.0, 1.0]}, index=dates)
+    weights = pd.DataFrame({"A": [0.5, np.nan], "B": [-0.2, np.nan]}, index=dates)
+    with pytest.raises(ValueError):
+        simulate(weights, prices)